@@ -26,7 +26,13 @@ from api.routes.carga_masiva import carga_masiva_bp
 from api.routes.whatsapp_reintentos import whatsapp_reintentos_bp
 from api.routes.cuentas import cuentas_bp
 from api.routes.producto_opciones import producto_opciones_bp
+from api.metricas import instalar_metricas
+from utilidades.perfil_consultas import instalar_perfil
 from modelos.configuracion_general_modelo import ConfiguracionGeneralModelo
+from modelos.base_datos import BaseDatos
+from modelos.esquema import EsquemaBD
+from config import DB_AUTO_MIGRATE, NOTIF_ASYNC_CONFIG, WA_WEBHOOK_CONFIG
+from utilidades.logger import obtener_logger
 
 
 def create_app(config_name='development'):
@@ -38,7 +44,8 @@ def create_app(config_name='development'):
         r"/api/*": {
             "origins": "*",
             "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-            "allow_headers": ["Content-Type", "Authorization"]
+            "allow_headers": ["Content-Type", "Authorization"],
+            "expose_headers": ["X-Total-Count"]
         }
     })
     
@@ -46,6 +53,11 @@ def create_app(config_name='development'):
     app.config['JSON_SORT_KEYS'] = False
     app.config['JSON_AS_ASCII'] = False
     
+    # Latencia, consultas a la BD y tamaño de respuesta por ruta (/api/metrics)
+    instalar_metricas(app)
+    # Perfil de consultas SQL por huella (DB_PROFILER_ENABLED)
+    instalar_perfil()
+    
     # Registrar blueprints
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(usuarios_bp, url_prefix='/api/usuarios')
@@ -70,10 +82,50 @@ def create_app(config_name='development'):
     app.register_blueprint(cuentas_bp, url_prefix='/api/cuentas')
     app.register_blueprint(producto_opciones_bp, url_prefix='/api/producto-opciones')
     
+    # Esquema de la BD: migraciones pendientes y una sola lectura de information_schema
+    # El código asume el esquema de la última migración: con pendientes, /api/health responde 503
+    migraciones_pendientes = []
+    try:
+        from utilidades.migraciones import GestorMigraciones
+        gestor_migraciones = GestorMigraciones()
+        if DB_AUTO_MIGRATE:
+            try:
+                gestor_migraciones.migrar()
+            except Exception as e:
+                obtener_logger().error(f"No se pudieron aplicar las migraciones pendientes: {e}")
+        migraciones_pendientes = [
+            f"{migracion.version:04d}_{migracion.nombre}" for migracion in gestor_migraciones.pendientes()
+        ]
+        if migraciones_pendientes:
+            obtener_logger().error(
+                f"Hay {len(migraciones_pendientes)} migraciones pendientes (desde {migraciones_pendientes[0]}): "
+                "ejecute python utilidades/migraciones.py; /api/health responderá 503 hasta aplicarlas"
+            )
+        EsquemaBD.cargar()
+    except Exception as e:
+        obtener_logger().warning(f"No se pudo verificar el esquema de la BD: {e}")
+    
     # Ruta de salud
     @app.route('/api/health')
     def health_check():
         from flask import jsonify
+        if migraciones_pendientes:
+            # Se vuelve a consultar: pudieron aplicarse con la CLI sin reiniciar la API
+            try:
+                from utilidades.migraciones import GestorMigraciones
+                migraciones_pendientes[:] = [
+                    f"{migracion.version:04d}_{migracion.nombre}" for migracion in GestorMigraciones().pendientes()
+                ]
+                if not migraciones_pendientes:
+                    EsquemaBD.invalidar()
+            except Exception:
+                pass
+        if migraciones_pendientes:
+            return jsonify({
+                'status': 'error',
+                'message': 'Esquema de la base de datos desactualizado: ejecute python utilidades/migraciones.py',
+                'migraciones_pendientes': migraciones_pendientes
+            }), 503
         nombre_plataforma = "Lirios Eventos"
         try:
             config = ConfiguracionGeneralModelo().obtener_configuracion() or {}
@@ -82,6 +134,70 @@ def create_app(config_name='development'):
             pass
         return jsonify({'status': 'ok', 'message': f'API {nombre_plataforma} funcionando correctamente'}), 200
     
+    # Estadísticas del pool de conexiones (para dimensionar DB_POOL_SIZE / DB_POOL_MAX_OVERFLOW)
+    @app.route('/api/health/pool')
+    def pool_stats():
+        from flask import jsonify
+        estadisticas = BaseDatos.estadisticas_pool()
+        if estadisticas is None:
+            return jsonify({'habilitado': False}), 200
+        return jsonify({'habilitado': True, 'pool': estadisticas}), 200
+    
+    # Estado de la cola de notificaciones automáticas
+    @app.route('/api/health/notificaciones')
+    def notificaciones_stats():
+        from flask import jsonify
+        from modelos.notificacion_outbox_modelo import NotificacionOutboxModelo
+        if not NOTIF_ASYNC_CONFIG['enabled']:
+            return jsonify({'habilitado': False}), 200
+        try:
+            resumen = NotificacionOutboxModelo().obtener_resumen()
+        except Exception:
+            resumen = None
+        return jsonify({'habilitado': True, 'cola': resumen}), 200
+    
+    # Hilos que envían las notificaciones encoladas (pagos, cambios de estado)
+    if NOTIF_ASYNC_CONFIG['enabled']:
+        from integraciones.despachador_notificaciones import DespachadorNotificaciones
+        if DespachadorNotificaciones.cola_disponible():
+            DespachadorNotificaciones.obtener().iniciar()
+        else:
+            # Sin la tabla los hilos solo registrarían errores; las notificaciones se envían en línea
+            obtener_logger().warning(
+                "Despachador de notificaciones no iniciado: falta notificaciones_outbox (migración 0008)"
+            )
+    
+    # Estado de la cola de eventos del webhook de WhatsApp
+    @app.route('/api/health/webhook-whatsapp')
+    def webhook_whatsapp_stats():
+        from flask import jsonify
+        from modelos.whatsapp_webhook_cola_modelo import WhatsAppWebhookColaModelo
+        from integraciones.whatsapp_chat import WhatsAppChatService
+        escrituras = WhatsAppChatService.estadisticas_webhook()
+        if not WA_WEBHOOK_CONFIG['async_enabled']:
+            return jsonify({'habilitado': False, 'escrituras': escrituras}), 200
+        try:
+            resumen = WhatsAppWebhookColaModelo().obtener_resumen()
+        except Exception:
+            resumen = None
+        return jsonify({'habilitado': True, 'cola': resumen, 'escrituras': escrituras}), 200
+    
+    # Hilos que procesan los mensajes y estados recibidos por el webhook
+    if WA_WEBHOOK_CONFIG['async_enabled']:
+        from integraciones.procesador_webhook_whatsapp import ProcesadorWebhookWhatsApp
+        if ProcesadorWebhookWhatsApp.cola_disponible():
+            ProcesadorWebhookWhatsApp.obtener().iniciar()
+        else:
+            # El webhook procesa en el request hasta que exista la tabla
+            obtener_logger().warning(
+                "Procesador del webhook de WhatsApp no iniciado: falta whatsapp_webhook_entrantes (migración 0009)"
+            )
+    
+    # Devolver al pool la conexión que el request haya fijado al hilo
+    @app.teardown_request
+    def liberar_conexion_bd(error=None):
+        BaseDatos.liberar_conexion_hilo()
+    
     # Obtener la ruta raíz del dominio (desde GestionEventos/api/app.py)
     def get_root_dir():
         """Obtiene la ruta raíz del dominio"""
@@ -0,0 +1,243 @@
+"""
+Instrumentación de la API: latencia, estado, tamaño de respuesta y uso de la
+base de datos por ruta, expuestos en /api/metrics en formato Prometheus
+"""
+import hmac
+import json
+import threading
+import time
+from flask import Response, g, request
+from config import METRICAS_CONFIG
+from api.middleware import requiere_rol
+from modelos.base_datos import BaseDatos
+from utilidades.logger import obtener_logger
+
+
+# Límites (segundos) de los buckets del histograma de latencia
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Límites de los buckets de consultas a la BD por request
+BUCKETS_CONSULTAS = (0, 1, 2, 5, 10, 20, 50, 100)
+# Ruta usada cuando el request no coincide con ninguna (404): evita una serie por URL
+RUTA_DESCONOCIDA = "sin_ruta"
+
+
+def _es_local():
+    """Request hecho desde la propia máquina y no reenviado por un proxy"""
+    return request.remote_addr in ('127.0.0.1', '::1') and not request.headers.get('X-Forwarded-For')
+
+
+class Histograma:
+    """Histograma acumulado al estilo Prometheus (buckets, suma y cantidad)"""
+
+    def __init__(self, limites):
+        self.limites = limites
+        self.conteos = [0] * len(limites)
+        self.suma = 0.0
+        self.cantidad = 0
+
+    def observar(self, valor):
+        self.suma += valor
+        self.cantidad += 1
+        for indice, limite in enumerate(self.limites):
+            if valor <= limite:
+                self.conteos[indice] += 1
+                break
+
+
+class MetricasAPI:
+    """Acumula las mediciones de todos los requests del proceso"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latencia = {}
+        self._consultas = {}
+        self._tiempo_bd = {}
+        self._bytes = {}
+        self._requests = {}
+        self._lentos = 0
+
+    def registrar(self, metodo, ruta, estado, segundos, consultas, segundos_bd, tamano, lento=False):
+        clave = (metodo, ruta)
+        with self._lock:
+            if clave not in self._latencia:
+                self._latencia[clave] = Histograma(BUCKETS_LATENCIA)
+                self._consultas[clave] = Histograma(BUCKETS_CONSULTAS)
+                self._tiempo_bd[clave] = 0.0
+                self._bytes[clave] = 0
+            self._latencia[clave].observar(segundos)
+            self._consultas[clave].observar(consultas)
+            self._tiempo_bd[clave] += segundos_bd
+            self._bytes[clave] += tamano
+            clave_estado = (metodo, ruta, str(estado))
+            self._requests[clave_estado] = self._requests.get(clave_estado, 0) + 1
+            if lento:
+                self._lentos += 1
+
+    def exportar(self):
+        """Texto en formato de exposición de Prometheus"""
+        with self._lock:
+            latencia = {clave: (list(h.conteos), h.suma, h.cantidad) for clave, h in self._latencia.items()}
+            consultas = {clave: (list(h.conteos), h.suma, h.cantidad) for clave, h in self._consultas.items()}
+            tiempo_bd = dict(self._tiempo_bd)
+            tamanos = dict(self._bytes)
+            requests = dict(self._requests)
+            lentos = self._lentos
+
+        lineas = []
+        lineas += _exportar_histograma(
+            "lirios_http_request_duration_seconds", "Latencia de los requests por ruta",
+            BUCKETS_LATENCIA, latencia
+        )
+        lineas += _exportar_histograma(
+            "lirios_http_request_db_queries", "Consultas a la BD por request",
+            BUCKETS_CONSULTAS, consultas
+        )
+        lineas.append("# HELP lirios_http_request_db_seconds_total Tiempo en la BD acumulado por ruta")
+        lineas.append("# TYPE lirios_http_request_db_seconds_total counter")
+        for (metodo, ruta), valor in sorted(tiempo_bd.items()):
+            lineas.append(f"lirios_http_request_db_seconds_total{_etiquetas(metodo=metodo, ruta=ruta)} {valor:.6f}")
+        lineas.append("# HELP lirios_http_response_bytes_total Bytes de respuesta acumulados por ruta")
+        lineas.append("# TYPE lirios_http_response_bytes_total counter")
+        for (metodo, ruta), valor in sorted(tamanos.items()):
+            lineas.append(f"lirios_http_response_bytes_total{_etiquetas(metodo=metodo, ruta=ruta)} {valor}")
+        lineas.append("# HELP lirios_http_requests_total Requests por ruta y código de estado")
+        lineas.append("# TYPE lirios_http_requests_total counter")
+        for (metodo, ruta, estado), valor in sorted(requests.items()):
+            lineas.append(f"lirios_http_requests_total{_etiquetas(metodo=metodo, ruta=ruta, estado=estado)} {valor}")
+        lineas.append("# HELP lirios_http_slow_requests_total Requests más lentos que METRICS_SLOW_REQUEST_MS")
+        lineas.append("# TYPE lirios_http_slow_requests_total counter")
+        lineas.append(f"lirios_http_slow_requests_total {lentos}")
+        lineas += _exportar_procesos()
+        return "\n".join(lineas) + "\n"
+
+
+def _etiquetas(**valores):
+    partes = []
+    for nombre, valor in valores.items():
+        valor = str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        partes.append(f'{nombre}="{valor}"')
+    return "{" + ",".join(partes) + "}"
+
+
+def _exportar_histograma(nombre, ayuda, limites, series):
+    lineas = [f"# HELP {nombre} {ayuda}", f"# TYPE {nombre} histogram"]
+    for (metodo, ruta), (conteos, suma, cantidad) in sorted(series.items()):
+        acumulado = 0
+        for limite, conteo in zip(limites, conteos):
+            acumulado += conteo
+            lineas.append(
+                f"{nombre}_bucket{_etiquetas(metodo=metodo, ruta=ruta, le=f'{limite:g}')} {acumulado}"
+            )
+        lineas.append(f"{nombre}_bucket{_etiquetas(metodo=metodo, ruta=ruta, le='+Inf')} {cantidad}")
+        lineas.append(f"{nombre}_sum{_etiquetas(metodo=metodo, ruta=ruta)} {suma:.6f}")
+        lineas.append(f"{nombre}_count{_etiquetas(metodo=metodo, ruta=ruta)} {cantidad}")
+    return lineas
+
+
+def _exportar_procesos():
+    """Indicadores del pool de conexiones y del logger"""
+    lineas = []
+    pool = BaseDatos.estadisticas_pool()
+    if pool:
+        for clave, valor in pool.items():
+            if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+                nombre = f"lirios_db_pool_{clave}"
+                lineas.append(f"# TYPE {nombre} gauge")
+                lineas.append(f"{nombre} {valor}")
+    logger = obtener_logger().estadisticas()
+    lineas.append("# HELP lirios_log_lines_dropped_total Líneas de log descartadas por cola llena")
+    lineas.append("# TYPE lirios_log_lines_dropped_total counter")
+    lineas.append(f"lirios_log_lines_dropped_total {logger['descartadas']}")
+    lineas.append("# TYPE lirios_log_queue_size gauge")
+    lineas.append(f"lirios_log_queue_size {logger['en_cola']}")
+    return lineas
+
+
+metricas_api = MetricasAPI()
+# Medición del request en curso en cada hilo (la completa el observador de BaseDatos)
+_medicion = threading.local()
+
+
+def _observar_consulta(consulta, parametros, segundos, filas, error):
+    medicion = getattr(_medicion, 'actual', None)
+    if medicion is None:
+        return
+    medicion['consultas'] += 1
+    medicion['segundos_bd'] += segundos
+    sentencias = medicion['sql']
+    if sentencias is not None and len(sentencias) < METRICAS_CONFIG['max_sql']:
+        sentencias.append({
+            'sql': " ".join(str(consulta).split())[:1000],
+            'ms': round(segundos * 1000, 2),
+            'error': str(error)[:200] if error else None
+        })
+
+
+def instalar_metricas(app):
+    """Registra los hooks de medición y la ruta /api/metrics en la app"""
+    if not METRICAS_CONFIG['enabled']:
+        return
+    BaseDatos.agregar_observador(_observar_consulta)
+    logger = obtener_logger()
+
+    @app.before_request
+    def iniciar_medicion():
+        g.metricas_inicio = time.perf_counter()
+        _medicion.actual = {
+            'consultas': 0,
+            'segundos_bd': 0.0,
+            'sql': [] if METRICAS_CONFIG['capture_sql'] and METRICAS_CONFIG['slow_request_ms'] > 0 else None
+        }
+
+    @app.after_request
+    def registrar_medicion(response):
+        inicio = g.pop('metricas_inicio', None)
+        medicion = getattr(_medicion, 'actual', None)
+        _medicion.actual = None
+        if inicio is None or medicion is None:
+            return response
+        segundos = time.perf_counter() - inicio
+        ruta = request.url_rule.rule if request.url_rule is not None else RUTA_DESCONOCIDA
+        tamano = response.calculate_content_length() or 0
+        lento = 0 < METRICAS_CONFIG['slow_request_ms'] <= segundos * 1000
+        metricas_api.registrar(
+            request.method, ruta, response.status_code, segundos,
+            medicion['consultas'], medicion['segundos_bd'], tamano, lento
+        )
+        if lento:
+            registro = {
+                'tipo': 'request_lento',
+                'metodo': request.method,
+                'ruta': ruta,
+                'path': request.path,
+                'estado': response.status_code,
+                'duracion_ms': round(segundos * 1000, 1),
+                'consultas_bd': medicion['consultas'],
+                'tiempo_bd_ms': round(medicion['segundos_bd'] * 1000, 1),
+                'bytes': tamano
+            }
+            if medicion['sql'] is not None:
+                registro['sql'] = medicion['sql']
+            logger.warning(json.dumps(registro, ensure_ascii=False, default=str))
+        return response
+
+    def _respuesta_metricas():
+        return Response(metricas_api.exportar(), mimetype="text/plain; version=0.0.4; charset=utf-8")
+
+    metricas_administrador = requiere_rol('administrador')(_respuesta_metricas)
+
+    @app.route('/api/metrics')
+    def exportar_metricas():
+        """
+        Con METRICS_TOKEN se exige ese token. Sin él, solo desde la propia
+        máquina (sin proxy de por medio) o con la sesión de un administrador.
+        """
+        token = METRICAS_CONFIG['token']
+        if token:
+            encabezado = request.headers.get('Authorization', '')
+            if not hmac.compare_digest(encabezado.encode(), f"Bearer {token}".encode()):
+                return Response("No autorizado\n", status=401, mimetype="text/plain")
+            return _respuesta_metricas()
+        if _es_local():
+            return _respuesta_metricas()
+        return metricas_administrador()
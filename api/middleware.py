@@ -1,15 +1,54 @@
 """
 Middleware para autenticación y autorización con JWT
 """
+import time
 from functools import wraps
 from flask import request, jsonify
+from config import AUTH_CACHE_CONFIG
 from modelos.usuario_modelo import UsuarioModelo
 from api.jwt_utils import verificar_token, extraer_token_del_header
+from utilidades.cache_lru import CacheLRU
 from utilidades.logger import obtener_logger
 
 logger = obtener_logger()
 usuario_modelo = UsuarioModelo()
 
+# Usuarios por id y payloads de tokens ya verificados: en el caso común el
+# decorador no consulta la base de datos (el frontend hace polling cada pocos segundos)
+cache_usuarios = CacheLRU(AUTH_CACHE_CONFIG['max_usuarios'], AUTH_CACHE_CONFIG['ttl'])
+cache_tokens = CacheLRU(AUTH_CACHE_CONFIG['max_tokens'], AUTH_CACHE_CONFIG['ttl'])
+
+
+def invalidar_usuario_cache(usuario_id):
+    """Descarta el usuario de la caché (llamar al modificarlo o desactivarlo)"""
+    if usuario_id is not None:
+        cache_usuarios.invalidar(int(usuario_id))
+
+
+def _verificar_token_cache(token):
+    """verificar_token con caché; la entrada nunca dura más que el token"""
+    payload = cache_tokens.obtener(token)
+    if payload is not None:
+        if payload.get('exp') and payload['exp'] <= time.time():
+            cache_tokens.invalidar(token)
+            return None
+        return payload
+    payload = verificar_token(token)
+    if payload:
+        restante = payload['exp'] - time.time() if payload.get('exp') else None
+        cache_tokens.guardar(token, payload, ttl=restante)
+    return payload
+
+
+def _obtener_usuario_cache(usuario_id):
+    usuario = cache_usuarios.obtener(usuario_id)
+    if usuario is None:
+        usuario = usuario_modelo.obtener_usuario_por_id(usuario_id)
+        if usuario:
+            cache_usuarios.guardar(usuario_id, usuario)
+    # Copia: las rutas pueden modificar request.usuario_actual
+    return dict(usuario) if usuario else usuario
+
 
 def requiere_autenticacion(f):
     """Decorador para requerir autenticación usando JWT tokens"""
@@ -34,7 +73,7 @@ def requiere_autenticacion(f):
             }), 401
         
         # Verificar token
-        payload = verificar_token(token)
+        payload = _verificar_token_cache(token)
         if not payload:
             return jsonify({
                 'error': 'Token inválido o expirado',
@@ -43,7 +82,7 @@ def requiere_autenticacion(f):
         
         # Obtener usuario desde la base de datos
         try:
-            usuario = usuario_modelo.obtener_usuario_por_id(payload['user_id'])
+            usuario = _obtener_usuario_cache(payload['user_id'])
             if not usuario:
                 return jsonify({'error': 'Usuario no encontrado'}), 401
             
@@ -53,7 +92,7 @@ def requiere_autenticacion(f):
             
             # Agregar usuario al request
             request.usuario_actual = usuario
-            request.token_payload = payload
+            request.token_payload = dict(payload)
             
             return f(*args, **kwargs)
         
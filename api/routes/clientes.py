@@ -3,7 +3,7 @@ Rutas para gestión de clientes
 """
 from flask import Blueprint, request, jsonify
 from modelos.cliente_modelo import ClienteModelo
-from api.middleware import requiere_autenticacion, requiere_rol, obtener_usuario_actual
+from api.middleware import requiere_autenticacion, requiere_rol, obtener_usuario_actual, invalidar_usuario_cache
 from utilidades.logger import obtener_logger
 
 clientes_bp = Blueprint('clientes', __name__)
@@ -159,6 +159,7 @@ def actualizar_cliente(cliente_id):
             }
             
             resultado_usuario = usuario_modelo.actualizar_usuario(usuario_id, datos_usuario)
+            invalidar_usuario_cache(usuario_id)
             if not resultado_usuario:
                 return jsonify({'error': 'Error al actualizar los datos del usuario'}), 500
         
@@ -2,10 +2,12 @@
 Rutas para utilidades de configuracion (limpieza de datos de prueba)
 """
 from flask import Blueprint, jsonify, request
+from config import PERFIL_CONSULTAS_CONFIG
 from api.middleware import requiere_autenticacion, requiere_rol
 from modelos.base_datos import BaseDatos
 from utilidades.logger import obtener_logger
 from modelos.configuracion_general_modelo import ConfiguracionGeneralModelo
+from utilidades.perfil_consultas import ORDENES, PerfilConsultas
 
 
 configuraciones_bp = Blueprint("configuraciones", __name__)
@@ -138,3 +140,28 @@ def actualizar_configuracion_general():
     except Exception as e:
         logger.error(f"Error al actualizar configuracion general: {e}")
         return jsonify({"error": "No se pudo actualizar la configuracion general"}), 500
+
+
+@configuraciones_bp.route("/perfil-consultas", methods=["GET"])
+@requiere_autenticacion
+@requiere_rol("administrador")
+def obtener_perfil_consultas():
+    """Consultas SQL más costosas de este proceso (?top=20&orden=total|p95|cantidad|filas|promedio)"""
+    if not PERFIL_CONSULTAS_CONFIG["enabled"]:
+        return jsonify({"error": "El perfil de consultas está desactivado (DB_PROFILER_ENABLED)"}), 404
+    orden = request.args.get("orden", "total")
+    if orden not in ORDENES:
+        return jsonify({"error": f"Orden inválido, use: {', '.join(ORDENES)}"}), 400
+    top = max(1, min(request.args.get("top", 20, type=int) or 20, 500))
+    return jsonify(PerfilConsultas.obtener().resumen(top=top, orden=orden)), 200
+
+
+@configuraciones_bp.route("/perfil-consultas", methods=["DELETE"])
+@requiere_autenticacion
+@requiere_rol("administrador")
+def reiniciar_perfil_consultas():
+    """Reinicia los acumulados del perfil de consultas de este proceso"""
+    if not PERFIL_CONSULTAS_CONFIG["enabled"]:
+        return jsonify({"error": "El perfil de consultas está desactivado (DB_PROFILER_ENABLED)"}), 404
+    PerfilConsultas.obtener().reiniciar()
+    return jsonify({"message": "Perfil de consultas reiniciado"}), 200
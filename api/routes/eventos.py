@@ -15,11 +15,29 @@ evento_modelo = EventoModelo()
 usuario_modelo = UsuarioModelo()
 pago_modelo = PagoModelo()
 
+LIMITE_POR_DEFECTO_EVENTOS = 50
+LIMITE_MAXIMO_EVENTOS = 500
+# Campos calculados (no provienen de la tabla eventos)
+CAMPOS_PROGRESO = ('progreso_servicios', 'porcentaje_avance_servicios')
+
 
 @eventos_bp.route('', methods=['GET'])
 @requiere_autenticacion
 def obtener_eventos():
-    """Obtiene todos los eventos"""
+    """
+    Obtiene todos los eventos.
+
+    Si se envía alguno de los parámetros limite, cursor, orden o fields la
+    respuesta es paginada por cursor:
+        - limite: eventos por página (máximo LIMITE_MAXIMO_EVENTOS)
+        - cursor: valor 'siguiente_cursor' de la página anterior
+        - orden: id_desc (por defecto), id_asc, fecha_desc, fecha_asc
+        - fields: campos a incluir separados por coma
+        - filtros: estado, fecha, fecha_desde, fecha_hasta, cliente_id, coordinador_id, id_salon
+    El total de eventos del filtro se retorna en el header X-Total-Count.
+    """
+    if any(parametro in request.args for parametro in ('limite', 'cursor', 'orden', 'fields')):
+        return obtener_eventos_paginados()
     try:
         filtro_estado = request.args.get('estado')
         filtro_fecha = request.args.get('fecha')
@@ -34,20 +52,70 @@ def obtener_eventos():
         else:
             eventos = evento_modelo.obtener_todos_eventos(filtro_estado=filtro_estado, filtro_fecha=filtro_fecha)
         
-        # Calcular y agregar porcentaje de avance para cada evento
-        for evento in eventos:
-            evento_id = evento.get('id_evento') or evento.get('id')
-            if evento_id:
-                evento['progreso_servicios'] = evento_modelo.obtener_porcentaje_avance_servicios(evento_id)
-                # Mantener compatibilidad con nombre anterior
-                evento['porcentaje_avance_servicios'] = evento['progreso_servicios']
-        
+        # Calcular y agregar porcentaje de avance de todos los eventos en una sola consulta
+        evento_modelo.agregar_progreso_servicios(eventos)
+
         return jsonify({'eventos': eventos}), 200
     except Exception as e:
         logger.error(f"Error al obtener eventos: {str(e)}")
         return jsonify({'error': 'Error al obtener eventos'}), 500
 
 
+def obtener_eventos_paginados():
+    """Listado de eventos paginado por cursor, con orden y proyección de campos"""
+    try:
+        try:
+            limite = int(request.args.get('limite', LIMITE_POR_DEFECTO_EVENTOS))
+        except ValueError:
+            return jsonify({'error': 'limite debe ser un número'}), 400
+        limite = max(1, min(limite, LIMITE_MAXIMO_EVENTOS))
+        
+        campos = None
+        incluir_progreso = True
+        if request.args.get('fields'):
+            campos = [campo.strip() for campo in request.args.get('fields').split(',') if campo.strip()]
+            incluir_progreso = any(campo in CAMPOS_PROGRESO for campo in campos)
+            campos = [campo for campo in campos if campo not in CAMPOS_PROGRESO]
+            if incluir_progreso and 'id_evento' not in campos:
+                campos.append('id_evento')
+        
+        filtros = {
+            'estado': request.args.get('estado'),
+            'fecha': request.args.get('fecha'),
+            'fecha_desde': request.args.get('fecha_desde'),
+            'fecha_hasta': request.args.get('fecha_hasta'),
+            'cliente_id': request.args.get('cliente_id', type=int),
+            'coordinador_id': request.args.get('coordinador_id', type=int),
+            'id_salon': request.args.get('id_salon', type=int)
+        }
+        
+        try:
+            eventos, siguiente_cursor = evento_modelo.listar_eventos_paginado(
+                filtros=filtros,
+                orden=request.args.get('orden', 'id_desc'),
+                limite=limite,
+                cursor=request.args.get('cursor'),
+                campos=campos
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        if incluir_progreso:
+            evento_modelo.agregar_progreso_servicios(eventos)
+        
+        respuesta = jsonify({
+            'eventos': eventos,
+            'siguiente_cursor': siguiente_cursor,
+            'limite': limite
+        })
+        # El total se calcula con un COUNT aparte (sin joins) sobre los mismos filtros
+        respuesta.headers['X-Total-Count'] = str(evento_modelo.contar_eventos(filtros))
+        return respuesta, 200
+    except Exception as e:
+        logger.error(f"Error al obtener eventos paginados: {str(e)}")
+        return jsonify({'error': 'Error al obtener eventos'}), 500
+
+
 @eventos_bp.route('/<int:evento_id>', methods=['GET'])
 @requiere_autenticacion
 def obtener_evento(evento_id):
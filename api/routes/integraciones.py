@@ -6,6 +6,8 @@ from api.middleware import requiere_autenticacion, requiere_rol
 from modelos.integracion_modelo import IntegracionModelo
 from utilidades.logger import obtener_logger
 from integraciones.whatsapp_chat import WhatsAppChatService
+from integraciones.procesador_webhook_whatsapp import ProcesadorWebhookWhatsApp, encolar_webhook
+from config import WA_WEBHOOK_CONFIG
 
 
 integraciones_bp = Blueprint("integraciones", __name__)
@@ -74,6 +76,16 @@ def whatsapp_webhook():
 
     payload = request.get_json(silent=True) or {}
     logger.info(f"WhatsApp webhook recibido: {payload}")
+    # Sin la tabla de la cola (migración 0009 sin aplicar) se procesa en el request como antes
+    if WA_WEBHOOK_CONFIG["async_enabled"] and ProcesadorWebhookWhatsApp.cola_disponible():
+        # Responder a Meta de inmediato; los eventos se procesan en segundo plano
+        try:
+            encolar_webhook(payload)
+        except Exception as e:
+            # Sin cola no hay durabilidad: responder error para que Meta reintente
+            logger.error(f"Error al encolar webhook WhatsApp: {str(e)}")
+            return "Error", 500
+        return "OK", 200
     try:
         WhatsAppChatService().procesar_webhook(payload)
     except Exception as e:
@@ -2,6 +2,7 @@
 Rutas para gestión de inventario
 """
 from flask import Blueprint, request, jsonify
+from modelos.esquema import EsquemaBD
 from modelos.inventario_modelo import InventarioModelo
 from modelos.producto_modelo import ProductoModelo
 from api.middleware import requiere_autenticacion, requiere_rol
@@ -142,14 +143,7 @@ def obtener_movimientos_cardex():
         base_datos = BaseDatos()
         
         # Verificar si la tabla existe
-        tabla_existe = base_datos.obtener_uno("""
-            SELECT COUNT(*) as total
-            FROM information_schema.TABLES
-            WHERE TABLE_SCHEMA = DATABASE()
-              AND TABLE_NAME = 'movimientos_inventario'
-        """) or {}
-        
-        if int(tabla_existe.get("total") or 0) == 0:
+        if not EsquemaBD.tabla_existe('movimientos_inventario'):
             return jsonify({'movimientos': [], 'mensaje': 'Tabla de movimientos no existe aún'}), 200
         
         # Obtener movimientos con nombre de producto, evento y cliente
@@ -181,24 +181,18 @@ def actualizar_estado_pago(pago_id):
                 logger.warning(f"Error al actualizar estado del evento {evento_id} tras aprobación: {e}")
         elif nuevo_estado == 'rechazado' and estado_anterior != 'rechazado' and evento_id:
             try:
-                from modelos.evento_modelo import EventoModelo
-                from integraciones.notificaciones_automaticas import NotificacionesAutomaticas
-                evento_modelo = EventoModelo()
-                evento = evento_modelo.obtener_evento_por_id(evento_id)
-                if evento:
-                    notif = NotificacionesAutomaticas()
-                    try:
-                        notif.enviar_notificacion_pago_anulado(
-                            evento=evento,
-                            monto=float(pago_actualizado.get('monto') or 0),
-                            metodo_pago=pago_actualizado.get('metodo_pago') or '',
-                            fecha_pago=str(pago_actualizado.get('fecha_pago') or ''),
-                            observaciones=pago_actualizado.get('observaciones')
-                        )
-                    except Exception as e:
-                        logger.warning(f"No se pudo enviar notificación de pago anulado {pago_id}: {e}")
+                # Se encola y se envía en segundo plano
+                from integraciones.despachador_notificaciones import encolar_notificacion
+                encolar_notificacion(
+                    'pago_anulado',
+                    evento_id,
+                    monto=float(pago_actualizado.get('monto') or 0),
+                    metodo_pago=pago_actualizado.get('metodo_pago') or '',
+                    fecha_pago=str(pago_actualizado.get('fecha_pago') or ''),
+                    observaciones=pago_actualizado.get('observaciones')
+                )
             except Exception as e:
-                logger.warning(f"Error al procesar anulación del pago {pago_id}: {e}")
+                logger.warning(f"No se pudo enviar notificación de pago anulado {pago_id}: {e}")
 
         return jsonify({
             'message': 'Estado actualizado',
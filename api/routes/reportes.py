@@ -2,16 +2,19 @@
 Rutas para reportes y métricas
 """
 import csv
-import io
-from datetime import datetime
+import itertools
+import tempfile
+from datetime import date, datetime
+from decimal import Decimal
 from flask import Blueprint, request, jsonify, Response
+from openpyxl import Workbook
 from modelos.evento_modelo import EventoModelo
 from modelos.pago_modelo import PagoModelo
 from modelos.cliente_modelo import ClienteModelo
 from modelos.producto_modelo import ProductoModelo
-from modelos.plan_modelo import PlanModelo
-from modelos.salon_modelo import SalonModelo
+from modelos.reporte_modelo import ReporteModelo
 from modelos.base_datos import BaseDatos
+from modelos.esquema import EsquemaBD
 from api.middleware import requiere_autenticacion, requiere_rol
 from utilidades.logger import obtener_logger
 
@@ -22,21 +25,12 @@ evento_modelo = EventoModelo()
 pago_modelo = PagoModelo()
 cliente_modelo = ClienteModelo()
 producto_modelo = ProductoModelo()
-plan_modelo = PlanModelo()
-salon_modelo = SalonModelo()
+reporte_modelo = ReporteModelo()
 base_datos = BaseDatos()
 
 
 def _columna_existe(tabla, columna):
-    consulta = """
-    SELECT COUNT(*) as total
-    FROM information_schema.COLUMNS
-    WHERE TABLE_SCHEMA = DATABASE()
-      AND TABLE_NAME = %s
-      AND COLUMN_NAME = %s
-    """
-    row = base_datos.obtener_uno(consulta, (tabla, columna)) or {}
-    return int(row.get("total") or 0) > 0
+    return EsquemaBD.columna_existe(tabla, columna)
 
 
 @reportes_bp.route('/metricas', methods=['GET'])
@@ -49,27 +43,21 @@ def obtener_metricas():
         fecha_desde = request.args.get('fecha_desde')
         fecha_hasta = request.args.get('fecha_hasta')
         
-        # Obtener datos (filtrados por fecha si se proporcionan)
-        if fecha_desde or fecha_hasta:
-            eventos = evento_modelo.obtener_eventos_por_rango(fecha_desde, fecha_hasta)
-        else:
-            eventos = evento_modelo.obtener_todos_eventos()
-        clientes = cliente_modelo.obtener_todos_clientes()
-        productos = producto_modelo.obtener_todos_productos(solo_activos=False)
-        planes = plan_modelo.obtener_todos_planes(solo_activos=False)
-        salones = salon_modelo.obtener_todos_salones(solo_activos=False)
+        # Indicadores calculados en MySQL (GROUP BY estado + conteos agregados)
+        metricas_eventos = reporte_modelo.obtener_metricas_eventos(fecha_desde, fecha_hasta)
+        recursos = reporte_modelo.obtener_conteos_recursos()
         
         # Calcular métricas de eventos
-        total_eventos = len(eventos)
-        eventos_confirmados = len([e for e in eventos if e.get('estado') == 'confirmado'])
-        eventos_completados = len([e for e in eventos if e.get('estado') == 'completado'])
-        eventos_en_proceso = len([e for e in eventos if e.get('estado') == 'en_proceso'])
-        eventos_cotizacion = len([e for e in eventos if e.get('estado') == 'cotizacion'])
-        eventos_cancelados = len([e for e in eventos if e.get('estado') == 'cancelado'])
+        total_eventos = metricas_eventos['total']
+        eventos_confirmados = metricas_eventos['por_estado']['confirmado']
+        eventos_completados = metricas_eventos['por_estado']['completado']
+        eventos_en_proceso = metricas_eventos['por_estado']['en_proceso']
+        eventos_cotizacion = metricas_eventos['por_estado']['cotizacion']
+        eventos_cancelados = metricas_eventos['por_estado']['cancelado']
         
         # Calcular métricas financieras
-        total_ingresos = sum(float(e.get('total', e.get('precio_total', 0) or 0)) for e in eventos)
-        total_pendiente = sum(float(e.get('saldo', e.get('saldo_pendiente', 0) or 0)) for e in eventos)
+        total_ingresos = metricas_eventos['total_ingresos']
+        total_pendiente = metricas_eventos['total_pendiente']
         total_cobrado = total_ingresos - total_pendiente
         porcentaje_cobrado = (total_cobrado / total_ingresos * 100) if total_ingresos > 0 else 0
         ticket_promedio = (total_ingresos / total_eventos) if total_eventos > 0 else 0
@@ -78,19 +66,19 @@ def obtener_metricas():
         total_pagos = pago_modelo.obtener_total_pagos()
         
         # Calcular métricas de clientes
-        total_clientes = len(clientes)
+        total_clientes = recursos['total_clientes']
         promedio_eventos_cliente = (total_eventos / total_clientes) if total_clientes > 0 else 0
         
         # Calcular métricas de recursos
-        total_productos = len(productos)
-        productos_activos = len([p for p in productos if p.get('activo', True)])
-        total_planes = len(planes)
-        planes_activos = len([p for p in planes if p.get('activo', True)])
-        total_salones = len(salones)
-        salones_activos = len([s for s in salones if s.get('activo', True)])
+        total_productos = recursos['total_productos']
+        productos_activos = recursos['productos_activos']
+        total_planes = recursos['total_planes']
+        planes_activos = recursos['planes_activos']
+        total_salones = recursos['total_salones']
+        salones_activos = recursos['salones_activos']
         
         # Calcular promedio de invitados
-        total_invitados = sum(int(e.get('numero_invitados', 0) or 0) for e in eventos)
+        total_invitados = metricas_eventos['total_invitados']
         promedio_invitados = (total_invitados / total_eventos) if total_eventos > 0 else 0
 
         # Métricas de notificaciones y WhatsApp (costos + segmentación)
@@ -98,15 +86,8 @@ def obtener_metricas():
         precio_email = 0.0
         try:
             # Verificar si la tabla existe antes de consultarla
-            tabla_existe = base_datos.obtener_uno(
-                """
-                SELECT COUNT(*) as total
-                FROM information_schema.TABLES
-                WHERE TABLE_SCHEMA = DATABASE()
-                  AND TABLE_NAME = 'whatsapp_metricas_config'
-                """
-            ) or {}
-            if int(tabla_existe.get("total") or 0) > 0:
+            tabla_existe = EsquemaBD.tabla_existe('whatsapp_metricas_config')
+            if tabla_existe:
                 config_costos = base_datos.obtener_uno(
                     "SELECT precio_whatsapp, precio_email, maximo_whatsapp, maximo_email FROM whatsapp_metricas_config ORDER BY id ASC LIMIT 1"
                 ) or {}
@@ -125,15 +106,7 @@ def obtener_metricas():
             maximo_email = None
 
         # Verificar si la tabla historial_notificaciones existe
-        tabla_notif_existe = base_datos.obtener_uno(
-            """
-            SELECT COUNT(*) as total
-            FROM information_schema.TABLES
-            WHERE TABLE_SCHEMA = DATABASE()
-              AND TABLE_NAME = 'historial_notificaciones'
-            """
-        ) or {}
-        tiene_tabla_notif = int(tabla_notif_existe.get("total") or 0) > 0
+        tiene_tabla_notif = EsquemaBD.tabla_existe('historial_notificaciones')
         
         tiene_costo_email = False
         tiene_costo_whatsapp = False
@@ -142,99 +115,40 @@ def obtener_metricas():
             tiene_costo_whatsapp = _columna_existe("historial_notificaciones", "costo_whatsapp")
         
         # Verificar si la tabla whatsapp_mensajes existe (necesario para calcular notificaciones WhatsApp)
-        tabla_chat_existe = base_datos.obtener_uno(
-            """
-            SELECT COUNT(*) as total
-            FROM information_schema.TABLES
-            WHERE TABLE_SCHEMA = DATABASE()
-              AND TABLE_NAME = 'whatsapp_mensajes'
-            """
-        ) or {}
-        tiene_tabla_chat = int(tabla_chat_existe.get("total") or 0) > 0
-        
-        # Construir filtros de fecha para consultas de notificaciones
-        filtro_fecha_notif = "WHERE enviado = TRUE"
-        filtro_fecha_wa = ""
-        if fecha_desde and fecha_hasta:
-            filtro_fecha_notif = f"WHERE enviado = TRUE AND fecha_envio BETWEEN '{fecha_desde}' AND '{fecha_hasta} 23:59:59'"
-            filtro_fecha_wa = f"WHERE fecha_creacion BETWEEN '{fecha_desde}' AND '{fecha_hasta} 23:59:59'"
-        elif fecha_desde:
-            filtro_fecha_notif = f"WHERE enviado = TRUE AND fecha_envio >= '{fecha_desde}'"
-            filtro_fecha_wa = f"WHERE fecha_creacion >= '{fecha_desde}'"
-        elif fecha_hasta:
-            filtro_fecha_notif = f"WHERE enviado = TRUE AND fecha_envio <= '{fecha_hasta} 23:59:59'"
-            filtro_fecha_wa = f"WHERE fecha_creacion <= '{fecha_hasta} 23:59:59'"
-
+        tiene_tabla_chat = EsquemaBD.tabla_existe('whatsapp_mensajes')
+        
+        # Totales por canal/tipo (rollup diario para días cerrados + día actual en vivo)
         notif_totales = {}
+        notif_por_tipo = []
         if tiene_tabla_notif:
             try:
-                consulta_notif = f"""
-                SELECT
-                  SUM(CASE WHEN canal='email' THEN 1 WHEN canal='ambos' THEN 1 ELSE 0 END) as email_out,
-                  SUM(CASE WHEN canal='whatsapp' THEN 1 WHEN canal='ambos' THEN 1 ELSE 0 END) as whatsapp_out,
-                  SUM(COALESCE(costo_email, 0)) as costo_email_total,
-                  SUM(COALESCE(costo_whatsapp, 0)) as costo_whatsapp_total
-                FROM historial_notificaciones
-                {filtro_fecha_notif}
-                """ if (tiene_costo_email or tiene_costo_whatsapp) else f"""
-                SELECT
-                  SUM(CASE WHEN canal='email' THEN 1 WHEN canal='ambos' THEN 1 ELSE 0 END) as email_out,
-                  SUM(CASE WHEN canal='whatsapp' THEN 1 WHEN canal='ambos' THEN 1 ELSE 0 END) as whatsapp_out
-                FROM historial_notificaciones
-                {filtro_fecha_notif}
-                """
-                notif_totales = base_datos.obtener_uno(consulta_notif) or {}
+                resultado_notif = reporte_modelo.obtener_totales_notificaciones(fecha_desde, fecha_hasta)
+                notif_totales = resultado_notif['totales']
+                notif_por_tipo = resultado_notif['por_tipo']
             except Exception as e:
                 logger.warning(f"Error al obtener totales de notificaciones: {str(e)}")
                 notif_totales = {}
+                notif_por_tipo = []
         notif_email = int(notif_totales.get("email_out") or 0)
-        # WhatsApp notificaciones: contar desde whatsapp_mensajes (origen='sistema' o 'campana')
-        # NO desde historial_notificaciones para evitar discrepancias con el panel
-        notif_whatsapp = 0
+
+        tiene_costo_chat = False
+        chat_totales = {}
         if tiene_tabla_chat:
+            tiene_costo_chat = _columna_existe("whatsapp_mensajes", "costo_total")
             try:
-                consulta_base = """
-                SELECT
-                  SUM(CASE WHEN direccion='out' AND (origen='sistema' OR origen='campana') THEN 1 ELSE 0 END) as whatsapp_notificaciones
-                FROM whatsapp_mensajes
-                """
-                if filtro_fecha_wa:
-                    consulta_notif_whatsapp = consulta_base + " " + filtro_fecha_wa
-                else:
-                    consulta_notif_whatsapp = consulta_base
-                notif_whatsapp_data = base_datos.obtener_uno(consulta_notif_whatsapp) or {}
-                notif_whatsapp = int(notif_whatsapp_data.get("whatsapp_notificaciones") or 0)
+                chat_totales = reporte_modelo.obtener_totales_whatsapp(fecha_desde, fecha_hasta)
             except Exception as e:
-                logger.warning(f"Error al obtener notificaciones WhatsApp desde whatsapp_mensajes: {str(e)}")
-                # Fallback: usar historial_notificaciones
-                notif_whatsapp = int(notif_totales.get("whatsapp_out") or 0)
+                logger.warning(f"Error al obtener totales de chat: {str(e)}")
+                chat_totales = {}
+
+        # WhatsApp notificaciones: contar desde whatsapp_mensajes (origen='sistema' o 'campana')
+        # NO desde historial_notificaciones para evitar discrepancias con el panel
+        if chat_totales:
+            notif_whatsapp = int(chat_totales.get("whatsapp_notificaciones") or 0)
+        else:
+            # Fallback: usar historial_notificaciones
+            notif_whatsapp = int(notif_totales.get("whatsapp_out") or 0) if tiene_tabla_chat else 0
 
-        notif_por_tipo = []
-        if tiene_tabla_notif:
-            try:
-                consulta_por_tipo = f"""
-                SELECT tipo_notificacion,
-                  SUM(CASE WHEN canal='email' THEN 1 WHEN canal='ambos' THEN 1 ELSE 0 END) as email_out,
-                  SUM(CASE WHEN canal='whatsapp' THEN 1 WHEN canal='ambos' THEN 1 ELSE 0 END) as whatsapp_out,
-                  SUM(COALESCE(costo_email, 0)) as costo_email_total,
-                  SUM(COALESCE(costo_whatsapp, 0)) as costo_whatsapp_total
-                FROM historial_notificaciones
-                {filtro_fecha_notif}
-                GROUP BY tipo_notificacion
-                ORDER BY tipo_notificacion
-                """ if (tiene_costo_email or tiene_costo_whatsapp) else f"""
-                SELECT tipo_notificacion,
-                  SUM(CASE WHEN canal='email' THEN 1 WHEN canal='ambos' THEN 1 ELSE 0 END) as email_out,
-                  SUM(CASE WHEN canal='whatsapp' THEN 1 WHEN canal='ambos' THEN 1 ELSE 0 END) as whatsapp_out
-                FROM historial_notificaciones
-                {filtro_fecha_notif}
-                GROUP BY tipo_notificacion
-                ORDER BY tipo_notificacion
-                """
-                notif_por_tipo = base_datos.obtener_todos(consulta_por_tipo) or []
-            except Exception as e:
-                logger.warning(f"Error al obtener notificaciones por tipo: {str(e)}")
-                notif_por_tipo = []
         por_tipo = []
         for fila in notif_por_tipo:
             email_out = int(fila.get("email_out") or 0)
@@ -253,28 +167,6 @@ def obtener_metricas():
                 }
             )
 
-        tiene_costo_chat = False
-        chat_totales = {}
-        if tiene_tabla_chat:
-            tiene_costo_chat = _columna_existe("whatsapp_mensajes", "costo_total")
-            try:
-                consulta_base = """
-                SELECT
-                  SUM(CASE WHEN direccion='in' THEN 1 ELSE 0 END) as whatsapp_in,
-                  SUM(CASE WHEN direccion='out' THEN 1 ELSE 0 END) as whatsapp_out,
-                  SUM(CASE WHEN direccion='out' AND origen='bot' THEN 1 ELSE 0 END) as whatsapp_bot,
-                  SUM(CASE WHEN direccion='out' AND origen='humano' THEN 1 ELSE 0 END) as whatsapp_humano
-                  {costo}
-                FROM whatsapp_mensajes
-                {filtro}
-                """.format(
-                    costo=", SUM(COALESCE(costo_total, 0)) as costo_total" if tiene_costo_chat else "",
-                    filtro=filtro_fecha_wa if filtro_fecha_wa else ""
-                )
-                chat_totales = base_datos.obtener_uno(consulta_base) or {}
-            except Exception as e:
-                logger.warning(f"Error al obtener totales de chat: {str(e)}")
-                chat_totales = {}
         whatsapp_in = int(chat_totales.get("whatsapp_in") or 0)
         whatsapp_out = int(chat_totales.get("whatsapp_out") or 0)
         whatsapp_bot = int(chat_totales.get("whatsapp_bot") or 0)
@@ -373,26 +265,16 @@ def obtener_metricas():
 def eventos_por_estado():
     """Obtiene resumen de eventos por estado"""
     try:
-        eventos = evento_modelo.obtener_todos_eventos()
+        resumen = reporte_modelo.obtener_resumen_eventos_por_estado()
         
+        total_eventos = sum(datos['cantidad'] for datos in resumen.values())
         estados = {}
-        for evento in eventos:
-            estado = evento.get('estado', 'sin_estado')
-            if estado not in estados:
-                estados[estado] = {
-                    'cantidad': 0,
-                    'total_ingresos': 0.0,
-                    'eventos': []
-                }
-            estados[estado]['cantidad'] += 1
-            estados[estado]['total_ingresos'] += float(evento.get('total', evento.get('precio_total', 0) or 0))
-            estados[estado]['eventos'].append(evento.get('id_evento') or evento.get('id'))
-        
-        total_eventos = len(eventos)
-        for estado in estados:
-            estados[estado]['porcentaje'] = (estados[estado]['cantidad'] / total_eventos * 100) if total_eventos > 0 else 0
-            # No incluir lista de eventos en la respuesta para reducir tamaño
-            del estados[estado]['eventos']
+        for estado, datos in resumen.items():
+            estados[estado] = {
+                'cantidad': datos['cantidad'],
+                'total_ingresos': datos['total_ingresos'],
+                'porcentaje': (datos['cantidad'] / total_eventos * 100) if total_eventos > 0 else 0
+            }
         
         return jsonify({'resumen': estados, 'total_eventos': total_eventos}), 200
     except Exception as e:
@@ -406,14 +288,16 @@ def eventos_por_estado():
 def resumen_financiero():
     """Obtiene resumen financiero del sistema"""
     try:
-        eventos = evento_modelo.obtener_todos_eventos()
+        # Totales desde los rollups diarios (días cerrados) + día actual en vivo
+        metricas_eventos = reporte_modelo.obtener_metricas_eventos()
+        total_eventos = metricas_eventos['total']
         
-        total_ingresos = sum(float(e.get('total', e.get('precio_total', 0) or 0)) for e in eventos)
-        total_pendiente = sum(float(e.get('saldo', e.get('saldo_pendiente', 0) or 0)) for e in eventos)
+        total_ingresos = metricas_eventos['total_ingresos']
+        total_pendiente = metricas_eventos['total_pendiente']
         total_cobrado = total_ingresos - total_pendiente
         
-        # Calcular total pagado verificado (consulta agregada)
-        total_pagado_verificado = pago_modelo.obtener_total_pagado_global()
+        # Calcular total pagado verificado (aprobados, sin reembolsos)
+        total_pagado_verificado = reporte_modelo.obtener_total_pagado_verificado()
         
         resumen = {
             'total_ingresos': float(total_ingresos),
@@ -421,8 +305,8 @@ def resumen_financiero():
             'total_cobrado': float(total_cobrado),
             'total_pagado_verificado': float(total_pagado_verificado),
             'porcentaje_cobrado': float((total_cobrado / total_ingresos * 100) if total_ingresos > 0 else 0),
-            'total_eventos': len(eventos),
-            'ticket_promedio': float((total_ingresos / len(eventos)) if len(eventos) > 0 else 0)
+            'total_eventos': total_eventos,
+            'ticket_promedio': float((total_ingresos / total_eventos) if total_eventos > 0 else 0)
         }
         
         return jsonify({'resumen_financiero': resumen}), 200
@@ -448,42 +332,23 @@ def pagos_por_cuenta():
                 'mensaje': 'La columna cuenta_id no existe en la tabla pagos'
             }), 200
         
-        # Construir consulta
-        consulta = """
-        SELECT 
-            c.id as cuenta_id,
-            c.nombre as nombre_cuenta,
-            c.tipo as tipo_cuenta,
-            c.numero_cuenta,
-            COUNT(p.id) as total_pagos,
-            COALESCE(SUM(CASE WHEN p.tipo_pago != 'reembolso' THEN p.monto ELSE 0 END), 0) as total_ingresos,
-            COALESCE(SUM(CASE WHEN p.tipo_pago = 'reembolso' THEN p.monto ELSE 0 END), 0) as total_reembolsos,
-            COALESCE(SUM(CASE WHEN p.tipo_pago != 'reembolso' THEN p.monto ELSE -p.monto END), 0) as total_neto
-        FROM cuentas c
-        LEFT JOIN pagos p ON c.id = p.cuenta_id
-        """
-        
-        condiciones = ["c.activo = 1"]
-        parametros = []
-        
-        # Filtrar por estado aprobado si existe la columna
-        if _columna_existe('pagos', 'estado_pago'):
-            condiciones.append("(p.estado_pago = 'aprobado' OR p.estado_pago IS NULL OR p.id IS NULL)")
-        
-        if fecha_desde:
-            condiciones.append("(p.fecha_pago >= %s OR p.id IS NULL)")
-            parametros.append(fecha_desde)
-        
-        if fecha_hasta:
-            condiciones.append("(p.fecha_pago <= %s OR p.id IS NULL)")
-            parametros.append(fecha_hasta)
-        
-        if condiciones:
-            consulta += " WHERE " + " AND ".join(condiciones)
-        
-        consulta += " GROUP BY c.id, c.nombre, c.tipo, c.numero_cuenta ORDER BY total_neto DESC"
-        
-        resultados = base_datos.obtener_todos(consulta, tuple(parametros) if parametros else None)
+        # Totales por cuenta desde el rollup diario (días cerrados) + día actual en vivo
+        totales_cuenta = reporte_modelo.obtener_pagos_por_cuenta(fecha_desde, fecha_hasta)
+        cuentas = base_datos.obtener_todos(
+            "SELECT id, nombre, tipo, numero_cuenta FROM cuentas WHERE activo = 1"
+        ) or []
+        sin_pagos = {'total_pagos': 0, 'total_ingresos': 0.0, 'total_reembolsos': 0.0, 'total_neto': 0.0}
+        resultados = []
+        for cuenta in cuentas:
+            resultado = {
+                'cuenta_id': cuenta.get('id'),
+                'nombre_cuenta': cuenta.get('nombre'),
+                'tipo_cuenta': cuenta.get('tipo'),
+                'numero_cuenta': cuenta.get('numero_cuenta'),
+            }
+            resultado.update(totales_cuenta.get(cuenta.get('id'), sin_pagos))
+            resultados.append(resultado)
+        resultados.sort(key=lambda r: r['total_neto'], reverse=True)
         
         # Calcular totales
         total_general = sum(float(r.get('total_neto', 0) or 0) for r in resultados)
@@ -519,40 +384,113 @@ def pagos_por_cuenta():
 # ENDPOINTS DE DESCARGA DE REPORTES
 # ============================================================================
 
-def _generar_csv(datos, columnas, nombre_archivo):
-    """Genera un archivo CSV para descarga con codificación UTF-8 BOM (para Excel)"""
-    output = io.StringIO()
-    
-    # Agregar BOM UTF-8 para que Excel reconozca correctamente los caracteres especiales
-    output.write('\ufeff')
-    
-    writer = csv.writer(output, delimiter=';', quoting=csv.QUOTE_MINIMAL)
-    
-    # Escribir encabezados
-    writer.writerow(columnas)
-    
-    # Escribir datos
+# Filas por lote al leer desde MySQL y bytes acumulados antes de enviar un fragmento
+TAMANO_LOTE_DESCARGA = 500
+TAMANO_FRAGMENTO_DESCARGA = 64 * 1024
+
+
+class _EcoEscritura:
+    """Objeto tipo archivo que devuelve lo escrito (para csv.writer en un generador)"""
+
+    def write(self, valor):
+        return valor
+
+
+def _valor_csv(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, datetime):
+        return valor.strftime('%Y-%m-%d %H:%M:%S')
+    return str(valor)
+
+
+def _valor_xlsx(valor):
+    if valor is None:
+        return None
+    if isinstance(valor, (bool, int, float, Decimal, datetime, date)):
+        return valor
+    return str(valor)
+
+
+def _filas_csv(datos, columnas):
+    """Genera el CSV por fragmentos con BOM UTF-8 (para Excel) sin armar el archivo completo"""
+    writer = csv.writer(_EcoEscritura(), delimiter=';', quoting=csv.QUOTE_MINIMAL)
+    fragmento = ['\ufeff', writer.writerow(columnas)]
+    tamano = 0
     for fila in datos:
-        row = []
-        for col in columnas:
-            valor = fila.get(col, '')
-            if valor is None:
-                valor = ''
-            elif isinstance(valor, datetime):
-                valor = valor.strftime('%Y-%m-%d %H:%M:%S')
-            row.append(str(valor))
-        writer.writerow(row)
-    
-    output.seek(0)
-    # Codificar a bytes con UTF-8
-    csv_content = output.getvalue().encode('utf-8')
-    
+        linea = writer.writerow([_valor_csv(fila.get(col, '')) for col in columnas])
+        fragmento.append(linea)
+        tamano += len(linea)
+        if tamano >= TAMANO_FRAGMENTO_DESCARGA:
+            yield ''.join(fragmento).encode('utf-8')
+            fragmento = []
+            tamano = 0
+    if fragmento:
+        yield ''.join(fragmento).encode('utf-8')
+
+
+def _filas_xlsx(datos, columnas, titulo):
+    """
+    Genera un XLSX con openpyxl en modo write_only
+
+    Las filas se vuelcan a un archivo temporal a medida que llegan y el
+    resultado se envía por fragmentos (un XLSX es un ZIP y no puede emitirse
+    antes de cerrarlo).
+    """
+    libro = Workbook(write_only=True)
+    hoja = libro.create_sheet(title=titulo[:31])
+    hoja.append(columnas)
+    for fila in datos:
+        hoja.append([_valor_xlsx(fila.get(col)) for col in columnas])
+    with tempfile.TemporaryFile() as archivo:
+        libro.save(archivo)
+        archivo.seek(0)
+        while True:
+            fragmento = archivo.read(TAMANO_FRAGMENTO_DESCARGA)
+            if not fragmento:
+                break
+            yield fragmento
+
+
+def _registrar_errores_descarga(generador, nombre_archivo):
+    """Los errores durante el envío ya no pueden devolverse como 500: se registran"""
+    try:
+        yield from generador
+    except Exception as e:
+        logger.error(f"Error al generar {nombre_archivo} durante el envío: {str(e)}")
+        raise
+
+
+def _generar_csv(datos, columnas, nombre_archivo):
+    """
+    Genera la descarga de un reporte como respuesta por fragmentos
+
+    `datos` puede ser una lista o un iterador (p. ej. base_datos.iterar_consulta).
+    Con ?formato=xlsx se genera un libro de Excel en lugar de CSV.
+    """
+    datos = iter(datos)
+    # Obtener la primera fila antes de responder para que un error de la consulta sea un 500
+    primera = next(datos, None)
+    if primera is not None:
+        datos = itertools.chain([primera], datos)
+
+    if (request.args.get('formato') or '').lower() == 'xlsx':
+        nombre_archivo = nombre_archivo.rsplit('.', 1)[0] + '.xlsx'
+        titulo = nombre_archivo.rsplit('_', 2)[0].replace('reporte_', '') or 'reporte'
+        contenido = _filas_xlsx(datos, columnas, titulo)
+        mimetype = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        content_type = mimetype
+    else:
+        contenido = _filas_csv(datos, columnas)
+        mimetype = 'text/csv'
+        content_type = 'text/csv; charset=utf-8-sig'
+
     return Response(
-        csv_content,
-        mimetype='text/csv',
+        _registrar_errores_descarga(contenido, nombre_archivo),
+        mimetype=mimetype,
         headers={
             'Content-Disposition': f'attachment; filename={nombre_archivo}',
-            'Content-Type': 'text/csv; charset=utf-8-sig'
+            'Content-Type': content_type
         }
     )
 
@@ -561,7 +499,7 @@ def _generar_csv(datos, columnas, nombre_archivo):
 @requiere_autenticacion
 @requiere_rol('administrador', 'gerente_general', 'coordinador')
 def descargar_eventos():
-    """Descarga reporte de eventos en CSV"""
+    """Descarga reporte de eventos en CSV (o XLSX con ?formato=xlsx)"""
     try:
         fecha_desde = request.args.get('fecha_desde')
         fecha_hasta = request.args.get('fecha_hasta')
@@ -589,7 +527,7 @@ def descargar_eventos():
 @requiere_autenticacion
 @requiere_rol('administrador', 'gerente_general', 'coordinador')
 def descargar_inventario():
-    """Descarga reporte de inventario en CSV"""
+    """Descarga reporte de inventario en CSV (o XLSX con ?formato=xlsx)"""
     try:
         productos = producto_modelo.obtener_todos_productos(solo_activos=False)
         
@@ -610,22 +548,15 @@ def descargar_inventario():
 @requiere_autenticacion
 @requiere_rol('administrador', 'gerente_general')
 def descargar_cardex():
-    """Descarga reporte de movimientos de inventario (cardex) en CSV"""
+    """Descarga reporte de movimientos de inventario (cardex) en CSV (o XLSX con ?formato=xlsx)"""
     try:
         fecha_desde = request.args.get('fecha_desde')
         fecha_hasta = request.args.get('fecha_hasta')
         
         # Verificar si existe la tabla de movimientos de inventario
-        tabla_existe = base_datos.obtener_uno(
-            """
-            SELECT COUNT(*) as total
-            FROM information_schema.TABLES
-            WHERE TABLE_SCHEMA = DATABASE()
-              AND TABLE_NAME = 'movimientos_inventario'
-            """
-        ) or {}
+        tabla_existe = EsquemaBD.tabla_existe('movimientos_inventario')
         
-        if int(tabla_existe.get("total") or 0) == 0:
+        if not tabla_existe:
             return jsonify({'error': 'No existe la tabla de movimientos de inventario'}), 404
         
         # Construir consulta con filtros de fecha
@@ -659,7 +590,7 @@ def descargar_cardex():
         
         consulta += " ORDER BY mi.fecha_movimiento DESC"
         
-        movimientos = base_datos.obtener_todos(consulta, tuple(params) if params else None) or []
+        movimientos = base_datos.iterar_consulta(consulta, tuple(params) if params else None, TAMANO_LOTE_DESCARGA)
         
         columnas = [
             'id', 'producto_id', 'producto_nombre', 'tipo_movimiento',
@@ -678,41 +609,26 @@ def descargar_cardex():
 @requiere_autenticacion
 @requiere_rol('administrador', 'gerente_general')
 def descargar_notificaciones():
-    """Descarga reporte de historial de notificaciones en CSV"""
+    """Descarga reporte de historial de notificaciones en CSV (o XLSX con ?formato=xlsx)"""
     try:
         fecha_desde = request.args.get('fecha_desde')
         fecha_hasta = request.args.get('fecha_hasta')
         
         # Verificar si existe la tabla
-        tabla_existe = base_datos.obtener_uno(
-            """
-            SELECT COUNT(*) as total
-            FROM information_schema.TABLES
-            WHERE TABLE_SCHEMA = DATABASE()
-              AND TABLE_NAME = 'historial_notificaciones'
-            """
-        ) or {}
+        tabla_existe = EsquemaBD.tabla_existe('historial_notificaciones')
         
-        if int(tabla_existe.get("total") or 0) == 0:
+        if not tabla_existe:
             return jsonify({'error': 'No existe la tabla de historial de notificaciones'}), 404
         
         # Construir consulta con filtros de fecha
         # Verificar si existen columnas de costo
-        tiene_costo_email = base_datos.obtener_uno("""
-            SELECT COUNT(*) as total FROM information_schema.columns 
-            WHERE table_schema = DATABASE() AND table_name = 'historial_notificaciones' 
-            AND column_name = 'costo_email'
-        """) or {}
-        tiene_costo_whatsapp = base_datos.obtener_uno("""
-            SELECT COUNT(*) as total FROM information_schema.columns 
-            WHERE table_schema = DATABASE() AND table_name = 'historial_notificaciones' 
-            AND column_name = 'costo_whatsapp'
-        """) or {}
+        tiene_costo_email = _columna_existe('historial_notificaciones', 'costo_email')
+        tiene_costo_whatsapp = _columna_existe('historial_notificaciones', 'costo_whatsapp')
         
         costo_cols = ""
-        if int(tiene_costo_email.get("total") or 0) > 0:
+        if tiene_costo_email:
             costo_cols += ", hn.costo_email"
-        if int(tiene_costo_whatsapp.get("total") or 0) > 0:
+        if tiene_costo_whatsapp:
             costo_cols += ", hn.costo_whatsapp"
         
         consulta = f"""
@@ -745,16 +661,16 @@ def descargar_notificaciones():
         
         consulta += " ORDER BY hn.fecha_envio DESC"
         
-        notificaciones = base_datos.obtener_todos(consulta, tuple(params) if params else None) or []
+        notificaciones = base_datos.iterar_consulta(consulta, tuple(params) if params else None, TAMANO_LOTE_DESCARGA)
         
         columnas = [
             'id', 'id_evento', 'nombre_evento', 'cliente_nombre',
             'tipo_notificacion', 'canal', 'destinatario', 'enviado',
             'fecha_envio', 'error'
         ]
-        if int(tiene_costo_email.get("total") or 0) > 0:
+        if tiene_costo_email:
             columnas.append('costo_email')
-        if int(tiene_costo_whatsapp.get("total") or 0) > 0:
+        if tiene_costo_whatsapp:
             columnas.append('costo_whatsapp')
         
         fecha_str = datetime.now().strftime('%Y%m%d_%H%M%S')
@@ -768,7 +684,7 @@ def descargar_notificaciones():
 @requiere_autenticacion
 @requiere_rol('administrador', 'gerente_general')
 def descargar_clientes():
-    """Descarga reporte de clientes en CSV"""
+    """Descarga reporte de clientes en CSV (o XLSX con ?formato=xlsx)"""
     try:
         clientes = cliente_modelo.obtener_todos_clientes()
         
@@ -788,7 +704,7 @@ def descargar_clientes():
 @requiere_autenticacion
 @requiere_rol('administrador', 'gerente_general')
 def descargar_pagos():
-    """Descarga reporte de pagos en CSV"""
+    """Descarga reporte de pagos en CSV (o XLSX con ?formato=xlsx)"""
     try:
         fecha_desde = request.args.get('fecha_desde')
         fecha_hasta = request.args.get('fecha_hasta')
@@ -854,7 +770,7 @@ def descargar_pagos():
         
         consulta += " ORDER BY p.fecha_pago DESC"
         
-        pagos = base_datos.obtener_todos(consulta, tuple(params) if params else None) or []
+        pagos = base_datos.iterar_consulta(consulta, tuple(params) if params else None, TAMANO_LOTE_DESCARGA)
         
         if tiene_cuenta:
             columnas = [
@@ -987,7 +903,7 @@ def obtener_resumen_calificaciones():
 @requiere_autenticacion
 @requiere_rol('administrador', 'gerente_general')
 def descargar_danos():
-    """Descarga reporte de daños en CSV"""
+    """Descarga reporte de daños en CSV (o XLSX con ?formato=xlsx)"""
     try:
         fecha_desde = request.args.get('fecha_desde')
         fecha_hasta = request.args.get('fecha_hasta')
@@ -1029,7 +945,7 @@ def descargar_danos():
         
         consulta += " ORDER BY e.fecha_finalizacion DESC"
         
-        danos = base_datos.obtener_todos(consulta, tuple(params) if params else None) or []
+        danos = base_datos.iterar_consulta(consulta, tuple(params) if params else None, TAMANO_LOTE_DESCARGA)
         
         columnas = [
             'id_evento', 'nombre_evento', 'fecha_evento', 'fecha_finalizacion',
@@ -1049,7 +965,7 @@ def descargar_danos():
 @requiere_autenticacion
 @requiere_rol('administrador', 'gerente_general')
 def descargar_calificaciones():
-    """Descarga reporte de calificaciones en CSV"""
+    """Descarga reporte de calificaciones en CSV (o XLSX con ?formato=xlsx)"""
     try:
         fecha_desde = request.args.get('fecha_desde')
         fecha_hasta = request.args.get('fecha_hasta')
@@ -1095,7 +1011,7 @@ def descargar_calificaciones():
         
         consulta += " ORDER BY e.fecha_calificacion DESC, e.fecha_finalizacion DESC"
         
-        calificaciones = base_datos.obtener_todos(consulta, tuple(params) if params else None) or []
+        calificaciones = base_datos.iterar_consulta(consulta, tuple(params) if params else None, TAMANO_LOTE_DESCARGA)
         
         columnas = [
             'id_evento', 'nombre_evento', 'fecha_evento', 'fecha_finalizacion',
@@ -1,8 +1,9 @@
 """
 Rutas para gestión de salones
 """
+from datetime import datetime
 from flask import Blueprint, request, jsonify
-from modelos.salon_modelo import SalonModelo
+from modelos.salon_modelo import LIMITE_HORARIOS_POR_CONSULTA, SalonModelo, normalizar_horario
 from api.middleware import requiere_autenticacion, requiere_rol
 from utilidades.logger import obtener_logger
 
@@ -104,14 +105,96 @@ def eliminar_salon(salon_id):
 @salones_bp.route('/<int:salon_id>/verificar-disponibilidad', methods=['POST'])
 @requiere_autenticacion
 def verificar_disponibilidad_salon(salon_id):
-    """Verifica si un salón está disponible en una fecha"""
+    """
+    Verifica si un salón está disponible en una fecha. Con hora_inicio y
+    hora_fin se comprueba solo ese horario (si hora_fin < hora_inicio termina
+    al día siguiente) y se retornan los eventos que se solapan.
+    """
     try:
         data = request.get_json()
         if not data or 'fecha_evento' not in data:
             return jsonify({'error': 'fecha_evento es requerida'}), 400
         
-        disponible = salon_modelo.verificar_disponibilidad(salon_id, data['fecha_evento'])
-        return jsonify({'disponible': disponible}), 200
+        horario = normalizar_horario(data['fecha_evento'], data.get('hora_inicio'), data.get('hora_fin'))
+        if horario is None:
+            return jsonify({'error': 'Fecha u horas inválidas (YYYY-MM-DD, HH:MM)'}), 400
+        conflictos = salon_modelo.obtener_conflictos(salon_id, *horario, data.get('evento_id_excluir'))
+        return jsonify({
+            'disponible': not conflictos,
+            'conflictos': [_serializar_intervalo(conflicto) for conflicto in conflictos]
+        }), 200
     except Exception as e:
         logger.error(f"Error al verificar disponibilidad: {str(e)}")
         return jsonify({'error': 'Error al verificar disponibilidad'}), 500
+
+
+@salones_bp.route('/<int:salon_id>/disponibilidad', methods=['GET'])
+@requiere_autenticacion
+def obtener_disponibilidad_salon(salon_id):
+    """
+    Horarios ocupados y libres de cada día de un mes.
+
+    Parámetros:
+        - anio, mes: mes a consultar (por defecto el actual)
+        - duracion_minima: minutos mínimos de un hueco libre (por defecto 60)
+    """
+    try:
+        hoy = datetime.now()
+        try:
+            anio = int(request.args.get('anio', hoy.year))
+            mes = int(request.args.get('mes', hoy.month))
+            duracion_minima = int(request.args.get('duracion_minima', 60))
+        except ValueError:
+            return jsonify({'error': 'anio, mes y duracion_minima deben ser números'}), 400
+        if not 1 <= mes <= 12 or not 1900 <= anio <= 9999:
+            return jsonify({'error': 'Mes o año inválido'}), 400
+        
+        dias = salon_modelo.obtener_disponibilidad_mes(salon_id, anio, mes, duracion_minima)
+        return jsonify({'salon_id': salon_id, 'anio': anio, 'mes': mes, 'dias': dias}), 200
+    except Exception as e:
+        logger.error(f"Error al obtener disponibilidad: {str(e)}")
+        return jsonify({'error': 'Error al obtener disponibilidad'}), 500
+
+
+@salones_bp.route('/disponibilidad/verificar', methods=['POST'])
+@requiere_autenticacion
+def verificar_horarios():
+    """
+    Verifica varios horarios candidatos en una sola consulta.
+
+    Body: {"horarios": [{"salon_id", "fecha_evento", "hora_inicio", "hora_fin"}], "evento_id_excluir"}
+    """
+    try:
+        data = request.get_json() or {}
+        horarios = data.get('horarios')
+        if not isinstance(horarios, list) or not horarios:
+            return jsonify({'error': 'horarios es requerido'}), 400
+        if len(horarios) > LIMITE_HORARIOS_POR_CONSULTA:
+            return jsonify({'error': f'Máximo {LIMITE_HORARIOS_POR_CONSULTA} horarios por consulta'}), 400
+        
+        candidatos = []
+        for horario in horarios:
+            normalizado = normalizar_horario(
+                horario.get('fecha_evento'), horario.get('hora_inicio'), horario.get('hora_fin')
+            ) if isinstance(horario, dict) and horario.get('salon_id') else None
+            if normalizado is None:
+                return jsonify({'error': 'Cada horario requiere salon_id y fecha_evento válidos'}), 400
+            candidatos.append((horario['salon_id'], *normalizado))
+        
+        libres = salon_modelo.verificar_horarios(candidatos, data.get('evento_id_excluir'))
+        resultados = [
+            {**horario, 'disponible': libre}
+            for horario, libre in zip(horarios, libres)
+        ]
+        return jsonify({'resultados': resultados}), 200
+    except Exception as e:
+        logger.error(f"Error al verificar horarios: {str(e)}")
+        return jsonify({'error': 'Error al verificar horarios'}), 500
+
+
+def _serializar_intervalo(evento):
+    """Convierte inicio/fin del evento a ISO 8601"""
+    return {
+        clave: valor.isoformat() if isinstance(valor, datetime) else valor
+        for clave, valor in evento.items()
+    }
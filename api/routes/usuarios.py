@@ -4,7 +4,7 @@ Rutas para gestión de usuarios
 from flask import Blueprint, request, jsonify
 from modelos.usuario_modelo import UsuarioModelo
 from modelos.permiso_modelo import PermisoModelo
-from api.middleware import requiere_autenticacion, requiere_rol, obtener_usuario_actual
+from api.middleware import requiere_autenticacion, requiere_rol, obtener_usuario_actual, invalidar_usuario_cache
 from utilidades.logger import obtener_logger
 
 usuarios_bp = Blueprint('usuarios', __name__)
@@ -133,6 +133,7 @@ def actualizar_usuario(usuario_id):
             data.pop('rol', None)
         
         resultado = usuario_modelo.actualizar_usuario(usuario_id, data)
+        invalidar_usuario_cache(usuario_id)
         if resultado:
             usuario = usuario_modelo.obtener_usuario_por_id(usuario_id)
             usuario_limpio = {
@@ -159,6 +160,7 @@ def eliminar_usuario(usuario_id):
     """Elimina (desactiva) un usuario"""
     try:
         resultado = usuario_modelo.eliminar_usuario(usuario_id)
+        invalidar_usuario_cache(usuario_id)
         if resultado:
             return jsonify({'message': 'Usuario eliminado exitosamente'}), 200
         else:
@@ -183,6 +185,7 @@ def cambiar_contrasena(usuario_id):
             return jsonify({'error': 'Nueva contraseña requerida'}), 400
         
         resultado = usuario_modelo.cambiar_contrasena(usuario_id, data['nueva_contrasena'])
+        invalidar_usuario_cache(usuario_id)
         if resultado:
             return jsonify({'message': 'Contraseña cambiada exitosamente'}), 200
         else:
@@ -1,21 +1,46 @@
 """
 Rutas para inbox y control de chat WhatsApp
 """
-from flask import Blueprint, jsonify, request, Response
-from api.middleware import requiere_autenticacion, requiere_rol
+import json
+import time
+from flask import Blueprint, jsonify, request, Response, send_file
+from config import MEDIA_CACHE_CONFIG, TIEMPO_REAL_CONFIG
+from api.middleware import _obtener_usuario_cache, requiere_autenticacion, requiere_rol
 from integraciones.whatsapp_chat import WhatsAppChatService
+from modelos.base_datos import BaseDatos
+from modelos.whatsapp_chat_modelo import CANAL_CHAT
+from utilidades.cache_media import CacheMedia
 from utilidades.logger import obtener_logger
+from utilidades.tiempo_real import CanalEventos
 
 
 whatsapp_chat_bp = Blueprint("whatsapp_chat", __name__)
 logger = obtener_logger()
 service = WhatsAppChatService()
 
+# Roles con acceso al chat (los del decorador de las rutas)
+ROLES_CHAT = ("administrador", "gerente_general", "coordinador")
+LIMITE_POR_DEFECTO_CONVERSACIONES = 50
+LIMITE_MAXIMO_CONVERSACIONES = 200
+LIMITE_POR_DEFECTO_MENSAJES = 50
+LIMITE_MAXIMO_MENSAJES = 200
+
 
 @whatsapp_chat_bp.route("/conversations", methods=["GET"])
 @requiere_autenticacion
 @requiere_rol("administrador", "gerente_general", "coordinador")
 def listar_conversaciones():
+    """
+    Bandeja de conversaciones.
+
+    Si se envía limite, cursor o updated_since la respuesta es paginada por cursor:
+        - limite: conversaciones por página (máximo LIMITE_MAXIMO_CONVERSACIONES)
+        - cursor: valor 'siguiente_cursor' de la página anterior
+        - updated_since: valor 'sincronizado_hasta' de una respuesta anterior;
+          retorna solo las conversaciones modificadas desde entonces
+    """
+    if any(parametro in request.args for parametro in ("limite", "cursor", "updated_since")):
+        return listar_conversaciones_paginado()
     try:
         conversaciones = service.modelo.listar_conversaciones()
         return jsonify({"conversaciones": conversaciones}), 200
@@ -24,13 +49,67 @@ def listar_conversaciones():
         return jsonify({"error": "Error al listar conversaciones"}), 500
 
 
+def listar_conversaciones_paginado():
+    try:
+        try:
+            limite = int(request.args.get("limite", LIMITE_POR_DEFECTO_CONVERSACIONES))
+        except ValueError:
+            return jsonify({"error": "limite debe ser un número"}), 400
+        limite = max(1, min(limite, LIMITE_MAXIMO_CONVERSACIONES))
+        try:
+            conversaciones, siguiente_cursor, sincronizado_hasta = service.modelo.listar_conversaciones_paginado(
+                limite=limite,
+                cursor=request.args.get("cursor"),
+                actualizado_desde=request.args.get("updated_since")
+            )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        return jsonify({
+            "conversaciones": conversaciones,
+            "siguiente_cursor": siguiente_cursor,
+            "sincronizado_hasta": sincronizado_hasta,
+            "limite": limite
+        }), 200
+    except Exception as e:
+        logger.error(f"Error al listar conversaciones: {str(e)}")
+        return jsonify({"error": "Error al listar conversaciones"}), 500
+
+
 @whatsapp_chat_bp.route("/conversations/<int:conversacion_id>/messages", methods=["GET"])
 @requiere_autenticacion
 @requiere_rol("administrador", "gerente_general", "coordinador")
 def obtener_mensajes(conversacion_id):
+    """
+    Historial de la conversación, del más antiguo al más reciente.
+
+    Parámetros:
+        - limite: mensajes a retornar (máximo LIMITE_MAXIMO_MENSAJES); sin
+          cursor, los más recientes
+        - before_id: mensajes anteriores a ese id (cargar historial)
+        - after_id: mensajes posteriores a ese id (solo los nuevos)
+        - include_raw: true para incluir raw_json
+    hay_mas indica si quedan mensajes en la dirección pedida.
+    """
     try:
-        mensajes = service.modelo.obtener_mensajes(conversacion_id)
-        return jsonify({"mensajes": mensajes}), 200
+        try:
+            limite = int(request.args.get("limite", LIMITE_POR_DEFECTO_MENSAJES))
+            before_id = request.args.get("before_id")
+            after_id = request.args.get("after_id")
+            before_id = int(before_id) if before_id else None
+            after_id = int(after_id) if after_id else None
+        except ValueError:
+            return jsonify({"error": "limite, before_id y after_id deben ser números"}), 400
+        if before_id is not None and after_id is not None:
+            return jsonify({"error": "Use before_id o after_id, no ambos"}), 400
+        limite = max(1, min(limite, LIMITE_MAXIMO_MENSAJES))
+        mensajes, hay_mas = service.modelo.obtener_mensajes(
+            conversacion_id,
+            limit=limite,
+            before_id=before_id,
+            after_id=after_id,
+            incluir_raw=request.args.get("include_raw", "false").lower() == "true"
+        )
+        return jsonify({"mensajes": mensajes, "hay_mas": hay_mas, "limite": limite}), 200
     except Exception as e:
         logger.error(f"Error al obtener mensajes: {str(e)}")
         return jsonify({"error": "Error al obtener mensajes"}), 500
@@ -79,7 +158,27 @@ def enviar_media(conversacion_id):
 @requiere_autenticacion
 @requiere_rol("administrador", "gerente_general", "coordinador")
 def obtener_media(media_id):
+    """
+    Media de un mensaje. Con la caché activa se sirve desde el disco con
+    soporte de Range y ETag (If-None-Match responde 304).
+    """
     try:
+        if MEDIA_CACHE_CONFIG['enabled']:
+            encontrado = CacheMedia.obtener().obtener_media(media_id)
+            if not encontrado:
+                return jsonify({"error": "Media no encontrada"}), 404
+            ruta, mime_type, sha256 = encontrado
+            respuesta = send_file(
+                ruta,
+                mimetype=mime_type,
+                conditional=True,
+                etag=sha256,
+                max_age=MEDIA_CACHE_CONFIG['max_age']
+            )
+            # Requiere autenticación: no guardar en cachés compartidas
+            respuesta.cache_control.public = False
+            respuesta.cache_control.private = True
+            return respuesta
         contenido, mime_type = service.whatsapp.descargar_media(media_id)
         if not contenido:
             return jsonify({"error": "Media no encontrada"}), 404
@@ -132,6 +231,83 @@ def marcar_leido(conversacion_id):
         return jsonify({"error": "Error al marcar como leído"}), 500
 
 
+@whatsapp_chat_bp.route("/stream", methods=["GET"])
+@requiere_autenticacion
+@requiere_rol("administrador", "gerente_general", "coordinador")
+def stream():
+    """
+    Stream SSE con los cambios del chat (text/event-stream)
+
+    Eventos: mensaje, estado, no_leidos, conversacion y resync (el cliente
+    perdió eventos y debe recargar con updated_since). Al conectarse llega
+    'conectado'; tras una reconexión conviene pedir updated_since. 'cerrado'
+    indica que venció el token o el usuario ya no tiene acceso.
+    """
+    if not TIEMPO_REAL_CONFIG["enabled"]:
+        return jsonify({"error": "Stream en tiempo real desactivado (REALTIME_ENABLED)"}), 404
+    # El generador corre fuera del contexto del request: se copian los datos de la sesión
+    usuario_id = request.usuario_actual.get("id")
+    expira = request.token_payload.get("exp")
+    canal = CanalEventos.obtener()
+    suscripcion = canal.suscribir([CANAL_CHAT])
+    # La conexión dura lo que el stream: no retener la conexión de BD del request
+    BaseDatos.liberar_conexion_hilo()
+
+    def generar():
+        proxima_revision = time.monotonic() + TIEMPO_REAL_CONFIG["revalidar_usuario"]
+        try:
+            yield "retry: 3000\n\n"
+            yield _evento_sse("conectado", {"broker": canal.broker})
+            while True:
+                # El token solo se verificó al conectar: cortar al vencer o si el usuario
+                # fue desactivado o perdió el rol (el cliente se reconecta y recibe 401/403)
+                if expira and time.time() >= expira:
+                    yield _evento_sse("cerrado", {"motivo": "token_expirado"})
+                    return
+                if time.monotonic() >= proxima_revision:
+                    proxima_revision = time.monotonic() + TIEMPO_REAL_CONFIG["revalidar_usuario"]
+                    if not _usuario_puede_ver_chat(usuario_id):
+                        yield _evento_sse("cerrado", {"motivo": "sin_acceso"})
+                        return
+                espera = TIEMPO_REAL_CONFIG["heartbeat"]
+                if expira:
+                    espera = max(0.1, min(espera, expira - time.time()))
+                if suscripcion.desbordada:
+                    suscripcion.desbordada = False
+                    yield _evento_sse("resync", {})
+                evento = suscripcion.siguiente(espera)
+                if evento is None:
+                    # Keep-alive: también detecta clientes desconectados
+                    yield ": ping\n\n"
+                    continue
+                yield _evento_sse(evento["tipo"], {**(evento["datos"] or {}), "fecha": evento["fecha"]})
+        finally:
+            canal.desuscribir(suscripcion)
+
+    return Response(generar(), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        # nginx: no acumular la respuesta en buffer
+        "X-Accel-Buffering": "no"
+    })
+
+
+def _usuario_puede_ver_chat(usuario_id):
+    """Usuario activo y con un rol del chat (caché de autenticación; descarta la conexión de BD)"""
+    try:
+        usuario = _obtener_usuario_cache(usuario_id)
+    except Exception as e:
+        # Sin BD no se corta el stream; se vuelve a intentar en la próxima revisión
+        logger.warning(f"Stream chat: no se pudo revalidar el usuario {usuario_id}: {e}")
+        return True
+    finally:
+        BaseDatos.liberar_conexion_hilo()
+    return bool(usuario) and usuario.get("activo", True) and usuario.get("rol") in ROLES_CHAT
+
+
+def _evento_sse(tipo, datos):
+    return f"event: {tipo}\ndata: {json.dumps(datos, ensure_ascii=False, default=str)}\n\n"
+
+
 @whatsapp_chat_bp.route("/no-leidos", methods=["GET"])
 @requiere_autenticacion
 @requiere_rol("administrador", "gerente_general", "coordinador")
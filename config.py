@@ -20,6 +20,152 @@ DB_CONFIG = {
     'port': int(os.getenv('DB_PORT', 3306))
 }
 
+# Pool de conexiones compartido por todos los modelos (desactivado por defecto)
+DB_POOL_CONFIG = {
+    'enabled': os.getenv('DB_POOL_ENABLED', 'false').lower() == 'true',
+    'size': int(os.getenv('DB_POOL_SIZE', 5)),
+    'max_overflow': int(os.getenv('DB_POOL_MAX_OVERFLOW', 10)),
+    'timeout': float(os.getenv('DB_POOL_TIMEOUT', 30)),
+    'recycle': int(os.getenv('DB_POOL_RECYCLE', 1800)),
+    'ping_interval': float(os.getenv('DB_POOL_PING_INTERVAL', 30))
+}
+
+# Migraciones versionadas (migraciones/, tabla schema_version)
+# La API aplica las pendientes al iniciar; con DB_AUTO_MIGRATE=false hay que ejecutar
+# la CLI antes de desplegar (mientras falten, /api/health responde 503)
+DB_AUTO_MIGRATE = os.getenv('DB_AUTO_MIGRATE', 'true').lower() == 'true'
+
+# Envío asíncrono de notificaciones (cola notificaciones_outbox + hilos de trabajo)
+NOTIF_ASYNC_CONFIG = {
+    'enabled': os.getenv('NOTIF_ASYNC_ENABLED', 'true').lower() == 'true',
+    'workers': int(os.getenv('NOTIF_ASYNC_WORKERS', 2)),
+    'max_attempts': int(os.getenv('NOTIF_ASYNC_MAX_ATTEMPTS', 5)),
+    'poll_interval': float(os.getenv('NOTIF_ASYNC_POLL_INTERVAL', 5)),
+    'lock_timeout': int(os.getenv('NOTIF_ASYNC_LOCK_TIMEOUT', 300))
+}
+
+# Despacho concurrente de notificaciones programadas (SistemaNotificacionesV2)
+NOTIF_DESPACHO_CONFIG = {
+    'workers': int(os.getenv('NOTIF_DESPACHO_WORKERS', 8)),
+    'email_concurrency': int(os.getenv('NOTIF_EMAIL_CONCURRENCY', 4)),
+    'email_rate': float(os.getenv('NOTIF_EMAIL_RATE', 0)),
+    'whatsapp_concurrency': int(os.getenv('NOTIF_WHATSAPP_CONCURRENCY', 8)),
+    # Mensajes por segundo permitidos por el nivel de la cuenta en Meta (80 por defecto)
+    'whatsapp_rate': float(os.getenv('NOTIF_WHATSAPP_RATE', 80)),
+    'status_batch_size': int(os.getenv('NOTIF_STATUS_BATCH_SIZE', 50))
+}
+
+# Webhook de WhatsApp: se guarda el evento y se responde a Meta de inmediato;
+# los hilos de ProcesadorWebhookWhatsApp lo procesan fuera del request
+WA_WEBHOOK_CONFIG = {
+    'async_enabled': os.getenv('WA_WEBHOOK_ASYNC_ENABLED', 'true').lower() == 'true',
+    'workers': int(os.getenv('WA_WEBHOOK_WORKERS', 2)),
+    # Fragmentos por teléfono; no cambiar con eventos pendientes en la cola
+    'shards': int(os.getenv('WA_WEBHOOK_SHARDS', 16)),
+    'max_attempts': int(os.getenv('WA_WEBHOOK_MAX_ATTEMPTS', 5)),
+    'poll_interval': float(os.getenv('WA_WEBHOOK_POLL_INTERVAL', 5)),
+    'batch_size': int(os.getenv('WA_WEBHOOK_BATCH_SIZE', 50)),
+    # Días que se conservan los eventos ya procesados
+    'retention_days': int(os.getenv('WA_WEBHOOK_RETENTION_DAYS', 7))
+}
+
+# Scheduler residente (scripts/scheduler.py --daemon): segundos entre ejecuciones de cada tarea
+SCHEDULER_CONFIG = {
+    'intervalos': {
+        'generar_notificaciones': int(os.getenv('SCHEDULER_INTERVALO_GENERAR', 300)),
+        'enviar_pendientes': int(os.getenv('SCHEDULER_INTERVALO_PENDIENTES', 30)),
+        'reintentos_whatsapp': int(os.getenv('SCHEDULER_INTERVALO_REINTENTOS_WA', 60)),
+        'eventos_finalizados': int(os.getenv('SCHEDULER_INTERVALO_FINALIZADOS', 900)),
+        'outbox_notificaciones': int(os.getenv('SCHEDULER_INTERVALO_OUTBOX', 30)),
+        'rollups_kpi': int(os.getenv('SCHEDULER_INTERVALO_ROLLUPS', 300)),
+        'webhook_whatsapp': int(os.getenv('SCHEDULER_INTERVALO_WEBHOOK_WA', 60))
+    },
+    'limite': int(os.getenv('SCHEDULER_LIMITE', 100)),
+    # Segundos entre resúmenes de métricas por tarea en logs/scheduler.log
+    'intervalo_metricas': int(os.getenv('SCHEDULER_INTERVALO_METRICAS', 900))
+}
+
+# Segundos que se reutilizan en memoria las configuraciones leídas de la BD
+# (integraciones, configuración general, precios de WhatsApp); 0 = sin caché
+CONFIG_CACHE_TTL = int(os.getenv('CONFIG_CACHE_TTL', 60))
+
+# Caché del decorador requiere_autenticacion (usuarios por id y tokens decodificados)
+AUTH_CACHE_CONFIG = {
+    # Segundos máximos que un cambio de usuario tarda en verse en otros procesos; 0 = sin caché
+    'ttl': int(os.getenv('AUTH_CACHE_TTL', 60)),
+    'max_usuarios': int(os.getenv('AUTH_CACHE_MAX_USERS', 1000)),
+    'max_tokens': int(os.getenv('AUTH_CACHE_MAX_TOKENS', 5000))
+}
+
+# Logs en logs/AAAA-MM-DD.txt (utilidades/logger.py)
+LOG_CONFIG = {
+    # Nivel mínimo que se escribe: DEBUG (todo, como antes), INFO, WARNING o ERROR
+    'level': os.getenv('LOG_LEVEL', 'DEBUG').upper(),
+    # Escritura en un hilo aparte; false = escribir en el hilo que registra
+    'async': os.getenv('LOG_ASYNC', 'true').lower() == 'true',
+    # Líneas en espera como máximo; si se llena, las nuevas se descartan y se cuentan
+    'queue_size': int(os.getenv('LOG_QUEUE_SIZE', 10000)),
+    'batch_size': int(os.getenv('LOG_BATCH_SIZE', 500)),
+    # Segundos máximos que una línea espera en memoria antes de llegar al archivo
+    'flush_interval': float(os.getenv('LOG_FLUSH_INTERVAL', 1))
+}
+
+# Métricas de la API en /api/metrics (formato Prometheus)
+METRICAS_CONFIG = {
+    'enabled': os.getenv('METRICS_ENABLED', 'true').lower() == 'true',
+    # Si se define, /api/metrics exige "Authorization: Bearer <token>"
+    'token': os.getenv('METRICS_TOKEN', ''),
+    # Requests más lentos que esto se registran en el log (JSON); 0 = no registrar
+    'slow_request_ms': int(os.getenv('METRICS_SLOW_REQUEST_MS', 1000)),
+    # Incluir las sentencias SQL ejecutadas en el registro de requests lentos
+    'capture_sql': os.getenv('METRICS_CAPTURE_SQL', 'true').lower() == 'true',
+    'max_sql': int(os.getenv('METRICS_MAX_SQL', 50))
+}
+
+# Perfil de consultas SQL por huella (utilidades/perfil_consultas.py); desactivado por defecto
+PERFIL_CONSULTAS_CONFIG = {
+    'enabled': os.getenv('DB_PROFILER_ENABLED', 'false').lower() == 'true',
+    # Consultas SELECT más lentas que esto (ms) guardan su EXPLAIN; 0 = no ejecutar EXPLAIN
+    'explain_ms': int(os.getenv('DB_PROFILER_EXPLAIN_MS', 0)),
+    # Huellas distintas como máximo (las nuevas se ignoran al llegar al límite)
+    'max_huellas': int(os.getenv('DB_PROFILER_MAX_FINGERPRINTS', 2000)),
+    # Tiempos recientes que se guardan por huella para calcular el p95
+    'muestras': int(os.getenv('DB_PROFILER_SAMPLES', 500)),
+    # Segundos entre volcados a logs/perfil_consultas_<pid>.json (los lee la CLI)
+    'intervalo_volcado': int(os.getenv('DB_PROFILER_DUMP_INTERVAL', 60))
+}
+
+# Eventos en tiempo real del chat de WhatsApp (stream SSE /api/whatsapp_chat/stream)
+# Cada conexión abierta ocupa un hilo del servidor durante toda su vida: activar solo
+# con workers que lo soporten (gunicorn --worker-class gthread --threads N, o gevent).
+# Desactivado, el frontend vuelve a consultar periódicamente como antes.
+TIEMPO_REAL_CONFIG = {
+    'enabled': os.getenv('REALTIME_ENABLED', 'false').lower() == 'true',
+    # local: solo dentro del proceso; bd: reenvío entre procesos por la tabla eventos_tiempo_real
+    'broker': os.getenv('REALTIME_BROKER', 'local').lower(),
+    'intervalo_bd': int(os.getenv('REALTIME_DB_POLL_MS', 1000)) / 1000,
+    'retencion_minutos': int(os.getenv('REALTIME_DB_RETENTION_MINUTES', 60)),
+    # Eventos en espera por cliente; si se llena, el cliente recibe 'resync'
+    'tamano_cola': int(os.getenv('REALTIME_CLIENT_QUEUE', 500)),
+    # Segundos entre comentarios keep-alive del stream
+    'heartbeat': int(os.getenv('REALTIME_HEARTBEAT_SECONDS', 15)),
+    # Segundos entre revisiones de que el usuario del stream sigue activo y con acceso
+    'revalidar_usuario': int(os.getenv('REALTIME_AUTH_RECHECK_SECONDS', 60))
+}
+
+# Caché en disco de la media del chat de WhatsApp (utilidades/cache_media.py)
+MEDIA_CACHE_CONFIG = {
+    'enabled': os.getenv('MEDIA_CACHE_ENABLED', 'true').lower() == 'true',
+    # Relativo a la carpeta del proyecto si no es una ruta absoluta
+    'directorio': os.getenv('MEDIA_CACHE_DIR', 'cache/media'),
+    # Al superarlo se borran los archivos usados hace más tiempo
+    'max_mb': int(os.getenv('MEDIA_CACHE_MAX_MB', 1024)),
+    # Descargar la media entrante al recibirla en el webhook
+    'prefetch': os.getenv('MEDIA_CACHE_PREFETCH', 'true').lower() == 'true',
+    # Cache-Control max-age (segundos) para el navegador
+    'max_age': int(os.getenv('MEDIA_CACHE_MAX_AGE', 86400))
+}
+
 # Configuración de seguridad JWT
 # IMPORTANTE: En producción, usar variable de entorno JWT_SECRET_KEY
 JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'lirios-eventos-secret-key-change-in-production-2024')
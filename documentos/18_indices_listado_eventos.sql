@@ -0,0 +1,17 @@
+-- Índices para el listado paginado de eventos (GET /api/eventos con limite/cursor/orden)
+-- y para el cálculo agrupado del avance de servicios
+
+-- Paginación por cursor: ORDER BY fecha_evento, id_evento
+ALTER TABLE eventos
+  ADD INDEX idx_fecha_id_evento (fecha_evento, id_evento);
+
+-- Filtros frecuentes combinados con el orden por id_evento
+ALTER TABLE eventos
+  ADD INDEX idx_estado_id_evento (estado, id_evento);
+
+ALTER TABLE eventos
+  ADD INDEX idx_coordinador_id_evento (coordinador_id, id_evento);
+
+-- Avance de servicios agrupado por evento (excluye descartados)
+ALTER TABLE evento_servicios
+  ADD INDEX idx_evento_descartado_completado (evento_id, descartado, completado);
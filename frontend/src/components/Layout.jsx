@@ -4,6 +4,7 @@ import { useAuth } from '../context/AuthContext';
 import { useNombrePlataforma } from '../hooks/useNombrePlataforma';
 import { getRoleLabel, hasModuleAccess, hasRole, MODULES, ROLES } from '../utils/roles';
 import { whatsappChatService } from '../services/api';
+import { suscribirChat } from '../services/chatStream';
 import {
   Calendar,
   CalendarDays,
@@ -176,10 +177,38 @@ const Layout = () => {
 
   useEffect(() => {
     cargarNoLeidos();
-    // Actualizar cada 10 segundos
-    const interval = setInterval(cargarNoLeidos, 10000);
-    return () => clearInterval(interval);
-  }, [cargarNoLeidos]);
+    if (!usuario || !hasModuleAccess(usuario.rol, MODULES.WHATSAPP_CHAT)) return undefined;
+    // El stream avisa cuando cambian los no leídos; sin stream (desactivado o caído)
+    // se consulta cada 10 s y con stream cada 60 s de respaldo
+    let pendiente = null;
+    let streamActivo = false;
+    let ultimaConsulta = Date.now();
+    const cancelar = suscribirChat((tipo, datos) => {
+      if (tipo === 'desconectado' || tipo === 'no_disponible') {
+        streamActivo = false;
+        return;
+      }
+      if (tipo !== 'no_leidos' && tipo !== 'conectado' && tipo !== 'resync') return;
+      if (tipo !== 'no_leidos') streamActivo = true;
+      // El evento trae el total de no leídos: solo se consulta al (re)conectar
+      if (tipo === 'no_leidos' && typeof datos?.total === 'number') {
+        setWhatsappNoLeidos(datos.total);
+        return;
+      }
+      clearTimeout(pendiente);
+      pendiente = setTimeout(cargarNoLeidos, 300);
+    });
+    const interval = setInterval(() => {
+      if (streamActivo && Date.now() - ultimaConsulta < 60000) return;
+      ultimaConsulta = Date.now();
+      cargarNoLeidos();
+    }, 10000);
+    return () => {
+      cancelar();
+      clearTimeout(pendiente);
+      clearInterval(interval);
+    };
+  }, [cargarNoLeidos, usuario]);
 
   // Cuando cambie la ubicación y estemos en WhatsApp Chat, resetear el badge
   useEffect(() => {
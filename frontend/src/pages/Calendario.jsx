@@ -18,6 +18,8 @@ const Calendario = () => {
   const [vista, setVista] = useState('mes'); // 'mes' o 'año'
   const [loading, setLoading] = useState(true);
   const [eventoSeleccionado, setEventoSeleccionado] = useState(null);
+  // Disponibilidad por día del salón filtrado (vista mes)
+  const [disponibilidad, setDisponibilidad] = useState({});
 
   const meses = [
     'Enero', 'Febrero', 'Marzo', 'Abril', 'Mayo', 'Junio',
@@ -39,10 +41,20 @@ const Calendario = () => {
       } else if (esAdminOGerente && filtroAsignacion === 'mios' && usuario?.id) {
         filtrosEventos.coordinador_id = usuario.id;
       }
-      const [eventosData, salonesData] = await Promise.all([
+      const [eventosData, salonesData, disponibilidadData] = await Promise.all([
         eventosService.getAll(filtrosEventos),
-        salonesService.getAll(true)
+        salonesService.getAll(true),
+        salonFiltro
+          ? salonesService
+              .getDisponibilidad(salonFiltro, fechaActual.getFullYear(), fechaActual.getMonth() + 1)
+              .catch(() => null)
+          : Promise.resolve(null),
       ]);
+      const disponibilidadPorDia = {};
+      (disponibilidadData?.dias || []).forEach((dia) => {
+        disponibilidadPorDia[dia.fecha] = dia;
+      });
+      setDisponibilidad(disponibilidadPorDia);
       
       let eventosFiltrados = eventosData.eventos || [];
       
@@ -180,6 +192,15 @@ const Calendario = () => {
            fecha.getFullYear() === fechaActual.getFullYear();
   };
 
+  const colorDisponibilidad = {
+    libre: '#059669',
+    parcial: '#d97706',
+    ocupado: '#dc2626',
+  };
+
+  const textoHorariosLibres = (dia) =>
+    (dia.libres || []).map((libre) => `${libre.inicio}–${libre.fin}`).join(', ') || 'Sin horarios libres';
+
   const renderVistaMes = () => {
     const dias = obtenerDiasMes();
     const eventosDiaMap = {};
@@ -247,6 +268,21 @@ const Calendario = () => {
               <div style={{ fontWeight: esDiaActual ? '700' : '500', marginBottom: '0.25rem' }}>
                 {dia.getDate()}
               </div>
+              {esDelMesActual && disponibilidad[fechaStr] && (
+                <div
+                  style={{
+                    fontSize: '0.65rem',
+                    fontWeight: '600',
+                    marginBottom: '0.25rem',
+                    color: colorDisponibilidad[disponibilidad[fechaStr].estado],
+                  }}
+                  title={textoHorariosLibres(disponibilidad[fechaStr])}
+                >
+                  {disponibilidad[fechaStr].estado === 'libre' && 'Libre'}
+                  {disponibilidad[fechaStr].estado === 'ocupado' && 'Sin horarios libres'}
+                  {disponibilidad[fechaStr].estado === 'parcial' && `Libre ${textoHorariosLibres(disponibilidad[fechaStr])}`}
+                </div>
+              )}
               <div style={{ fontSize: '0.75rem' }}>
                 {eventosDia.length > 0 && (
                   <>
@@ -623,6 +659,14 @@ const Calendario = () => {
           <div style={{ width: '20px', height: '20px', backgroundColor: '#f59e0b30', borderRadius: '0.25rem' }}></div>
           <span>Múltiples Eventos</span>
         </div>
+        {salonFiltro && vista === 'mes' && (
+          <div style={{ display: 'flex', alignItems: 'center', gap: '0.5rem', color: '#6b7280' }}>
+            <span style={{ color: colorDisponibilidad.libre, fontWeight: '600' }}>Libre</span>/
+            <span style={{ color: colorDisponibilidad.parcial, fontWeight: '600' }}>parcial</span>/
+            <span style={{ color: colorDisponibilidad.ocupado, fontWeight: '600' }}>sin horarios</span>
+            <span>del salón seleccionado</span>
+          </div>
+        )}
       </div>
 
       {/* Calendario */}
@@ -1,16 +1,22 @@
 import React, { useEffect, useMemo, useRef, useState } from 'react';
 import { whatsappChatService } from '../services/api';
+import { suscribirChat } from '../services/chatStream';
 import { useToast } from '../hooks/useToast';
 import ToastContainer from '../components/ToastContainer';
 import useIsMobile from '../hooks/useIsMobile';
 import { Image, FileText, Mic, Smile, Search, MessageSquare, ArrowLeft, Plus, Send, X, Camera } from 'lucide-react';
 
+// Mensajes por página del historial (el servidor admite hasta 200)
+const LIMITE_MENSAJES = 50;
+
 const WhatsAppChat = () => {
   const { toasts, removeToast, error: showError, success } = useToast();
   const isMobile = useIsMobile();
   const [conversaciones, setConversaciones] = useState([]);
   const [seleccion, setSeleccion] = useState(null);
   const [mensajes, setMensajes] = useState([]);
+  const [hayAnteriores, setHayAnteriores] = useState(false);
+  const [cargandoAnteriores, setCargandoAnteriores] = useState(false);
   const [mensaje, setMensaje] = useState('');
   const [loading, setLoading] = useState(true);
   const [busqueda, setBusqueda] = useState('');
@@ -47,22 +53,53 @@ const WhatsAppChat = () => {
     );
   }, [busqueda, conversaciones]);
 
+  // Marca 'sincronizado_hasta' de la última carga: los polls piden solo lo modificado
+  const sincronizadoRef = useRef(null);
+
+  const ordenarConversaciones = (lista) =>
+    [...lista].sort(
+      (a, b) =>
+        (b.mensajes_no_leidos || 0) - (a.mensajes_no_leidos || 0) ||
+        (Date.parse(b.ultima_interaccion) || 0) - (Date.parse(a.ultima_interaccion) || 0) ||
+        b.id - a.id
+    );
+
+  const obtenerPaginas = async (params) => {
+    let cursor = null;
+    let filas = [];
+    let sincronizado = null;
+    do {
+      const data = await whatsappChatService.getConversations({
+        ...params,
+        limite: 200,
+        ...(cursor ? { cursor } : {}),
+      });
+      filas = filas.concat(data.conversaciones || []);
+      sincronizado = data.sincronizado_hasta || sincronizado;
+      cursor = data.siguiente_cursor;
+    } while (cursor);
+    return { filas, sincronizado };
+  };
+
   const cargarConversaciones = async (silent = false) => {
     try {
       if (!silent) {
         setLoading(true);
       }
-      const data = await whatsappChatService.getConversations();
-      const nuevas = data.conversaciones || [];
-      const actualHash = (conversaciones || [])
-        .map((c) => `${c.id}-${c.ultimo_mensaje}-${c.ultima_fecha}-${c.bot_activo}-${c.requiere_reengagement}`)
-        .join('|');
-      const nuevoHash = nuevas
-        .map((c) => `${c.id}-${c.ultimo_mensaje}-${c.ultima_fecha}-${c.bot_activo}-${c.requiere_reengagement}`)
-        .join('|');
-      if (actualHash !== nuevoHash) {
-        setConversaciones(nuevas);
+      if (!silent || !sincronizadoRef.current) {
+        const { filas, sincronizado } = await obtenerPaginas({});
+        sincronizadoRef.current = sincronizado;
+        setConversaciones(filas);
+        return;
       }
+      const { filas: cambiadas, sincronizado } = await obtenerPaginas({ updated_since: sincronizadoRef.current });
+      sincronizadoRef.current = sincronizado || sincronizadoRef.current;
+      if (cambiadas.length === 0) return;
+      setConversaciones((actuales) => {
+        const porId = new Map(actuales.map((c) => [c.id, c]));
+        cambiadas.forEach((c) => porId.set(c.id, c));
+        return ordenarConversaciones(Array.from(porId.values()));
+      });
     } catch (err) {
       const mensaje = err.response?.data?.error || 'Error al cargar conversaciones';
       showError(mensaje);
@@ -73,21 +110,66 @@ const WhatsAppChat = () => {
     }
   };
 
+  // Conversación abierta, leída desde el handler del stream
+  const seleccionIdRef = useRef(null);
+  seleccionIdRef.current = seleccion?.id || null;
+
+  // Conversación cuyos mensajes están cargados y copia de la lista para los handlers
+  const mensajesConvRef = useRef(null);
+  const mensajesRef = useRef([]);
+  mensajesRef.current = mensajes;
+
+  const agregarMensajes = (actuales, nuevos) => {
+    const ids = new Set(actuales.map((m) => m.id));
+    return [...actuales, ...nuevos.filter((m) => !ids.has(m.id))];
+  };
+
   const cargarMensajes = async (convId) => {
     try {
-      const data = await whatsappChatService.getMessages(convId);
-      const nuevos = data.mensajes || [];
-      const ultimoActual = mensajes[mensajes.length - 1]?.id;
-      const ultimoNuevo = nuevos[nuevos.length - 1]?.id;
-      if (ultimoActual !== ultimoNuevo || mensajes.length !== nuevos.length) {
-        setMensajes(nuevos);
+      const ultimoId = mensajesConvRef.current === convId
+        ? mensajesRef.current[mensajesRef.current.length - 1]?.id
+        : null;
+      if (ultimoId) {
+        // Conversación ya cargada: solo lo posterior al último mensaje visto
+        const data = await whatsappChatService.getMessages(convId, { after_id: ultimoId, limite: LIMITE_MENSAJES });
+        if (seleccionIdRef.current !== convId || mensajesConvRef.current !== convId) return;
+        const nuevos = data.mensajes || [];
+        if (nuevos.length > 0) {
+          setMensajes((actuales) => agregarMensajes(actuales, nuevos));
+        }
+        if (!data.hay_mas) return;
+        // Demasiados mensajes nuevos: se recarga el tramo más reciente
       }
+      const data = await whatsappChatService.getMessages(convId, { limite: LIMITE_MENSAJES });
+      if (seleccionIdRef.current !== convId) return;
+      mensajesConvRef.current = convId;
+      setMensajes(data.mensajes || []);
+      setHayAnteriores(Boolean(data.hay_mas));
     } catch (err) {
       const mensaje = err.response?.data?.error || 'Error al cargar mensajes';
       showError(mensaje);
     }
   };
 
+  const cargarAnteriores = async () => {
+    const convId = mensajesConvRef.current;
+    const primerId = mensajesRef.current[0]?.id;
+    if (!convId || !primerId || cargandoAnteriores) return;
+    setCargandoAnteriores(true);
+    try {
+      const data = await whatsappChatService.getMessages(convId, { before_id: primerId, limite: LIMITE_MENSAJES });
+      if (mensajesConvRef.current !== convId) return;
+      const anteriores = data.mensajes || [];
+      setMensajes((actuales) => agregarMensajes(anteriores, actuales));
+      setHayAnteriores(Boolean(data.hay_mas));
+    } catch (err) {
+      const mensaje = err.response?.data?.error || 'Error al cargar mensajes';
+      showError(mensaje);
+    } finally {
+      setCargandoAnteriores(false);
+    }
+  };
+
   useEffect(() => {
     cargarConversaciones();
   }, []);
@@ -96,7 +178,9 @@ const WhatsAppChat = () => {
     if (seleccion?.id) {
       cargarMensajes(seleccion.id);
     } else {
+      mensajesConvRef.current = null;
       setMensajes([]);
+      setHayAnteriores(false);
     }
   }, [seleccion]);
 
@@ -115,24 +199,64 @@ const WhatsAppChat = () => {
   }, [conversaciones, seleccion]);
 
   useEffect(() => {
-    const intervaloMs = 5000;
-    const tick = async () => {
-      if (document.visibilityState !== 'visible') return;
-      if (seleccion?.id) {
-        await cargarMensajes(seleccion.id);
+    // Los cambios llegan por el stream SSE; la bandeja se actualiza con updated_since
+    let pendiente = null;
+    const refrescarBandeja = () => {
+      clearTimeout(pendiente);
+      pendiente = setTimeout(() => cargarConversaciones(true), 300);
+    };
+    // Sin stream (desactivado o caído) se consulta cada 5 s; con stream, cada 30 s de respaldo
+    let streamActivo = false;
+    let ultimaConsulta = Date.now();
+    const cancelar = suscribirChat((tipo, datos) => {
+      const abierta = seleccionIdRef.current;
+      if (tipo === 'desconectado' || tipo === 'no_disponible') {
+        streamActivo = false;
+        return;
+      }
+      if (tipo === 'mensaje') {
+        if (datos.conversacion_id === abierta && datos.mensaje) {
+          setMensajes((actuales) =>
+            actuales.some((m) => m.id === datos.mensaje.id) ? actuales : [...actuales, datos.mensaje]
+          );
+        }
+        refrescarBandeja();
+      } else if (tipo === 'estado') {
+        setMensajes((actuales) =>
+          actuales.some((m) => m.wa_message_id === datos.wa_message_id)
+            ? actuales.map((m) => (m.wa_message_id === datos.wa_message_id ? { ...m, estado: datos.estado } : m))
+            : actuales
+        );
+      } else if (tipo === 'no_leidos' || tipo === 'conversacion') {
+        refrescarBandeja();
+      } else if (tipo === 'conectado' || tipo === 'resync') {
+        streamActivo = true;
+        // Pudieron perderse eventos mientras no había conexión
+        if (abierta) cargarMensajes(abierta);
+        refrescarBandeja();
       }
-      await cargarConversaciones(true);
+    });
+    const intervalId = setInterval(() => {
+      if (document.visibilityState !== 'visible') return;
+      if (streamActivo && Date.now() - ultimaConsulta < 30000) return;
+      ultimaConsulta = Date.now();
+      if (seleccionIdRef.current) cargarMensajes(seleccionIdRef.current);
+      cargarConversaciones(true);
+    }, 5000);
+    return () => {
+      cancelar();
+      clearTimeout(pendiente);
+      clearInterval(intervalId);
     };
-    tick();
-    const intervalId = setInterval(tick, intervaloMs);
-    return () => clearInterval(intervalId);
-  }, [seleccion?.id]);
+  }, []);
 
+  // Solo se baja al final cuando cambia el último mensaje (no al cargar anteriores)
+  const ultimoMensajeId = mensajes[mensajes.length - 1]?.id;
   useEffect(() => {
     if (messagesEndRef.current) {
       messagesEndRef.current.scrollIntoView({ behavior: 'smooth', block: 'end' });
     }
-  }, [mensajes, seleccion]);
+  }, [ultimoMensajeId, seleccion?.id]);
 
   useEffect(() => {
     const pendientes = mensajes.filter((msg) => msg.media_id && !mediaCache[msg.media_id]);
@@ -684,6 +808,26 @@ const WhatsAppChat = () => {
             backgroundImage: 'url("data:image/svg+xml,%3Csvg width=\'60\' height=\'60\' viewBox=\'0 0 60 60\' xmlns=\'http://www.w3.org/2000/svg\'%3E%3Cg fill=\'none\' fill-rule=\'evenodd\'%3E%3Cg fill=\'%23182229\' fill-opacity=\'0.6\'%3E%3Cpath d=\'M36 34v-4h-2v4h-4v2h4v4h2v-4h4v-2h-4zm0-30V0h-2v4h-4v2h4v4h2V6h4V4h-4zM6 34v-4H4v4H0v2h4v4h2v-4h4v-2H6zM6 4V0H4v4H0v2h4v4h2V6h4V4H6z\'/%3E%3C/g%3E%3C/g%3E%3C/svg%3E")',
             minHeight: 0,
           }}>
+            {seleccion && hayAnteriores && (
+              <div style={{ display: 'flex', justifyContent: 'center', marginBottom: '0.5rem' }}>
+                <button
+                  type="button"
+                  onClick={cargarAnteriores}
+                  disabled={cargandoAnteriores}
+                  style={{
+                    padding: '0.35rem 0.9rem',
+                    borderRadius: '999px',
+                    border: 'none',
+                    background: '#202c33',
+                    color: '#8696a0',
+                    fontSize: '0.8rem',
+                    cursor: cargandoAnteriores ? 'default' : 'pointer',
+                  }}
+                >
+                  {cargandoAnteriores ? 'Cargando...' : 'Cargar mensajes anteriores'}
+                </button>
+              </div>
+            )}
             {seleccion ? (
               mensajes.map((msg) => (
                 <div
@@ -592,9 +592,26 @@ export const salonesService = {
     return response.data;
   },
 
-  verificarDisponibilidad: async (id, fechaEvento) => {
+  verificarDisponibilidad: async (id, fechaEvento, horaInicio = null, horaFin = null) => {
     const response = await api.post(`/salones/${id}/verificar-disponibilidad`, {
       fecha_evento: fechaEvento,
+      hora_inicio: horaInicio,
+      hora_fin: horaFin,
+    });
+    return response.data;
+  },
+
+  getDisponibilidad: async (id, anio, mes) => {
+    const response = await api.get(`/salones/${id}/disponibilidad`, {
+      params: { anio, mes },
+    });
+    return response.data;
+  },
+
+  verificarHorarios: async (horarios, eventoIdExcluir = null) => {
+    const response = await api.post('/salones/disponibilidad/verificar', {
+      horarios,
+      evento_id_excluir: eventoIdExcluir,
     });
     return response.data;
   },
@@ -740,12 +757,12 @@ export const integracionesService = {
 };
 
 export const whatsappChatService = {
-  getConversations: async () => {
-    const response = await api.get('/whatsapp_chat/conversations');
+  getConversations: async (params = null) => {
+    const response = await api.get('/whatsapp_chat/conversations', { params: params || {} });
     return response.data;
   },
-  getMessages: async (conversationId) => {
-    const response = await api.get(`/whatsapp_chat/conversations/${conversationId}/messages`);
+  getMessages: async (conversationId, params = null) => {
+    const response = await api.get(`/whatsapp_chat/conversations/${conversationId}/messages`, { params: params || {} });
     return response.data;
   },
   sendMessage: async (conversationId, mensaje) => {
@@ -0,0 +1,124 @@
+// Stream SSE del chat de WhatsApp (/api/whatsapp_chat/stream)
+// Una sola conexión por pestaña, compartida por todos los componentes suscritos.
+// Se usa fetch en lugar de EventSource para poder enviar el header Authorization.
+
+const API_BASE_URL = import.meta.env.VITE_API_URL || '/api';
+const REINTENTO_MINIMO_MS = 2000;
+const REINTENTO_MAXIMO_MS = 30000;
+
+const suscriptores = new Set();
+let controlador = null;
+let reintentoMs = REINTENTO_MINIMO_MS;
+let temporizador = null;
+// El servidor tiene el stream desactivado (REALTIME_ENABLED=false): no reintentar
+let noDisponible = false;
+
+const emitir = (tipo, datos = {}) => {
+  suscriptores.forEach((handler) => {
+    try {
+      handler(tipo, datos);
+    } catch (err) {
+      console.error('Error en suscriptor del stream de chat:', err);
+    }
+  });
+};
+
+const procesarBloque = (bloque) => {
+  let tipo = 'message';
+  const lineas = [];
+  bloque.split('\n').forEach((linea) => {
+    if (linea.startsWith('event:')) tipo = linea.slice(6).trim();
+    else if (linea.startsWith('data:')) lineas.push(linea.slice(5).trimStart());
+  });
+  if (lineas.length === 0) return;
+  try {
+    emitir(tipo, JSON.parse(lineas.join('\n')));
+  } catch (_) {
+    // Bloque incompleto o no JSON: se ignora
+  }
+};
+
+const programarReconexion = () => {
+  if (suscriptores.size === 0 || temporizador) return;
+  temporizador = setTimeout(() => {
+    temporizador = null;
+    conectar();
+  }, reintentoMs);
+  reintentoMs = Math.min(reintentoMs * 2, REINTENTO_MAXIMO_MS);
+};
+
+const conectar = async () => {
+  const token = localStorage.getItem('token');
+  if (!token || controlador) return;
+  controlador = new AbortController();
+  const propio = controlador;
+  try {
+    const response = await fetch(`${API_BASE_URL}/whatsapp_chat/stream`, {
+      headers: { Authorization: `Bearer ${token}`, Accept: 'text/event-stream' },
+      signal: propio.signal,
+    });
+    if (response.status === 404) {
+      noDisponible = true;
+      controlador = null;
+      emitir('no_disponible');
+      return;
+    }
+    if (!response.ok || !response.body) {
+      throw new Error(`Stream no disponible (${response.status})`);
+    }
+    reintentoMs = REINTENTO_MINIMO_MS;
+    const lector = response.body.getReader();
+    const decodificador = new TextDecoder();
+    let buffer = '';
+    for (;;) {
+      const { value, done } = await lector.read();
+      if (done) break;
+      buffer += decodificador.decode(value, { stream: true }).replace(/\r\n/g, '\n');
+      let separador = buffer.indexOf('\n\n');
+      while (separador !== -1) {
+        procesarBloque(buffer.slice(0, separador));
+        buffer = buffer.slice(separador + 2);
+        separador = buffer.indexOf('\n\n');
+      }
+    }
+  } catch (_) {
+    // Red caída, token vencido o stream desactivado: se reintenta con espera creciente
+  } finally {
+    if (controlador === propio) {
+      controlador = null;
+      if (!propio.signal.aborted) {
+        emitir('desconectado');
+        programarReconexion();
+      }
+    }
+  }
+};
+
+/**
+ * Suscribe un handler(tipo, datos) a los eventos del chat.
+ * Tipos: conectado, desconectado, no_disponible (stream desactivado en el
+ * servidor: consultar periódicamente), mensaje, estado, no_leidos,
+ * conversacion, resync.
+ * Retorna la función para cancelar la suscripción.
+ */
+export const suscribirChat = (handler) => {
+  suscriptores.add(handler);
+  if (suscriptores.size === 1) {
+    reintentoMs = REINTENTO_MINIMO_MS;
+    noDisponible = false;
+    conectar();
+  } else if (noDisponible) {
+    setTimeout(() => suscriptores.has(handler) && handler('no_disponible', {}), 0);
+  }
+  return () => {
+    suscriptores.delete(handler);
+    if (suscriptores.size === 0) {
+      clearTimeout(temporizador);
+      temporizador = null;
+      if (controlador) {
+        controlador.abort();
+        controlador = null;
+      }
+    }
+  };
+};
@@ -0,0 +1,217 @@
+"""
+Despacho asíncrono de notificaciones automáticas
+Los modelos encolan los envíos en notificaciones_outbox y un grupo de hilos
+los envía fuera del request (SMTP y WhatsApp pueden tardar decenas de segundos)
+"""
+import os
+import threading
+from config import NOTIF_ASYNC_CONFIG
+from modelos.esquema import EsquemaBD
+from modelos.notificacion_outbox_modelo import NotificacionOutboxModelo
+from utilidades.logger import obtener_logger
+
+
+TIPOS_NOTIFICACION = ('cambio_estado', 'pago', 'pago_anulado')
+
+
+def enviar_notificacion(tipo, evento, datos):
+    """
+    Envía una notificación con NotificacionesAutomaticas
+
+    Returns:
+        bool: True si se envió por al menos un canal
+    """
+    from integraciones.notificaciones_automaticas import NotificacionesAutomaticas
+    notif = NotificacionesAutomaticas()
+    if tipo == 'cambio_estado':
+        return notif.enviar_notificacion_cambio_estado(
+            evento=evento,
+            estado_anterior=datos.get('estado_anterior'),
+            estado_nuevo=datos.get('estado_nuevo')
+        )
+    if tipo == 'pago':
+        return notif.enviar_notificacion_pago(
+            evento=evento,
+            monto=float(datos.get('monto') or 0),
+            tipo_pago=datos.get('tipo_pago'),
+            metodo_pago=datos.get('metodo_pago') or '',
+            fecha_pago=str(datos.get('fecha_pago') or ''),
+            saldo_pendiente=float(datos.get('saldo_pendiente') or 0)
+        )
+    if tipo == 'pago_anulado':
+        return notif.enviar_notificacion_pago_anulado(
+            evento=evento,
+            monto=float(datos.get('monto') or 0),
+            metodo_pago=datos.get('metodo_pago') or '',
+            fecha_pago=str(datos.get('fecha_pago') or ''),
+            observaciones=datos.get('observaciones')
+        )
+    raise ValueError(f"Tipo de notificación desconocido: {tipo}")
+
+
+def encolar_notificacion(tipo, evento_id, **datos):
+    """
+    Encola una notificación para enviarla en segundo plano
+
+    Si el envío asíncrono está desactivado (NOTIF_ASYNC_ENABLED=false) o no se
+    pudo escribir en la cola, se envía en el momento como antes.
+
+    Args:
+        tipo: 'cambio_estado', 'pago' o 'pago_anulado'
+        evento_id: ID del evento (sus datos se leen al momento de enviar)
+        **datos: parámetros del envío (montos, estados, fechas)
+    """
+    logger = obtener_logger()
+    if tipo not in TIPOS_NOTIFICACION:
+        raise ValueError(f"Tipo de notificación desconocido: {tipo}")
+
+    if NOTIF_ASYNC_CONFIG['enabled']:
+        try:
+            outbox_id = NotificacionOutboxModelo().encolar(
+                tipo, datos, evento_id=evento_id, max_intentos=NOTIF_ASYNC_CONFIG['max_attempts']
+            )
+        except Exception as e:
+            logger.warning(f"No se pudo encolar la notificación '{tipo}': {e}")
+            outbox_id = None
+        if outbox_id:
+            DespachadorNotificaciones.obtener().despertar()
+            return outbox_id
+        logger.warning(f"Notificación '{tipo}' del evento {evento_id} enviada en línea (cola no disponible)")
+
+    from modelos.evento_modelo import EventoModelo
+    evento = EventoModelo().obtener_evento_por_id(evento_id)
+    if evento:
+        enviar_notificacion(tipo, evento, datos)
+    return None
+
+
+class DespachadorNotificaciones:
+    """Grupo de hilos que vacía la cola notificaciones_outbox"""
+
+    _instancia = None
+    _lock = threading.Lock()
+
+    def __init__(self, trabajadores=2, intervalo=5, bloqueo_segundos=300, tamano_lote=5):
+        self.trabajadores = max(1, int(trabajadores))
+        self.intervalo = intervalo
+        self.bloqueo_segundos = bloqueo_segundos
+        self.tamano_lote = tamano_lote
+        self.outbox = NotificacionOutboxModelo()
+        self.logger = obtener_logger()
+        self._despertar = threading.Event()
+        self._detener = threading.Event()
+        self._hilos = []
+        self._pid = None
+
+    @classmethod
+    def obtener(cls):
+        """Instancia compartida del proceso (se inicia al primer uso)"""
+        with cls._lock:
+            if cls._instancia is None:
+                cls._instancia = cls(
+                    trabajadores=NOTIF_ASYNC_CONFIG['workers'],
+                    intervalo=NOTIF_ASYNC_CONFIG['poll_interval'],
+                    bloqueo_segundos=NOTIF_ASYNC_CONFIG['lock_timeout']
+                )
+            return cls._instancia
+
+    @staticmethod
+    def cola_disponible():
+        """Indica si existe notificaciones_outbox (migración 0008); ante un error de BD se asume que sí"""
+        try:
+            return EsquemaBD.tabla_existe('notificaciones_outbox')
+        except Exception:
+            return True
+
+    def iniciar(self):
+        """Arranca los hilos (también tras un fork de gunicorn, donde los hilos no se heredan)"""
+        with self._lock:
+            if self._pid == os.getpid() and any(hilo.is_alive() for hilo in self._hilos):
+                return
+            self._pid = os.getpid()
+            self._detener.clear()
+            self._hilos = []
+            for numero in range(self.trabajadores):
+                hilo = threading.Thread(
+                    target=self._bucle,
+                    name=f"despachador-notificaciones-{numero + 1}",
+                    daemon=True
+                )
+                hilo.start()
+                self._hilos.append(hilo)
+        self.logger.info(f"Despachador de notificaciones iniciado con {self.trabajadores} hilos")
+
+    def despertar(self):
+        """Avisa a los hilos que hay trabajo nuevo (los inicia si hace falta)"""
+        self.iniciar()
+        self._despertar.set()
+
+    def detener(self, timeout=5):
+        self._detener.set()
+        self._despertar.set()
+        for hilo in self._hilos:
+            hilo.join(timeout)
+
+    def _bucle(self):
+        while not self._detener.is_set():
+            try:
+                procesados = self.procesar_lote()
+            except Exception as e:
+                self.logger.error(f"Error en el despachador de notificaciones: {e}")
+                procesados = 0
+            finally:
+                # Los hilos del despachador no pasan por teardown_request
+                from modelos.base_datos import BaseDatos
+                BaseDatos.liberar_conexion_hilo()
+            if not procesados:
+                self._despertar.wait(self.intervalo)
+                self._despertar.clear()
+
+    def procesar_lote(self, limite=None):
+        """
+        Reclama y envía un lote de notificaciones
+
+        Returns:
+            int: cantidad de registros procesados
+        """
+        registros = self.outbox.reclamar(limite or self.tamano_lote, self.bloqueo_segundos)
+        for registro in registros:
+            self._procesar(registro)
+        return len(registros)
+
+    def procesar_pendientes(self, limite=100):
+        """Vacía la cola de forma síncrona (usado por scripts/scheduler.py)"""
+        total = 0
+        while total < limite:
+            procesados = self.procesar_lote(min(self.tamano_lote, limite - total))
+            if not procesados:
+                break
+            total += procesados
+        return total
+
+    def _procesar(self, registro):
+        from modelos.evento_modelo import EventoModelo
+        outbox_id = registro['id']
+        try:
+            evento = EventoModelo().obtener_evento_por_id(registro.get('evento_id')) \
+                if registro.get('evento_id') else None
+            if not evento:
+                self.outbox.marcar_descartado(outbox_id, f"Evento {registro.get('evento_id')} no encontrado")
+                return
+            if not evento.get('email') and not evento.get('telefono'):
+                self.outbox.marcar_descartado(outbox_id, "Evento sin email ni teléfono de contacto")
+                return
+            if enviar_notificacion(registro['tipo'], evento, registro.get('datos') or {}):
+                self.outbox.marcar_enviado(outbox_id)
+            else:
+                self.outbox.marcar_error(
+                    outbox_id, "No se pudo enviar por ningún canal",
+                    int(registro.get('intentos') or 0), int(registro.get('max_intentos') or 0)
+                )
+        except ValueError as e:
+            self.outbox.marcar_descartado(outbox_id, e)
+        except Exception as e:
+            self.logger.error(f"Error al enviar notificación {outbox_id} ({registro.get('tipo')}): {e}")
+            self.outbox.marcar_error(
+                outbox_id, e, int(registro.get('intentos') or 0), int(registro.get('max_intentos') or 0)
+            )
@@ -3,6 +3,8 @@ Módulo de integración con correo electrónico
 """
 import smtplib
 import os
+import threading
+import time
 from utilidades.logger import obtener_logger
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
@@ -14,8 +16,104 @@ from modelos.base_datos import BaseDatos
 load_dotenv()
 
 
+class PoolSMTP:
+    """
+    Sesiones SMTP reutilizables (conexión + STARTTLS + login una sola vez).
+
+    Las sesiones inactivas se guardan en una pila (LIFO) para que envíos
+    consecutivos del mismo hilo reutilicen la misma. Se cierran al superar
+    `max_mensajes` enviados o `inactividad` segundos sin uso, y se verifican
+    con NOOP antes de reutilizarlas si llevan más de `intervalo_noop` segundos
+    inactivas.
+    """
+
+    def __init__(self, abrir_sesion, tamano=2, max_mensajes=100, inactividad=60, intervalo_noop=10):
+        self.abrir_sesion = abrir_sesion
+        self.tamano = tamano
+        self.max_mensajes = max_mensajes
+        self.inactividad = inactividad
+        self.intervalo_noop = intervalo_noop
+        self._disponibles = []
+        self._lock = threading.Lock()
+        self._estadisticas = {'abiertas': 0, 'reutilizadas': 0, 'descartadas': 0, 'mensajes': 0}
+
+    def obtener(self, reutilizar=True):
+        """
+        Returns:
+            tuple: (sesion, datos de la sesión, reutilizada)
+        """
+        while reutilizar:
+            with self._lock:
+                if not self._disponibles:
+                    break
+                sesion, datos = self._disponibles.pop()
+            inactiva = time.monotonic() - datos['ultimo_uso']
+            if inactiva > self.inactividad:
+                self._cerrar(sesion)
+                continue
+            if inactiva > self.intervalo_noop:
+                try:
+                    codigo = sesion.noop()[0]
+                except Exception:
+                    codigo = None
+                if codigo != 250:
+                    self._cerrar(sesion, descartada=True)
+                    continue
+            with self._lock:
+                self._estadisticas['reutilizadas'] += 1
+            return sesion, datos, True
+
+        sesion = self.abrir_sesion()
+        with self._lock:
+            self._estadisticas['abiertas'] += 1
+        return sesion, {'mensajes': 0, 'ultimo_uso': time.monotonic()}, False
+
+    def devolver(self, sesion, datos, descartar=False):
+        """Devuelve la sesión a la pila o la cierra (dañada, agotada o sobrante)"""
+        datos['ultimo_uso'] = time.monotonic()
+        with self._lock:
+            if not descartar and datos['mensajes'] < self.max_mensajes and len(self._disponibles) < self.tamano:
+                self._disponibles.append((sesion, datos))
+                return
+        self._cerrar(sesion, descartada=descartar)
+
+    def registrar_envio(self, datos):
+        datos['mensajes'] += 1
+        with self._lock:
+            self._estadisticas['mensajes'] += 1
+
+    def _cerrar(self, sesion, descartada=False):
+        if descartada:
+            with self._lock:
+                self._estadisticas['descartadas'] += 1
+        try:
+            sesion.quit()
+        except Exception:
+            try:
+                sesion.close()
+            except Exception:
+                pass
+
+    def cerrar_todas(self):
+        with self._lock:
+            sesiones = [sesion for sesion, _ in self._disponibles]
+            self._disponibles = []
+        for sesion in sesiones:
+            self._cerrar(sesion)
+
+    def estadisticas(self):
+        with self._lock:
+            datos = dict(self._estadisticas)
+            datos['inactivas'] = len(self._disponibles)
+        return datos
+
+
 class IntegracionEmail:
     """Clase para gestionar envío de correos electrónicos"""
+
+    # Pools compartidos por todas las instancias, uno por servidor/cuenta
+    _pools = {}
+    _pools_lock = threading.Lock()
     
     def __init__(self):
         self.base_datos = BaseDatos()
@@ -93,29 +191,6 @@ class IntegracionEmail:
             else:
                 msg.attach(MIMEText(cuerpo, 'plain', 'utf-8'))
             
-            # Conectar al servidor SMTP con timeout
-            timeout = 30  # 30 segundos de timeout
-            self.logger.info(f"Conectando a SMTP {self.smtp_server}:{self.smtp_port}")
-            
-            if self.use_ssl:
-                # Usar SSL (puerto 465)
-                server = smtplib.SMTP_SSL(self.smtp_server, self.smtp_port, timeout=timeout)
-            else:
-                # Usar conexión normal (puerto 587 o 25)
-                server = smtplib.SMTP(self.smtp_server, self.smtp_port, timeout=timeout)
-            
-            # Configurar timeout para operaciones
-            server.timeout = timeout
-            
-            # Iniciar TLS si está configurado
-            if self.use_tls and not self.use_ssl:
-                self.logger.info("Iniciando TLS")
-                server.starttls()
-            
-            # Autenticarse
-            self.logger.info(f"Autenticando SMTP como {self.email_from}")
-            server.login(self.email_from, self.email_password)
-            
             # Enviar correo usando sendmail para capturar respuesta completa
             self.logger.info(f"Enviando correo a {destinatario}")
             
@@ -123,22 +198,15 @@ class IntegracionEmail:
             msg_string = msg.as_string()
             self.logger.info(f"Tamaño del mensaje: {len(msg_string)} bytes")
             
-            rechazados = server.sendmail(
-                self.email_from,
-                [destinatario],
-                msg_string
-            )
+            rechazados = self._enviar_mensaje([destinatario], msg_string)
             
             # sendmail retorna un diccionario de rechazados
             if rechazados:
                 self.logger.error(f"Destinatarios rechazados por SMTP: {rechazados}")
-                server.quit()
                 return False
             
             # Verificar última respuesta del servidor
             self.logger.info(f"Correo aceptado por servidor SMTP para {destinatario}")
-            server.quit()
-            self.logger.info("Conexion SMTP cerrada correctamente")
             self.logger.info(f"Correo enviado exitosamente a {destinatario}: {asunto}")
             return True
             
@@ -178,6 +246,106 @@ class IntegracionEmail:
                 self.logger.error("El servidor cerró la conexión. Verifica SSL/TLS")
             return False
     
+    def enviar_lote(self, mensajes):
+        """
+        Envía varios correos reutilizando la misma sesión SMTP
+
+        Args:
+            mensajes: lista de dicts con destinatario, asunto, cuerpo y es_html (opcional)
+
+        Returns:
+            list: True/False por cada mensaje, en el mismo orden
+        """
+        # La pila del pool entrega al hilo la sesión que acaba de devolver
+        return [
+            self.enviar_correo(
+                mensaje['destinatario'],
+                mensaje['asunto'],
+                mensaje['cuerpo'],
+                es_html=mensaje.get('es_html', False)
+            )
+            for mensaje in mensajes
+        ]
+
+    def _abrir_sesion(self):
+        """Abre una conexión SMTP autenticada"""
+        # Conectar al servidor SMTP con timeout
+        timeout = 30  # 30 segundos de timeout
+        self.logger.info(f"Conectando a SMTP {self.smtp_server}:{self.smtp_port}")
+        
+        if self.use_ssl:
+            # Usar SSL (puerto 465)
+            server = smtplib.SMTP_SSL(self.smtp_server, self.smtp_port, timeout=timeout)
+        else:
+            # Usar conexión normal (puerto 587 o 25)
+            server = smtplib.SMTP(self.smtp_server, self.smtp_port, timeout=timeout)
+        
+        try:
+            # Configurar timeout para operaciones
+            server.timeout = timeout
+            
+            # Iniciar TLS si está configurado
+            if self.use_tls and not self.use_ssl:
+                self.logger.info("Iniciando TLS")
+                server.starttls()
+            
+            # Autenticarse
+            self.logger.info(f"Autenticando SMTP como {self.email_from}")
+            server.login(self.email_from, self.email_password)
+        except Exception:
+            server.close()
+            raise
+        return server
+
+    def _obtener_pool(self):
+        clave = (self.smtp_server, self.smtp_port, self.email_from, self.email_password, self.use_ssl, self.use_tls)
+        with self._pools_lock:
+            pool = self._pools.get(clave)
+            if pool is None:
+                pool = PoolSMTP(
+                    self._abrir_sesion,
+                    tamano=int(os.getenv('SMTP_POOL_SIZE', '2')),
+                    max_mensajes=int(os.getenv('SMTP_POOL_MAX_MESSAGES', '100')),
+                    inactividad=float(os.getenv('SMTP_POOL_IDLE_TIMEOUT', '60'))
+                )
+                self._pools[clave] = pool
+            return pool
+
+    def _enviar_mensaje(self, destinatarios, msg_string):
+        """
+        Envía con una sesión del pool; si una sesión reutilizada fue cerrada por
+        el servidor, reintenta una vez con una conexión nueva
+        """
+        pool = self._obtener_pool()
+        for intento in (1, 2):
+            sesion, datos, reutilizada = pool.obtener(reutilizar=intento == 1)
+            try:
+                rechazados = sesion.sendmail(self.email_from, destinatarios, msg_string)
+            except smtplib.SMTPRecipientsRefused:
+                # La sesión sigue siendo válida: solo se rechazaron los destinatarios
+                pool.devolver(sesion, datos)
+                raise
+            except (smtplib.SMTPServerDisconnected, smtplib.SMTPResponseException, OSError) as e:
+                pool.devolver(sesion, datos, descartar=True)
+                if reutilizada and intento == 1:
+                    self.logger.warning(f"Sesión SMTP reutilizada no válida ({e}); reconectando")
+                    continue
+                raise
+            except Exception:
+                pool.devolver(sesion, datos, descartar=True)
+                raise
+            pool.registrar_envio(datos)
+            pool.devolver(sesion, datos)
+            return rechazados
+
+    @classmethod
+    def cerrar_conexiones(cls):
+        """Cierra las sesiones SMTP inactivas de todos los pools"""
+        with cls._pools_lock:
+            pools = list(cls._pools.values())
+        for pool in pools:
+            pool.cerrar_todas()
+    
     def enviar_notificacion_evento(self, evento_id, tipo_notificacion):
         """Envía notificación por email sobre un evento"""
         from modelos.evento_modelo import EventoModelo
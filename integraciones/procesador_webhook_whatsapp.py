@@ -0,0 +1,231 @@
+"""
+Procesamiento en segundo plano de los eventos del webhook de WhatsApp
+El webhook guarda cada mensaje/estado en whatsapp_webhook_entrantes y responde
+200 a Meta de inmediato; un grupo de hilos los procesa con WhatsAppChatService
+"""
+import os
+import random
+import threading
+from config import WA_WEBHOOK_CONFIG
+from modelos.base_datos import BaseDatos
+from modelos.esquema import EsquemaBD
+from modelos.whatsapp_webhook_cola_modelo import WhatsAppWebhookColaModelo
+from utilidades.logger import obtener_logger
+
+
+# Prefijo del bloqueo GET_LOCK de cada fragmento de la cola
+PREFIJO_BLOQUEO = "lirios_wa_webhook"
+
+
+def encolar_webhook(payload):
+    """
+    Guarda el payload del webhook en la cola y despierta a los hilos
+
+    Returns:
+        int: eventos nuevos encolados (lanza la excepción si falla la BD)
+    """
+    nuevos = WhatsAppWebhookColaModelo().encolar_payload(
+        payload,
+        fragmentos=WA_WEBHOOK_CONFIG['shards'],
+        max_intentos=WA_WEBHOOK_CONFIG['max_attempts']
+    )
+    if nuevos:
+        ProcesadorWebhookWhatsApp.obtener().despertar()
+    return nuevos
+
+
+class ProcesadorWebhookWhatsApp:
+    """
+    Grupo de hilos que vacía la cola whatsapp_webhook_entrantes
+
+    Cada fragmento de la cola lo procesa un solo hilo a la vez (GET_LOCK en
+    MySQL, válido también entre procesos de gunicorn y el scheduler) y en
+    orden de llegada, así los eventos de una conversación mantienen su orden.
+    """
+
+    _instancia = None
+    _lock = threading.Lock()
+
+    def __init__(self, trabajadores=2, intervalo=5, tamano_lote=50, retencion_dias=7):
+        self.trabajadores = max(1, int(trabajadores))
+        self.intervalo = intervalo
+        self.tamano_lote = tamano_lote
+        self.retencion_dias = retencion_dias
+        self.cola = WhatsAppWebhookColaModelo()
+        self.base_datos = BaseDatos()
+        self.logger = obtener_logger()
+        self._despertar = threading.Event()
+        self._detener = threading.Event()
+        self._hilos = []
+        self._pid = None
+
+    @classmethod
+    def obtener(cls):
+        """Instancia compartida del proceso (se inicia al primer uso)"""
+        with cls._lock:
+            if cls._instancia is None:
+                cls._instancia = cls(
+                    trabajadores=WA_WEBHOOK_CONFIG['workers'],
+                    intervalo=WA_WEBHOOK_CONFIG['poll_interval'],
+                    tamano_lote=WA_WEBHOOK_CONFIG['batch_size'],
+                    retencion_dias=WA_WEBHOOK_CONFIG['retention_days']
+                )
+            return cls._instancia
+
+    @staticmethod
+    def cola_disponible():
+        """Indica si existe whatsapp_webhook_entrantes (migración 0009); ante un error de BD se asume que sí"""
+        try:
+            return EsquemaBD.tabla_existe('whatsapp_webhook_entrantes')
+        except Exception:
+            return True
+
+    def iniciar(self):
+        """Arranca los hilos (también tras un fork de gunicorn, donde los hilos no se heredan)"""
+        with self._lock:
+            if self._pid == os.getpid() and any(hilo.is_alive() for hilo in self._hilos):
+                return
+            self._pid = os.getpid()
+            self._detener.clear()
+            self._hilos = []
+            for numero in range(self.trabajadores):
+                hilo = threading.Thread(
+                    target=self._bucle,
+                    name=f"webhook-whatsapp-{numero + 1}",
+                    daemon=True
+                )
+                hilo.start()
+                self._hilos.append(hilo)
+        self.logger.info(f"Procesador del webhook de WhatsApp iniciado con {self.trabajadores} hilos")
+
+    def despertar(self):
+        """Avisa a los hilos que hay eventos nuevos (los inicia si hace falta)"""
+        self.iniciar()
+        self._despertar.set()
+
+    def detener(self, timeout=5):
+        self._detener.set()
+        self._despertar.set()
+        for hilo in self._hilos:
+            hilo.join(timeout)
+
+    def _bucle(self):
+        # Un servicio por hilo: WhatsAppChatService mantiene estado por instancia
+        servicio = None
+        while not self._detener.is_set():
+            procesados = 0
+            try:
+                if servicio is None:
+                    servicio = self._crear_servicio()
+                procesados = self.procesar_ronda(servicio)
+            except Exception as e:
+                self.logger.error(f"Error en el procesador del webhook de WhatsApp: {e}")
+            finally:
+                # Los hilos del procesador no pasan por teardown_request
+                BaseDatos.liberar_conexion_hilo()
+            if not procesados:
+                self._despertar.wait(self.intervalo)
+                self._despertar.clear()
+
+    @staticmethod
+    def _crear_servicio():
+        from integraciones.whatsapp_chat import WhatsAppChatService
+        return WhatsAppChatService()
+
+    def procesar_ronda(self, servicio, limite=None):
+        """
+        Recorre los fragmentos con eventos listos y procesa los que no tenga otro hilo
+
+        Returns:
+            int: cantidad de eventos procesados
+        """
+        fragmentos = self.cola.fragmentos_con_pendientes()
+        # Orden aleatorio para que los hilos no compitan siempre por el mismo fragmento
+        random.shuffle(fragmentos)
+        total = 0
+        for fragmento in fragmentos:
+            if self._detener.is_set() or (limite is not None and total >= limite):
+                break
+            with self.base_datos.bloqueo_asesor(f"{PREFIJO_BLOQUEO}:{fragmento}") as obtenido:
+                if obtenido:
+                    total += self.procesar_fragmento(servicio, fragmento)
+        return total
+
+    def procesar_pendientes(self, limite=500):
+        """Vacía la cola de forma síncrona (usado por scripts/scheduler.py)"""
+        servicio = self._crear_servicio()
+        total = 0
+        while total < limite:
+            procesados = self.procesar_ronda(servicio, limite=limite - total)
+            if not procesados:
+                break
+            total += procesados
+        self.cola.purgar_procesados(self.retencion_dias)
+        return total
+
+    def procesar_fragmento(self, servicio, fragmento):
+        """
+        Procesa en orden los eventos pendientes de un fragmento
+
+        Los estados consecutivos de una conversación se aplican juntos (un
+        UPDATE por mensaje). Si un evento falla o espera reintento, los
+        siguientes de la misma conversación quedan para después; los de otras
+        conversaciones siguen.
+        """
+        registros = self.cola.obtener_pendientes(fragmento, self.tamano_lote)
+        detenidas = set()
+        estados = {}
+        procesados = 0
+        for registro in registros:
+            particion = registro.get('particion')
+            if particion in detenidas:
+                continue
+            if registro['tipo'] == 'estado' and registro.get('listo'):
+                estados.setdefault(particion, []).append(registro)
+                continue
+            # Antes de otro evento de la conversación, aplicar sus estados previos
+            ok, cantidad = self._procesar_estados(servicio, estados.pop(particion, []))
+            procesados += cantidad
+            if not ok or not registro.get('listo'):
+                detenidas.add(particion)
+                continue
+            if self._procesar(servicio, registro):
+                procesados += 1
+            else:
+                detenidas.add(particion)
+        for lote in estados.values():
+            procesados += self._procesar_estados(servicio, lote)[1]
+        return procesados
+
+    def _procesar_estados(self, servicio, registros):
+        """
+        Aplica juntos los estados acumulados de una conversación
+
+        Returns:
+            tuple: (ok, cantidad de eventos procesados)
+        """
+        if not registros:
+            return True, 0
+        try:
+            servicio.procesar_estados([registro['payload'] for registro in registros])
+        except Exception as e:
+            self.logger.error(f"Error al procesar {len(registros)} estados del webhook WhatsApp: {e}")
+            for registro in registros:
+                self.cola.marcar_error(registro['id'], e, registro.get('intentos'), registro.get('max_intentos'))
+            return False, 0
+        self.cola.marcar_procesados([registro['id'] for registro in registros])
+        return True, len(registros)
+
+    def _procesar(self, servicio, registro):
+        registro_id = registro['id']
+        try:
+            servicio.procesar_mensaje(registro['payload'])
+        except Exception as e:
+            self.logger.error(
+                f"Error al procesar evento {registro_id} del webhook WhatsApp "
+                f"({registro['tipo']} {registro.get('wa_message_id')}): {e}"
+            )
+            self.cola.marcar_error(registro_id, e, registro.get('intentos'), registro.get('max_intentos'))
+            return False
+        self.cola.marcar_procesado(registro_id)
+        return True
@@ -5,7 +5,41 @@ Este sistema es mucho más eficiente al delegar la lógica a MySQL
 from modelos.notificacion_modelo_v2 import NotificacionModeloV2
 from integraciones.email import IntegracionEmail
 from integraciones.whatsapp import IntegracionWhatsApp
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
+import threading
+import time
+from config import NOTIF_DESPACHO_CONFIG
+
+
+class LimitadorCanal:
+    """
+    Limita los envíos simultáneos y por segundo de un canal
+    Uso: with limitador: enviar(...)
+    """
+    
+    def __init__(self, concurrencia, por_segundo=0):
+        self._semaforo = threading.BoundedSemaphore(max(1, int(concurrencia)))
+        self._intervalo = (1.0 / por_segundo) if por_segundo and por_segundo > 0 else 0
+        self._siguiente = 0.0
+        self._lock = threading.Lock()
+    
+    def __enter__(self):
+        self._semaforo.acquire()
+        if self._intervalo:
+            # Reservar el próximo turno libre y esperar fuera del lock
+            with self._lock:
+                ahora = time.monotonic()
+                turno = max(ahora, self._siguiente)
+                self._siguiente = turno + self._intervalo
+            espera = turno - time.monotonic()
+            if espera > 0:
+                time.sleep(espera)
+        return self
+    
+    def __exit__(self, *args):
+        self._semaforo.release()
+        return False
 
 
 class SistemaNotificacionesV2:
@@ -21,12 +55,22 @@ class SistemaNotificacionesV2:
         self.modelo = NotificacionModeloV2()
         self.email = IntegracionEmail()
         self.whatsapp = IntegracionWhatsApp()
+        self.limitador_email = LimitadorCanal(
+            NOTIF_DESPACHO_CONFIG['email_concurrency'], NOTIF_DESPACHO_CONFIG['email_rate']
+        )
+        self.limitador_whatsapp = LimitadorCanal(
+            NOTIF_DESPACHO_CONFIG['whatsapp_concurrency'], NOTIF_DESPACHO_CONFIG['whatsapp_rate']
+        )
     
     def procesar_notificaciones_pendientes(self, limite=50):
         """
         Procesa notificaciones pendientes de envío
         Este es el método principal que debe llamarse periódicamente
         
+        Las notificaciones se envían en paralelo (NOTIF_DESPACHO_WORKERS hilos)
+        respetando la concurrencia y la tasa máxima de cada canal, y los
+        resultados se registran en MySQL por lotes.
+        
         Parámetros:
             limite: Número máximo de notificaciones a procesar por vez
         
@@ -35,98 +79,122 @@ class SistemaNotificacionesV2:
         """
         # Obtener notificaciones pendientes usando procedimiento almacenado
         notificaciones = self.modelo.obtener_notificaciones_pendientes(limite)
+        if not notificaciones:
+            return (0, 0)
         
         enviadas = 0
         errores = 0
+        resultados = []
+        trabajadores = max(1, min(NOTIF_DESPACHO_CONFIG['workers'], len(notificaciones)))
+        with ThreadPoolExecutor(max_workers=trabajadores, thread_name_prefix="notif-v2") as executor:
+            futuros = {executor.submit(self._enviar_notificacion, notif): notif['id'] for notif in notificaciones}
+            for futuro in as_completed(futuros):
+                notif_id = futuros[futuro]
+                try:
+                    exito, error_msg = futuro.result()
+                except Exception as e:
+                    exito, error_msg = False, f"Error inesperado: {str(e)}"
+                
+                if exito:
+                    enviadas += 1
+                    print(f"   [OK] Notificación {notif_id} enviada exitosamente")
+                else:
+                    errores += 1
+                    print(f"   [ERROR] Notificación {notif_id} falló: {error_msg}")
+                
+                # Marcar como enviadas por lotes (una transacción por lote)
+                resultados.append((notif_id, exito, error_msg))
+                if len(resultados) >= NOTIF_DESPACHO_CONFIG['status_batch_size']:
+                    self._registrar_resultados(resultados)
+                    resultados = []
         
-        for notif in notificaciones:
-            notif_id = notif['id']
-            canal = notif['canal']
-            exito = False
-            error_msg = None
-            exito_email = False
-            exito_whatsapp = False
-            
-            try:
-                # Enviar por email si está configurado
-                if canal in ('email', 'ambos') and notif.get('destinatario_email'):
-                    if self.email.activo:
-                        try:
+        self._registrar_resultados(resultados)
+        return (enviadas, errores)
+    
+    def _registrar_resultados(self, resultados):
+        """Marca un lote de notificaciones como enviadas o con error"""
+        if not resultados:
+            return
+        if not self.modelo.marcar_como_enviadas_lote(resultados):
+            ids = ", ".join(str(notif_id) for notif_id, _, _ in resultados)
+            print(f"   [ERROR CRÍTICO] No se pudo registrar el resultado de las notificaciones {ids}")
+    
+    def _enviar_notificacion(self, notif):
+        """
+        Envía una notificación por sus canales (se ejecuta en un hilo del pool)
+        
+        Retorna:
+            Tupla (exito, error_msg)
+        """
+        notif_id = notif['id']
+        canal = notif['canal']
+        exito = False
+        error_msg = None
+        exito_email = False
+        exito_whatsapp = False
+        
+        try:
+            # Enviar por email si está configurado
+            if canal in ('email', 'ambos') and notif.get('destinatario_email'):
+                if self.email.activo:
+                    try:
+                        with self.limitador_email:
                             exito_email = self.email.enviar_correo(
                                 notif['destinatario_email'],
                                 notif['asunto'],
                                 notif['mensaje_email'],
                                 es_html=False
                             )
-                            if exito_email:
-                                exito = True
-                            else:
-                                if not error_msg:
-                                    error_msg = "Error al enviar email"
-                        except Exception as e:
+                        if exito_email:
+                            exito = True
+                        else:
                             if not error_msg:
-                                error_msg = f"Error SMTP: {str(e)}"
-                            print(f"   [ERROR] Error al enviar email para notificación {notif_id}: {e}")
-                    else:
+                                error_msg = "Error al enviar email"
+                    except Exception as e:
                         if not error_msg:
-                            error_msg = "Email no configurado"
-                
-                # Enviar por WhatsApp si está configurado
-                if canal in ('whatsapp', 'ambos') and notif.get('destinatario_telefono'):
-                    if self.whatsapp.activo:
-                        try:
+                            error_msg = f"Error SMTP: {str(e)}"
+                        print(f"   [ERROR] Error al enviar email para notificación {notif_id}: {e}")
+                else:
+                    if not error_msg:
+                        error_msg = "Email no configurado"
+            
+            # Enviar por WhatsApp si está configurado
+            if canal in ('whatsapp', 'ambos') and notif.get('destinatario_telefono'):
+                if self.whatsapp.activo:
+                    try:
+                        with self.limitador_whatsapp:
                             exito_whatsapp = self.whatsapp.enviar_mensaje(
                                 notif['destinatario_telefono'],
                                 notif['mensaje_whatsapp']
                             )
-                            if exito_whatsapp:
-                                exito = True
-                            else:
-                                if not error_msg:
-                                    error_msg = "Error al enviar WhatsApp"
-                        except Exception as e:
+                        if exito_whatsapp:
+                            exito = True
+                        else:
                             if not error_msg:
-                                error_msg = f"Error WhatsApp: {str(e)}"
-                            print(f"   [ERROR] Error al enviar WhatsApp para notificación {notif_id}: {e}")
-                    else:
+                                error_msg = "Error al enviar WhatsApp"
+                    except Exception as e:
                         if not error_msg:
-                            error_msg = "WhatsApp no configurado"
-                
-                # Si ambos canales están configurados, al menos uno debe tener éxito
-                if canal == 'ambos' and (exito_email or exito_whatsapp):
-                    exito = True
-                    if not exito_email and not exito_whatsapp:
-                        error_msg = "Ambos canales fallaron"
-                    elif not exito_email:
-                        error_msg = "Email falló, WhatsApp exitoso"
-                    elif not exito_whatsapp:
-                        error_msg = "WhatsApp falló, Email exitoso"
-                
-            except Exception as e:
-                error_msg = f"Error inesperado: {str(e)}"
-                print(f"   [ERROR] Error procesando notificación {notif_id}: {e}")
+                            error_msg = f"Error WhatsApp: {str(e)}"
+                        print(f"   [ERROR] Error al enviar WhatsApp para notificación {notif_id}: {e}")
+                else:
+                    if not error_msg:
+                        error_msg = "WhatsApp no configurado"
             
-            # Marcar como enviada usando procedimiento almacenado
-            # Usar try-except separado para no perder el error si falla el marcado
-            try:
-                self.modelo.marcar_como_enviada(notif_id, exito, error_msg)
-            except Exception as e:
-                print(f"   [ERROR] No se pudo marcar notificación {notif_id} como enviada: {e}")
-                # Intentar reconectar
-                try:
-                    self.modelo.base_datos.conectar()
-                    self.modelo.marcar_como_enviada(notif_id, exito, error_msg)
-                except:
-                    print(f"   [ERROR CRÍTICO] No se pudo reconectar para marcar notificación {notif_id}")
+            # Si ambos canales están configurados, al menos uno debe tener éxito
+            if canal == 'ambos' and (exito_email or exito_whatsapp):
+                exito = True
+                if not exito_email and not exito_whatsapp:
+                    error_msg = "Ambos canales fallaron"
+                elif not exito_email:
+                    error_msg = "Email falló, WhatsApp exitoso"
+                elif not exito_whatsapp:
+                    error_msg = "WhatsApp falló, Email exitoso"
             
-            if exito:
-                enviadas += 1
-                print(f"   [OK] Notificación {notif_id} enviada exitosamente")
-            else:
-                errores += 1
-                print(f"   [ERROR] Notificación {notif_id} falló: {error_msg}")
+        except Exception as e:
+            error_msg = f"Error inesperado: {str(e)}"
+            print(f"   [ERROR] Error procesando notificación {notif_id}: {e}")
         
-        return (enviadas, errores)
+        return exito, error_msg
     
     def generar_notificaciones_programadas(self):
         """
@@ -7,6 +7,7 @@ import urllib.error
 import mimetypes
 import uuid
 from modelos.base_datos import BaseDatos
+from utilidades.cache_configuracion import cache_configuracion
 from utilidades.logger import obtener_logger
 
 
@@ -23,13 +24,16 @@ class IntegracionWhatsApp:
         self.api_version = "v22.0"
         self.cargar_configuracion()
     
-    def cargar_configuracion(self):
-        """Carga la configuración de WhatsApp desde la base de datos"""
+    def _leer_configuracion(self):
         consulta = """
         SELECT * FROM configuracion_integraciones 
         WHERE tipo_integracion = 'whatsapp' AND activo = TRUE
         """
-        config = self.base_datos.obtener_uno(consulta)
+        return self.base_datos.obtener_uno(consulta)
+
+    def cargar_configuracion(self):
+        """Carga la configuración de WhatsApp (desde la caché del proceso o la base de datos)"""
+        config = cache_configuracion.obtener("integracion_activa:whatsapp", self._leer_configuracion)
         if config:
             try:
                 raw = config.get("configuracion")
@@ -478,7 +482,34 @@ class IntegracionWhatsApp:
         except Exception as e:
             self.logger.error(f"Error al descargar media: {e}")
             return None, None
-    
+
+    def descargar_media_a_archivo(self, media_id, archivo, tamano_bloque=65536):
+        """
+        Descarga media por bloques en un archivo abierto en modo binario,
+        sin cargar el contenido completo en memoria
+
+        Returns:
+            str: mime_type, o None si no se pudo descargar
+        """
+        media_url, mime_type = self.obtener_media_url(media_id)
+        if not media_url:
+            return None
+        try:
+            req = urllib.request.Request(media_url, method="GET")
+            req.add_header("Authorization", f"Bearer {self.access_token}")
+            with urllib.request.urlopen(req, timeout=20) as response:
+                if not 200 <= response.status < 300:
+                    return None
+                while True:
+                    bloque = response.read(tamano_bloque)
+                    if not bloque:
+                        break
+                    archivo.write(bloque)
+                return mime_type or response.headers.get("Content-Type") or "application/octet-stream"
+        except Exception as e:
+            self.logger.error(f"Error al descargar media: {e}")
+            return None
+
     def enviar_notificacion_evento(self, evento_id, tipo_notificacion):
         """Envía notificación sobre un evento"""
         from modelos.evento_modelo import EventoModelo
@@ -3,24 +3,36 @@ Servicio de chat WhatsApp: inbox, bot y respuestas automaticas
 """
 import random
 import re
+import threading
 from datetime import datetime, timedelta
-from modelos.whatsapp_chat_modelo import WhatsAppChatModelo
+from modelos.whatsapp_chat_modelo import WhatsAppChatModelo, colapsar_estados
 from modelos.cliente_modelo import ClienteModelo
 from modelos.evento_modelo import EventoModelo
 from modelos.pago_modelo import PagoModelo
 from modelos.usuario_modelo import UsuarioModelo
 from modelos.autenticacion import Autenticacion
 from modelos.plan_modelo import PlanModelo
-from modelos.salon_modelo import SalonModelo
+from modelos.salon_modelo import SalonModelo, normalizar_horario
 from modelos.producto_modelo import ProductoModelo
 from modelos.whatsapp_templates_modelo import WhatsAppTemplatesModelo
 from integraciones.whatsapp import IntegracionWhatsApp
+from utilidades.cache_media import precargar_media
 from utilidades.logger import obtener_logger
 from modelos.configuracion_general_modelo import ConfiguracionGeneralModelo
 from modelos.whatsapp_templates_modelo import WhatsAppTemplatesModelo
 
 
 class WhatsAppChatService:
+    # Contadores del webhook en este proceso (ver /api/health/webhook-whatsapp)
+    _estadisticas_webhook = {
+        "estados_recibidos": 0,
+        "estados_escritos": 0,
+        "estados_omitidos": 0,
+        "mensajes_recibidos": 0,
+        "mensajes_duplicados": 0,
+    }
+    _lock_estadisticas = threading.Lock()
+
     def __init__(self):
         self.modelo = WhatsAppChatModelo()
         self.clientes = ClienteModelo()
@@ -832,6 +844,10 @@ class WhatsAppChatService:
             return "Indica la hora de fin (HH:MM)."
         if paso == "hora_fin":
             datos["hora_fin"] = texto.strip()
+            if normalizar_horario(datos.get("fecha_evento"), datos.get("hora_inicio"), datos["hora_fin"]) is None:
+                datos["paso"] = "fecha_evento"
+                self.modelo.guardar_estado_bot(conversacion["id"], "crear_evento", datos)
+                return "La fecha u hora no es válida. Indica la fecha del evento (YYYY-MM-DD)."
             datos["paso"] = "numero_invitados"
             self.modelo.guardar_estado_bot(conversacion["id"], "crear_evento", datos)
             return "¿Cuantos invitados estimas?"
@@ -902,6 +918,20 @@ class WhatsAppChatService:
             if not opciones_salones:
                 self.modelo.limpiar_estado_bot(conversacion["id"])
                 return "No hay salones disponibles para ese número de invitados."
+            # Solo salones libres en el horario pedido (una consulta para todos)
+            horario = normalizar_horario(datos.get("fecha_evento"), datos.get("hora_inicio"), datos.get("hora_fin"))
+            if horario:
+                libres = self.salones.verificar_horarios(
+                    [(int(opcion["id"].split(":", 1)[1]), *horario) for opcion in opciones_salones]
+                )
+                opciones_salones = [opcion for opcion, libre in zip(opciones_salones, libres) if libre]
+                if not opciones_salones:
+                    datos["paso"] = "fecha_evento"
+                    self.modelo.guardar_estado_bot(conversacion["id"], "crear_evento", datos)
+                    return (
+                        f"No hay salones libres el {datos.get('fecha_evento')} de {datos.get('hora_inicio')} "
+                        f"a {datos.get('hora_fin')}. Indica otra fecha (YYYY-MM-DD)."
+                    )
             datos["opciones"] = opciones_salones
             self.modelo.guardar_estado_bot(conversacion["id"], "crear_evento", datos)
             self._enviar_opciones(conversacion, "Selecciona el salón para tu evento:", opciones_salones)
@@ -1036,6 +1066,13 @@ class WhatsAppChatService:
             if not cliente:
                 self.modelo.limpiar_estado_bot(conversacion["id"])
                 return "No se pudo crear el cliente. Intenta mas tarde."
+            horario = normalizar_horario(datos.get("fecha_evento"), datos.get("hora_inicio"), datos.get("hora_fin"))
+            if horario and datos.get("salon_id") and not self.salones.horario_libre(datos.get("salon_id"), *horario):
+                self.modelo.limpiar_estado_bot(conversacion["id"])
+                return (
+                    "El salón se reservó en ese horario mientras completabas los datos. "
+                    "Escribe 'crear evento' para elegir otro horario."
+                )
             total_plan = float(datos.get("plan_precio") or 0)
             total_adicionales = sum([float(a.get("subtotal") or 0) for a in (datos.get("adicionales") or [])])
             total_evento = total_plan + total_adicionales
@@ -1077,112 +1114,165 @@ class WhatsAppChatService:
                     value = change.get("value") or {}
                     mensajes = value.get("messages") or []
                     estados = value.get("statuses") or []
-                    for status in estados:
-                        wa_message_id = status.get("id")
-                        estado = status.get("status")
-                        if wa_message_id and estado:
-                            self.modelo.actualizar_estado_por_wa_id_con_detalle(wa_message_id, estado, raw_json=status)
-                            if estado == "failed":
-                                errores = status.get("errors") or []
-                                error_131047 = False
-                                for error in errores:
-                                    if str(error.get("code")) == "131047":
-                                        error_131047 = True
-                                        detalle = error.get("error_data", {}).get("details") or error.get("message")
-                                        conversacion_id = self.modelo.obtener_conversacion_id_por_wa_id(wa_message_id)
-                                        if conversacion_id:
-                                            self.modelo.marcar_reengagement(conversacion_id, detalle=detalle)
-                                        self.logger.warning(
-                                            f"WhatsApp fuera de ventana 24h (re-engagement) para wa_id={wa_message_id}: {detalle}"
-                                        )
-                                
-                                # Si no es error 131047, marcar como pendiente de reintento
-                                if not error_131047:
-                                    try:
-                                        self.modelo.marcar_pendiente_reintento_por_wa_id(wa_message_id)
-                                    except Exception as e:
-                                        self.logger.warning(f"Error al marcar mensaje como pendiente de reintento: {e}")
+                    if estados:
+                        self.procesar_estados(estados)
                     for mensaje in mensajes:
-                        texto = (mensaje.get("text") or {}).get("body") or ""
-                        tipo = mensaje.get("type")
-                        wa_message_id = mensaje.get("id")
-                        media_type = None
-                        media_id = None
-                        if tipo in ("image", "audio", "document"):
-                            media_info = mensaje.get(tipo) or {}
-                            media_id = media_info.get("id")
-                            media_type = tipo
-                            if tipo == "image":
-                                texto = media_info.get("caption") or "[Imagen]"
-                            elif tipo == "audio":
-                                texto = "[Audio]"
-                            else:
-                                texto = media_info.get("filename") or "[Documento]"
-                        elif tipo == "interactive":
-                            interactive = mensaje.get("interactive") or {}
-                            if "button_reply" in interactive:
-                                reply = interactive.get("button_reply") or {}
-                                texto = reply.get("id") or reply.get("title") or ""
-                            elif "list_reply" in interactive:
-                                reply = interactive.get("list_reply") or {}
-                                texto = reply.get("id") or reply.get("title") or ""
-                        telefono = mensaje.get("from")
-                        if not telefono:
-                            continue
-                        
-                        # Siempre obtener/crear conversación y registrar mensaje entrante
-                        conversacion = self.modelo.obtener_conversacion_por_telefono(telefono)
-                        if not conversacion:
-                            cliente = self._obtener_cliente_por_telefono(telefono)
-                            conversacion_id = self.modelo.crear_conversacion(telefono, cliente_id=cliente.get("id") if cliente else None)
-                            conversacion = self.modelo.obtener_conversacion_por_telefono(telefono)
-                        
-                        # Registrar mensaje entrante del cliente
-                        self._registrar_mensaje(
-                            conversacion["id"],
-                            "in",
-                            texto,
-                            raw_json=mensaje,
-                            media_type=media_type,
-                            media_id=media_id,
-                            wa_message_id=wa_message_id,
-                            estado="received",
-                            origen="cliente"
-                        )
-                        
-                        self.modelo.actualizar_conversacion(conversacion["id"])
-                        self.modelo.actualizar_interaccion_cliente(conversacion["id"])
-                        self.modelo.incrementar_no_leidos(conversacion["id"])
-                        
-                        # Procesar calificación si es una respuesta de calificación (formato interactivo)
-                        if texto and texto.startswith("calif_"):
-                            self._procesar_calificacion(telefono, texto, mensaje.get("id"))
-                            continue
-                        
-                        # Procesar calificación si es un número simple (1-5) y hay solicitud pendiente
-                        texto_limpio = texto.strip() if texto else ""
-                        if texto_limpio in ['1', '2', '3', '4', '5']:
-                            if self._procesar_calificacion_simple(telefono, int(texto_limpio), mensaje.get("id")):
-                                continue
-                        
-                        # Reenviar mensajes fallidos por ventana 24h ahora que el cliente escribió
-                        self._reenviar_mensajes_fallidos_por_ventana(telefono, conversacion["id"])
-                        
-                        # Verificar si hay calificación pendiente de observaciones
-                        if self._procesar_observaciones_calificacion(telefono, texto):
-                            continue
-                        
-                        # Procesar bot si está activo
-                        if not conversacion.get("bot_activo"):
-                            continue
-                        self._procesar_bot(conversacion, telefono, texto, media_type=media_type, media_id=media_id)
+                        self.procesar_mensaje(mensaje)
         except Exception as e:
             self.logger.error(f"Error procesando webhook WhatsApp: {e}")
 
+    @classmethod
+    def _contar(cls, **valores):
+        with cls._lock_estadisticas:
+            for clave, valor in valores.items():
+                cls._estadisticas_webhook[clave] += valor
+
+    @classmethod
+    def estadisticas_webhook(cls):
+        """Estados y mensajes recibidos por el webhook frente a escrituras realizadas"""
+        with cls._lock_estadisticas:
+            return dict(cls._estadisticas_webhook)
+
+    def procesar_estado(self, status):
+        """Aplica un estado (sent/delivered/read/failed) recibido por el webhook"""
+        return self.procesar_estados([status])
+
+    def procesar_estados(self, estados):
+        """
+        Aplica los estados recibidos con un solo UPDATE por mensaje
+
+        Varios estados del mismo mensaje se reducen al más avanzado y el UPDATE
+        no retrocede el estado guardado, así las reentregas no escriben.
+
+        Returns:
+            int: cantidad de mensajes actualizados
+        """
+        finales = colapsar_estados(estados)
+        escrituras = 0
+        for wa_message_id, status in finales.items():
+            estado = status.get("status")
+            if not self.modelo.actualizar_estado_monotonico(wa_message_id, estado, raw_json=status):
+                continue
+            escrituras += 1
+            if estado == "failed":
+                self._procesar_estado_fallido(wa_message_id, status)
+        self._contar(
+            estados_recibidos=len(estados),
+            estados_escritos=escrituras,
+            estados_omitidos=len(estados) - escrituras
+        )
+        if len(estados) > escrituras:
+            self.logger.info(f"Webhook WhatsApp: {len(estados)} estados, {escrituras} escrituras")
+        return escrituras
+
+    def _procesar_estado_fallido(self, wa_message_id, status):
+        errores = status.get("errors") or []
+        error_131047 = False
+        for error in errores:
+            if str(error.get("code")) == "131047":
+                error_131047 = True
+                detalle = error.get("error_data", {}).get("details") or error.get("message")
+                conversacion_id = self.modelo.obtener_conversacion_id_por_wa_id(wa_message_id)
+                if conversacion_id:
+                    self.modelo.marcar_reengagement(conversacion_id, detalle=detalle)
+                self.logger.warning(
+                    f"WhatsApp fuera de ventana 24h (re-engagement) para wa_id={wa_message_id}: {detalle}"
+                )
+        
+        # Si no es error 131047, marcar como pendiente de reintento
+        if not error_131047:
+            try:
+                self.modelo.marcar_pendiente_reintento_por_wa_id(wa_message_id)
+            except Exception as e:
+                self.logger.warning(f"Error al marcar mensaje como pendiente de reintento: {e}")
+
+    def procesar_mensaje(self, mensaje):
+        """Registra un mensaje entrante del cliente y ejecuta calificaciones, reenvíos y bot"""
+        texto = (mensaje.get("text") or {}).get("body") or ""
+        tipo = mensaje.get("type")
+        wa_message_id = mensaje.get("id")
+        media_type = None
+        media_id = None
+        if tipo in ("image", "audio", "document"):
+            media_info = mensaje.get(tipo) or {}
+            media_id = media_info.get("id")
+            media_type = tipo
+            if tipo == "image":
+                texto = media_info.get("caption") or "[Imagen]"
+            elif tipo == "audio":
+                texto = "[Audio]"
+            else:
+                texto = media_info.get("filename") or "[Documento]"
+        elif tipo == "interactive":
+            interactive = mensaje.get("interactive") or {}
+            if "button_reply" in interactive:
+                reply = interactive.get("button_reply") or {}
+                texto = reply.get("id") or reply.get("title") or ""
+            elif "list_reply" in interactive:
+                reply = interactive.get("list_reply") or {}
+                texto = reply.get("id") or reply.get("title") or ""
+        telefono = mensaje.get("from")
+        if not telefono:
+            return
+        
+        # Conversación, mensaje, interacción y no leídos en una sola transacción
+        resultado = self.modelo.registrar_mensaje_entrante(
+            telefono,
+            texto,
+            raw_json=mensaje,
+            media_type=media_type,
+            media_id=media_id,
+            wa_message_id=wa_message_id
+        )
+        if resultado is None:
+            # Reentrega de Meta: el mensaje ya se registró y respondió
+            self._contar(mensajes_recibidos=1, mensajes_duplicados=1)
+            self.logger.info(f"Webhook WhatsApp: mensaje {wa_message_id} duplicado ignorado")
+            return
+        self._contar(mensajes_recibidos=1)
+        conversacion, creada = resultado
+        if media_id:
+            # El agente la verá desde la caché sin esperar a Meta
+            precargar_media(media_id)
+        if creada:
+            cliente = self._obtener_cliente_por_telefono(telefono)
+            if cliente:
+                self.modelo.actualizar_conversacion(conversacion["id"], cliente_id=cliente.get("id"))
+                conversacion["cliente_id"] = cliente.get("id")
+        
+        # Procesar calificación si es una respuesta de calificación (formato interactivo)
+        if texto and texto.startswith("calif_"):
+            self._procesar_calificacion(telefono, texto, mensaje.get("id"))
+            return
+        
+        # Procesar calificación si es un número simple (1-5) y hay solicitud pendiente
+        texto_limpio = texto.strip() if texto else ""
+        if texto_limpio in ['1', '2', '3', '4', '5']:
+            if self._procesar_calificacion_simple(telefono, int(texto_limpio), mensaje.get("id")):
+                return
+        
+        # Reenviar mensajes fallidos por ventana 24h ahora que el cliente escribió
+        # (solo si la conversación tiene alguno marcado)
+        if conversacion.get("reenvio_pendiente") and self.modelo.tomar_reenvio_pendiente(conversacion["id"]):
+            self._reenviar_mensajes_fallidos_por_ventana(telefono, conversacion["id"])
+        
+        # Verificar si hay calificación pendiente de observaciones
+        if self._procesar_observaciones_calificacion(telefono, texto):
+            return
+        
+        # Procesar bot si está activo
+        if not conversacion.get("bot_activo"):
+            return
+        self._procesar_bot(conversacion, telefono, texto, media_type=media_type, media_id=media_id)
+
     def _reenviar_mensajes_fallidos_por_ventana(self, telefono, conversacion_id):
         """
         Reenvía mensajes que fallaron por ventana de 24h cuando el cliente escribe.
+
+        Si alguno no se pudo reenviar, vuelve a marcar la conversación con
+        reenvio_pendiente para intentarlo en el próximo mensaje del cliente.
         """
+        pendientes = False
         try:
             # Buscar mensajes fallidos por error 131047 (ventana 24h) para esta conversación
             consulta = """
@@ -1199,6 +1289,8 @@ class WhatsAppChatService:
             
             if not mensajes_fallidos:
                 return
+            # Puede haber más de los 10 de esta pasada
+            pendientes = len(mensajes_fallidos) >= 10
             
             self.logger.info(f"[REENVIO] Encontrados {len(mensajes_fallidos)} mensajes fallidos para {telefono}")
             
@@ -1244,10 +1336,14 @@ class WhatsAppChatService:
                     self.modelo.base_datos.ejecutar_consulta(update_query, (wa_msg_id, msg_id))
                     self.logger.info(f"[REENVIO] Mensaje {msg_id} reenviado exitosamente")
                 else:
+                    pendientes = True
                     self.logger.warning(f"[REENVIO] Fallo al reenviar mensaje {msg_id}")
                     
         except Exception as e:
+            pendientes = True
             self.logger.error(f"[REENVIO] Error al reenviar mensajes fallidos: {e}")
+        if pendientes:
+            self.modelo.marcar_reenvio_pendiente(conversacion_id)
 
     def _procesar_calificacion_simple(self, telefono, calificacion, wa_message_id=None):
         """
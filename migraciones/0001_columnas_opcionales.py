@@ -0,0 +1,114 @@
+"""
+Columnas y tablas que antes creaban los modelos en tiempo de ejecución
+(cuentas, movimientos de inventario, costos y reintentos de WhatsApp, etc.)
+
+Es idempotente: solo crea lo que falta. Las tablas opcionales que todavía no
+existen (scripts de documentos/ sin aplicar) se omiten.
+"""
+from modelos.esquema import EsquemaBD
+
+
+TABLA_CUENTAS = """
+CREATE TABLE IF NOT EXISTS cuentas (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    nombre VARCHAR(100) NOT NULL COMMENT 'Nombre identificador de la cuenta',
+    tipo ENUM('ahorros', 'corriente', 'digital', 'efectivo', 'otro') NOT NULL DEFAULT 'ahorros' COMMENT 'Tipo de cuenta',
+    numero_cuenta VARCHAR(50) NULL COMMENT 'Número de cuenta bancaria',
+    descripcion TEXT NULL COMMENT 'Descripción detallada de la cuenta',
+    activo TINYINT(1) NOT NULL DEFAULT 1 COMMENT 'Estado de la cuenta (1=activa, 0=inactiva)',
+    fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP COMMENT 'Fecha de creación del registro',
+    fecha_actualizacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT 'Fecha de última actualización',
+    INDEX idx_cuentas_tipo (tipo),
+    INDEX idx_cuentas_activo (activo)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='Cuentas para confirmación y registro de pagos'
+"""
+
+TABLA_MOVIMIENTOS_INVENTARIO = """
+CREATE TABLE IF NOT EXISTS movimientos_inventario (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    producto_id INT NOT NULL,
+    tipo_movimiento ENUM('entrada', 'salida', 'ajuste', 'reserva', 'devolucion') NOT NULL,
+    cantidad INT NOT NULL,
+    stock_anterior INT NOT NULL,
+    stock_nuevo INT NOT NULL,
+    motivo VARCHAR(255),
+    referencia_tipo ENUM('evento', 'compra', 'ajuste_manual', 'devolucion', 'otro') DEFAULT 'otro',
+    referencia_id INT DEFAULT NULL,
+    usuario_id INT,
+    fecha_movimiento TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    observaciones TEXT,
+    INDEX idx_producto_id (producto_id),
+    INDEX idx_tipo_movimiento (tipo_movimiento),
+    INDEX idx_fecha_movimiento (fecha_movimiento)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+"""
+
+# {tabla: {columna: definición}}, en el orden en que se agregan
+COLUMNAS = {
+    'cuentas': {
+        'numero_cuenta': "VARCHAR(50) NULL COMMENT 'Número de cuenta bancaria' AFTER tipo",
+    },
+    'productos': {
+        'control_inventario': "ENUM('ilimitado', 'controlado') DEFAULT 'ilimitado'",
+        'stock_minimo': "INT DEFAULT 0",
+        'alerta_stock_bajo': "BOOLEAN DEFAULT TRUE",
+    },
+    'pagos': {
+        'estado_pago': "ENUM('en_revision','aprobado','rechazado') DEFAULT 'en_revision' AFTER tipo_pago",
+        'cuenta_id': "INT NULL AFTER metodo_pago",
+    },
+    'historial_notificaciones': {
+        'costo_email': "DECIMAL(10,4) NULL",
+        'costo_whatsapp': "DECIMAL(10,4) NULL",
+    },
+    'configuracion_general': {
+        'contacto_nombre': "VARCHAR(255) NULL",
+        'contacto_email': "VARCHAR(255) NULL",
+        'contacto_telefono': "VARCHAR(50) NULL",
+        'contacto_whatsapp': "VARCHAR(50) NULL",
+        'establecimiento_direccion': "TEXT NULL",
+        'establecimiento_horario': "VARCHAR(255) NULL",
+    },
+    'whatsapp_conversaciones': {
+        'mensajes_no_leidos': "INT DEFAULT 0",
+    },
+    'whatsapp_mensajes': {
+        'costo_unitario': "DECIMAL(10,4) NULL",
+        'costo_total': "DECIMAL(10,4) NULL",
+        'intentos_reintento': "INT DEFAULT 0",
+        'fecha_ultimo_reintento': "TIMESTAMP NULL",
+        'pendiente_reintento': "TINYINT(1) DEFAULT 0",
+        'max_intentos_reintento': "INT DEFAULT 3",
+    },
+    'whatsapp_metricas_config': {
+        'whatsapp_desactivado': "TINYINT(1) DEFAULT 0",
+        'maximo_whatsapp': "INT DEFAULT NULL",
+        'maximo_email': "INT DEFAULT NULL",
+    },
+}
+
+
+def aplicar(base_datos):
+    with base_datos.transaccion() as cursor:
+        cursor.execute(TABLA_CUENTAS)
+        cursor.execute(TABLA_MOVIMIENTOS_INVENTARIO)
+    EsquemaBD.invalidar()
+
+    for tabla, columnas in COLUMNAS.items():
+        if not EsquemaBD.tabla_existe(tabla):
+            continue
+        faltantes = [columna for columna in columnas if not EsquemaBD.columna_existe(tabla, columna)]
+        if not faltantes:
+            continue
+        with base_datos.transaccion() as cursor:
+            for columna in faltantes:
+                cursor.execute(f"ALTER TABLE {tabla} ADD COLUMN {columna} {columnas[columna]}")
+        EsquemaBD.registrar(tabla, faltantes)
+
+    if EsquemaBD.tabla_existe('whatsapp_mensajes'):
+        if not EsquemaBD.indice_existe('whatsapp_mensajes', 'idx_pendiente_reintento'):
+            with base_datos.transaccion() as cursor:
+                cursor.execute(
+                    "ALTER TABLE whatsapp_mensajes "
+                    "ADD INDEX idx_pendiente_reintento (pendiente_reintento, estado, fecha_creacion)"
+                )
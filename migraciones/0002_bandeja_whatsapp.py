@@ -0,0 +1,80 @@
+"""
+Último mensaje desnormalizado en whatsapp_conversaciones para la bandeja
+
+listar_conversaciones dejaba tres subconsultas correlacionadas por conversación;
+ahora registrar_mensaje mantiene ultimo_mensaje_id, ultimo_mensaje, ultima_fecha
+y ultima_direccion. fecha_actualizacion cambia con cualquier UPDATE de la fila y
+permite pedir solo las conversaciones modificadas (updated_since).
+"""
+from modelos.esquema import EsquemaBD
+
+
+COLUMNAS = {
+    'ultimo_mensaje_id': "INT NULL",
+    'ultimo_mensaje': "TEXT NULL",
+    'ultima_fecha': "TIMESTAMP NULL DEFAULT NULL",
+    'ultima_direccion': "ENUM('in', 'out') NULL",
+    'fecha_actualizacion': "TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP(3) ON UPDATE CURRENT_TIMESTAMP(3)",
+}
+
+# {tabla: {índice: columnas}}
+INDICES = {
+    'whatsapp_conversaciones': {
+        # Orden de la bandeja (no leídos primero) y paginación por cursor
+        'idx_bandeja': "mensajes_no_leidos, ultima_interaccion, id",
+        # Consultas incrementales (updated_since)
+        'idx_fecha_actualizacion': "fecha_actualizacion, id",
+    },
+    'whatsapp_mensajes': {
+        'idx_conversacion_fecha': "conversacion_id, fecha_creacion, id",
+    },
+}
+
+# Último mensaje de cada conversación a partir del historial existente
+RELLENAR_ULTIMO_MENSAJE = """
+UPDATE whatsapp_conversaciones c
+JOIN (
+    SELECT conversacion_id, MAX(id) AS mensaje_id
+    FROM whatsapp_mensajes
+    GROUP BY conversacion_id
+) u ON u.conversacion_id = c.id
+JOIN whatsapp_mensajes m ON m.id = u.mensaje_id
+SET c.ultimo_mensaje_id = m.id,
+    c.ultimo_mensaje = m.mensaje,
+    c.ultima_fecha = m.fecha_creacion,
+    c.ultima_direccion = m.direccion
+"""
+
+
+def aplicar(base_datos):
+    if not EsquemaBD.tabla_existe('whatsapp_conversaciones'):
+        # Módulo de chat sin instalar (documentos/13_whatsapp_chat.sql)
+        return
+
+    faltantes = [
+        columna for columna in COLUMNAS
+        if not EsquemaBD.columna_existe('whatsapp_conversaciones', columna)
+    ]
+    if faltantes:
+        with base_datos.transaccion() as cursor:
+            for columna in faltantes:
+                cursor.execute(
+                    f"ALTER TABLE whatsapp_conversaciones ADD COLUMN {columna} {COLUMNAS[columna]}"
+                )
+        EsquemaBD.registrar('whatsapp_conversaciones', faltantes)
+
+    for tabla, indices in INDICES.items():
+        if not EsquemaBD.tabla_existe(tabla):
+            continue
+        for indice, columnas in indices.items():
+            if not EsquemaBD.indice_existe(tabla, indice):
+                with base_datos.transaccion() as cursor:
+                    cursor.execute(f"ALTER TABLE {tabla} ADD INDEX {indice} ({columnas})")
+
+    with base_datos.transaccion() as cursor:
+        # El cursor de la bandeja compara mensajes_no_leidos: sin NULL
+        cursor.execute(
+            "UPDATE whatsapp_conversaciones SET mensajes_no_leidos = 0 WHERE mensajes_no_leidos IS NULL"
+        )
+        if EsquemaBD.tabla_existe('whatsapp_mensajes'):
+            cursor.execute(RELLENAR_ULTIMO_MENSAJE)
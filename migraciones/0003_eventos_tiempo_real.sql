@@ -0,0 +1,12 @@
+-- Eventos del stream en tiempo real reenviados entre procesos (REALTIME_BROKER=bd)
+-- Cada proceso con clientes SSE conectados lee las filas nuevas de los demás;
+-- se conservan REALTIME_DB_RETENTION_MINUTES minutos.
+CREATE TABLE IF NOT EXISTS eventos_tiempo_real (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    canal VARCHAR(50) NOT NULL,
+    tipo VARCHAR(50) NOT NULL,
+    datos TEXT NULL,
+    origen VARCHAR(120) NOT NULL,
+    fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_eventos_tiempo_real_fecha (fecha_creacion)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
@@ -0,0 +1,37 @@
+"""
+Marca por conversación de mensajes salientes fallidos que reenviar
+
+Cuando el cliente vuelve a escribir (se abre la ventana de 24 h de WhatsApp)
+solo se buscan mensajes para reenviar en las conversaciones marcadas, en lugar
+de consultar whatsapp_mensajes con cada mensaje entrante.
+"""
+from modelos.esquema import EsquemaBD
+
+
+MARCAR_PENDIENTES = """
+UPDATE whatsapp_conversaciones c
+SET c.reenvio_pendiente = 1
+WHERE EXISTS (
+    SELECT 1 FROM whatsapp_mensajes m
+    WHERE m.conversacion_id = c.id
+      AND m.direccion = 'out'
+      AND m.estado = 'fallido'
+      AND m.fecha_creacion > DATE_SUB(NOW(), INTERVAL 24 HOUR)
+)
+"""
+
+
+def aplicar(base_datos):
+    if not EsquemaBD.tabla_existe('whatsapp_conversaciones'):
+        # Módulo de chat sin instalar (documentos/13_whatsapp_chat.sql)
+        return
+    if not EsquemaBD.columna_existe('whatsapp_conversaciones', 'reenvio_pendiente'):
+        with base_datos.transaccion() as cursor:
+            cursor.execute(
+                "ALTER TABLE whatsapp_conversaciones "
+                "ADD COLUMN reenvio_pendiente TINYINT(1) NOT NULL DEFAULT 0"
+            )
+        EsquemaBD.registrar('whatsapp_conversaciones', ['reenvio_pendiente'])
+    if EsquemaBD.tabla_existe('whatsapp_mensajes'):
+        with base_datos.transaccion() as cursor:
+            cursor.execute(MARCAR_PENDIENTES)
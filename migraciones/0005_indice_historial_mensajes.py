@@ -0,0 +1,18 @@
+"""
+Índice (conversacion_id, id) para el historial paginado de whatsapp_mensajes
+
+Reemplaza a idx_conversacion (solo conversacion_id): el índice compuesto
+también sirve a la clave foránea hacia whatsapp_conversaciones.
+"""
+from modelos.esquema import EsquemaBD
+
+
+def aplicar(base_datos):
+    if not EsquemaBD.tabla_existe('whatsapp_mensajes'):
+        return
+    if not EsquemaBD.indice_existe('whatsapp_mensajes', 'idx_conversacion_id'):
+        with base_datos.transaccion() as cursor:
+            cursor.execute("ALTER TABLE whatsapp_mensajes ADD INDEX idx_conversacion_id (conversacion_id, id)")
+    if EsquemaBD.indice_existe('whatsapp_mensajes', 'idx_conversacion'):
+        with base_datos.transaccion() as cursor:
+            cursor.execute("ALTER TABLE whatsapp_mensajes DROP INDEX idx_conversacion")
@@ -0,0 +1,43 @@
+"""
+Horario normalizado de los eventos para consultar la disponibilidad de salones
+
+fecha_hora_inicio y fecha_hora_fin son columnas generadas a partir de
+fecha_evento, hora_inicio y hora_fin: si hora_fin es menor que hora_inicio el
+evento termina al día siguiente, y sin horas ocupa el día completo. Con el
+índice (id_salon, fecha_hora_inicio, fecha_hora_fin) los solapamientos se
+buscan con una sola consulta por rango (SalonModelo.obtener_conflictos).
+"""
+from modelos.esquema import EsquemaBD
+
+
+COLUMNAS = {
+    'fecha_hora_inicio': (
+        "DATETIME AS (IF(hora_inicio IS NULL OR hora_fin IS NULL, "
+        "TIMESTAMP(fecha_evento), TIMESTAMP(fecha_evento, hora_inicio))) STORED"
+    ),
+    'fecha_hora_fin': (
+        "DATETIME AS (IF(hora_inicio IS NULL OR hora_fin IS NULL, "
+        "TIMESTAMP(fecha_evento + INTERVAL 1 DAY), "
+        "IF(hora_fin < hora_inicio, TIMESTAMP(fecha_evento + INTERVAL 1 DAY, hora_fin), "
+        "TIMESTAMP(fecha_evento, hora_fin)))) STORED"
+    ),
+}
+
+INDICE = ('idx_salon_intervalo', "id_salon, fecha_hora_inicio, fecha_hora_fin")
+
+
+def aplicar(base_datos):
+    if not EsquemaBD.tabla_existe('eventos'):
+        return
+
+    faltantes = [columna for columna in COLUMNAS if not EsquemaBD.columna_existe('eventos', columna)]
+    if faltantes:
+        with base_datos.transaccion() as cursor:
+            for columna in faltantes:
+                cursor.execute(f"ALTER TABLE eventos ADD COLUMN {columna} {COLUMNAS[columna]}")
+        EsquemaBD.registrar('eventos', faltantes)
+
+    indice, columnas = INDICE
+    if not EsquemaBD.indice_existe('eventos', indice):
+        with base_datos.transaccion() as cursor:
+            cursor.execute(f"ALTER TABLE eventos ADD INDEX {indice} ({columnas})")
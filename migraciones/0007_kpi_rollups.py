@@ -0,0 +1,117 @@
+"""
+Tablas de agregados diarios (rollups) para el tablero y los reportes
+
+Se refrescan de forma incremental desde scripts/scheduler.py
+(KpiRollupModelo.refrescar); los reportes leen de aquí los días cerrados y
+calculan en vivo solo el día actual. pagos.fecha_actualizacion cambia con
+cualquier UPDATE del pago (aprobación, rechazo) y marca los días que hay que
+recalcular. Reemplaza al script documentos/19_kpi_rollups.sql: si ya se
+aplicó, solo se crea lo que falta.
+"""
+from modelos.esquema import EsquemaBD
+
+
+TABLAS = [
+    # Eventos por día (fecha_evento), estado y salón (0 = sin salón)
+    """
+    CREATE TABLE IF NOT EXISTS kpi_eventos_diario (
+        fecha DATE NOT NULL,
+        estado VARCHAR(20) NOT NULL DEFAULT '',
+        id_salon INT NOT NULL DEFAULT 0,
+        cantidad INT NOT NULL DEFAULT 0,
+        total DECIMAL(14, 2) NOT NULL DEFAULT 0.00,
+        saldo DECIMAL(14, 2) NOT NULL DEFAULT 0.00,
+        invitados INT NOT NULL DEFAULT 0,
+        PRIMARY KEY (fecha, estado, id_salon),
+        INDEX idx_estado_fecha (estado, fecha)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    """,
+    # Pagos por día (fecha_pago), cuenta destino (0 = sin cuenta), tipo y estado
+    """
+    CREATE TABLE IF NOT EXISTS kpi_pagos_diario (
+        fecha DATE NOT NULL,
+        cuenta_id INT NOT NULL DEFAULT 0,
+        tipo_pago VARCHAR(20) NOT NULL DEFAULT '',
+        estado_pago VARCHAR(20) NOT NULL DEFAULT '',
+        cantidad INT NOT NULL DEFAULT 0,
+        monto DECIMAL(14, 2) NOT NULL DEFAULT 0.00,
+        PRIMARY KEY (fecha, cuenta_id, tipo_pago, estado_pago),
+        INDEX idx_cuenta_fecha (cuenta_id, fecha)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    """,
+    # Notificaciones enviadas por día (fecha_envio), tipo y canal; costos NULL si
+    # historial_notificaciones no tiene las columnas de costo
+    """
+    CREATE TABLE IF NOT EXISTS kpi_notificaciones_diario (
+        fecha DATE NOT NULL,
+        tipo_notificacion VARCHAR(50) NOT NULL DEFAULT '',
+        canal VARCHAR(20) NOT NULL DEFAULT '',
+        enviados INT NOT NULL DEFAULT 0,
+        costo_email DECIMAL(14, 4) NULL,
+        costo_whatsapp DECIMAL(14, 4) NULL,
+        PRIMARY KEY (fecha, tipo_notificacion, canal)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    """,
+    # Mensajes de WhatsApp por día (fecha_creacion), dirección y origen
+    """
+    CREATE TABLE IF NOT EXISTS kpi_whatsapp_diario (
+        fecha DATE NOT NULL,
+        direccion VARCHAR(10) NOT NULL DEFAULT '',
+        origen VARCHAR(20) NOT NULL DEFAULT '',
+        cantidad INT NOT NULL DEFAULT 0,
+        costo DECIMAL(14, 4) NULL,
+        PRIMARY KEY (fecha, direccion, origen)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    """,
+    # Marca de agua y estado de cada rollup
+    """
+    CREATE TABLE IF NOT EXISTS kpi_rollup_estado (
+        rollup VARCHAR(30) PRIMARY KEY,
+        marca_agua DATETIME NULL,
+        ultima_reconstruccion DATETIME NULL,
+        filas_afectadas INT DEFAULT 0,
+        duracion_ms INT DEFAULT 0,
+        fecha_actualizacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    """,
+]
+
+COLUMNAS = {
+    'pagos': {
+        'fecha_actualizacion': "TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP",
+    },
+}
+
+# {tabla: {índice: columnas}}: días afectados desde la marca de agua
+INDICES = {
+    'eventos': {'idx_fecha_actualizacion': "fecha_actualizacion"},
+    'pagos': {'idx_fecha_actualizacion': "fecha_actualizacion"},
+    'historial_notificaciones': {'idx_fecha_envio': "fecha_envio"},
+    'whatsapp_mensajes': {'idx_fecha_creacion': "fecha_creacion"},
+}
+
+
+def aplicar(base_datos):
+    with base_datos.transaccion() as cursor:
+        for tabla in TABLAS:
+            cursor.execute(tabla)
+    EsquemaBD.invalidar()
+
+    for tabla, columnas in COLUMNAS.items():
+        if not EsquemaBD.tabla_existe(tabla):
+            continue
+        faltantes = [columna for columna in columnas if not EsquemaBD.columna_existe(tabla, columna)]
+        if not faltantes:
+            continue
+        with base_datos.transaccion() as cursor:
+            for columna in faltantes:
+                cursor.execute(f"ALTER TABLE {tabla} ADD COLUMN {columna} {columnas[columna]}")
+        EsquemaBD.registrar(tabla, faltantes)
+
+    for tabla, indices in INDICES.items():
+        if not EsquemaBD.tabla_existe(tabla):
+            continue
+        for indice, columnas in indices.items():
+            if not EsquemaBD.indice_existe(tabla, indice):
+                with base_datos.transaccion() as cursor:
+                    cursor.execute(f"ALTER TABLE {tabla} ADD INDEX {indice} ({columnas})")
@@ -0,0 +1,24 @@
+-- Cola (outbox) de notificaciones automáticas
+-- Los modelos encolan aquí los envíos de pagos y cambios de estado y los hilos
+-- de DespachadorNotificaciones los envían fuera del request, con reintentos
+-- (antes documentos/20_notificaciones_outbox.sql; si ya se aplicó no cambia nada)
+
+CREATE TABLE IF NOT EXISTS notificaciones_outbox (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    tipo VARCHAR(50) NOT NULL,
+    evento_id INT NULL,
+    datos TEXT NOT NULL,
+    estado ENUM('pendiente', 'procesando', 'enviado', 'fallido', 'descartado') NOT NULL DEFAULT 'pendiente',
+    intentos INT NOT NULL DEFAULT 0,
+    max_intentos INT NOT NULL DEFAULT 5,
+    proximo_intento DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    bloqueado_por VARCHAR(64) NULL,
+    bloqueado_en DATETIME NULL,
+    ultimo_error TEXT NULL,
+    fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    fecha_envio TIMESTAMP NULL,
+    fecha_actualizacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    INDEX idx_estado_proximo (estado, proximo_intento),
+    INDEX idx_bloqueado_por (bloqueado_por),
+    INDEX idx_evento_id (evento_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
@@ -0,0 +1,28 @@
+-- Cola de eventos entrantes del webhook de WhatsApp (mensajes y estados)
+-- El webhook solo guarda aquí cada mensaje/estado y responde 200 a Meta;
+-- los hilos de ProcesadorWebhookWhatsApp los procesan después.
+-- clave_dedup es única: las reentregas de Meta se descartan con INSERT IGNORE.
+-- particion = teléfono de la conversación; fragmento = CRC32(particion) % WA_WEBHOOK_SHARDS.
+-- Cada fragmento lo procesa un solo hilo a la vez (GET_LOCK), en orden de id,
+-- así los eventos de una misma conversación nunca se procesan en paralelo ni desordenados.
+-- (antes documentos/21_whatsapp_webhook_entrantes.sql; si ya se aplicó no cambia nada)
+
+CREATE TABLE IF NOT EXISTS whatsapp_webhook_entrantes (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    clave_dedup VARCHAR(191) NOT NULL,
+    tipo ENUM('mensaje', 'estado') NOT NULL,
+    wa_message_id VARCHAR(128) NULL,
+    particion VARCHAR(32) NOT NULL,
+    fragmento SMALLINT NOT NULL DEFAULT 0,
+    payload MEDIUMTEXT NOT NULL,
+    estado ENUM('pendiente', 'procesado', 'fallido') NOT NULL DEFAULT 'pendiente',
+    intentos INT NOT NULL DEFAULT 0,
+    max_intentos INT NOT NULL DEFAULT 5,
+    proximo_intento DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    ultimo_error TEXT NULL,
+    fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    fecha_procesado TIMESTAMP NULL,
+    UNIQUE KEY uk_clave_dedup (clave_dedup),
+    INDEX idx_estado_fragmento (estado, fragmento, id),
+    INDEX idx_particion (particion, id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
@@ -0,0 +1,57 @@
+"""
+Idempotencia del webhook de WhatsApp: wa_message_id único en whatsapp_mensajes
+
+Las reentregas de Meta ya no duplican mensajes entrantes (registrar_mensaje
+usa ON DUPLICATE KEY UPDATE) y los estados se aplican con
+WhatsAppChatModelo.actualizar_estado_monotonico (sent < failed < delivered < read).
+Antes de crear el índice se eliminan los duplicados existentes, conservando el
+primer registro. Reemplaza al script documentos/22_whatsapp_mensajes_wa_id_unico.sql:
+si ya se aplicó, no cambia nada.
+"""
+from modelos.esquema import EsquemaBD
+
+
+# Vacíos como NULL (un índice único admite varios NULL, no varios '')
+VACIOS_A_NULL = "UPDATE whatsapp_mensajes SET wa_message_id = NULL WHERE wa_message_id = ''"
+
+# La bandeja no debe apuntar a un duplicado que se va a borrar
+REAPUNTAR_ULTIMO_MENSAJE = """
+UPDATE whatsapp_conversaciones c
+JOIN whatsapp_mensajes m ON m.id = c.ultimo_mensaje_id
+JOIN (
+    SELECT wa_message_id, MIN(id) AS id
+    FROM whatsapp_mensajes
+    WHERE wa_message_id IS NOT NULL
+    GROUP BY wa_message_id
+    HAVING COUNT(*) > 1
+) p ON p.wa_message_id = m.wa_message_id
+SET c.ultimo_mensaje_id = p.id
+WHERE p.id <> m.id
+"""
+
+BORRAR_DUPLICADOS = """
+DELETE m
+FROM whatsapp_mensajes m
+JOIN whatsapp_mensajes p
+  ON p.wa_message_id = m.wa_message_id
+ AND p.id < m.id
+"""
+
+
+def aplicar(base_datos):
+    if not EsquemaBD.tabla_existe('whatsapp_mensajes'):
+        # Módulo de chat sin instalar (documentos/13_whatsapp_chat.sql)
+        return
+    if EsquemaBD.indice_existe('whatsapp_mensajes', 'uk_wa_message_id'):
+        return
+    with base_datos.transaccion() as cursor:
+        cursor.execute(VACIOS_A_NULL)
+        if EsquemaBD.columna_existe('whatsapp_conversaciones', 'ultimo_mensaje_id'):
+            cursor.execute(REAPUNTAR_ULTIMO_MENSAJE)
+        cursor.execute(BORRAR_DUPLICADOS)
+    # El índice no único queda redundante; se reemplaza en la misma sentencia
+    cambios = ["ADD UNIQUE KEY uk_wa_message_id (wa_message_id)"]
+    if EsquemaBD.indice_existe('whatsapp_mensajes', 'idx_wa_message'):
+        cambios.insert(0, "DROP INDEX idx_wa_message")
+    with base_datos.transaccion() as cursor:
+        cursor.execute(f"ALTER TABLE whatsapp_mensajes {', '.join(cambios)}")
@@ -2,22 +2,323 @@
 Módulo de conexión y operaciones con la base de datos MySQL
 """
 import threading
+import time
+from collections import deque
+from contextlib import contextmanager
 import mysql.connector
 from mysql.connector import Error
-from config import DB_CONFIG
+from mysql.connector.errors import InterfaceError, OperationalError
+from config import DB_CONFIG, DB_POOL_CONFIG
+
+
+class PoolConexiones:
+    """
+    Pool acotado de conexiones MySQL compartido por todos los modelos.
+
+    Mantiene hasta `tamano` conexiones inactivas y permite abrir hasta
+    `max_desborde` conexiones adicionales en picos de carga. Si el pool está
+    agotado, el hilo espera hasta `timeout` segundos a que se libere una.
+    """
+
+    def __init__(self, config_bd, tamano=5, max_desborde=10, timeout=30, reciclar=1800, intervalo_ping=30):
+        """
+        Args:
+            config_bd: Parámetros de conexión para mysql.connector.connect
+            tamano: Conexiones que se conservan abiertas en el pool
+            max_desborde: Conexiones extra permitidas por encima de `tamano`
+            timeout: Segundos máximos de espera para obtener una conexión
+            reciclar: Edad máxima (segundos) de una conexión antes de reabrirla
+            intervalo_ping: Segundos de inactividad a partir de los cuales se
+                verifica la conexión con un ping antes de prestarla
+        """
+        self.config_bd = config_bd
+        self.tamano = max(1, int(tamano))
+        self.max_desborde = max(0, int(max_desborde))
+        self.timeout = float(timeout)
+        self.reciclar = int(reciclar)
+        self.intervalo_ping = float(intervalo_ping)
+
+        self._condicion = threading.Condition()
+        # Conexiones inactivas: (conexion, momento_devolucion)
+        self._disponibles = deque()
+        # Momento de creación de cada conexión abierta (por id del objeto)
+        self._creadas = {}
+        self._abiertas = 0
+        self._prestadas = 0
+        self._esperando = 0
+        self._estadisticas = {
+            'prestamos': 0,
+            'esperas': 0,
+            'tiempo_espera_total': 0.0,
+            'tiempo_espera_max': 0.0,
+            'timeouts': 0,
+            'creadas': 0,
+            'recicladas': 0,
+            'descartadas': 0,
+            'pings': 0
+        }
+
+    def obtener(self):
+        """Presta una conexión del pool, esperando si está agotado"""
+        inicio = time.monotonic()
+        limite = inicio + self.timeout
+        entrada = None
+        with self._condicion:
+            while True:
+                if self._disponibles:
+                    # LIFO: reutilizar la conexión más reciente mantiene "calientes" pocas conexiones
+                    entrada = self._disponibles.pop()
+                    break
+                if self._abiertas < self.tamano + self.max_desborde:
+                    # Reservar el cupo; la conexión se abre fuera del lock
+                    self._abiertas += 1
+                    break
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    self._estadisticas['timeouts'] += 1
+                    raise Error(
+                        f"Timeout esperando conexión del pool ({self.timeout}s, "
+                        f"{self._prestadas} conexiones en uso)"
+                    )
+                self._esperando += 1
+                try:
+                    self._condicion.wait(restante)
+                finally:
+                    self._esperando -= 1
+
+            self._prestadas += 1
+            espera = time.monotonic() - inicio
+            self._estadisticas['prestamos'] += 1
+            if espera > 0.001:
+                self._estadisticas['esperas'] += 1
+                self._estadisticas['tiempo_espera_total'] += espera
+                self._estadisticas['tiempo_espera_max'] = max(self._estadisticas['tiempo_espera_max'], espera)
+
+        try:
+            return self._preparar(entrada)
+        except Exception:
+            with self._condicion:
+                self._abiertas -= 1
+                self._prestadas -= 1
+                self._condicion.notify()
+            raise
+
+    def devolver(self, conexion, descartar=False):
+        """Devuelve una conexión al pool (o la cierra si está dañada, vieja o sobra)"""
+        if conexion is None:
+            return
+
+        if not descartar:
+            try:
+                # Las conexiones del pool van en autocommit: solo queda una
+                # transacción abierta si un bloque terminó sin commit ni rollback
+                if conexion.in_transaction:
+                    conexion.rollback()
+            except Exception:
+                descartar = True
+
+        ahora = time.monotonic()
+        creada = self._creadas.get(id(conexion), ahora)
+        with self._condicion:
+            self._prestadas -= 1
+            vieja = self.reciclar > 0 and ahora - creada > self.reciclar
+            if descartar or vieja or len(self._disponibles) >= self.tamano:
+                self._abiertas -= 1
+                self._creadas.pop(id(conexion), None)
+                if descartar:
+                    self._estadisticas['descartadas'] += 1
+                elif vieja:
+                    self._estadisticas['recicladas'] += 1
+                cerrar = True
+            else:
+                self._disponibles.append((conexion, ahora))
+                cerrar = False
+            self._condicion.notify()
+
+        if cerrar:
+            self._cerrar(conexion)
+
+    def _preparar(self, entrada):
+        """Abre una conexión nueva o valida una reutilizada (ping perezoso)"""
+        if entrada is None:
+            return self._crear()
+
+        conexion, devuelta_en = entrada
+        ahora = time.monotonic()
+        creada = self._creadas.get(id(conexion), ahora)
+        if self.reciclar > 0 and ahora - creada > self.reciclar:
+            self._descartar_entrada(conexion, 'recicladas')
+            return self._crear()
+
+        if ahora - devuelta_en > self.intervalo_ping:
+            self._estadisticas['pings'] += 1
+            try:
+                conexion.ping(reconnect=False)
+            except Exception:
+                self._descartar_entrada(conexion, 'descartadas')
+                return self._crear()
+        return conexion
+
+    def _crear(self):
+        """
+        Abre una conexión física nueva en autocommit: las consultas sueltas no
+        dejan una transacción abierta que haya que cerrar al devolverla
+        (transaccion() la inicia explícitamente)
+        """
+        conexion = mysql.connector.connect(**dict(self.config_bd, autocommit=True))
+        self._creadas[id(conexion)] = time.monotonic()
+        self._estadisticas['creadas'] += 1
+        return conexion
+
+    def _descartar_entrada(self, conexion, motivo):
+        """Cierra una conexión reutilizada que ya no sirve (el cupo se conserva)"""
+        self._creadas.pop(id(conexion), None)
+        self._estadisticas[motivo] += 1
+        self._cerrar(conexion)
+
+    @staticmethod
+    def _cerrar(conexion):
+        try:
+            conexion.close()
+        except Exception:
+            pass
+
+    def estadisticas(self):
+        """Retorna un resumen del estado del pool para dimensionarlo"""
+        with self._condicion:
+            datos = dict(self._estadisticas)
+            datos.update({
+                'tamano': self.tamano,
+                'max_desborde': self.max_desborde,
+                'abiertas': self._abiertas,
+                'prestadas': self._prestadas,
+                'inactivas': len(self._disponibles),
+                'desborde': max(0, self._abiertas - self.tamano),
+                'esperando': self._esperando
+            })
+        esperas = datos['esperas']
+        datos['tiempo_espera_promedio'] = (datos['tiempo_espera_total'] / esperas) if esperas else 0.0
+        return datos
+
+    def cerrar_todas(self):
+        """Cierra las conexiones inactivas del pool"""
+        with self._condicion:
+            entradas = list(self._disponibles)
+            self._disponibles.clear()
+            self._abiertas -= len(entradas)
+            for conexion, _ in entradas:
+                self._creadas.pop(id(conexion), None)
+        for conexion, _ in entradas:
+            self._cerrar(conexion)
+
+
+class CursorMedido:
+    """Cursor de transaccion() que informa cada sentencia a los observadores de BaseDatos"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, consulta, parametros=None):
+        return BaseDatos._ejecutar(self._cursor, consulta, parametros)
+
+    def executemany(self, consulta, parametros):
+        return BaseDatos._ejecutar(self._cursor, consulta, parametros, muchos=True)
+
+    def __getattr__(self, nombre):
+        return getattr(self._cursor, nombre)
+
+    def __iter__(self):
+        return iter(self._cursor)
 
 
 class BaseDatos:
     """Clase para gestionar la conexión y operaciones con MySQL"""
-    
+
     _thread_local = threading.local()
+    _pool = None
+    _pool_lock = threading.Lock()
+    # Funciones (consulta, segundos, error) llamadas tras cada sentencia (métricas)
+    _observadores = []
 
     def __init__(self):
         self.ultimo_error = None
         self.conectar()
-    
+
+    @classmethod
+    def _obtener_pool(cls):
+        """Retorna el pool compartido si el modo pool está activo (DB_POOL_ENABLED)"""
+        if not DB_POOL_CONFIG.get('enabled'):
+            return None
+        if cls._pool is None:
+            with cls._pool_lock:
+                if cls._pool is None:
+                    cls._pool = PoolConexiones(
+                        DB_CONFIG,
+                        tamano=DB_POOL_CONFIG['size'],
+                        max_desborde=DB_POOL_CONFIG['max_overflow'],
+                        timeout=DB_POOL_CONFIG['timeout'],
+                        reciclar=DB_POOL_CONFIG['recycle'],
+                        intervalo_ping=DB_POOL_CONFIG['ping_interval']
+                    )
+        return cls._pool
+
+    @classmethod
+    def estadisticas_pool(cls):
+        """Estadísticas del pool de conexiones (None si el modo pool está desactivado)"""
+        pool = cls._obtener_pool()
+        return pool.estadisticas() if pool else None
+
+    @classmethod
+    def liberar_conexion_hilo(cls):
+        """Devuelve al pool la conexión fijada al hilo actual (fin de request)"""
+        pool = cls._obtener_pool()
+        conexion = getattr(cls._thread_local, 'conexion_pool', None)
+        if pool and conexion is not None:
+            cls._thread_local.conexion_pool = None
+            pool.devolver(conexion)
+
+    @classmethod
+    def agregar_observador(cls, funcion):
+        """
+        Registra una función que se llama tras cada sentencia ejecutada
+
+        Recibe (consulta, parametros, segundos, filas, error); corre en el hilo
+        de la consulta, así que debe ser rápida y no lanzar excepciones.
+        `filas` son las filas devueltas o afectadas (0 si no se conocen).
+        """
+        if funcion not in cls._observadores:
+            cls._observadores.append(funcion)
+
+    @classmethod
+    def _ejecutar(cls, cursor, consulta, parametros=None, muchos=False):
+        """cursor.execute (o executemany) medido para los observadores"""
+        if not cls._observadores:
+            if muchos:
+                return cursor.executemany(consulta, parametros)
+            return cursor.execute(consulta, parametros) if parametros else cursor.execute(consulta)
+        inicio = time.perf_counter()
+        error = None
+        try:
+            if muchos:
+                return cursor.executemany(consulta, parametros)
+            return cursor.execute(consulta, parametros) if parametros else cursor.execute(consulta)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            segundos = time.perf_counter() - inicio
+            filas = max(getattr(cursor, 'rowcount', 0) or 0, 0) if error is None else 0
+            for observador in cls._observadores:
+                try:
+                    observador(consulta, None if muchos else parametros, segundos, filas, error)
+                except Exception:
+                    pass
+
     def conectar(self):
         """Establece conexión con la base de datos MySQL"""
+        if self._obtener_pool() is not None:
+            # En modo pool las conexiones se abren bajo demanda al prestarlas
+            return True
         try:
             conexion = mysql.connector.connect(**DB_CONFIG)
             if conexion.is_connected():
@@ -33,159 +334,273 @@ class BaseDatos:
 
     def _obtener_conexion(self):
         """Obtiene la conexión asociada al hilo actual"""
+        pool = self._obtener_pool()
+        if pool is not None:
+            # Acceso directo a la conexión: queda fijada al hilo hasta liberar_conexion_hilo()
+            conexion = getattr(self._thread_local, 'conexion_pool', None)
+            if conexion is None:
+                try:
+                    conexion = pool.obtener()
+                except Error as e:
+                    print(f"Error al obtener conexión del pool: {e}")
+                    return None
+                self._thread_local.conexion_pool = conexion
+            return conexion
+
         conexion = getattr(self._thread_local, 'conexion', None)
         if not conexion or not conexion.is_connected():
             self.conectar()
             conexion = getattr(self._thread_local, 'conexion', None)
         return conexion
 
+    @contextmanager
+    def _conexion_consulta(self):
+        """
+        Presta una conexión para ejecutar una sola consulta.
+
+        En modo pool la conexión se toma y devuelve al pool en cada llamada
+        (salvo que el hilo ya tenga una fijada); sin pool se usa la del hilo.
+        Produce None si no se pudo establecer conexión.
+        """
+        pool = self._obtener_pool()
+        if pool is None or getattr(self._thread_local, 'conexion_pool', None) is not None:
+            conexion = self._obtener_conexion()
+            yield conexion if conexion and conexion.is_connected() else None
+            return
+
+        conexion = pool.obtener()
+        descartar = False
+        try:
+            yield conexion
+        except (InterfaceError, OperationalError):
+            # Conexión caída o inutilizable: no devolverla al pool
+            descartar = True
+            raise
+        finally:
+            pool.devolver(conexion, descartar=descartar)
+
+    @contextmanager
+    def transaccion(self):
+        """
+        Ejecuta varias sentencias en una sola transacción y conexión.
+
+        Produce un cursor (dictionary=True); hace commit al salir del bloque
+        o rollback si ocurre una excepción.
+        """
+        with self._conexion_consulta() as conexion:
+            if not conexion:
+                raise Error("Error: No se pudo establecer conexión a MySQL")
+            if not conexion.in_transaction:
+                # Necesario con las conexiones en autocommit del pool
+                conexion.start_transaction()
+            cursor = conexion.cursor(dictionary=True, buffered=True)
+            try:
+                yield CursorMedido(cursor) if self._observadores else cursor
+                conexion.commit()
+            except Exception:
+                try:
+                    conexion.rollback()
+                except Exception:
+                    pass
+                raise
+            finally:
+                cursor.close()
+
+    @contextmanager
+    def bloqueo_asesor(self, nombre, timeout=0):
+        """
+        Toma un bloqueo con nombre de MySQL (GET_LOCK) mientras dura el bloque.
+
+        Sirve para que una tarea no corra en paralelo en dos procesos. El
+        bloqueo pertenece a la sesión, así que se mantiene la misma conexión
+        hasta RELEASE_LOCK. Produce True si se obtuvo el bloqueo.
+        """
+        with self._conexion_consulta() as conexion:
+            if not conexion:
+                raise Error("Error: No se pudo establecer conexión a MySQL")
+            cursor = conexion.cursor(buffered=True)
+            try:
+                cursor.execute("SELECT GET_LOCK(%s, %s)", (nombre, timeout))
+                fila = cursor.fetchone()
+                obtenido = bool(fila and fila[0] == 1)
+                try:
+                    yield obtenido
+                finally:
+                    if obtenido:
+                        try:
+                            cursor.execute("SELECT RELEASE_LOCK(%s)", (nombre,))
+                            cursor.fetchall()
+                        except Error:
+                            # Si la conexión se perdió, MySQL ya liberó el bloqueo
+                            pass
+            finally:
+                cursor.close()
+
+    def iterar_consulta(self, consulta, parametros=None, tamano_lote=500):
+        """
+        Recorre un SELECT grande sin cargarlo completo en memoria.
+
+        Usa un cursor no bufferizado (el servidor envía las filas a medida que
+        se leen) y `fetchmany` por lotes sobre una conexión exclusiva: del pool
+        si está habilitado o una conexión nueva si no, para no bloquear la
+        conexión del hilo mientras dura el recorrido.
+
+        La consulta se ejecuta al obtener la primera fila. Si el recorrido se
+        abandona antes de terminar, la conexión se cierra en lugar de
+        devolverse al pool (quedarían filas sin leer).
+
+        Yields:
+            dict: una fila por iteración
+        """
+        pool = self._obtener_pool()
+        conexion = pool.obtener() if pool is not None else mysql.connector.connect(**DB_CONFIG)
+        completado = False
+        cursor = None
+        try:
+            cursor = conexion.cursor(dictionary=True)
+            self._ejecutar(cursor, consulta, parametros)
+            while True:
+                filas = cursor.fetchmany(tamano_lote)
+                if not filas:
+                    break
+                for fila in filas:
+                    yield fila
+            completado = True
+        finally:
+            if cursor is not None and completado:
+                cursor.close()
+            if pool is not None:
+                pool.devolver(conexion, descartar=not completado)
+            else:
+                PoolConexiones._cerrar(conexion)
+
     @property
     def conexion(self):
         """Compatibilidad: devuelve la conexión del hilo actual"""
         return self._obtener_conexion()
-    
+
     def desconectar(self):
         """Cierra la conexión con la base de datos"""
+        if self._obtener_pool() is not None:
+            self.liberar_conexion_hilo()
+            return
         conexion = getattr(self._thread_local, 'conexion', None)
         if conexion and conexion.is_connected():
             conexion.close()
             self._thread_local.conexion = None
             print("Conexión cerrada")
-    
+
     def ejecutar_consulta(self, consulta, parametros=None):
         """Ejecuta una consulta que no retorna resultados (INSERT, UPDATE, DELETE)"""
         try:
             self.ultimo_error = None
-            # Verificar que la conexión esté activa
-            conexion = self._obtener_conexion()
-            if not conexion or not conexion.is_connected():
-                print("Error: No se pudo establecer conexión a MySQL")
-                return False
-            
-            cursor = conexion.cursor(buffered=True)
-            if parametros:
-                cursor.execute(consulta, parametros)
-            else:
-                cursor.execute(consulta)
-            filas_afectadas = cursor.rowcount
-            conexion.commit()
-            cursor.close()
-            
-            # Si es un CALL, consumir todos los resultados (si está disponible)
-            if consulta.strip().upper().startswith('CALL'):
-                try:
-                    while conexion.next_result():
+            self._thread_local.filas_afectadas = 0
+            with self._conexion_consulta() as conexion:
+                # Verificar que la conexión esté activa
+                if not conexion:
+                    print("Error: No se pudo establecer conexión a MySQL")
+                    return False
+
+                cursor = conexion.cursor(buffered=True)
+                self._ejecutar(cursor, consulta, parametros)
+                filas_afectadas = cursor.rowcount
+                self._thread_local.filas_afectadas = filas_afectadas
+                if cursor.lastrowid:
+                    # En modo pool LAST_INSERT_ID() podría leerse en otra conexión
+                    self._thread_local.ultimo_id = cursor.lastrowid
+                if conexion.in_transaction:
+                    # En autocommit (pool) la sentencia ya quedó confirmada
+                    conexion.commit()
+                cursor.close()
+
+                # Si es un CALL, consumir todos los resultados (si está disponible)
+                if consulta.strip().upper().startswith('CALL'):
+                    try:
+                        while conexion.next_result():
+                            pass
+                    except AttributeError:
+                        # next_result() no está disponible en esta versión
                         pass
-                except AttributeError:
-                    # next_result() no está disponible en esta versión
-                    pass
-                except Exception:
-                    # Ignorar errores al consumir resultados adicionales
-                    pass
-            
+                    except Exception:
+                        # Ignorar errores al consumir resultados adicionales
+                        pass
+
             # Para UPDATE/DELETE, verificar si se afectaron filas
             if consulta.strip().upper().startswith(('UPDATE', 'DELETE')):
                 print(f"Filas afectadas: {filas_afectadas}")
-            
+
             return True
         except Error as e:
             self.ultimo_error = str(e)
             print(f"Error al ejecutar consulta: {e}")
-            try:
-                conexion = self._obtener_conexion()
-                if conexion and conexion.is_connected():
-                    conexion.rollback()
-            except:
-                pass
+            if self._obtener_pool() is None:
+                try:
+                    conexion = self._obtener_conexion()
+                    if conexion and conexion.is_connected():
+                        conexion.rollback()
+                except:
+                    pass
             return False
-    
-    def obtener_todos(self, consulta, parametros=None):
-        """Ejecuta una consulta SELECT y retorna todos los resultados"""
-        try:
+
+    def _consultar(self, consulta, parametros, uno):
+        """Ejecuta un SELECT con una conexión prestada y retorna filas (o una fila)"""
+        with self._conexion_consulta() as conexion:
             # Verificar que la conexión esté activa
-            conexion = self._obtener_conexion()
-            if not conexion or not conexion.is_connected():
+            if not conexion:
                 error_msg = "Error: No se pudo establecer conexión a MySQL"
                 print(error_msg)
                 raise Error(error_msg)
-            
+
             cursor = conexion.cursor(dictionary=True, buffered=True)
-            if parametros:
-                cursor.execute(consulta, parametros)
+            self._ejecutar(cursor, consulta, parametros)
+            if uno:
+                resultado = cursor.fetchone()
+                # Consumir cualquier resultado adicional para evitar "Unread result found"
+                try:
+                    cursor.fetchall()
+                except Exception:
+                    pass
             else:
-                cursor.execute(consulta)
-            resultados = cursor.fetchall()
+                resultado = cursor.fetchall()
             cursor.close()
-            return resultados
+            return resultado
+
+    def obtener_todos(self, consulta, parametros=None):
+        """Ejecuta una consulta SELECT y retorna todos los resultados"""
+        try:
+            return self._consultar(consulta, parametros, uno=False)
         except Error as e:
             print(f"Error al obtener datos: {e}")
-            # Intentar reconectar si falló
+            # Reintentar la consulta una vez más (reconectando o con otra conexión del pool)
             try:
-                conexion = self._obtener_conexion()
-                # Reintentar la consulta una vez más después de reconectar
-                if conexion and conexion.is_connected():
-                    cursor = conexion.cursor(dictionary=True, buffered=True)
-                    if parametros:
-                        cursor.execute(consulta, parametros)
-                    else:
-                        cursor.execute(consulta)
-                    resultados = cursor.fetchall()
-                    cursor.close()
-                    return resultados
+                return self._consultar(consulta, parametros, uno=False)
             except Exception as retry_error:
                 print(f"Error al reintentar consulta: {retry_error}")
             # Si no se pudo reconectar, lanzar la excepción para que el llamador la maneje
             raise
-    
+
     def obtener_uno(self, consulta, parametros=None):
         """Ejecuta una consulta SELECT y retorna un solo resultado"""
         try:
-            # Verificar que la conexión esté activa
-            conexion = self._obtener_conexion()
-            if not conexion or not conexion.is_connected():
-                error_msg = "Error: No se pudo establecer conexión a MySQL"
-                print(error_msg)
-                raise Error(error_msg)
-            
-            cursor = conexion.cursor(dictionary=True, buffered=True)
-            if parametros:
-                cursor.execute(consulta, parametros)
-            else:
-                cursor.execute(consulta)
-            resultado = cursor.fetchone()
-            # Consumir cualquier resultado adicional para evitar "Unread result found"
-            try:
-                cursor.fetchall()
-            except Exception:
-                pass
-            cursor.close()
-            return resultado
+            return self._consultar(consulta, parametros, uno=True)
         except Error as e:
             print(f"Error al obtener dato: {e}")
-            # Intentar reconectar si falló
+            # Reintentar la consulta una vez más (reconectando o con otra conexión del pool)
             try:
-                conexion = self._obtener_conexion()
-                # Reintentar la consulta una vez más después de reconectar
-                if conexion and conexion.is_connected():
-                    cursor = conexion.cursor(dictionary=True, buffered=True)
-                    if parametros:
-                        cursor.execute(consulta, parametros)
-                    else:
-                        cursor.execute(consulta)
-                    resultado = cursor.fetchone()
-                    try:
-                        cursor.fetchall()
-                    except Exception:
-                        pass
-                    cursor.close()
-                    return resultado
+                return self._consultar(consulta, parametros, uno=True)
             except Exception as retry_error:
                 print(f"Error al reintentar consulta: {retry_error}")
             # Si no se pudo reconectar, lanzar la excepción para que el llamador la maneje
             raise
-    
+
+    def obtener_filas_afectadas(self):
+        """Filas afectadas por el último ejecutar_consulta de este hilo"""
+        return getattr(self._thread_local, 'filas_afectadas', 0)
+
     def obtener_ultimo_id(self):
         """Retorna el último ID insertado"""
+        if self._obtener_pool() is not None and getattr(self._thread_local, 'conexion_pool', None) is None:
+            return getattr(self._thread_local, 'ultimo_id', None)
         try:
             conexion = self._obtener_conexion()
             if not conexion or not conexion.is_connected():
@@ -199,4 +614,3 @@ class BaseDatos:
         except Error as e:
             print(f"Error al obtener último ID: {e}")
             return None
-
@@ -4,6 +4,7 @@ Modelo para gestionar calificaciones de eventos
 import logging
 from datetime import datetime
 from modelos.base_datos import BaseDatos
+from modelos.esquema import EsquemaBD
 
 class CalificacionModelo:
     def __init__(self):
@@ -12,12 +13,7 @@ class CalificacionModelo:
 
     def _tabla_existe(self):
         """Verifica si la tabla de calificaciones existe"""
-        consulta = """
-        SELECT COUNT(*) as existe FROM information_schema.tables 
-        WHERE table_schema = DATABASE() AND table_name = 'calificaciones_eventos'
-        """
-        resultado = self.base_datos.obtener_uno(consulta)
-        return resultado and resultado.get('existe', 0) > 0
+        return EsquemaBD.tabla_existe('calificaciones_eventos')
 
     def crear_solicitud_calificacion(self, evento_id, cliente_id):
         """Crea un registro de solicitud de calificación pendiente"""
@@ -170,13 +166,7 @@ class CalificacionModelo:
         """Actualiza la calificación en la tabla de eventos"""
         try:
             # Verificar si existen las columnas
-            check_columna = """
-            SELECT COUNT(*) as existe FROM information_schema.columns 
-            WHERE table_schema = DATABASE() AND table_name = 'eventos' AND column_name = 'calificacion_cliente'
-            """
-            resultado = self.base_datos.obtener_uno(check_columna)
-            
-            if not resultado or resultado.get('existe', 0) == 0:
+            if not EsquemaBD.columna_existe('eventos', 'calificacion_cliente'):
                 return
             
             consulta = """
@@ -3,6 +3,7 @@ Modelo para gestión de clientes
 """
 from datetime import date
 from modelos.base_datos import BaseDatos
+from modelos.esquema import EsquemaBD
 
 
 class ClienteModelo:
@@ -16,14 +17,7 @@ class ClienteModelo:
         """Verifica si la tabla clientes tiene los campos de fidelización"""
         if self._campos_extendidos is None:
             try:
-                consulta = """
-                SELECT COUNT(*) as existe FROM information_schema.columns 
-                WHERE table_schema = DATABASE() 
-                AND table_name = 'clientes' 
-                AND column_name = 'fecha_nacimiento'
-                """
-                resultado = self.base_datos.obtener_uno(consulta)
-                self._campos_extendidos = resultado and resultado.get('existe', 0) > 0
+                self._campos_extendidos = EsquemaBD.columna_existe('clientes', 'fecha_nacimiento')
             except:
                 self._campos_extendidos = False
         return self._campos_extendidos
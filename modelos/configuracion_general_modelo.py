@@ -1,39 +1,15 @@
 from modelos.base_datos import BaseDatos
+from utilidades.cache_configuracion import cache_configuracion
 
 
 class ConfiguracionGeneralModelo:
     def __init__(self):
         self.base_datos = BaseDatos()
 
-    def _asegurar_columnas_contacto(self):
-        columnas = {
-            "contacto_nombre": "VARCHAR(255) NULL",
-            "contacto_email": "VARCHAR(255) NULL",
-            "contacto_telefono": "VARCHAR(50) NULL",
-            "contacto_whatsapp": "VARCHAR(50) NULL",
-            "establecimiento_direccion": "TEXT NULL",
-            "establecimiento_horario": "VARCHAR(255) NULL",
-        }
-        try:
-            consulta = """
-            SELECT COLUMN_NAME
-            FROM information_schema.COLUMNS
-            WHERE TABLE_SCHEMA = DATABASE()
-              AND TABLE_NAME = 'configuracion_general'
-              AND COLUMN_NAME IN ({placeholders})
-            """.format(placeholders=",".join(["%s"] * len(columnas)))
-            existentes = self.base_datos.obtener_todos(consulta, tuple(columnas.keys())) or []
-            presentes = {row.get("COLUMN_NAME") for row in existentes}
-            for columna, tipo in columnas.items():
-                if columna not in presentes:
-                    self.base_datos.ejecutar_consulta(
-                        f"ALTER TABLE configuracion_general ADD COLUMN {columna} {tipo}"
-                    )
-        except Exception:
-            pass
-
     def obtener_configuracion(self):
-        self._asegurar_columnas_contacto()
+        return cache_configuracion.obtener("configuracion_general", self._leer_configuracion)
+
+    def _leer_configuracion(self):
         consulta = """
         SELECT
           id,
@@ -61,6 +37,12 @@ class ConfiguracionGeneralModelo:
         return self.base_datos.obtener_uno(consulta)
 
     def actualizar_nombre_plataforma(self, nombre_plataforma):
+        try:
+            return self._actualizar_nombre_plataforma(nombre_plataforma)
+        finally:
+            cache_configuracion.invalidar("configuracion_general")
+
+    def _actualizar_nombre_plataforma(self, nombre_plataforma):
         existente = self.obtener_configuracion()
         if existente and existente.get("id"):
             consulta = """
@@ -76,7 +58,12 @@ class ConfiguracionGeneralModelo:
         return self.base_datos.ejecutar_consulta(consulta, (nombre_plataforma,))
 
     def actualizar_configuracion(self, data):
-        self._asegurar_columnas_contacto()
+        try:
+            return self._actualizar_configuracion(data)
+        finally:
+            cache_configuracion.invalidar("configuracion_general")
+
+    def _actualizar_configuracion(self, data):
         existente = self.obtener_configuracion()
         campos = [
             "nombre_plataforma",
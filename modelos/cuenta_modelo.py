@@ -11,42 +11,6 @@ class CuentaModelo:
     def __init__(self):
         self.base_datos = BaseDatos()
         self.logger = obtener_logger()
-        self._asegurar_tabla_cuentas()
-    
-    def _asegurar_tabla_cuentas(self):
-        """Crea la tabla de cuentas si no existe"""
-        try:
-            consulta = """
-            CREATE TABLE IF NOT EXISTS cuentas (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                nombre VARCHAR(100) NOT NULL COMMENT 'Nombre identificador de la cuenta',
-                tipo ENUM('ahorros', 'corriente', 'digital', 'efectivo', 'otro') NOT NULL DEFAULT 'ahorros' COMMENT 'Tipo de cuenta',
-                numero_cuenta VARCHAR(50) NULL COMMENT 'Número de cuenta bancaria',
-                descripcion TEXT NULL COMMENT 'Descripción detallada de la cuenta',
-                activo TINYINT(1) NOT NULL DEFAULT 1 COMMENT 'Estado de la cuenta (1=activa, 0=inactiva)',
-                fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP COMMENT 'Fecha de creación del registro',
-                fecha_actualizacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT 'Fecha de última actualización',
-                INDEX idx_cuentas_tipo (tipo),
-                INDEX idx_cuentas_activo (activo)
-            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='Cuentas para confirmación y registro de pagos'
-            """
-            self.base_datos.ejecutar_consulta(consulta)
-            self._asegurar_columna_numero_cuenta()
-        except Exception as e:
-            self.logger.warning(f"No se pudo asegurar la tabla cuentas: {e}")
-    
-    def _asegurar_columna_numero_cuenta(self):
-        """Asegura que exista la columna numero_cuenta"""
-        try:
-            columnas = self.base_datos.obtener_todos("SHOW COLUMNS FROM cuentas")
-            columnas_nombres = {col.get("Field") for col in columnas if col.get("Field")}
-            if "numero_cuenta" not in columnas_nombres:
-                self.base_datos.ejecutar_consulta(
-                    "ALTER TABLE cuentas ADD COLUMN numero_cuenta VARCHAR(50) NULL COMMENT 'Número de cuenta bancaria' AFTER tipo"
-                )
-                self.logger.info("Columna numero_cuenta agregada a tabla cuentas")
-        except Exception as e:
-            self.logger.warning(f"No se pudo asegurar columna numero_cuenta: {e}")
     
     def crear_cuenta(self, datos_cuenta):
         """Crea una nueva cuenta
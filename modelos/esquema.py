@@ -0,0 +1,155 @@
+"""
+Registro del esquema de la base de datos (tablas y columnas)
+Se carga una vez con una sola consulta a information_schema y los modelos lo
+consultan en memoria en vez de preguntar a MySQL en cada llamada.
+"""
+import threading
+import time
+from mysql.connector import Error
+from utilidades.logger import obtener_logger
+
+
+# Segundos mínimos entre recargas provocadas por una tabla/columna no encontrada
+# (p. ej. un script SQL aplicado con la aplicación corriendo)
+SEGUNDOS_ENTRE_RECARGAS = 300
+
+
+class EsquemaBD:
+    """Tablas y columnas de la base de datos actual, compartidas por el proceso"""
+
+    _columnas = None
+    _cargado_en = 0.0
+    _lock = threading.RLock()
+
+    @classmethod
+    def _base_datos(cls):
+        from modelos.base_datos import BaseDatos
+        return BaseDatos()
+
+    @classmethod
+    def cargar(cls):
+        """Lee todas las columnas del esquema actual (una sola consulta)"""
+        filas = cls._base_datos().obtener_todos(
+            "SELECT TABLE_NAME AS tabla, COLUMN_NAME AS columna "
+            "FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = DATABASE()"
+        ) or []
+        columnas = {}
+        for fila in filas:
+            columnas.setdefault(str(fila['tabla']).lower(), set()).add(str(fila['columna']).lower())
+        with cls._lock:
+            cls._columnas = columnas
+            cls._cargado_en = time.monotonic()
+        obtener_logger().info(
+            f"Esquema de BD cargado: {len(columnas)} tablas, {sum(len(c) for c in columnas.values())} columnas"
+        )
+        return columnas
+
+    @classmethod
+    def _obtener(cls):
+        with cls._lock:
+            if cls._columnas is None:
+                cls.cargar()
+            return cls._columnas
+
+    @classmethod
+    def _recargar_si_corresponde(cls):
+        """Recarga ante un faltante, como mucho cada SEGUNDOS_ENTRE_RECARGAS"""
+        with cls._lock:
+            if time.monotonic() - cls._cargado_en < SEGUNDOS_ENTRE_RECARGAS:
+                return False
+            try:
+                cls.cargar()
+            except Error as e:
+                obtener_logger().warning(f"No se pudo recargar el esquema de BD: {e}")
+                cls._cargado_en = time.monotonic()
+                return False
+            return True
+
+    @classmethod
+    def tabla_existe(cls, tabla):
+        tabla = tabla.lower()
+        if tabla in cls._obtener():
+            return True
+        return cls._recargar_si_corresponde() and tabla in cls._obtener()
+
+    @classmethod
+    def columna_existe(cls, tabla, columna):
+        tabla, columna = tabla.lower(), columna.lower()
+        if columna in cls._obtener().get(tabla, ()):
+            return True
+        return cls._recargar_si_corresponde() and columna in cls._obtener().get(tabla, ())
+
+    @classmethod
+    def indice_existe(cls, tabla, indice):
+        """Consulta information_schema en cada llamada: los índices no se registran (migraciones)"""
+        fila = cls._base_datos().obtener_uno(
+            "SELECT COUNT(*) AS total FROM information_schema.STATISTICS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s",
+            (tabla, indice)
+        ) or {}
+        return bool(int(fila.get('total') or 0))
+
+    @classmethod
+    def columnas(cls, tabla):
+        """Conjunto de columnas (en minúsculas) de una tabla"""
+        return set(cls._obtener().get(tabla.lower(), ()))
+
+    @classmethod
+    def registrar(cls, tabla, columnas=()):
+        """Agrega al registro una tabla o columnas recién creadas por este proceso"""
+        with cls._lock:
+            registro = cls._obtener().setdefault(tabla.lower(), set())
+            registro.update(columna.lower() for columna in columnas)
+
+    @classmethod
+    def asegurar_columnas(cls, tabla, columnas):
+        """
+        Crea las columnas que falten en una tabla existente
+
+        Args:
+            tabla: nombre de la tabla
+            columnas: dict {columna: definición SQL}, en orden
+
+        Returns:
+            bool: True si todas las columnas existen al terminar
+        """
+        faltantes = [columna for columna in columnas if not cls.columna_existe(tabla, columna)]
+        if not faltantes:
+            return True
+        if not cls.tabla_existe(tabla):
+            return False
+        base_datos = cls._base_datos()
+        for columna in faltantes:
+            if base_datos.ejecutar_consulta(f"ALTER TABLE {tabla} ADD COLUMN {columna} {columnas[columna]}"):
+                cls.registrar(tabla, [columna])
+        if all(columna in cls.columnas(tabla) for columna in faltantes):
+            return True
+        # Otro proceso pudo agregarlas antes (columna duplicada): releer el esquema
+        with cls._lock:
+            cls._cargado_en = 0.0
+        cls._recargar_si_corresponde()
+        return all(cls.columna_existe(tabla, columna) for columna in faltantes)
+
+    @classmethod
+    def ejecutar_ddl(cls, tabla, sentencia, columnas=()):
+        """
+        Ejecuta un CREATE TABLE/ALTER y actualiza el registro si tuvo éxito
+
+        Registra las `columnas` indicadas; si no se indican, relee el esquema
+        en la próxima consulta.
+        """
+        if not cls._base_datos().ejecutar_consulta(sentencia):
+            return False
+        if columnas:
+            cls.registrar(tabla, columnas)
+        else:
+            cls.invalidar()
+        return True
+
+    @classmethod
+    def invalidar(cls):
+        """Fuerza a releer el esquema en la próxima consulta (tras aplicar scripts SQL)"""
+        with cls._lock:
+            cls._columnas = None
+            cls._cargado_en = 0.0
+
@@ -1,12 +1,60 @@
 """
 Modelo para gestión de eventos
 """
+import base64
+import json
 from datetime import timedelta
 from modelos.base_datos import BaseDatos
+from modelos.esquema import EsquemaBD
 from modelos.inventario_modelo import InventarioModelo
+from modelos.salon_modelo import SalonModelo, normalizar_horario
 from utilidades.logger import obtener_logger
 
 
+# Joins opcionales de los listados de eventos
+JOINS_LISTADO_EVENTOS = {
+    'cliente': "LEFT JOIN clientes c ON e.id_cliente = c.id LEFT JOIN usuarios u ON c.usuario_id = u.id",
+    'coordinador': "LEFT JOIN usuarios u_coor ON e.coordinador_id = u_coor.id",
+    'salon': "LEFT JOIN salones ON e.id_salon = salones.id_salon",
+    'plan': "LEFT JOIN planes p ON e.plan_id = p.id",
+}
+
+# Campos proyectables del listado: campo -> (columnas SQL, joins requeridos)
+CAMPOS_LISTADO_EVENTOS = {
+    'id_evento': (['e.id_evento'], []),
+    'id': (['e.id_evento'], []),
+    'id_salon': (['e.id_salon'], []),
+    'salon_id': (['e.id_salon'], []),
+    'salon': (['e.salon'], []),
+    'cliente_id': (['e.id_cliente'], []),
+    'nombre_evento': (['e.nombre_evento'], []),
+    'tipo_evento': (['e.tipo_evento'], []),
+    'fecha_evento': (['e.fecha_evento'], []),
+    'estado': (['e.estado'], []),
+    'hora_inicio': (['e.hora_inicio'], []),
+    'hora_fin': (['e.hora_fin'], []),
+    'numero_invitados': (['e.numero_invitados'], []),
+    'total': (['e.total'], []),
+    'precio_total': (['e.total'], []),
+    'saldo': (['e.saldo'], []),
+    'saldo_pendiente': (['e.saldo'], []),
+    'nombre_cliente': (['u.nombre_completo as nombre_cliente'], ['cliente']),
+    'documento_identidad_cliente': (['c.documento_identidad as documento_identidad_cliente'], ['cliente']),
+    'nombre_salon': (['salones.nombre as nombre_salon'], ['salon']),
+    'nombre_plan': (['p.nombre as nombre_plan'], ['plan']),
+    'coordinador_id': (['e.coordinador_id'], []),
+    'nombre_coordinador': (['u_coor.nombre_completo as nombre_coordinador'], ['coordinador']),
+}
+
+# Órdenes permitidos; todos terminan en id_evento para que el cursor sea estable
+ORDENES_LISTADO_EVENTOS = {
+    'id_desc': "e.id_evento DESC",
+    'id_asc': "e.id_evento ASC",
+    'fecha_desc': "e.fecha_evento DESC, e.id_evento DESC",
+    'fecha_asc': "e.fecha_evento ASC, e.id_evento ASC",
+}
+
+
 class EventoModelo:
     """Clase para operaciones CRUD de eventos"""
     
@@ -146,63 +194,7 @@ class EventoModelo:
             resultados = self.base_datos.obtener_todos(consulta)
         
         # Mapear nombres de columnas para compatibilidad con la vista
-        eventos_mapeados = []
-        for evento in resultados:
-            # Convertir timedelta a string si es necesario
-            hora_inicio = evento.get('hora_inicio')
-            if isinstance(hora_inicio, timedelta):
-                total_seconds = int(hora_inicio.total_seconds())
-                hours = total_seconds // 3600
-                minutes = (total_seconds % 3600) // 60
-                seconds = total_seconds % 60
-                hora_inicio = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
-            elif hora_inicio is not None:
-                hora_inicio = str(hora_inicio)
-            
-            hora_fin = evento.get('hora_fin')
-            if isinstance(hora_fin, timedelta):
-                total_seconds = int(hora_fin.total_seconds())
-                hours = total_seconds // 3600
-                minutes = (total_seconds % 3600) // 60
-                seconds = total_seconds % 60
-                hora_fin = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
-            elif hora_fin is not None:
-                hora_fin = str(hora_fin)
-            
-            # Convertir fecha a string si es necesario
-            fecha_evento = evento.get('fecha_evento')
-            if fecha_evento is not None and not isinstance(fecha_evento, str):
-                fecha_evento = str(fecha_evento)
-            
-            # Mapear nombres de columnas para compatibilidad con la vista
-            evento_mapeado = {
-                'id_evento': evento.get('id_evento', evento.get('id')),
-                'id': evento.get('id_evento', evento.get('id')),
-                'id_salon': evento.get('id_salon'),
-                'salon_id': evento.get('id_salon'),  # Alias para compatibilidad
-                'salon': evento.get('salon', evento.get('salon_nombre')),
-                'cliente_id': evento.get('id_cliente'),
-                'nombre_evento': evento.get('nombre_evento', evento.get('evento_nombre', 'Evento')),
-                'tipo_evento': evento.get('tipo_evento', 'Otro'),
-                'fecha_evento': fecha_evento,
-                'estado': evento.get('estado'),
-                'hora_inicio': hora_inicio,
-                'hora_fin': hora_fin,
-                'numero_invitados': evento.get('numero_invitados'),
-                'total': float(evento.get('total', 0) or 0),
-                'precio_total': float(evento.get('total', 0) or 0),
-                'saldo': float(evento.get('saldo', 0) or 0),
-                'saldo_pendiente': float(evento.get('saldo', 0) or 0),
-                'nombre_cliente': evento.get('nombre_cliente', 'N/A'),
-                'documento_identidad_cliente': evento.get('documento_identidad_cliente') or evento.get('documento_identidad'),
-                'nombre_salon': evento.get('nombre_salon'),
-                'nombre_plan': evento.get('nombre_plan'),
-                'coordinador_id': evento.get('coordinador_id'),
-                'nombre_coordinador': evento.get('nombre_coordinador')
-            }
-            eventos_mapeados.append(evento_mapeado)
-        
-        return eventos_mapeados
+        return [self._mapear_evento_listado(evento) for evento in resultados]
 
     def obtener_eventos_por_rango(self, fecha_desde=None, fecha_hasta=None):
         """Obtiene eventos filtrados por rango de fechas"""
@@ -239,61 +231,181 @@ class EventoModelo:
             resultados = self.base_datos.obtener_todos(consulta)
         
         # Usar el mismo mapeo que obtener_todos_eventos
-        eventos_mapeados = []
-        for evento in resultados:
-            hora_inicio = evento.get('hora_inicio')
-            if isinstance(hora_inicio, timedelta):
-                total_seconds = int(hora_inicio.total_seconds())
-                hours = total_seconds // 3600
-                minutes = (total_seconds % 3600) // 60
-                seconds = total_seconds % 60
-                hora_inicio = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
-            elif hora_inicio is not None:
-                hora_inicio = str(hora_inicio)
-            
-            hora_fin = evento.get('hora_fin')
-            if isinstance(hora_fin, timedelta):
-                total_seconds = int(hora_fin.total_seconds())
-                hours = total_seconds // 3600
-                minutes = (total_seconds % 3600) // 60
-                seconds = total_seconds % 60
-                hora_fin = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
-            elif hora_fin is not None:
-                hora_fin = str(hora_fin)
-            
-            fecha_evento = evento.get('fecha_evento')
-            if fecha_evento is not None and not isinstance(fecha_evento, str):
-                fecha_evento = str(fecha_evento)
-            
-            evento_mapeado = {
-                'id_evento': evento.get('id_evento', evento.get('id')),
-                'id': evento.get('id_evento', evento.get('id')),
-                'id_salon': evento.get('id_salon'),
-                'salon_id': evento.get('id_salon'),
-                'salon': evento.get('salon', evento.get('salon_nombre')),
-                'cliente_id': evento.get('id_cliente'),
-                'nombre_evento': evento.get('nombre_evento', evento.get('evento_nombre', 'Evento')),
-                'tipo_evento': evento.get('tipo_evento', 'Otro'),
-                'fecha_evento': fecha_evento,
-                'estado': evento.get('estado'),
-                'hora_inicio': hora_inicio,
-                'hora_fin': hora_fin,
-                'numero_invitados': evento.get('numero_invitados'),
-                'total': float(evento.get('total', 0) or 0),
-                'precio_total': float(evento.get('total', 0) or 0),
-                'saldo': float(evento.get('saldo', 0) or 0),
-                'saldo_pendiente': float(evento.get('saldo', 0) or 0),
-                'nombre_cliente': evento.get('nombre_cliente', 'N/A'),
-                'documento_identidad_cliente': evento.get('documento_identidad_cliente') or evento.get('documento_identidad'),
-                'nombre_salon': evento.get('nombre_salon'),
-                'nombre_plan': evento.get('nombre_plan'),
-                'coordinador_id': evento.get('coordinador_id'),
-                'nombre_coordinador': evento.get('nombre_coordinador')
-            }
-            eventos_mapeados.append(evento_mapeado)
+        return [self._mapear_evento_listado(evento) for evento in resultados]
+
+    @staticmethod
+    def _formatear_hora(hora):
+        """Convierte un TIME de MySQL (timedelta) a 'HH:MM:SS'"""
+        if isinstance(hora, timedelta):
+            total_seconds = int(hora.total_seconds())
+            hours = total_seconds // 3600
+            minutes = (total_seconds % 3600) // 60
+            seconds = total_seconds % 60
+            return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+        elif hora is not None:
+            return str(hora)
+        return None
+
+    def _mapear_evento_listado(self, evento, campos=None):
+        """
+        Mapea una fila de eventos al formato de los listados.
+
+        Args:
+            evento: Fila de la consulta (diccionario)
+            campos: Lista opcional de campos a incluir (proyección)
+        """
+        # Convertir fecha a string si es necesario
+        fecha_evento = evento.get('fecha_evento')
+        if fecha_evento is not None and not isinstance(fecha_evento, str):
+            fecha_evento = str(fecha_evento)
         
-        return eventos_mapeados
-    
+        # Mapear nombres de columnas para compatibilidad con la vista
+        evento_mapeado = {
+            'id_evento': evento.get('id_evento', evento.get('id')),
+            'id': evento.get('id_evento', evento.get('id')),
+            'id_salon': evento.get('id_salon'),
+            'salon_id': evento.get('id_salon'),  # Alias para compatibilidad
+            'salon': evento.get('salon', evento.get('salon_nombre')),
+            'cliente_id': evento.get('id_cliente'),
+            'nombre_evento': evento.get('nombre_evento', evento.get('evento_nombre', 'Evento')),
+            'tipo_evento': evento.get('tipo_evento', 'Otro'),
+            'fecha_evento': fecha_evento,
+            'estado': evento.get('estado'),
+            'hora_inicio': self._formatear_hora(evento.get('hora_inicio')),
+            'hora_fin': self._formatear_hora(evento.get('hora_fin')),
+            'numero_invitados': evento.get('numero_invitados'),
+            'total': float(evento.get('total', 0) or 0),
+            'precio_total': float(evento.get('total', 0) or 0),
+            'saldo': float(evento.get('saldo', 0) or 0),
+            'saldo_pendiente': float(evento.get('saldo', 0) or 0),
+            'nombre_cliente': evento.get('nombre_cliente', 'N/A'),
+            'documento_identidad_cliente': evento.get('documento_identidad_cliente') or evento.get('documento_identidad'),
+            'nombre_salon': evento.get('nombre_salon'),
+            'nombre_plan': evento.get('nombre_plan'),
+            'coordinador_id': evento.get('coordinador_id'),
+            'nombre_coordinador': evento.get('nombre_coordinador')
+        }
+        if campos:
+            return {campo: evento_mapeado[campo] for campo in campos if campo in evento_mapeado}
+        return evento_mapeado
+
+    def listar_eventos_paginado(self, filtros=None, orden='id_desc', limite=50, cursor=None, campos=None):
+        """
+        Lista eventos con paginación por cursor (keyset), orden y proyección de campos.
+
+        Solo se seleccionan las columnas y joins que requieren los campos pedidos.
+
+        Args:
+            filtros: dict con estado, fecha, fecha_desde, fecha_hasta, cliente_id,
+                coordinador_id, id_salon
+            orden: Clave de ORDENES_LISTADO_EVENTOS
+            limite: Cantidad máxima de eventos a retornar
+            cursor: Cursor opaco retornado por la página anterior
+            campos: Lista de campos de CAMPOS_LISTADO_EVENTOS (None = todos)
+
+        Returns:
+            tuple: (eventos, siguiente_cursor) con siguiente_cursor None en la última página
+
+        Raises:
+            ValueError: Si el orden, el cursor o algún campo no son válidos
+        """
+        if orden not in ORDENES_LISTADO_EVENTOS:
+            raise ValueError(f"Orden inválido. Opciones: {', '.join(ORDENES_LISTADO_EVENTOS)}")
+        campos = list(campos) if campos else list(CAMPOS_LISTADO_EVENTOS)
+        invalidos = [campo for campo in campos if campo not in CAMPOS_LISTADO_EVENTOS]
+        if invalidos:
+            raise ValueError(f"Campos inválidos: {', '.join(invalidos)}")
+        
+        # Columnas y joins necesarios para la proyección (más las claves del cursor)
+        columnas = ['e.id_evento', 'e.fecha_evento']
+        joins = []
+        for campo in campos:
+            for columna in CAMPOS_LISTADO_EVENTOS[campo][0]:
+                if columna not in columnas:
+                    columnas.append(columna)
+            for join in CAMPOS_LISTADO_EVENTOS[campo][1]:
+                if join not in joins:
+                    joins.append(join)
+        
+        where, parametros = self._filtros_listado_eventos(filtros)
+        descendente = orden.endswith('_desc')
+        operador = '<' if descendente else '>'
+        if cursor:
+            valores_cursor = self._decodificar_cursor(cursor)
+            if orden.startswith('fecha'):
+                where.append(f"(e.fecha_evento {operador} %s OR (e.fecha_evento = %s AND e.id_evento {operador} %s))")
+                parametros.extend([valores_cursor[0], valores_cursor[0], valores_cursor[1]])
+            else:
+                where.append(f"e.id_evento {operador} %s")
+                parametros.append(valores_cursor[1])
+        
+        consulta = f"""
+        SELECT {", ".join(columnas)}
+        FROM eventos e
+        {" ".join(JOINS_LISTADO_EVENTOS[join] for join in joins)}
+        WHERE {" AND ".join(where) if where else "1=1"}
+        ORDER BY {ORDENES_LISTADO_EVENTOS[orden]}
+        LIMIT %s
+        """
+        # Se pide una fila extra para saber si existe una página siguiente
+        parametros.append(int(limite) + 1)
+        resultados = self.base_datos.obtener_todos(consulta, tuple(parametros)) or []
+        
+        siguiente_cursor = None
+        if len(resultados) > limite:
+            resultados = resultados[:limite]
+            ultimo = resultados[-1]
+            siguiente_cursor = self._codificar_cursor(ultimo.get('fecha_evento'), ultimo.get('id_evento'))
+        
+        return [self._mapear_evento_listado(evento, campos) for evento in resultados], siguiente_cursor
+
+    def contar_eventos(self, filtros=None):
+        """Cuenta los eventos que cumplen los filtros de listar_eventos_paginado"""
+        where, parametros = self._filtros_listado_eventos(filtros)
+        consulta = f"""
+        SELECT COUNT(*) AS total
+        FROM eventos e
+        WHERE {" AND ".join(where) if where else "1=1"}
+        """
+        resultado = self.base_datos.obtener_uno(consulta, tuple(parametros) if parametros else None)
+        return int(resultado['total']) if resultado else 0
+
+    @staticmethod
+    def _filtros_listado_eventos(filtros):
+        """Construye las condiciones WHERE (sobre la tabla eventos) de los listados"""
+        filtros = filtros or {}
+        where = []
+        parametros = []
+        condiciones = (
+            ('estado', "e.estado = %s"),
+            ('fecha', "e.fecha_evento = %s"),
+            ('fecha_desde', "e.fecha_evento >= %s"),
+            ('fecha_hasta', "e.fecha_evento <= %s"),
+            ('cliente_id', "e.id_cliente = %s"),
+            ('coordinador_id', "e.coordinador_id = %s"),
+            ('id_salon', "e.id_salon = %s"),
+        )
+        for clave, condicion in condiciones:
+            if filtros.get(clave) not in (None, ''):
+                where.append(condicion)
+                parametros.append(filtros[clave])
+        return where, parametros
+
+    @staticmethod
+    def _codificar_cursor(fecha_evento, id_evento):
+        """Codifica la posición (fecha_evento, id_evento) como cursor opaco"""
+        valor = json.dumps([str(fecha_evento) if fecha_evento is not None else None, id_evento])
+        return base64.urlsafe_b64encode(valor.encode('utf-8')).decode('ascii')
+
+    @staticmethod
+    def _decodificar_cursor(cursor):
+        """Decodifica un cursor generado por _codificar_cursor"""
+        try:
+            fecha_evento, id_evento = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+            return fecha_evento, int(id_evento)
+        except Exception:
+            raise ValueError("Cursor inválido")
+
     def obtener_eventos_por_cliente(self, cliente_id):
         """Obtiene todos los eventos de un cliente"""
         consulta = """
@@ -541,17 +653,15 @@ class EventoModelo:
             except Exception as e:
                 self.logger.error(f"Error al gestionar inventario al cambiar estado: {e}")
             
-            # Enviar notificación
+            # Encolar notificación (se envía en segundo plano)
             try:
-                evento = self.obtener_evento_por_id(evento_id)
-                if evento:
-                    from integraciones.notificaciones_automaticas import NotificacionesAutomaticas
-                    notif = NotificacionesAutomaticas()
-                    notif.enviar_notificacion_cambio_estado(
-                        evento=evento,
-                        estado_anterior=estado_anterior,
-                        estado_nuevo=nuevo_estado
-                    )
+                from integraciones.despachador_notificaciones import encolar_notificacion
+                encolar_notificacion(
+                    'cambio_estado',
+                    evento_id,
+                    estado_anterior=estado_anterior,
+                    estado_nuevo=nuevo_estado
+                )
             except Exception as e:
                 self.logger.error(f"Error al enviar notificación de cambio de estado: {e}")
         
@@ -829,100 +939,12 @@ class EventoModelo:
         """Verifica si hay conflictos de horario para un salón en una fecha"""
         if not salon_id or not fecha_evento or not hora_inicio or not hora_fin:
             return False
-        
-        # Convertir horas a minutos para comparación
-        def hora_a_minutos(hora_str):
-            if not hora_str:
-                return None
-            partes = str(hora_str).split(':')
-            if len(partes) < 2:
-                return None
-            try:
-                horas = int(partes[0])
-                minutos = int(partes[1])
-                return horas * 60 + minutos
-            except:
-                return None
-        
-        inicio_min = hora_a_minutos(hora_inicio)
-        fin_min = hora_a_minutos(hora_fin)
-        if inicio_min is None or fin_min is None:
+        horario = normalizar_horario(fecha_evento, hora_inicio, hora_fin)
+        if horario is None:
             return False
-        
-        # Ajustar si cruza medianoche
-        if fin_min < inicio_min or (inicio_min >= 12 * 60 and fin_min < 12 * 60):
-            fin_min += 24 * 60
-        
-        # Buscar eventos en el mismo salón y fecha (o fechas adyacentes si cruza medianoche)
-        from datetime import datetime
-        try:
-            if isinstance(fecha_evento, str):
-                fecha_obj = datetime.strptime(fecha_evento, '%Y-%m-%d').date()
-            else:
-                fecha_obj = fecha_evento
-            
-            fecha_anterior = (fecha_obj - timedelta(days=1)).strftime('%Y-%m-%d')
-            fecha_siguiente = (fecha_obj + timedelta(days=1)).strftime('%Y-%m-%d')
-        except:
-            fecha_anterior = None
-            fecha_siguiente = None
-        
-        # Construir consulta SQL
-        consulta = """
-        SELECT id_evento, fecha_evento, hora_inicio, hora_fin, estado
-        FROM eventos
-        WHERE id_salon = %s 
-        AND estado != 'cancelado'
-        AND (
-            fecha_evento = %s
-            OR (fecha_evento = %s AND hora_fin IS NOT NULL AND hora_inicio IS NOT NULL)
-            OR (fecha_evento = %s AND hora_fin IS NOT NULL AND hora_inicio IS NOT NULL)
-        )
-        """
-        params = [salon_id, fecha_evento]
-        params.append(fecha_anterior if fecha_anterior else None)
-        params.append(fecha_siguiente if fecha_siguiente else None)
-        
-        if evento_id_excluir:
-            consulta += " AND id_evento != %s"
-            params.append(evento_id_excluir)
-        
-        eventos = self.base_datos.obtener_todos(consulta, tuple(params))
-        
-        for evento in eventos:
-            ev_inicio = hora_a_minutos(evento.get('hora_inicio'))
-            ev_fin = hora_a_minutos(evento.get('hora_fin'))
-            if ev_inicio is None or ev_fin is None:
-                # Si no tiene horas, considerar conflicto si es el mismo día
-                if str(evento.get('fecha_evento')) == str(fecha_evento):
-                    return True
-                continue
-            
-            # Ajustar si cruza medianoche
-            if ev_fin < ev_inicio or (ev_inicio >= 12 * 60 and ev_fin < 12 * 60):
-                ev_fin += 24 * 60
-            
-            # Calcular offset según la fecha del evento existente
-            ev_fecha = str(evento.get('fecha_evento'))
-            fecha_evento_str = str(fecha_evento)
-            if ev_fecha == fecha_evento_str:
-                offset = 0
-            elif fecha_anterior and ev_fecha == fecha_anterior:
-                offset = -24 * 60
-            elif fecha_siguiente and ev_fecha == fecha_siguiente:
-                offset = 24 * 60
-            else:
-                continue
-            
-            ev_inicio_abs = ev_inicio + offset
-            ev_fin_abs = ev_fin + offset
-            
-            # Verificar solapamiento: los intervalos se solapan si uno empieza antes de que termine el otro
-            if inicio_min < ev_fin_abs and ev_inicio_abs < fin_min:
-                return True
-        
-        return False
-    
+        inicio, fin = horario
+        return not SalonModelo().horario_libre(salon_id, inicio, fin, evento_id_excluir)
+
     def obtener_fechas_ocupadas_salon(self, salon_id):
         """Obtiene las fechas ocupadas para un salón específico"""
         if not salon_id:
@@ -967,11 +989,50 @@ class EventoModelo:
         WHERE evento_id = %s AND descartado = FALSE
         """
         resultado = self.base_datos.obtener_uno(consulta, (evento_id,))
-        
+
         if resultado and resultado['total_servicios'] > 0:
             return round((resultado['servicios_completados'] / resultado['total_servicios']) * 100)
         return 0
 
+    def obtener_porcentajes_avance_servicios(self, evento_ids, tamano_lote=1000):
+        """
+        Calcula el porcentaje de avance de servicios de varios eventos con una
+        consulta agrupada por evento (en lotes de `tamano_lote` IDs).
+
+        Returns:
+            dict: {evento_id: porcentaje}; los eventos sin servicios no aparecen
+        """
+        ids = sorted({int(evento_id) for evento_id in evento_ids if evento_id})
+        porcentajes = {}
+        for inicio in range(0, len(ids), tamano_lote):
+            lote = ids[inicio:inicio + tamano_lote]
+            marcadores = ", ".join(["%s"] * len(lote))
+            consulta = f"""
+            SELECT evento_id,
+                   COUNT(id) AS total_servicios,
+                   SUM(CASE WHEN completado = TRUE THEN 1 ELSE 0 END) AS servicios_completados
+            FROM evento_servicios
+            WHERE descartado = FALSE AND evento_id IN ({marcadores})
+            GROUP BY evento_id
+            """
+            for fila in self.base_datos.obtener_todos(consulta, tuple(lote)) or []:
+                if fila['total_servicios'] > 0:
+                    porcentajes[fila['evento_id']] = round(
+                        (fila['servicios_completados'] / fila['total_servicios']) * 100
+                    )
+        return porcentajes
+
+    def agregar_progreso_servicios(self, eventos):
+        """Agrega 'progreso_servicios' a una lista de eventos usando una sola consulta agregada"""
+        ids = [evento.get('id_evento') or evento.get('id') for evento in eventos]
+        porcentajes = self.obtener_porcentajes_avance_servicios(ids)
+        for evento, evento_id in zip(eventos, ids):
+            if evento_id:
+                evento['progreso_servicios'] = porcentajes.get(int(evento_id), 0)
+                # Mantener compatibilidad con nombre anterior
+                evento['porcentaje_avance_servicios'] = evento['progreso_servicios']
+        return eventos
+
     def completar_evento_con_observaciones(self, evento_id, datos_finalizacion, usuario_id=None):
         """
         Completa un evento registrando observaciones y daños si aplica.
@@ -1044,17 +1105,15 @@ class EventoModelo:
                 except Exception as e:
                     self.logger.error(f"Error al gestionar inventario al completar: {e}")
             
-            # Enviar notificación de cambio de estado
+            # Encolar notificación de cambio de estado (se envía en segundo plano)
             try:
-                evento_actualizado = self.obtener_evento_por_id(evento_id)
-                if evento_actualizado:
-                    from integraciones.notificaciones_automaticas import NotificacionesAutomaticas
-                    notif = NotificacionesAutomaticas()
-                    notif.enviar_notificacion_cambio_estado(
-                        evento=evento_actualizado,
-                        estado_anterior=estado_anterior,
-                        estado_nuevo='completado'
-                    )
+                from integraciones.despachador_notificaciones import encolar_notificacion
+                encolar_notificacion(
+                    'cambio_estado',
+                    evento_id,
+                    estado_anterior=estado_anterior,
+                    estado_nuevo='completado'
+                )
             except Exception as e:
                 self.logger.error(f"Error al enviar notificación de evento completado: {e}")
             
@@ -1075,12 +1134,7 @@ class EventoModelo:
         """
         try:
             # Verificar si existe la tabla evento_danos
-            check_tabla = """
-            SELECT COUNT(*) as existe FROM information_schema.tables 
-            WHERE table_schema = DATABASE() AND table_name = 'evento_danos'
-            """
-            resultado = self.base_datos.obtener_uno(check_tabla)
-            if not resultado or resultado.get('existe', 0) == 0:
+            if not EsquemaBD.tabla_existe('evento_danos'):
                 self.logger.warning("Tabla evento_danos no existe, saltando registro de daño")
                 return None
             
@@ -1109,12 +1163,7 @@ class EventoModelo:
         """Obtiene todos los daños registrados para un evento."""
         try:
             # Verificar si existe la tabla
-            check_tabla = """
-            SELECT COUNT(*) as existe FROM information_schema.tables 
-            WHERE table_schema = DATABASE() AND table_name = 'evento_danos'
-            """
-            resultado = self.base_datos.obtener_uno(check_tabla)
-            if not resultado or resultado.get('existe', 0) == 0:
+            if not EsquemaBD.tabla_existe('evento_danos'):
                 return []
             
             consulta = """
@@ -1189,13 +1238,7 @@ class EventoModelo:
         """Obtiene la información de finalización de un evento."""
         try:
             # Verificar si existen las columnas
-            check_columna = """
-            SELECT COUNT(*) as existe FROM information_schema.columns 
-            WHERE table_schema = DATABASE() AND table_name = 'eventos' AND column_name = 'observacion_finalizacion'
-            """
-            resultado = self.base_datos.obtener_uno(check_columna)
-            
-            if not resultado or resultado.get('existe', 0) == 0:
+            if not EsquemaBD.columna_existe('eventos', 'observacion_finalizacion'):
                 return None
             
             consulta = """
@@ -1244,13 +1287,7 @@ class EventoModelo:
             danos_pagados = nuevo_monto_pagado >= costo_danos
             
             # Verificar si existen las columnas
-            check_columna = """
-            SELECT COUNT(*) as existe FROM information_schema.columns 
-            WHERE table_schema = DATABASE() AND table_name = 'eventos' AND column_name = 'danos_pagados'
-            """
-            resultado = self.base_datos.obtener_uno(check_columna)
-            
-            if not resultado or resultado.get('existe', 0) == 0:
+            if not EsquemaBD.columna_existe('eventos', 'danos_pagados'):
                 return False, "Campos de pago de daños no disponibles. Ejecute el script SQL actualizado."
             
             consulta = """
@@ -1282,13 +1319,7 @@ class EventoModelo:
         """Obtiene eventos con daños pendientes de pago"""
         try:
             # Verificar si existen las columnas
-            check_columna = """
-            SELECT COUNT(*) as existe FROM information_schema.columns 
-            WHERE table_schema = DATABASE() AND table_name = 'eventos' AND column_name = 'danos_pagados'
-            """
-            resultado = self.base_datos.obtener_uno(check_columna)
-            
-            if not resultado or resultado.get('existe', 0) == 0:
+            if not EsquemaBD.columna_existe('eventos', 'danos_pagados'):
                 return []
             
             consulta = """
@@ -1313,13 +1344,7 @@ class EventoModelo:
         """Obtiene resumen de daños para reportes"""
         try:
             # Verificar si existen las columnas
-            check_columna = """
-            SELECT COUNT(*) as existe FROM information_schema.columns 
-            WHERE table_schema = DATABASE() AND table_name = 'eventos' AND column_name = 'danos_pagados'
-            """
-            resultado = self.base_datos.obtener_uno(check_columna)
-            
-            if not resultado or resultado.get('existe', 0) == 0:
+            if not EsquemaBD.columna_existe('eventos', 'danos_pagados'):
                 return {}
             
             where_fecha = ""
@@ -3,6 +3,7 @@ Modelo para gestión de configuraciones de integraciones externas
 """
 import json
 from modelos.base_datos import BaseDatos
+from utilidades.cache_configuracion import cache_configuracion
 
 
 class IntegracionModelo:
@@ -12,6 +13,12 @@ class IntegracionModelo:
         self.base_datos = BaseDatos()
 
     def obtener_integracion(self, tipo_integracion):
+        return cache_configuracion.obtener(
+            f"integracion:{tipo_integracion}",
+            lambda: self._leer_integracion(tipo_integracion)
+        )
+
+    def _leer_integracion(self, tipo_integracion):
         consulta = """
         SELECT * FROM configuracion_integraciones
         WHERE tipo_integracion = %s
@@ -27,6 +34,12 @@ class IntegracionModelo:
         return resultado
 
     def guardar_integracion(self, tipo_integracion, nombre, configuracion, activo):
+        try:
+            return self._guardar_integracion(tipo_integracion, nombre, configuracion, activo)
+        finally:
+            cache_configuracion.invalidar("integracion")
+
+    def _guardar_integracion(self, tipo_integracion, nombre, configuracion, activo):
         configuracion_json = json.dumps(configuracion or {})
         existente = self.base_datos.obtener_uno(
             "SELECT id FROM configuracion_integraciones WHERE tipo_integracion = %s ORDER BY id DESC LIMIT 1",
@@ -11,42 +11,6 @@ class InventarioModelo:
     def __init__(self):
         self.base_datos = BaseDatos()
         self.logger = obtener_logger()
-        self._asegurar_columnas_producto()
-        self._asegurar_tabla_movimientos()
-    
-    def _asegurar_tabla_movimientos(self):
-        """Crea la tabla movimientos_inventario si no existe"""
-        try:
-            consulta = """
-            SELECT COUNT(*) as total
-            FROM information_schema.TABLES
-            WHERE TABLE_SCHEMA = DATABASE()
-              AND TABLE_NAME = 'movimientos_inventario'
-            """
-            existe = self.base_datos.obtener_uno(consulta) or {}
-            if int(existe.get("total") or 0) == 0:
-                self.base_datos.ejecutar_consulta("""
-                    CREATE TABLE movimientos_inventario (
-                        id INT AUTO_INCREMENT PRIMARY KEY,
-                        producto_id INT NOT NULL,
-                        tipo_movimiento ENUM('entrada', 'salida', 'ajuste', 'reserva', 'devolucion') NOT NULL,
-                        cantidad INT NOT NULL,
-                        stock_anterior INT NOT NULL,
-                        stock_nuevo INT NOT NULL,
-                        motivo VARCHAR(255),
-                        referencia_tipo ENUM('evento', 'compra', 'ajuste_manual', 'devolucion', 'otro') DEFAULT 'otro',
-                        referencia_id INT DEFAULT NULL,
-                        usuario_id INT,
-                        fecha_movimiento TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        observaciones TEXT,
-                        INDEX idx_producto_id (producto_id),
-                        INDEX idx_tipo_movimiento (tipo_movimiento),
-                        INDEX idx_fecha_movimiento (fecha_movimiento)
-                    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
-                """)
-                self.logger.info("Tabla movimientos_inventario creada correctamente")
-        except Exception as e:
-            self.logger.error(f"Error al crear tabla movimientos_inventario: {e}")
     
     def registrar_movimiento(self, producto_id, tipo_movimiento, cantidad, stock_anterior, stock_nuevo, 
                               motivo=None, referencia_tipo='otro', referencia_id=None, usuario_id=None):
@@ -67,53 +31,6 @@ class InventarioModelo:
             self.logger.error(f"Error al registrar movimiento de inventario: {e}")
             return False
     
-    def _asegurar_columnas_producto(self):
-        """Asegura que los productos tengan las columnas necesarias para control de inventario"""
-        try:
-            # Verificar si existe control_inventario
-            consulta = """
-            SELECT COUNT(*) as total
-            FROM information_schema.COLUMNS
-            WHERE TABLE_SCHEMA = DATABASE()
-              AND TABLE_NAME = 'productos'
-              AND COLUMN_NAME = 'control_inventario'
-            """
-            existe = self.base_datos.obtener_uno(consulta) or {}
-            if int(existe.get("total") or 0) == 0:
-                self.base_datos.ejecutar_consulta(
-                    "ALTER TABLE productos ADD COLUMN control_inventario ENUM('ilimitado', 'controlado') DEFAULT 'ilimitado'"
-                )
-            
-            # Verificar si existe stock_minimo
-            consulta = """
-            SELECT COUNT(*) as total
-            FROM information_schema.COLUMNS
-            WHERE TABLE_SCHEMA = DATABASE()
-              AND TABLE_NAME = 'productos'
-              AND COLUMN_NAME = 'stock_minimo'
-            """
-            existe = self.base_datos.obtener_uno(consulta) or {}
-            if int(existe.get("total") or 0) == 0:
-                self.base_datos.ejecutar_consulta(
-                    "ALTER TABLE productos ADD COLUMN stock_minimo INT DEFAULT 0"
-                )
-            
-            # Verificar si existe alerta_stock_bajo
-            consulta = """
-            SELECT COUNT(*) as total
-            FROM information_schema.COLUMNS
-            WHERE TABLE_SCHEMA = DATABASE()
-              AND TABLE_NAME = 'productos'
-              AND COLUMN_NAME = 'alerta_stock_bajo'
-            """
-            existe = self.base_datos.obtener_uno(consulta) or {}
-            if int(existe.get("total") or 0) == 0:
-                self.base_datos.ejecutar_consulta(
-                    "ALTER TABLE productos ADD COLUMN alerta_stock_bajo BOOLEAN DEFAULT TRUE"
-                )
-        except Exception as e:
-            self.logger.warning(f"Error al asegurar columnas de inventario: {e}")
-    
     def obtener_stock_disponible(self, producto_id):
         """Obtiene el stock disponible de un producto"""
         consulta = """
@@ -0,0 +1,218 @@
+"""
+Modelo para los agregados diarios (rollups) de indicadores
+Mantiene las tablas kpi_*_diario a partir de eventos, pagos,
+historial_notificaciones y whatsapp_mensajes, refrescando solo los días
+afectados desde la última marca de agua
+"""
+import time
+from modelos.base_datos import BaseDatos
+from modelos.esquema import EsquemaBD
+from utilidades.logger import obtener_logger
+
+
+# Horas entre reconstrucciones completas: recogen los borrados y el día anterior
+# de un evento o pago cuya fecha cambió (el incremental solo ve la fecha nueva)
+HORAS_RECONSTRUCCION_COMPLETA = 24
+# Máximo de fechas por sentencia DELETE/INSERT en el refresco incremental
+TAMANO_LOTE_FECHAS = 200
+
+ROLLUPS = ('eventos', 'pagos', 'notificaciones', 'whatsapp')
+
+
+class KpiRollupModelo:
+    """Clase para refrescar las tablas de agregados diarios"""
+
+    def __init__(self):
+        self.base_datos = BaseDatos()
+        self.logger = obtener_logger()
+
+    def _columna_existe(self, tabla, columna):
+        return EsquemaBD.columna_existe(tabla, columna)
+
+    def _tabla_existe(self, tabla):
+        return EsquemaBD.tabla_existe(tabla)
+
+    def obtener_estado(self):
+        """Devuelve la marca de agua y la última ejecución de cada rollup"""
+        filas = self.base_datos.obtener_todos(
+            "SELECT rollup, marca_agua, ultima_reconstruccion, filas_afectadas, duracion_ms, "
+            "fecha_actualizacion FROM kpi_rollup_estado ORDER BY rollup"
+        ) or []
+        return {fila['rollup']: fila for fila in filas}
+
+    def _definicion(self, nombre):
+        """
+        SQL de cada rollup
+
+        Returns:
+            dict con tabla destino, INSERT ... SELECT (con marcador {filtro}),
+            columna de origen para filtrar por fecha y tabla de origen
+        """
+        if nombre == 'eventos':
+            return {
+                'tabla': 'kpi_eventos_diario',
+                'origen': 'eventos',
+                'columna_fecha': 'fecha_evento',
+                'por_rango': False,
+                'insertar': """
+                INSERT INTO kpi_eventos_diario (fecha, estado, id_salon, cantidad, total, saldo, invitados)
+                SELECT fecha_evento, COALESCE(estado, ''), COALESCE(id_salon, 0), COUNT(*),
+                       COALESCE(SUM(total), 0), COALESCE(SUM(saldo), 0), COALESCE(SUM(numero_invitados), 0)
+                FROM eventos
+                WHERE {filtro}
+                GROUP BY fecha_evento, COALESCE(estado, ''), COALESCE(id_salon, 0)
+                """,
+                'afectadas': """
+                SELECT DISTINCT fecha_evento AS fecha
+                FROM eventos
+                WHERE fecha_actualizacion >= %s
+                """
+            }
+        if nombre == 'pagos':
+            cuenta = 'COALESCE(cuenta_id, 0)' if self._columna_existe('pagos', 'cuenta_id') else '0'
+            estado = "COALESCE(estado_pago, '')" if self._columna_existe('pagos', 'estado_pago') else "''"
+            return {
+                'tabla': 'kpi_pagos_diario',
+                'origen': 'pagos',
+                'columna_fecha': 'fecha_pago',
+                'por_rango': False,
+                'insertar': f"""
+                INSERT INTO kpi_pagos_diario (fecha, cuenta_id, tipo_pago, estado_pago, cantidad, monto)
+                SELECT fecha_pago, {cuenta}, COALESCE(tipo_pago, ''), {estado}, COUNT(*), COALESCE(SUM(monto), 0)
+                FROM pagos
+                WHERE {{filtro}}
+                GROUP BY fecha_pago, {cuenta}, COALESCE(tipo_pago, ''), {estado}
+                """,
+                # fecha_actualizacion cambia también al aprobar o rechazar el pago (migración 0007)
+                'afectadas': """
+                SELECT DISTINCT fecha_pago AS fecha
+                FROM pagos
+                WHERE fecha_actualizacion >= %s
+                """
+            }
+        if nombre == 'notificaciones':
+            costo_email = 'SUM(COALESCE(costo_email, 0))' \
+                if self._columna_existe('historial_notificaciones', 'costo_email') else 'NULL'
+            costo_whatsapp = 'SUM(COALESCE(costo_whatsapp, 0))' \
+                if self._columna_existe('historial_notificaciones', 'costo_whatsapp') else 'NULL'
+            return {
+                'tabla': 'kpi_notificaciones_diario',
+                'origen': 'historial_notificaciones',
+                'columna_fecha': 'fecha_envio',
+                'por_rango': True,
+                'insertar': f"""
+                INSERT INTO kpi_notificaciones_diario (fecha, tipo_notificacion, canal, enviados, costo_email, costo_whatsapp)
+                SELECT DATE(fecha_envio), COALESCE(tipo_notificacion, ''), COALESCE(canal, ''), COUNT(*),
+                       {costo_email}, {costo_whatsapp}
+                FROM historial_notificaciones
+                WHERE enviado = TRUE AND fecha_envio IS NOT NULL AND {{filtro}}
+                GROUP BY DATE(fecha_envio), COALESCE(tipo_notificacion, ''), COALESCE(canal, '')
+                """
+            }
+        if nombre == 'whatsapp':
+            costo = 'SUM(COALESCE(costo_total, 0))' \
+                if self._columna_existe('whatsapp_mensajes', 'costo_total') else 'NULL'
+            return {
+                'tabla': 'kpi_whatsapp_diario',
+                'origen': 'whatsapp_mensajes',
+                'columna_fecha': 'fecha_creacion',
+                'por_rango': True,
+                'insertar': f"""
+                INSERT INTO kpi_whatsapp_diario (fecha, direccion, origen, cantidad, costo)
+                SELECT DATE(fecha_creacion), COALESCE(direccion, ''), COALESCE(origen, ''), COUNT(*), {costo}
+                FROM whatsapp_mensajes
+                WHERE fecha_creacion IS NOT NULL AND {{filtro}}
+                GROUP BY DATE(fecha_creacion), COALESCE(direccion, ''), COALESCE(origen, '')
+                """
+            }
+        raise ValueError(f"Rollup desconocido: {nombre}")
+
+    def refrescar(self, completo=False):
+        """
+        Refresca todos los rollups
+
+        Args:
+            completo: Si es True reconstruye las tablas desde cero
+
+        Returns:
+            dict: {rollup: {modo, filas, duracion_ms} o {error}}
+        """
+        resultados = {}
+        for nombre in ROLLUPS:
+            try:
+                resultados[nombre] = self.refrescar_rollup(nombre, completo=completo)
+            except Exception as e:
+                self.logger.error(f"Error al refrescar rollup {nombre}: {e}")
+                resultados[nombre] = {'error': str(e)}
+        return resultados
+
+    def refrescar_rollup(self, nombre, completo=False):
+        """
+        Refresca un rollup desde su marca de agua
+
+        Sin marca de agua, con completo=True o si la última reconstrucción
+        tiene más de HORAS_RECONSTRUCCION_COMPLETA horas, se reconstruye la
+        tabla completa; en otro caso solo se recalculan los días afectados.
+        """
+        definicion = self._definicion(nombre)
+        if not self._tabla_existe(definicion['origen']):
+            return {'modo': 'omitido', 'filas': 0, 'duracion_ms': 0}
+
+        inicio = time.monotonic()
+        estado = self.base_datos.obtener_uno(
+            "SELECT marca_agua, ultima_reconstruccion, "
+            "ultima_reconstruccion < NOW() - INTERVAL %s HOUR AS reconstruir, NOW() AS ahora "
+            "FROM kpi_rollup_estado WHERE rollup = %s",
+            (HORAS_RECONSTRUCCION_COMPLETA, nombre)
+        )
+        if estado:
+            ahora = estado['ahora']
+        else:
+            ahora = (self.base_datos.obtener_uno("SELECT NOW() AS ahora") or {}).get('ahora')
+        marca_agua = estado.get('marca_agua') if estado else None
+        completo = completo or not marca_agua or not estado.get('ultima_reconstruccion') \
+            or bool(estado.get('reconstruir'))
+
+        tabla = definicion['tabla']
+        columna = definicion['columna_fecha']
+        filas = 0
+        with self.base_datos.transaccion() as cursor:
+            if completo:
+                cursor.execute(f"DELETE FROM {tabla}")
+                cursor.execute(definicion['insertar'].format(filtro='1 = 1'))
+                filas = cursor.rowcount
+            elif definicion['por_rango']:
+                # Las tablas de mensajes solo crecen: basta con recalcular desde el día de la marca
+                cursor.execute(f"DELETE FROM {tabla} WHERE fecha >= DATE(%s)", (marca_agua,))
+                cursor.execute(definicion['insertar'].format(filtro=f"{columna} >= DATE(%s)"), (marca_agua,))
+                filas = cursor.rowcount
+            else:
+                cursor.execute(definicion['afectadas'], (marca_agua,))
+                fechas = [fila['fecha'] for fila in cursor.fetchall() if fila.get('fecha')]
+                for i in range(0, len(fechas), TAMANO_LOTE_FECHAS):
+                    lote = fechas[i:i + TAMANO_LOTE_FECHAS]
+                    marcadores = ', '.join(['%s'] * len(lote))
+                    cursor.execute(f"DELETE FROM {tabla} WHERE fecha IN ({marcadores})", tuple(lote))
+                    cursor.execute(
+                        definicion['insertar'].format(filtro=f"{columna} IN ({marcadores})"),
+                        tuple(lote)
+                    )
+                    filas += cursor.rowcount
+
+            duracion_ms = int((time.monotonic() - inicio) * 1000)
+            cursor.execute(
+                """
+                INSERT INTO kpi_rollup_estado (rollup, marca_agua, ultima_reconstruccion, filas_afectadas, duracion_ms)
+                VALUES (%s, %s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE
+                    marca_agua = VALUES(marca_agua),
+                    ultima_reconstruccion = COALESCE(VALUES(ultima_reconstruccion), ultima_reconstruccion),
+                    filas_afectadas = VALUES(filas_afectadas),
+                    duracion_ms = VALUES(duracion_ms)
+                """,
+                (nombre, ahora, ahora if completo else None, filas, duracion_ms)
+            )
+
+        modo = 'completo' if completo else 'incremental'
+        self.logger.info(f"Rollup {nombre} refrescado ({modo}): {filas} filas en {duracion_ms} ms")
+        return {'modo': modo, 'filas': filas, 'duracion_ms': duracion_ms}
@@ -186,7 +186,6 @@ class NotificacionModelo:
         costo_whatsapp=None,
     ):
         """Registra un envío de notificación en el historial"""
-        self._asegurar_columnas_costos()
         consulta = """
         INSERT INTO historial_notificaciones 
         (id_evento, tipo_notificacion, canal, destinatario, asunto, mensaje, enviado, fecha_envio, error, costo_email, costo_whatsapp)
@@ -210,28 +209,6 @@ class NotificacionModelo:
             return self.base_datos.obtener_ultimo_id()
         return None
 
-    def _asegurar_columnas_costos(self):
-        try:
-            consulta = """
-            SELECT COLUMN_NAME
-            FROM information_schema.COLUMNS
-            WHERE TABLE_SCHEMA = DATABASE()
-              AND TABLE_NAME = 'historial_notificaciones'
-              AND COLUMN_NAME IN ('costo_email', 'costo_whatsapp')
-            """
-            existentes = self.base_datos.obtener_todos(consulta) or []
-            columnas = {row.get("COLUMN_NAME") for row in existentes}
-            if "costo_email" not in columnas:
-                self.base_datos.ejecutar_consulta(
-                    "ALTER TABLE historial_notificaciones ADD COLUMN costo_email DECIMAL(10,4) NULL"
-                )
-            if "costo_whatsapp" not in columnas:
-                self.base_datos.ejecutar_consulta(
-                    "ALTER TABLE historial_notificaciones ADD COLUMN costo_whatsapp DECIMAL(10,4) NULL"
-                )
-        except Exception:
-            pass
-    
     def obtener_historial_evento(self, evento_id):
         """Obtiene el historial de notificaciones de un evento"""
         consulta = """
@@ -78,6 +78,50 @@ class NotificacionModeloV2:
                 pass
             return False
     
+    def marcar_como_enviadas_lote(self, resultados):
+        """
+        Registra el resultado de varios envíos en una sola transacción
+        Equivale a llamar marcar_notificacion_enviada() por cada uno
+        Parámetros:
+            resultados: lista de tuplas (notificacion_id, exito, error)
+        """
+        if not resultados:
+            return True
+        exitosas = [notif_id for notif_id, exito, _ in resultados if exito]
+        fallidas = [(error, notif_id) for notif_id, exito, error in resultados if not exito]
+        try:
+            with self.base_datos.transaccion() as cursor:
+                if exitosas:
+                    marcadores = ', '.join(['%s'] * len(exitosas))
+                    cursor.execute(f"""
+                    INSERT INTO historial_notificaciones (
+                        id_evento, tipo_notificacion, canal, destinatario,
+                        asunto, mensaje, enviado, fecha_envio
+                    )
+                    SELECT id_evento, tipo_notificacion, canal,
+                           COALESCE(destinatario_email, destinatario_telefono),
+                           asunto, COALESCE(mensaje_email, mensaje_whatsapp), TRUE, NOW()
+                    FROM notificaciones_pendientes
+                    WHERE id IN ({marcadores})
+                    """, tuple(exitosas))
+                    cursor.execute(f"""
+                    UPDATE notificaciones_pendientes
+                    SET enviado = TRUE, fecha_envio = NOW(), error = NULL
+                    WHERE id IN ({marcadores})
+                    """, tuple(exitosas))
+                if fallidas:
+                    cursor.executemany(
+                        "UPDATE notificaciones_pendientes SET intentos = intentos + 1, error = %s WHERE id = %s",
+                        fallidas
+                    )
+            return True
+        except Exception as e:
+            print(f"Error al marcar lote de {len(resultados)} notificaciones, se marcan una a una: {e}")
+            ok = True
+            for notif_id, exito, error in resultados:
+                ok = self.marcar_como_enviada(notif_id, exito, error) and ok
+            return ok
+
     def generar_notificaciones_programadas(self):
         """
         Genera notificaciones programadas usando procedimiento almacenado
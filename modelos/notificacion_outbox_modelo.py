@@ -0,0 +1,117 @@
+"""
+Modelo de la cola (outbox) de notificaciones automáticas
+"""
+import json
+import uuid
+from modelos.base_datos import BaseDatos
+from utilidades.logger import obtener_logger
+
+
+# Espera entre reintentos: 30 s, 60 s, 120 s ... hasta 1 hora
+REINTENTO_BASE_SEGUNDOS = 30
+REINTENTO_MAXIMO_SEGUNDOS = 3600
+
+
+class NotificacionOutboxModelo:
+    """Clase para encolar y reclamar envíos de notificaciones"""
+
+    def __init__(self):
+        self.base_datos = BaseDatos()
+        self.logger = obtener_logger()
+
+    def encolar(self, tipo, datos, evento_id=None, max_intentos=5):
+        """
+        Registra un envío pendiente
+
+        Args:
+            tipo: Tipo de notificación ('cambio_estado', 'pago', 'pago_anulado')
+            datos: dict serializable a JSON con los parámetros del envío
+            evento_id: ID del evento relacionado
+
+        Returns:
+            int: ID del registro o None si no se pudo encolar
+        """
+        consulta = """
+        INSERT INTO notificaciones_outbox (tipo, evento_id, datos, max_intentos)
+        VALUES (%s, %s, %s, %s)
+        """
+        parametros = (tipo, evento_id, json.dumps(datos, default=str), max_intentos)
+        if self.base_datos.ejecutar_consulta(consulta, parametros):
+            return self.base_datos.obtener_ultimo_id()
+        return None
+
+    def reclamar(self, limite=5, bloqueo_segundos=300):
+        """
+        Toma hasta `limite` envíos listos y los marca como 'procesando'
+
+        El UPDATE con un token único evita que dos hilos o procesos tomen el
+        mismo registro. También recupera los 'procesando' cuyo bloqueo venció
+        (proceso caído a mitad de un envío).
+
+        Returns:
+            list: registros reclamados (con 'datos' ya decodificado)
+        """
+        token = uuid.uuid4().hex
+        consulta = """
+        UPDATE notificaciones_outbox
+        SET estado = 'procesando', bloqueado_por = %s, bloqueado_en = NOW(), intentos = intentos + 1
+        WHERE (estado = 'pendiente' AND proximo_intento <= NOW())
+           OR (estado = 'procesando' AND bloqueado_en < NOW() - INTERVAL %s SECOND)
+        ORDER BY id
+        LIMIT %s
+        """
+        if not self.base_datos.ejecutar_consulta(consulta, (token, int(bloqueo_segundos), int(limite))):
+            return []
+        registros = self.base_datos.obtener_todos(
+            "SELECT * FROM notificaciones_outbox WHERE bloqueado_por = %s AND estado = 'procesando' ORDER BY id",
+            (token,)
+        ) or []
+        for registro in registros:
+            try:
+                registro['datos'] = json.loads(registro.get('datos') or '{}')
+            except (TypeError, ValueError):
+                registro['datos'] = {}
+        return registros
+
+    def marcar_enviado(self, outbox_id):
+        consulta = """
+        UPDATE notificaciones_outbox
+        SET estado = 'enviado', fecha_envio = NOW(), bloqueado_por = NULL, ultimo_error = NULL
+        WHERE id = %s
+        """
+        return self.base_datos.ejecutar_consulta(consulta, (outbox_id,))
+
+    def marcar_descartado(self, outbox_id, motivo):
+        """Envío que no se reintenta (p. ej. el evento ya no existe)"""
+        consulta = """
+        UPDATE notificaciones_outbox
+        SET estado = 'descartado', bloqueado_por = NULL, ultimo_error = %s
+        WHERE id = %s
+        """
+        return self.base_datos.ejecutar_consulta(consulta, (str(motivo)[:2000], outbox_id))
+
+    def marcar_error(self, outbox_id, error, intentos, max_intentos):
+        """Programa un reintento con espera exponencial o marca el envío como fallido"""
+        if intentos >= max_intentos:
+            consulta = """
+            UPDATE notificaciones_outbox
+            SET estado = 'fallido', bloqueado_por = NULL, ultimo_error = %s
+            WHERE id = %s
+            """
+            return self.base_datos.ejecutar_consulta(consulta, (str(error)[:2000], outbox_id))
+
+        espera = min(REINTENTO_BASE_SEGUNDOS * (2 ** max(intentos - 1, 0)), REINTENTO_MAXIMO_SEGUNDOS)
+        consulta = """
+        UPDATE notificaciones_outbox
+        SET estado = 'pendiente', bloqueado_por = NULL, ultimo_error = %s,
+            proximo_intento = NOW() + INTERVAL %s SECOND
+        WHERE id = %s
+        """
+        return self.base_datos.ejecutar_consulta(consulta, (str(error)[:2000], espera, outbox_id))
+
+    def obtener_resumen(self):
+        """Cantidad de envíos por estado"""
+        filas = self.base_datos.obtener_todos(
+            "SELECT estado, COUNT(*) AS total FROM notificaciones_outbox GROUP BY estado"
+        ) or []
+        return {fila['estado']: int(fila['total'] or 0) for fila in filas}
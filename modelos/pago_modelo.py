@@ -2,6 +2,7 @@
 Modelo para gestión de pagos y abonos
 """
 from modelos.base_datos import BaseDatos
+from modelos.esquema import EsquemaBD
 from modelos.evento_modelo import EventoModelo
 from utilidades.logger import obtener_logger
 from integraciones.notificaciones_automaticas import NotificacionesAutomaticas
@@ -13,47 +14,10 @@ class PagoModelo:
     def __init__(self):
         self.base_datos = BaseDatos()
         self.logger = obtener_logger()
-        self._pagos_columnas_cache = None
-        self._asegurar_columna_estado_pago()
-        self._asegurar_columna_cuenta_id()
 
     def _pagos_tiene_columna(self, nombre):
-        if self._pagos_columnas_cache is None:
-            try:
-                columnas = self.base_datos.obtener_todos("SHOW COLUMNS FROM pagos")
-                self._pagos_columnas_cache = {col.get("Field") for col in columnas if col.get("Field")}
-            except Exception as e:
-                self.logger.warning(f"No se pudieron cargar columnas de pagos: {e}")
-                self._pagos_columnas_cache = set()
-        return nombre in self._pagos_columnas_cache
+        return EsquemaBD.columna_existe("pagos", nombre)
 
-    def _asegurar_columna_estado_pago(self):
-        if self._pagos_tiene_columna("estado_pago"):
-            return
-        try:
-            self.base_datos.ejecutar_consulta(
-                "ALTER TABLE pagos ADD COLUMN estado_pago ENUM('en_revision','aprobado','rechazado') "
-                "DEFAULT 'en_revision' AFTER tipo_pago"
-            )
-            self._pagos_columnas_cache = None
-            self._pagos_tiene_columna("estado_pago")
-        except Exception as e:
-            self.logger.warning(f"No se pudo crear la columna estado_pago en pagos: {e}")
-    
-    def _asegurar_columna_cuenta_id(self):
-        """Asegura que exista la columna cuenta_id para relacionar pagos con cuentas"""
-        if self._pagos_tiene_columna("cuenta_id"):
-            return
-        try:
-            self.base_datos.ejecutar_consulta(
-                "ALTER TABLE pagos ADD COLUMN cuenta_id INT NULL AFTER metodo_pago"
-            )
-            self._pagos_columnas_cache = None
-            self._pagos_tiene_columna("cuenta_id")
-            self.logger.info("Columna cuenta_id agregada a tabla pagos")
-        except Exception as e:
-            self.logger.warning(f"No se pudo crear la columna cuenta_id en pagos: {e}")
-    
     def crear_pago(self, datos_pago):
         """Crea un nuevo pago o abono
         
@@ -342,18 +306,19 @@ class PagoModelo:
         else:
             tipo_notif = 'abono'
 
-        from integraciones.notificaciones_automaticas import NotificacionesAutomaticas
-        notif = NotificacionesAutomaticas()
+        # Se encola y se envía en segundo plano (SMTP/WhatsApp no bloquean el request)
+        from integraciones.despachador_notificaciones import encolar_notificacion
         saldo_pendiente = float(evento.get('saldo', 0) or 0)
-        notif.enviar_notificacion_pago(
-            evento=evento,
+        encolar_notificacion(
+            'pago',
+            evento.get('id_evento'),
             monto=float(monto),
             tipo_pago=tipo_notif,
             metodo_pago=metodo_pago,
             fecha_pago=str(fecha_pago),
             saldo_pendiente=saldo_pendiente
         )
-        self.logger.debug(f"Notificación enviada para pago evento {evento.get('id_evento')}, Tipo: {tipo_notif}")
+        self.logger.debug(f"Notificación encolada para pago evento {evento.get('id_evento')}, Tipo: {tipo_notif}")
     
     def actualizar_saldo_evento(self, evento_id):
         """Actualiza el saldo pendiente de un evento basado en los pagos
@@ -0,0 +1,332 @@
+"""
+Modelo para reportes y métricas agregadas
+Calcula los indicadores directamente en MySQL (GROUP BY / SUM condicional)
+en lugar de cargar todas las filas en Python.
+
+Cuando los rollups diarios (kpi_*_diario, ver KpiRollupModelo) están al día,
+los días cerrados se leen de ellos y solo el día actual en adelante se
+calcula sobre las tablas de origen.
+"""
+import threading
+import time
+from datetime import date
+from modelos.base_datos import BaseDatos
+from modelos.esquema import EsquemaBD
+
+
+ESTADOS_EVENTO = ('cotizacion', 'confirmado', 'en_proceso', 'completado', 'cancelado')
+
+# Segundos que se recuerda si un rollup está al día antes de volver a consultarlo
+SEGUNDOS_CACHE_VIGENCIA_ROLLUP = 60
+
+
+class ReporteModelo:
+    """Clase para consultas agregadas de reportes"""
+
+    # Caché compartida entre instancias: {(rollup, fecha): (vigente, expira)}
+    _vigencia_rollups = {}
+    _vigencia_lock = threading.Lock()
+
+    def __init__(self):
+        self.base_datos = BaseDatos()
+
+    def _columna_existe(self, tabla, columna):
+        return EsquemaBD.columna_existe(tabla, columna)
+
+    def _rollup_vigente(self, rollup):
+        """Indica si el rollup fue refrescado hoy (sus días cerrados están completos)"""
+        clave = (rollup, date.today())
+        ahora = time.monotonic()
+        with self._vigencia_lock:
+            vigente, expira = self._vigencia_rollups.get(clave, (None, 0))
+        if vigente is not None and ahora < expira:
+            return vigente
+        try:
+            fila = self.base_datos.obtener_uno(
+                "SELECT marca_agua >= CURDATE() AS vigente FROM kpi_rollup_estado WHERE rollup = %s",
+                (rollup,)
+            ) or {}
+            vigente = bool(fila.get('vigente'))
+        except Exception:
+            # Tabla de rollups aún no creada: se calcula todo en vivo
+            vigente = False
+        with self._vigencia_lock:
+            for vencida in [k for k, valor in self._vigencia_rollups.items() if valor[1] <= ahora]:
+                del self._vigencia_rollups[vencida]
+            self._vigencia_rollups[clave] = (vigente, ahora + SEGUNDOS_CACHE_VIGENCIA_ROLLUP)
+        return vigente
+
+    @staticmethod
+    def _condiciones_fecha(columna, fecha_desde=None, fecha_hasta=None, fecha_hora=False):
+        """Condiciones de rango (fecha_hasta incluye el día completo en columnas DATETIME)"""
+        condiciones = []
+        parametros = []
+        if fecha_desde:
+            condiciones.append(f"{columna} >= %s")
+            parametros.append(fecha_desde)
+        if fecha_hasta:
+            condiciones.append(f"{columna} <= %s")
+            parametros.append(f"{fecha_hasta} 23:59:59" if fecha_hora else fecha_hasta)
+        return condiciones, parametros
+
+    def _obtener_filtrado(self, consulta, condiciones, parametros):
+        where = " AND ".join(condiciones) if condiciones else "1 = 1"
+        return self.base_datos.obtener_todos(
+            consulta.format(condiciones=where),
+            tuple(parametros) if parametros else None
+        ) or []
+
+    def _filas_combinadas(self, rollup, consulta_rollup, consulta_vivo, columna_vivo,
+                          fecha_desde=None, fecha_hasta=None, fecha_hora=False):
+        """
+        Filas de los días cerrados desde el rollup más las del día actual en vivo
+
+        Ambas consultas llevan el marcador {condiciones} y devuelven las mismas
+        columnas; el llamador suma las filas por su clave. Si el rollup no está
+        al día se usa solo la consulta en vivo sobre todo el rango.
+
+        Los días cerrados reflejan las altas y modificaciones hasta el último
+        refresco (SCHEDULER_INTERVALO_ROLLUPS). Los borrados, y el día anterior
+        de un evento o pago al que se le cambió la fecha, se corrigen en la
+        siguiente reconstrucción completa (cada HORAS_RECONSTRUCCION_COMPLETA
+        horas): es la demora máxima aceptada para el tablero.
+        """
+        condiciones_vivo, parametros_vivo = self._condiciones_fecha(
+            columna_vivo, fecha_desde, fecha_hasta, fecha_hora
+        )
+        if not self._rollup_vigente(rollup):
+            return self._obtener_filtrado(consulta_vivo, condiciones_vivo, parametros_vivo)
+
+        condiciones, parametros = self._condiciones_fecha('k.fecha', fecha_desde, fecha_hasta)
+        filas = list(self._obtener_filtrado(consulta_rollup, ['k.fecha < CURDATE()'] + condiciones, parametros))
+        filas.extend(self._obtener_filtrado(
+            consulta_vivo, [f"{columna_vivo} >= CURDATE()"] + condiciones_vivo, parametros_vivo
+        ))
+        return filas
+
+    @staticmethod
+    def _sumar_por(filas, clave, campos):
+        """Suma los campos de las filas agrupando por clave; los costos NULL se conservan como None"""
+        agrupado = {}
+        for fila in filas:
+            llave = clave(fila)
+            destino = agrupado.setdefault(llave, {campo: None for campo in campos})
+            for campo in campos:
+                valor = fila.get(campo)
+                if valor is not None:
+                    destino[campo] = (destino[campo] or 0) + valor
+        return agrupado
+
+    def obtener_resumen_eventos_por_estado(self, fecha_desde=None, fecha_hasta=None):
+        """
+        Agrupa los eventos por estado
+
+        Returns:
+            dict: {estado: {cantidad, total_ingresos, total_pendiente, total_invitados}}
+        """
+        consulta_rollup = """
+        SELECT k.estado,
+               SUM(k.cantidad) AS cantidad,
+               SUM(k.total) AS total_ingresos,
+               SUM(k.saldo) AS total_pendiente,
+               SUM(k.invitados) AS total_invitados
+        FROM kpi_eventos_diario k
+        WHERE {condiciones}
+        GROUP BY k.estado
+        """
+        consulta_vivo = """
+        SELECT e.estado,
+               COUNT(*) AS cantidad,
+               COALESCE(SUM(e.total), 0) AS total_ingresos,
+               COALESCE(SUM(e.saldo), 0) AS total_pendiente,
+               COALESCE(SUM(e.numero_invitados), 0) AS total_invitados
+        FROM eventos e
+        WHERE {condiciones}
+        GROUP BY e.estado
+        """
+        filas = self._filas_combinadas('eventos', consulta_rollup, consulta_vivo, 'e.fecha_evento',
+                                       fecha_desde, fecha_hasta)
+        agrupado = self._sumar_por(
+            filas, lambda fila: fila.get('estado') or 'sin_estado',
+            ('cantidad', 'total_ingresos', 'total_pendiente', 'total_invitados')
+        )
+        resumen = {}
+        for estado, datos in agrupado.items():
+            resumen[estado] = {
+                'cantidad': int(datos['cantidad'] or 0),
+                'total_ingresos': float(datos['total_ingresos'] or 0),
+                'total_pendiente': float(datos['total_pendiente'] or 0),
+                'total_invitados': int(datos['total_invitados'] or 0)
+            }
+        return resumen
+
+    def obtener_metricas_eventos(self, fecha_desde=None, fecha_hasta=None):
+        """Totales de eventos, dinero e invitados a partir del resumen por estado"""
+        resumen = self.obtener_resumen_eventos_por_estado(fecha_desde, fecha_hasta)
+        metricas = {
+            'total': sum(datos['cantidad'] for datos in resumen.values()),
+            'total_ingresos': sum(datos['total_ingresos'] for datos in resumen.values()),
+            'total_pendiente': sum(datos['total_pendiente'] for datos in resumen.values()),
+            'total_invitados': sum(datos['total_invitados'] for datos in resumen.values()),
+            'por_estado': {}
+        }
+        for estado in ESTADOS_EVENTO:
+            metricas['por_estado'][estado] = resumen.get(estado, {}).get('cantidad', 0)
+        return metricas
+
+    def obtener_conteos_recursos(self):
+        """Cuenta clientes, productos, planes y salones (totales y activos) en una consulta"""
+        consulta = """
+        SELECT
+            (SELECT COUNT(*) FROM clientes c JOIN usuarios u ON c.usuario_id = u.id) AS total_clientes,
+            (SELECT COUNT(*) FROM productos) AS total_productos,
+            (SELECT COALESCE(SUM(CASE WHEN activo THEN 1 ELSE 0 END), 0) FROM productos) AS productos_activos,
+            (SELECT COUNT(*) FROM planes) AS total_planes,
+            (SELECT COALESCE(SUM(CASE WHEN activo THEN 1 ELSE 0 END), 0) FROM planes) AS planes_activos,
+            (SELECT COUNT(*) FROM salones) AS total_salones,
+            (SELECT COALESCE(SUM(CASE WHEN activo THEN 1 ELSE 0 END), 0) FROM salones) AS salones_activos
+        """
+        fila = self.base_datos.obtener_uno(consulta) or {}
+        return {clave: int(valor or 0) for clave, valor in fila.items()}
+
+    def _pagos_agrupados(self, fecha_desde=None, fecha_hasta=None):
+        """Pagos agrupados por cuenta, tipo y estado (estado '' = sin estado)"""
+        cuenta = 'COALESCE(p.cuenta_id, 0)' if self._columna_existe('pagos', 'cuenta_id') else '0'
+        estado = "COALESCE(p.estado_pago, '')" if self._columna_existe('pagos', 'estado_pago') else "''"
+        consulta_rollup = """
+        SELECT k.cuenta_id, k.tipo_pago, k.estado_pago,
+               SUM(k.cantidad) AS cantidad, SUM(k.monto) AS monto
+        FROM kpi_pagos_diario k
+        WHERE {condiciones}
+        GROUP BY k.cuenta_id, k.tipo_pago, k.estado_pago
+        """
+        consulta_vivo = f"""
+        SELECT {cuenta} AS cuenta_id, p.tipo_pago, {estado} AS estado_pago,
+               COUNT(*) AS cantidad, COALESCE(SUM(p.monto), 0) AS monto
+        FROM pagos p
+        WHERE {{condiciones}}
+        GROUP BY {cuenta}, p.tipo_pago, {estado}
+        """
+        filas = self._filas_combinadas('pagos', consulta_rollup, consulta_vivo, 'p.fecha_pago',
+                                       fecha_desde, fecha_hasta)
+        return [fila for fila in filas if fila.get('estado_pago') in ('aprobado', '')]
+
+    def obtener_total_pagado_verificado(self):
+        """Total pagado global (aprobado o sin estado, sin reembolsos)"""
+        return float(sum(
+            fila.get('monto') or 0 for fila in self._pagos_agrupados()
+            if fila.get('tipo_pago') != 'reembolso'
+        ))
+
+    def obtener_pagos_por_cuenta(self, fecha_desde=None, fecha_hasta=None):
+        """
+        Totales de pagos aprobados por cuenta destino
+
+        Returns:
+            dict: {cuenta_id: {total_pagos, total_ingresos, total_reembolsos, total_neto}}
+        """
+        por_cuenta = {}
+        for fila in self._pagos_agrupados(fecha_desde, fecha_hasta):
+            datos = por_cuenta.setdefault(int(fila.get('cuenta_id') or 0), {
+                'total_pagos': 0, 'total_ingresos': 0.0, 'total_reembolsos': 0.0, 'total_neto': 0.0
+            })
+            monto = float(fila.get('monto') or 0)
+            datos['total_pagos'] += int(fila.get('cantidad') or 0)
+            if fila.get('tipo_pago') == 'reembolso':
+                datos['total_reembolsos'] += monto
+                datos['total_neto'] -= monto
+            else:
+                datos['total_ingresos'] += monto
+                datos['total_neto'] += monto
+        return por_cuenta
+
+    def obtener_totales_notificaciones(self, fecha_desde=None, fecha_hasta=None):
+        """
+        Envíos y costos de historial_notificaciones (enviado = TRUE)
+
+        Returns:
+            dict: {'totales': {...}, 'por_tipo': [...]} con email_out, whatsapp_out,
+            costo_email_total y costo_whatsapp_total (None si no existe la columna de costo)
+        """
+        costo_email = 'SUM(COALESCE(h.costo_email, 0))' \
+            if self._columna_existe('historial_notificaciones', 'costo_email') else 'NULL'
+        costo_whatsapp = 'SUM(COALESCE(h.costo_whatsapp, 0))' \
+            if self._columna_existe('historial_notificaciones', 'costo_whatsapp') else 'NULL'
+        consulta_rollup = """
+        SELECT k.tipo_notificacion, k.canal, SUM(k.enviados) AS enviados,
+               SUM(k.costo_email) AS costo_email, SUM(k.costo_whatsapp) AS costo_whatsapp
+        FROM kpi_notificaciones_diario k
+        WHERE {condiciones}
+        GROUP BY k.tipo_notificacion, k.canal
+        """
+        consulta_vivo = f"""
+        SELECT h.tipo_notificacion, h.canal, COUNT(*) AS enviados,
+               {costo_email} AS costo_email, {costo_whatsapp} AS costo_whatsapp
+        FROM historial_notificaciones h
+        WHERE h.enviado = TRUE AND h.fecha_envio IS NOT NULL AND {{condiciones}}
+        GROUP BY h.tipo_notificacion, h.canal
+        """
+        filas = self._filas_combinadas('notificaciones', consulta_rollup, consulta_vivo, 'h.fecha_envio',
+                                       fecha_desde, fecha_hasta, fecha_hora=True)
+        for fila in filas:
+            enviados = int(fila.get('enviados') or 0)
+            fila['email_out'] = enviados if fila.get('canal') in ('email', 'ambos') else 0
+            fila['whatsapp_out'] = enviados if fila.get('canal') in ('whatsapp', 'ambos') else 0
+            fila['costo_email_total'] = fila.get('costo_email')
+            fila['costo_whatsapp_total'] = fila.get('costo_whatsapp')
+
+        campos = ('email_out', 'whatsapp_out', 'costo_email_total', 'costo_whatsapp_total')
+        totales = self._sumar_por(filas, lambda fila: None, campos).get(None, {campo: None for campo in campos})
+        por_tipo = [
+            dict(datos, tipo_notificacion=tipo)
+            for tipo, datos in sorted(
+                self._sumar_por(filas, lambda fila: fila.get('tipo_notificacion') or '', campos).items()
+            )
+        ]
+        return {'totales': totales, 'por_tipo': por_tipo}
+
+    def obtener_totales_whatsapp(self, fecha_desde=None, fecha_hasta=None):
+        """
+        Mensajes de whatsapp_mensajes por dirección y origen
+
+        Returns:
+            dict: whatsapp_in, whatsapp_out, whatsapp_bot, whatsapp_humano,
+            whatsapp_notificaciones (origen sistema/campana) y costo_total (None sin columna de costo)
+        """
+        costo = 'SUM(COALESCE(w.costo_total, 0))' \
+            if self._columna_existe('whatsapp_mensajes', 'costo_total') else 'NULL'
+        consulta_rollup = """
+        SELECT k.direccion, k.origen, SUM(k.cantidad) AS cantidad, SUM(k.costo) AS costo
+        FROM kpi_whatsapp_diario k
+        WHERE {condiciones}
+        GROUP BY k.direccion, k.origen
+        """
+        consulta_vivo = f"""
+        SELECT w.direccion, COALESCE(w.origen, '') AS origen, COUNT(*) AS cantidad, {costo} AS costo
+        FROM whatsapp_mensajes w
+        WHERE {{condiciones}}
+        GROUP BY w.direccion, COALESCE(w.origen, '')
+        """
+        filas = self._filas_combinadas('whatsapp', consulta_rollup, consulta_vivo, 'w.fecha_creacion',
+                                       fecha_desde, fecha_hasta, fecha_hora=True)
+        totales = {
+            'whatsapp_in': 0, 'whatsapp_out': 0, 'whatsapp_bot': 0,
+            'whatsapp_humano': 0, 'whatsapp_notificaciones': 0, 'costo_total': None
+        }
+        for fila in filas:
+            cantidad = int(fila.get('cantidad') or 0)
+            direccion = fila.get('direccion')
+            origen = fila.get('origen')
+            if direccion == 'in':
+                totales['whatsapp_in'] += cantidad
+            elif direccion == 'out':
+                totales['whatsapp_out'] += cantidad
+                if origen == 'bot':
+                    totales['whatsapp_bot'] += cantidad
+                elif origen == 'humano':
+                    totales['whatsapp_humano'] += cantidad
+                elif origen in ('sistema', 'campana'):
+                    totales['whatsapp_notificaciones'] += cantidad
+            if fila.get('costo') is not None:
+                totales['costo_total'] = (totales['costo_total'] or 0) + float(fila['costo'])
+        return totales
@@ -1,10 +1,79 @@
 """
 Modelo para gestión de salones
 """
+import calendar
+from datetime import date, datetime, time, timedelta
 from modelos.base_datos import BaseDatos
+from modelos.esquema import EsquemaBD
 from utilidades.logger import obtener_logger
 
 
+# Intervalo [inicio, fin) que ocupa un evento (mismas reglas que las columnas
+# generadas de la migración 0006, que se usan cuando existen)
+INICIO_EVENTO_SQL = (
+    "IF(e.hora_inicio IS NULL OR e.hora_fin IS NULL, "
+    "TIMESTAMP(e.fecha_evento), TIMESTAMP(e.fecha_evento, e.hora_inicio))"
+)
+FIN_EVENTO_SQL = (
+    "IF(e.hora_inicio IS NULL OR e.hora_fin IS NULL, "
+    "TIMESTAMP(e.fecha_evento + INTERVAL 1 DAY), "
+    "IF(e.hora_fin < e.hora_inicio, TIMESTAMP(e.fecha_evento + INTERVAL 1 DAY, e.hora_fin), "
+    "TIMESTAMP(e.fecha_evento, e.hora_fin)))"
+)
+# Ningún evento ocupa más de un día: acota el rango de búsqueda en el índice
+DURACION_MAXIMA_EVENTO = timedelta(days=1)
+# Horarios que se pueden comprobar en una sola consulta
+LIMITE_HORARIOS_POR_CONSULTA = 200
+
+
+def _parsear_hora(valor):
+    """HH:MM[:SS], time o timedelta (TIME de MySQL) a time; None si no es válida"""
+    if valor is None or valor == '':
+        return None
+    if isinstance(valor, time):
+        return valor
+    if isinstance(valor, timedelta):
+        segundos = int(valor.total_seconds()) % 86400
+        return time(segundos // 3600, segundos % 3600 // 60, segundos % 60)
+    partes = str(valor).strip().split(':')
+    try:
+        return time(*[int(parte) for parte in partes[:3]]) if len(partes) >= 2 else None
+    except (TypeError, ValueError):
+        return None
+
+
+def normalizar_horario(fecha_evento, hora_inicio=None, hora_fin=None):
+    """
+    Intervalo que ocuparía un evento
+
+    Si hora_fin es menor que hora_inicio el evento termina al día siguiente;
+    sin alguna de las horas ocupa el día completo.
+
+    Returns:
+        tuple: (inicio, fin) como datetime, o None si la fecha o las horas no son válidas
+    """
+    if isinstance(fecha_evento, datetime):
+        fecha = fecha_evento.date()
+    elif isinstance(fecha_evento, date):
+        fecha = fecha_evento
+    else:
+        try:
+            fecha = datetime.strptime(str(fecha_evento).strip(), '%Y-%m-%d').date()
+        except (TypeError, ValueError):
+            return None
+    if hora_inicio in (None, '') or hora_fin in (None, ''):
+        inicio = datetime.combine(fecha, time())
+        return inicio, inicio + timedelta(days=1)
+    inicio_hora, fin_hora = _parsear_hora(hora_inicio), _parsear_hora(hora_fin)
+    if inicio_hora is None or fin_hora is None:
+        return None
+    inicio = datetime.combine(fecha, inicio_hora)
+    fin = datetime.combine(fecha, fin_hora)
+    if fin_hora < inicio_hora:
+        fin += timedelta(days=1)
+    return inicio, fin
+
+
 class SalonModelo:
     """Clase para operaciones CRUD de salones"""
     
@@ -80,13 +149,154 @@ class SalonModelo:
             self.logger.error(f"Error al eliminar salón ID {salon_id}: {str(e)}")
             return False
     
-    def verificar_disponibilidad(self, salon_id, fecha_evento):
-        """Verifica si un salón está disponible en una fecha"""
-        consulta = """
-        SELECT COUNT(*) as eventos_count
-        FROM eventos
-        WHERE id_salon = %s AND fecha_evento = %s AND estado != 'cancelado'
+    def verificar_disponibilidad(self, salon_id, fecha_evento, hora_inicio=None, hora_fin=None, evento_id_excluir=None):
+        """Verifica si un salón está disponible en una fecha (o en un horario de esa fecha)"""
+        horario = normalizar_horario(fecha_evento, hora_inicio, hora_fin)
+        if horario is None:
+            return False
+        inicio, fin = horario
+        return self.horario_libre(salon_id, inicio, fin, evento_id_excluir)
+
+    def _columnas_intervalo(self):
+        """Columnas generadas (migración 0006) o, si aún no existen, su expresión"""
+        if EsquemaBD.columna_existe('eventos', 'fecha_hora_inicio') and EsquemaBD.columna_existe('eventos', 'fecha_hora_fin'):
+            return "e.fecha_hora_inicio", "e.fecha_hora_fin"
+        return INICIO_EVENTO_SQL, FIN_EVENTO_SQL
+
+    def obtener_conflictos(self, salon_id, inicio, fin, evento_id_excluir=None):
         """
-        resultado = self.base_datos.obtener_uno(consulta, (salon_id, fecha_evento))
-        return resultado['eventos_count'] == 0 if resultado else True
+        Eventos no cancelados del salón que se solapan con [inicio, fin)
+
+        Args:
+            salon_id: Salón
+            inicio: datetime de inicio (ver normalizar_horario)
+            fin: datetime de fin
+            evento_id_excluir: Evento que se está editando
+
+        Returns:
+            list: Eventos con id_evento, nombre_evento, estado, inicio y fin
+        """
+        columna_inicio, columna_fin = self._columnas_intervalo()
+        consulta = f"""
+        SELECT e.id_evento, e.nombre_evento, e.estado,
+               {columna_inicio} AS inicio, {columna_fin} AS fin
+        FROM eventos e
+        WHERE e.id_salon = %s
+        AND e.estado != 'cancelado'
+        AND {columna_inicio} >= %s AND {columna_inicio} < %s
+        AND {columna_fin} > %s
+        """
+        parametros = [salon_id, inicio - DURACION_MAXIMA_EVENTO, fin, inicio]
+        if evento_id_excluir:
+            consulta += " AND e.id_evento != %s"
+            parametros.append(evento_id_excluir)
+        consulta += f" ORDER BY {columna_inicio}"
+        return self.base_datos.obtener_todos(consulta, tuple(parametros)) or []
+
+    def horario_libre(self, salon_id, inicio, fin, evento_id_excluir=None):
+        """True si ningún evento del salón se solapa con [inicio, fin)"""
+        return not self.obtener_conflictos(salon_id, inicio, fin, evento_id_excluir)
+
+    def verificar_horarios(self, horarios, evento_id_excluir=None):
+        """
+        Comprueba varios horarios candidatos en una sola consulta
+
+        Args:
+            horarios: Lista de (salon_id, inicio, fin)
+            evento_id_excluir: Evento que se está editando
+
+        Returns:
+            list: True (libre) o False por cada horario, en el mismo orden
+        """
+        if not horarios:
+            return []
+        if len(horarios) > LIMITE_HORARIOS_POR_CONSULTA:
+            raise ValueError(f"Máximo {LIMITE_HORARIOS_POR_CONSULTA} horarios por consulta")
+        columna_inicio, columna_fin = self._columnas_intervalo()
+        filas = []
+        parametros = []
+        for indice, (salon_id, inicio, fin) in enumerate(horarios):
+            filas.append("SELECT %s AS indice, %s AS salon_id, CAST(%s AS DATETIME) AS inicio, CAST(%s AS DATETIME) AS fin")
+            parametros.extend([indice, salon_id, inicio, fin])
+        excluir = ""
+        if evento_id_excluir:
+            excluir = "AND e.id_evento != %s"
+            parametros.append(evento_id_excluir)
+        consulta = f"""
+        SELECT c.indice, EXISTS (
+            SELECT 1 FROM eventos e
+            WHERE e.id_salon = c.salon_id
+            AND e.estado != 'cancelado'
+            AND {columna_inicio} >= c.inicio - INTERVAL 1 DAY AND {columna_inicio} < c.fin
+            AND {columna_fin} > c.inicio
+            {excluir}
+        ) AS ocupado
+        FROM ({" UNION ALL ".join(filas)}) c
+        """
+        resultados = self.base_datos.obtener_todos(consulta, tuple(parametros)) or []
+        libres = [True] * len(horarios)
+        for resultado in resultados:
+            libres[int(resultado['indice'])] = not resultado['ocupado']
+        return libres
+
+    def obtener_disponibilidad_mes(self, salon_id, anio, mes, duracion_minima=60):
+        """
+        Horarios ocupados y libres de cada día del mes (una consulta)
+
+        Args:
+            salon_id: Salón
+            anio: Año
+            mes: Mes (1-12)
+            duracion_minima: Minutos mínimos para considerar libre un hueco
+
+        Returns:
+            list: Un dict por día con fecha, estado ('libre', 'parcial' u
+                'ocupado'), ocupados [{id_evento, nombre_evento, estado, inicio,
+                fin}] y libres [{inicio, fin}], con horas HH:MM ('24:00' = fin del día)
+        """
+        inicio_mes = datetime(anio, mes, 1)
+        dias_mes = calendar.monthrange(anio, mes)[1]
+        fin_mes = inicio_mes + timedelta(days=dias_mes)
+        eventos = self.obtener_conflictos(salon_id, inicio_mes, fin_mes)
+        minimo = timedelta(minutes=max(1, int(duracion_minima)))
+
+        def hora(valor, dia):
+            return '24:00' if valor >= dia + timedelta(days=1) else valor.strftime('%H:%M')
 
+        dias = []
+        for numero in range(dias_mes):
+            dia = inicio_mes + timedelta(days=numero)
+            fin_dia = dia + timedelta(days=1)
+            ocupados = []
+            libres = []
+            cursor = dia
+            for evento in eventos:
+                inicio_evento, fin_evento = evento['inicio'], evento['fin']
+                if fin_evento <= dia or inicio_evento >= fin_dia:
+                    continue
+                desde, hasta = max(inicio_evento, dia), min(fin_evento, fin_dia)
+                ocupados.append({
+                    'id_evento': evento['id_evento'],
+                    'nombre_evento': evento.get('nombre_evento'),
+                    'estado': evento.get('estado'),
+                    'inicio': hora(desde, dia),
+                    'fin': hora(hasta, dia)
+                })
+                if desde - cursor >= minimo:
+                    libres.append({'inicio': hora(cursor, dia), 'fin': hora(desde, dia)})
+                cursor = max(cursor, hasta)
+            if fin_dia - cursor >= minimo:
+                libres.append({'inicio': hora(cursor, dia), 'fin': '24:00'})
+            if not ocupados:
+                estado = 'libre'
+            elif libres:
+                estado = 'parcial'
+            else:
+                estado = 'ocupado'
+            dias.append({
+                'fecha': dia.strftime('%Y-%m-%d'),
+                'estado': estado,
+                'ocupados': ocupados,
+                'libres': libres
+            })
+        return dias
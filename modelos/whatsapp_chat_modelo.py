@@ -1,8 +1,61 @@
 """
 Modelo para chat WhatsApp (conversaciones, mensajes y estado del bot)
 """
+import base64
 import json
+from datetime import datetime, timedelta
+from mysql.connector import Error
 from modelos.base_datos import BaseDatos
+from config import TIEMPO_REAL_CONFIG
+from modelos.esquema import EsquemaBD
+from utilidades.tiempo_real import publicar
+
+
+# Orden de los estados que informa Meta para un mensaje saliente. Un estado solo
+# se aplica si avanza (un 'delivered' reentregado o tardío no pisa un 'read').
+# 'failed' puede llegar tras 'sent', pero no retrocede un mensaje ya entregado.
+RANGO_ESTADOS = {
+    "sent": 1,
+    "failed": 2,
+    "delivered": 3,
+    "read": 4,
+}
+
+
+def colapsar_estados(estados):
+    """
+    Reduce una lista de estados del webhook a uno por mensaje (el más avanzado)
+
+    Returns:
+        dict: {wa_message_id: status} en el orden en que aparecieron los mensajes
+    """
+    finales = {}
+    for status in estados:
+        wa_message_id = status.get("id")
+        estado = status.get("status")
+        if not wa_message_id or not estado:
+            continue
+        actual = finales.get(wa_message_id)
+        if actual is None or RANGO_ESTADOS.get(estado, 0) >= RANGO_ESTADOS.get(actual.get("status"), 0):
+            finales[wa_message_id] = status
+    return finales
+
+# Columnas de la bandeja: el último mensaje viene desnormalizado en la conversación
+# (lo mantiene registrar_mensaje)
+COLUMNAS_BANDEJA = """
+    c.*,
+    u.nombre_completo as nombre_cliente,
+    u.email as email_cliente,
+    u.telefono as telefono_cliente,
+    COALESCE(c.mensajes_no_leidos, 0) as mensajes_no_leidos
+"""
+
+# Canal del stream en tiempo real (/api/whatsapp_chat/stream)
+CANAL_CHAT = "whatsapp_chat"
+
+# Segundos que retrocede una consulta incremental de la bandeja (updated_since)
+# para incluir cambios de transacciones que confirmaron después de la marca
+MARGEN_SINCRONIZACION_SEGUNDOS = 2
 
 
 class WhatsAppChatModelo:
@@ -29,7 +82,9 @@ class WhatsAppChatModelo:
         VALUES (%s, %s, %s, NOW(), NULL, 0)
         """
         if self.base_datos.ejecutar_consulta(consulta, (telefono, cliente_id, bot_activo)):
-            return self.base_datos.obtener_ultimo_id()
+            conversacion_id = self.base_datos.obtener_ultimo_id()
+            publicar(CANAL_CHAT, "conversacion", {"conversacion_id": conversacion_id})
+            return conversacion_id
         return None
 
     def actualizar_conversacion(self, conversacion_id, cliente_id=None, bot_activo=None):
@@ -48,7 +103,10 @@ class WhatsAppChatModelo:
         WHERE id = %s
         """
         parametros.append(conversacion_id)
-        return self.base_datos.ejecutar_consulta(consulta, tuple(parametros))
+        actualizado = self.base_datos.ejecutar_consulta(consulta, tuple(parametros))
+        if actualizado and (cliente_id is not None or bot_activo is not None):
+            publicar(CANAL_CHAT, "conversacion", {"conversacion_id": conversacion_id})
+        return actualizado
 
     def actualizar_interaccion_cliente(self, conversacion_id):
         consulta = """
@@ -66,49 +124,62 @@ class WhatsAppChatModelo:
             fecha_ultimo_error = NOW()
         WHERE id = %s
         """
-        return self.base_datos.ejecutar_consulta(consulta, (detalle, conversacion_id))
-
-    def _asegurar_columna_no_leidos(self):
-        """Asegura que exista la columna mensajes_no_leidos en whatsapp_conversaciones"""
-        try:
-            consulta = """
-            SELECT COUNT(*) as total
-            FROM information_schema.COLUMNS
-            WHERE TABLE_SCHEMA = DATABASE()
-              AND TABLE_NAME = 'whatsapp_conversaciones'
-              AND COLUMN_NAME = 'mensajes_no_leidos'
-            """
-            existe = self.base_datos.obtener_uno(consulta) or {}
-            if int(existe.get("total") or 0) == 0:
-                self.base_datos.ejecutar_consulta(
-                    "ALTER TABLE whatsapp_conversaciones ADD COLUMN mensajes_no_leidos INT DEFAULT 0"
-                )
-        except Exception:
-            pass
+        actualizado = self.base_datos.ejecutar_consulta(consulta, (detalle, conversacion_id))
+        if actualizado:
+            publicar(CANAL_CHAT, "conversacion", {"conversacion_id": conversacion_id})
+        return actualizado
 
     def incrementar_no_leidos(self, conversacion_id):
         """Incrementa el contador de mensajes no leídos cuando el cliente envía un mensaje"""
-        self._asegurar_columna_no_leidos()
         consulta = """
         UPDATE whatsapp_conversaciones
         SET mensajes_no_leidos = COALESCE(mensajes_no_leidos, 0) + 1
         WHERE id = %s
         """
-        return self.base_datos.ejecutar_consulta(consulta, (conversacion_id,))
+        actualizado = self.base_datos.ejecutar_consulta(consulta, (conversacion_id,))
+        if actualizado:
+            self._publicar_no_leidos(conversacion_id)
+        return actualizado
 
     def marcar_como_leido(self, conversacion_id):
         """Resetea el contador de mensajes no leídos cuando se abre la conversación"""
-        self._asegurar_columna_no_leidos()
         consulta = """
         UPDATE whatsapp_conversaciones
         SET mensajes_no_leidos = 0
         WHERE id = %s
         """
-        return self.base_datos.ejecutar_consulta(consulta, (conversacion_id,))
+        actualizado = self.base_datos.ejecutar_consulta(consulta, (conversacion_id,))
+        # Abrir una conversación ya leída no cambia nada: no se publica
+        if actualizado and self.base_datos.obtener_filas_afectadas() > 0:
+            self._publicar_no_leidos(conversacion_id, 0)
+        return actualizado
+
+    def _publicar_no_leidos(self, conversacion_id, mensajes_no_leidos=None):
+        """
+        Publica el contador de la conversación y el total de todas, para que
+        el badge del menú se actualice sin consultar /no-leidos
+        """
+        if not TIEMPO_REAL_CONFIG['enabled']:
+            return
+        try:
+            fila = self.base_datos.obtener_uno(
+                """
+                SELECT (SELECT mensajes_no_leidos FROM whatsapp_conversaciones WHERE id = %s) AS mensajes_no_leidos,
+                       (SELECT COALESCE(SUM(mensajes_no_leidos), 0) FROM whatsapp_conversaciones) AS total
+                """,
+                (conversacion_id,)
+            ) or {}
+        except Exception:
+            fila = {}
+        if mensajes_no_leidos is None:
+            mensajes_no_leidos = int(fila.get("mensajes_no_leidos") or 0)
+        datos = {"conversacion_id": conversacion_id, "mensajes_no_leidos": mensajes_no_leidos}
+        if fila.get("total") is not None:
+            datos["total"] = int(fila["total"])
+        publicar(CANAL_CHAT, "no_leidos", datos)
 
     def obtener_total_no_leidos(self):
         """Obtiene el total de mensajes no leídos de todas las conversaciones"""
-        self._asegurar_columna_no_leidos()
         consulta = """
         SELECT COALESCE(SUM(mensajes_no_leidos), 0) as total
         FROM whatsapp_conversaciones
@@ -117,80 +188,208 @@ class WhatsAppChatModelo:
         return int(resultado.get("total") or 0)
 
     def listar_conversaciones(self):
-        self._asegurar_columna_no_leidos()
-        consulta = """
-        SELECT c.*,
-               u.nombre_completo as nombre_cliente,
-               u.email as email_cliente,
-               u.telefono as telefono_cliente,
-               (SELECT mensaje FROM whatsapp_mensajes m
-                WHERE m.conversacion_id = c.id
-                ORDER BY m.fecha_creacion DESC
-                LIMIT 1) as ultimo_mensaje,
-               (SELECT fecha_creacion FROM whatsapp_mensajes m
-                WHERE m.conversacion_id = c.id
-                ORDER BY m.fecha_creacion DESC
-                LIMIT 1) as ultima_fecha,
-               (SELECT direccion FROM whatsapp_mensajes m
-                WHERE m.conversacion_id = c.id
-                ORDER BY m.fecha_creacion DESC
-                LIMIT 1) as ultima_direccion,
-               COALESCE(c.mensajes_no_leidos, 0) as mensajes_no_leidos
+        """Todas las conversaciones de la bandeja (sin paginar)"""
+        consulta = f"""
+        SELECT {COLUMNAS_BANDEJA}
         FROM whatsapp_conversaciones c
         LEFT JOIN clientes cl ON c.cliente_id = cl.id
         LEFT JOIN usuarios u ON cl.usuario_id = u.id
         ORDER BY c.mensajes_no_leidos DESC, c.ultima_interaccion DESC
         """
-        resultados = self.base_datos.obtener_todos(consulta)
-        # Convertir fechas a formato ISO
-        from datetime import datetime
-        for resultado in resultados or []:
-            if resultado.get('ultima_fecha'):
-                try:
-                    fecha = resultado['ultima_fecha']
-                    # Si es un objeto datetime, convertirlo a ISO
-                    if isinstance(fecha, datetime):
-                        resultado['ultima_fecha'] = fecha.isoformat()
-                    elif isinstance(fecha, str):
-                        # Si ya es string, intentar parsearlo y convertirlo
-                        try:
-                            fecha_obj = datetime.strptime(fecha, '%Y-%m-%d %H:%M:%S')
-                            resultado['ultima_fecha'] = fecha_obj.isoformat()
-                        except:
-                            # Si ya está en formato ISO, dejarlo así
-                            pass
-                except Exception:
-                    pass
-        return resultados
+        resultados = self.base_datos.obtener_todos(consulta) or []
+        return [self._fechas_iso(resultado) for resultado in resultados]
 
-    def obtener_mensajes(self, conversacion_id, limit=200):
-        consulta = """
-        SELECT * FROM whatsapp_mensajes
-        WHERE conversacion_id = %s
-        ORDER BY fecha_creacion ASC
+    def listar_conversaciones_paginado(self, limite=50, cursor=None, actualizado_desde=None):
+        """
+        Bandeja paginada por cursor (keyset) o, con `actualizado_desde`, solo las
+        conversaciones modificadas desde esa marca (consulta incremental).
+
+        La bandeja se ordena por no leídos e interacción más reciente; el modo
+        incremental por fecha_actualizacion ascendente, y retrocede
+        MARGEN_SINCRONIZACION_SEGUNDOS para no perder transacciones que
+        confirmaron tarde (el cliente reemplaza por id las repetidas).
+
+        Args:
+            limite: Cantidad máxima de conversaciones a retornar
+            cursor: Cursor opaco retornado por la página anterior
+            actualizado_desde: 'sincronizado_hasta' de una respuesta anterior (ISO 8601)
+
+        Returns:
+            tuple: (conversaciones, siguiente_cursor, sincronizado_hasta) con
+            siguiente_cursor None en la última página
+
+        Raises:
+            ValueError: Si el cursor o la fecha no son válidos
+        """
+        where = []
+        parametros = []
+        sincronizado_hasta = None
+        if actualizado_desde:
+            desde = self._parsear_fecha(actualizado_desde)
+            where.append("c.fecha_actualizacion >= %s")
+            parametros.append(desde - timedelta(seconds=MARGEN_SINCRONIZACION_SEGUNDOS))
+            if cursor:
+                fecha, conversacion_id = self._decodificar_cursor(cursor, 2)
+                where.append("(c.fecha_actualizacion > %s OR (c.fecha_actualizacion = %s AND c.id > %s))")
+                parametros.extend([fecha, fecha, conversacion_id])
+            orden = "c.fecha_actualizacion ASC, c.id ASC"
+            sincronizado_hasta = actualizado_desde
+        else:
+            if cursor:
+                no_leidos, fecha, conversacion_id = self._decodificar_cursor(cursor, 3)
+                # ultima_interaccion NULL va al final en orden descendente
+                if fecha is None:
+                    where.append(
+                        "(c.mensajes_no_leidos < %s OR (c.mensajes_no_leidos = %s "
+                        "AND c.ultima_interaccion IS NULL AND c.id < %s))"
+                    )
+                    parametros.extend([no_leidos, no_leidos, conversacion_id])
+                else:
+                    where.append(
+                        "(c.mensajes_no_leidos < %s OR (c.mensajes_no_leidos = %s AND ("
+                        "c.ultima_interaccion < %s OR c.ultima_interaccion IS NULL "
+                        "OR (c.ultima_interaccion = %s AND c.id < %s))))"
+                    )
+                    parametros.extend([no_leidos, no_leidos, fecha, fecha, conversacion_id])
+            else:
+                # Marca para la primera consulta incremental, tomada antes de leer la página
+                marca = self.base_datos.obtener_uno(
+                    "SELECT MAX(fecha_actualizacion) AS marca FROM whatsapp_conversaciones"
+                ) or {}
+                if marca.get('marca'):
+                    sincronizado_hasta = self._iso(marca['marca'])
+            orden = "c.mensajes_no_leidos DESC, c.ultima_interaccion DESC, c.id DESC"
+
+        consulta = f"""
+        SELECT {COLUMNAS_BANDEJA}
+        FROM whatsapp_conversaciones c
+        LEFT JOIN clientes cl ON c.cliente_id = cl.id
+        LEFT JOIN usuarios u ON cl.usuario_id = u.id
+        WHERE {" AND ".join(where) if where else "1=1"}
+        ORDER BY {orden}
         LIMIT %s
         """
-        resultados = self.base_datos.obtener_todos(consulta, (conversacion_id, limit))
-        # Convertir fechas a formato ISO
-        from datetime import datetime
-        for resultado in resultados or []:
-            if resultado.get('fecha_creacion'):
+        # Se pide una fila extra para saber si existe una página siguiente
+        parametros.append(int(limite) + 1)
+        resultados = self.base_datos.obtener_todos(consulta, tuple(parametros)) or []
+
+        siguiente_cursor = None
+        if len(resultados) > limite:
+            resultados = resultados[:limite]
+            ultimo = resultados[-1]
+            if actualizado_desde:
+                siguiente_cursor = self._codificar_cursor(ultimo.get('fecha_actualizacion'), ultimo.get('id'))
+            else:
+                siguiente_cursor = self._codificar_cursor(
+                    int(ultimo.get('mensajes_no_leidos') or 0), ultimo.get('ultima_interaccion'), ultimo.get('id')
+                )
+        if actualizado_desde and resultados:
+            # Filas en orden ascendente: la última es la modificación más reciente
+            ultima = resultados[-1].get('fecha_actualizacion')
+            if isinstance(ultima, datetime) and ultima > desde:
+                sincronizado_hasta = ultima.isoformat()
+        return [self._fechas_iso(resultado) for resultado in resultados], siguiente_cursor, sincronizado_hasta
+
+    @staticmethod
+    def _iso(fecha):
+        return fecha.isoformat() if isinstance(fecha, datetime) else str(fecha)
+
+    @classmethod
+    def _fechas_iso(cls, conversacion):
+        """Convierte las fechas de la bandeja a ISO 8601"""
+        for campo in ('ultima_fecha', 'fecha_actualizacion'):
+            fecha = conversacion.get(campo)
+            if isinstance(fecha, datetime):
+                conversacion[campo] = fecha.isoformat()
+            elif isinstance(fecha, str):
                 try:
-                    fecha = resultado['fecha_creacion']
-                    # Si es un objeto datetime, convertirlo a ISO
-                    if isinstance(fecha, datetime):
-                        resultado['fecha_creacion'] = fecha.isoformat()
-                    elif isinstance(fecha, str):
-                        # Si ya es string, intentar parsearlo y convertirlo
-                        try:
-                            fecha_obj = datetime.strptime(fecha, '%Y-%m-%d %H:%M:%S')
-                            resultado['fecha_creacion'] = fecha_obj.isoformat()
-                        except:
-                            # Si ya está en formato ISO, dejarlo así
-                            pass
-                except Exception:
+                    conversacion[campo] = datetime.strptime(fecha, '%Y-%m-%d %H:%M:%S').isoformat()
+                except ValueError:
+                    # Si ya está en formato ISO, dejarlo así
                     pass
-        return resultados
+        return conversacion
+
+    @staticmethod
+    def _parsear_fecha(valor):
+        try:
+            fecha = datetime.fromisoformat(str(valor).strip().replace('Z', '+00:00'))
+        except ValueError:
+            raise ValueError("updated_since debe ser una fecha ISO 8601")
+        if fecha.tzinfo is not None:
+            fecha = fecha.astimezone().replace(tzinfo=None)
+        return fecha
+
+    @staticmethod
+    def _codificar_cursor(*valores):
+        """Codifica la posición de la última fila como cursor opaco"""
+        valor = json.dumps([
+            valor.isoformat() if isinstance(valor, datetime) else valor for valor in valores
+        ])
+        return base64.urlsafe_b64encode(valor.encode('utf-8')).decode('ascii')
+
+    @staticmethod
+    def _decodificar_cursor(cursor, cantidad):
+        """Decodifica un cursor generado por _codificar_cursor"""
+        try:
+            valores = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+            if len(valores) != cantidad:
+                raise ValueError
+            valores[-1] = int(valores[-1])
+            return valores
+        except Exception:
+            raise ValueError("Cursor inválido")
+
+    def obtener_mensajes(self, conversacion_id, limit=50, before_id=None, after_id=None, incluir_raw=False):
+        """
+        Historial de una conversación paginado por id
+
+        Sin cursor retorna los `limit` mensajes más recientes; con before_id los
+        anteriores a ese mensaje y con after_id los posteriores (lo nuevo desde
+        el último visto). Siempre en orden cronológico.
+
+        Args:
+            conversacion_id: Conversación
+            limit: Cantidad máxima de mensajes
+            before_id: Solo mensajes con id menor (cargar anteriores)
+            after_id: Solo mensajes con id mayor (consultar nuevos)
+            incluir_raw: Incluir raw_json (payload de Meta), omitido por defecto
+
+        Returns:
+            tuple: (mensajes, hay_mas) con hay_mas True si quedan mensajes en esa dirección
+        """
+        columnas = EsquemaBD.columnas('whatsapp_mensajes')
+        if not incluir_raw:
+            columnas.discard('raw_json')
+        seleccion = ", ".join(sorted(columnas)) if columnas else "*"
+        where = ["conversacion_id = %s"]
+        parametros = [conversacion_id]
+        if after_id is not None:
+            where.append("id > %s")
+            parametros.append(after_id)
+            orden = "id ASC"
+        else:
+            if before_id is not None:
+                where.append("id < %s")
+                parametros.append(before_id)
+            orden = "id DESC"
+        consulta = f"""
+        SELECT {seleccion} FROM whatsapp_mensajes
+        WHERE {" AND ".join(where)}
+        ORDER BY {orden}
+        LIMIT %s
+        """
+        # Se pide una fila extra para saber si quedan más mensajes
+        parametros.append(int(limit) + 1)
+        resultados = self.base_datos.obtener_todos(consulta, tuple(parametros)) or []
+        hay_mas = len(resultados) > limit
+        resultados = resultados[:limit]
+        if after_id is None:
+            resultados.reverse()
+        for resultado in resultados:
+            fecha = resultado.get('fecha_creacion')
+            if isinstance(fecha, datetime):
+                resultado['fecha_creacion'] = fecha.isoformat()
+        return resultados, hay_mas
 
     def registrar_mensaje(
         self,
@@ -207,8 +406,6 @@ class WhatsAppChatModelo:
         costo_unitario=None,
         costo_total=None
     ):
-        self._asegurar_columnas_costos()
-        self._asegurar_columnas_reintento()
         
         # Determinar si el mensaje debe marcarse como pendiente de reintento
         pendiente_reintento = 0
@@ -217,58 +414,196 @@ class WhatsAppChatModelo:
             if not self._es_error_no_reintentable(raw_json):
                 pendiente_reintento = 1
         
+        # wa_message_id es único: una reentrega de Meta no duplica el mensaje
         consulta = """
         INSERT INTO whatsapp_mensajes
         (conversacion_id, direccion, mensaje, media_type, media_id, media_url, wa_message_id, origen, estado, raw_json, costo_unitario, costo_total, pendiente_reintento)
         VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE id = id
         """
         raw_text = json.dumps(raw_json, ensure_ascii=False, default=str) if isinstance(raw_json, dict) else raw_json
-        return self.base_datos.ejecutar_consulta(
-            consulta,
-            (
-                conversacion_id,
-                direccion,
-                mensaje,
-                media_type,
-                media_id,
-                media_url,
-                wa_message_id,
-                origen,
-                estado,
-                raw_text,
-                costo_unitario,
-                costo_total,
-                pendiente_reintento
-            )
+        parametros = (
+            conversacion_id,
+            direccion,
+            mensaje,
+            media_type,
+            media_id,
+            media_url,
+            # '' chocaría con el índice único; NULL se admite repetido
+            wa_message_id or None,
+            origen,
+            estado,
+            raw_text,
+            costo_unitario,
+            costo_total,
+            pendiente_reintento
         )
-    
-    def _asegurar_columnas_reintento(self):
-        """Asegura que las columnas de reintento existan"""
         try:
-            consulta = """
-            SELECT COUNT(*) as total
-            FROM information_schema.COLUMNS
-            WHERE TABLE_SCHEMA = DATABASE()
-              AND TABLE_NAME = 'whatsapp_mensajes'
-              AND COLUMN_NAME = 'intentos_reintento'
-            """
-            existe = self.base_datos.obtener_uno(consulta) or {}
-            if int(existe.get("total") or 0) == 0:
-                self.base_datos.ejecutar_consulta(
-                    "ALTER TABLE whatsapp_mensajes ADD COLUMN intentos_reintento INT DEFAULT 0"
-                )
-                self.base_datos.ejecutar_consulta(
-                    "ALTER TABLE whatsapp_mensajes ADD COLUMN fecha_ultimo_reintento TIMESTAMP NULL"
-                )
-                self.base_datos.ejecutar_consulta(
-                    "ALTER TABLE whatsapp_mensajes ADD COLUMN pendiente_reintento TINYINT(1) DEFAULT 0"
-                )
-                self.base_datos.ejecutar_consulta(
-                    "ALTER TABLE whatsapp_mensajes ADD COLUMN max_intentos_reintento INT DEFAULT 3"
-                )
-        except Exception:
-            pass
+            with self.base_datos.transaccion() as cursor:
+                cursor.execute(consulta, parametros)
+                mensaje_id = cursor.lastrowid
+                # Último mensaje de la bandeja; comparar ids evita que una reentrega
+                # o un mensaje anterior pise a uno más nuevo
+                if mensaje_id:
+                    cursor.execute("""
+                    UPDATE whatsapp_conversaciones
+                    SET ultimo_mensaje_id = %s,
+                        ultimo_mensaje = %s,
+                        ultima_fecha = NOW(),
+                        ultima_direccion = %s
+                    WHERE id = %s
+                      AND (ultimo_mensaje_id IS NULL OR ultimo_mensaje_id < %s)
+                    """, (mensaje_id, mensaje, direccion, conversacion_id, mensaje_id))
+                    if estado == 'fallido' and direccion == 'out':
+                        # Se revisa para reenviar cuando el cliente vuelva a escribir
+                        cursor.execute(
+                            "UPDATE whatsapp_conversaciones SET reenvio_pendiente = 1 WHERE id = %s",
+                            (conversacion_id,)
+                        )
+        except Error as e:
+            self.base_datos.ultimo_error = str(e)
+            print(f"Error al registrar mensaje de WhatsApp: {e}")
+            return False
+        if not mensaje_id:
+            return True
+        publicar(CANAL_CHAT, "mensaje", {
+            "conversacion_id": conversacion_id,
+            "mensaje": {
+                "id": mensaje_id,
+                "conversacion_id": conversacion_id,
+                "direccion": direccion,
+                "mensaje": mensaje,
+                "media_type": media_type,
+                "media_id": media_id,
+                "media_url": media_url,
+                "wa_message_id": wa_message_id,
+                "origen": origen,
+                "estado": estado,
+                "fecha_creacion": datetime.now().isoformat(timespec='seconds')
+            }
+        })
+        return True
     
+    def registrar_mensaje_entrante(
+        self,
+        telefono,
+        mensaje,
+        raw_json=None,
+        media_type=None,
+        media_id=None,
+        wa_message_id=None
+    ):
+        """
+        Registra un mensaje del cliente en una sola transacción
+
+        Obtiene o crea la conversación (bloqueándola), inserta el mensaje y
+        actualiza interacción, reengagement, no leídos y último mensaje con un
+        único UPDATE. Lanza la excepción si falla la BD (el webhook reintenta).
+
+        Returns:
+            tuple: (conversacion, creada) con la conversación ya actualizada, o
+            None si el wa_message_id ya estaba registrado (reentrega de Meta)
+        """
+        telefono = self.normalizar_telefono(telefono)
+        raw_text = json.dumps(raw_json, ensure_ascii=False, default=str) if isinstance(raw_json, dict) else raw_json
+        creada = False
+        with self.base_datos.transaccion() as cursor:
+            cursor.execute("""
+            SELECT c.*,
+                   (SELECT COUNT(*) FROM whatsapp_mensajes m WHERE m.wa_message_id = %s) AS duplicado
+            FROM whatsapp_conversaciones c
+            WHERE c.telefono = %s
+            FOR UPDATE
+            """, (wa_message_id, telefono))
+            conversacion = cursor.fetchone()
+            if conversacion and wa_message_id and int(conversacion.get('duplicado') or 0):
+                return None
+            if not conversacion:
+                cursor.execute("""
+                INSERT INTO whatsapp_conversaciones (telefono, cliente_id, bot_activo, ultima_interaccion, last_cliente_interaccion, requiere_reengagement)
+                VALUES (%s, NULL, 1, NOW(), NULL, 0)
+                ON DUPLICATE KEY UPDATE id = LAST_INSERT_ID(id)
+                """, (telefono,))
+                cursor.execute(
+                    "SELECT * FROM whatsapp_conversaciones WHERE id = %s FOR UPDATE", (cursor.lastrowid,)
+                )
+                conversacion = cursor.fetchone()
+                creada = True
+            conversacion.pop('duplicado', None)
+            conversacion_id = conversacion['id']
+
+            cursor.execute("""
+            INSERT INTO whatsapp_mensajes
+            (conversacion_id, direccion, mensaje, media_type, media_id, wa_message_id, origen, estado, raw_json)
+            VALUES (%s, 'in', %s, %s, %s, %s, 'cliente', 'received', %s)
+            ON DUPLICATE KEY UPDATE id = id
+            """, (conversacion_id, mensaje, media_type, media_id, wa_message_id, raw_text))
+            mensaje_id = cursor.lastrowid
+            if not mensaje_id:
+                # Otro hilo registró el mismo wa_message_id entre la consulta y el INSERT
+                return None
+            # Interacción, reengagement, no leídos y último mensaje en un solo UPDATE
+            cursor.execute("""
+            UPDATE whatsapp_conversaciones
+            SET ultima_interaccion = NOW(),
+                last_cliente_interaccion = NOW(),
+                requiere_reengagement = 0,
+                mensajes_no_leidos = COALESCE(mensajes_no_leidos, 0) + 1,
+                ultimo_mensaje_id = %s,
+                ultimo_mensaje = %s,
+                ultima_fecha = NOW(),
+                ultima_direccion = 'in'
+            WHERE id = %s
+            """, (mensaje_id, mensaje, conversacion_id))
+
+        ahora = datetime.now().replace(microsecond=0)
+        no_leidos = int(conversacion.get('mensajes_no_leidos') or 0) + 1
+        conversacion.update({
+            'ultima_interaccion': ahora,
+            'last_cliente_interaccion': ahora,
+            'requiere_reengagement': 0,
+            'mensajes_no_leidos': no_leidos,
+            'ultimo_mensaje_id': mensaje_id,
+            'ultimo_mensaje': mensaje,
+            'ultima_fecha': ahora,
+            'ultima_direccion': 'in'
+        })
+        if creada:
+            publicar(CANAL_CHAT, "conversacion", {"conversacion_id": conversacion_id})
+        publicar(CANAL_CHAT, "mensaje", {
+            "conversacion_id": conversacion_id,
+            "mensaje": {
+                "id": mensaje_id,
+                "conversacion_id": conversacion_id,
+                "direccion": "in",
+                "mensaje": mensaje,
+                "media_type": media_type,
+                "media_id": media_id,
+                "media_url": None,
+                "wa_message_id": wa_message_id,
+                "origen": "cliente",
+                "estado": "received",
+                "fecha_creacion": ahora.isoformat()
+            }
+        })
+        self._publicar_no_leidos(conversacion_id, no_leidos)
+        return conversacion, creada
+
+    def tomar_reenvio_pendiente(self, conversacion_id):
+        """Quita la marca de reenvío pendiente; True si estaba puesta (este hilo debe revisar)"""
+        if not self.base_datos.ejecutar_consulta(
+            "UPDATE whatsapp_conversaciones SET reenvio_pendiente = 0 WHERE id = %s AND reenvio_pendiente = 1",
+            (conversacion_id,)
+        ):
+            # Ante la duda, revisar
+            return True
+        return self.base_datos.obtener_filas_afectadas() > 0
+
+    def marcar_reenvio_pendiente(self, conversacion_id):
+        return self.base_datos.ejecutar_consulta(
+            "UPDATE whatsapp_conversaciones SET reenvio_pendiente = 1 WHERE id = %s", (conversacion_id,)
+        )
+
     def _es_error_no_reintentable(self, raw_json):
         """Determina si un error no debe reintentarse"""
         if not raw_json:
@@ -300,28 +635,6 @@ class WhatsAppChatModelo:
         
         return False
 
-    def _asegurar_columnas_costos(self):
-        try:
-            consulta = """
-            SELECT COLUMN_NAME
-            FROM information_schema.COLUMNS
-            WHERE TABLE_SCHEMA = DATABASE()
-              AND TABLE_NAME = 'whatsapp_mensajes'
-              AND COLUMN_NAME IN ('costo_unitario', 'costo_total')
-            """
-            existentes = self.base_datos.obtener_todos(consulta) or []
-            columnas = {row.get("COLUMN_NAME") for row in existentes}
-            if "costo_unitario" not in columnas:
-                self.base_datos.ejecutar_consulta(
-                    "ALTER TABLE whatsapp_mensajes ADD COLUMN costo_unitario DECIMAL(10,4) NULL"
-                )
-            if "costo_total" not in columnas:
-                self.base_datos.ejecutar_consulta(
-                    "ALTER TABLE whatsapp_mensajes ADD COLUMN costo_total DECIMAL(10,4) NULL"
-                )
-        except Exception:
-            pass
-
     def actualizar_estado_por_wa_id(self, wa_message_id, estado):
         consulta = """
         UPDATE whatsapp_mensajes
@@ -339,6 +652,45 @@ class WhatsAppChatModelo:
         raw_text = json.dumps(raw_json, ensure_ascii=False, default=str) if isinstance(raw_json, dict) else raw_json
         return self.base_datos.ejecutar_consulta(consulta, (estado, raw_text, wa_message_id))
 
+    def existe_mensaje_wa(self, wa_message_id):
+        """Indica si ya se registró un mensaje con ese wa_message_id"""
+        if not wa_message_id:
+            return False
+        consulta = """
+        SELECT 1 AS existe FROM whatsapp_mensajes WHERE wa_message_id = %s LIMIT 1
+        """
+        return self.base_datos.obtener_uno(consulta, (wa_message_id,)) is not None
+
+    def actualizar_estado_monotonico(self, wa_message_id, estado, raw_json=None):
+        """
+        Aplica un estado del webhook solo si avanza respecto al actual
+
+        Las reentregas y los estados que llegan desordenados no escriben nada.
+
+        Returns:
+            int: filas actualizadas (0 si el estado no avanzaba)
+        """
+        rango = RANGO_ESTADOS.get(estado)
+        if rango is None:
+            # Estado desconocido: se guarda como antes, sin orden
+            if not self.actualizar_estado_por_wa_id_con_detalle(wa_message_id, estado, raw_json=raw_json):
+                raise RuntimeError(f"No se pudo actualizar el estado de {wa_message_id}: {self.base_datos.ultimo_error}")
+            return self.base_datos.obtener_filas_afectadas()
+        casos = " ".join(f"WHEN '{nombre}' THEN {valor}" for nombre, valor in RANGO_ESTADOS.items())
+        consulta = f"""
+        UPDATE whatsapp_mensajes
+        SET estado = %s, raw_json = %s
+        WHERE wa_message_id = %s
+          AND (CASE estado {casos} ELSE 0 END) < %s
+        """
+        raw_text = json.dumps(raw_json, ensure_ascii=False, default=str) if isinstance(raw_json, dict) else raw_json
+        if not self.base_datos.ejecutar_consulta(consulta, (estado, raw_text, wa_message_id, rango)):
+            raise RuntimeError(f"No se pudo actualizar el estado de {wa_message_id}: {self.base_datos.ultimo_error}")
+        filas = self.base_datos.obtener_filas_afectadas()
+        if filas:
+            publicar(CANAL_CHAT, "estado", {"wa_message_id": wa_message_id, "estado": estado})
+        return filas
+
     def obtener_conversacion_id_por_wa_id(self, wa_message_id):
         consulta = """
         SELECT conversacion_id
@@ -352,7 +704,6 @@ class WhatsAppChatModelo:
     
     def marcar_pendiente_reintento_por_wa_id(self, wa_message_id):
         """Marca un mensaje como pendiente de reintento basado en su wa_message_id"""
-        self._asegurar_columnas_reintento()
         # Solo marcar si no es un error no reintentable
         consulta = """
         UPDATE whatsapp_mensajes
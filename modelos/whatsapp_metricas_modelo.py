@@ -2,6 +2,8 @@
 Modelo para métricas y control de envíos WhatsApp/Email
 """
 from modelos.base_datos import BaseDatos
+from modelos.esquema import EsquemaBD
+from utilidades.cache_configuracion import cache_configuracion
 
 
 class WhatsAppMetricasModelo:
@@ -9,73 +11,25 @@ class WhatsAppMetricasModelo:
         self.base_datos = BaseDatos()
 
     def obtener_config(self):
-        self._asegurar_columnas_limites()
+        # Se consulta en cada envío de WhatsApp (precio, bloqueo global): leer de la caché
+        return cache_configuracion.obtener("whatsapp_metricas_config", self._leer_config)
+
+    def _leer_config(self):
         consulta = "SELECT * FROM whatsapp_metricas_config ORDER BY id ASC LIMIT 1"
         return self.base_datos.obtener_uno(consulta) or {"precio_whatsapp": 0, "precio_email": 0, "maximo_whatsapp": None, "maximo_email": None}
 
     def _columna_existe(self, tabla, columna):
-        consulta = """
-        SELECT COUNT(*) as total
-        FROM information_schema.COLUMNS
-        WHERE TABLE_SCHEMA = DATABASE()
-          AND TABLE_NAME = %s
-          AND COLUMN_NAME = %s
-        """
-        row = self.base_datos.obtener_uno(consulta, (tabla, columna)) or {}
-        return int(row.get("total") or 0) > 0
+        return EsquemaBD.columna_existe(tabla, columna)
 
-    def _asegurar_columna_whatsapp_desactivado(self):
-        try:
-            consulta = """
-            SELECT COUNT(*) as total
-            FROM information_schema.COLUMNS
-            WHERE TABLE_SCHEMA = DATABASE()
-              AND TABLE_NAME = 'whatsapp_metricas_config'
-              AND COLUMN_NAME = 'whatsapp_desactivado'
-            """
-            existe = self.base_datos.obtener_uno(consulta) or {}
-            if int(existe.get("total") or 0) == 0:
-                self.base_datos.ejecutar_consulta(
-                    "ALTER TABLE whatsapp_metricas_config ADD COLUMN whatsapp_desactivado TINYINT(1) DEFAULT 0"
-                )
-        except Exception:
-            pass
-
-    def _asegurar_columnas_limites(self):
+    def actualizar_config(self, precio_whatsapp, precio_email, whatsapp_desactivado=0, maximo_whatsapp=None, maximo_email=None):
         try:
-            # Verificar y agregar maximo_whatsapp
-            consulta = """
-            SELECT COUNT(*) as total
-            FROM information_schema.COLUMNS
-            WHERE TABLE_SCHEMA = DATABASE()
-              AND TABLE_NAME = 'whatsapp_metricas_config'
-              AND COLUMN_NAME = 'maximo_whatsapp'
-            """
-            existe = self.base_datos.obtener_uno(consulta) or {}
-            if int(existe.get("total") or 0) == 0:
-                self.base_datos.ejecutar_consulta(
-                    "ALTER TABLE whatsapp_metricas_config ADD COLUMN maximo_whatsapp INT DEFAULT NULL"
-                )
-            
-            # Verificar y agregar maximo_email
-            consulta = """
-            SELECT COUNT(*) as total
-            FROM information_schema.COLUMNS
-            WHERE TABLE_SCHEMA = DATABASE()
-              AND TABLE_NAME = 'whatsapp_metricas_config'
-              AND COLUMN_NAME = 'maximo_email'
-            """
-            existe = self.base_datos.obtener_uno(consulta) or {}
-            if int(existe.get("total") or 0) == 0:
-                self.base_datos.ejecutar_consulta(
-                    "ALTER TABLE whatsapp_metricas_config ADD COLUMN maximo_email INT DEFAULT NULL"
-                )
-        except Exception:
-            pass
+            return self._actualizar_config(
+                precio_whatsapp, precio_email, whatsapp_desactivado, maximo_whatsapp, maximo_email
+            )
+        finally:
+            cache_configuracion.invalidar("whatsapp_metricas_config")
 
-    def actualizar_config(self, precio_whatsapp, precio_email, whatsapp_desactivado=0, maximo_whatsapp=None, maximo_email=None):
-        self._asegurar_columna_whatsapp_desactivado()
-        self._asegurar_columnas_limites()
+    def _actualizar_config(self, precio_whatsapp, precio_email, whatsapp_desactivado=0, maximo_whatsapp=None, maximo_email=None):
         existente = self.obtener_config()
         if existente and existente.get("id"):
             consulta = """
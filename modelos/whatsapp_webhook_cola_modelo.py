@@ -0,0 +1,192 @@
+"""
+Modelo de la cola de eventos entrantes del webhook de WhatsApp
+"""
+import json
+import zlib
+from modelos.base_datos import BaseDatos
+from utilidades.logger import obtener_logger
+
+
+# Espera entre reintentos: 5 s, 10 s, 20 s ... hasta 5 minutos
+REINTENTO_BASE_SEGUNDOS = 5
+REINTENTO_MAXIMO_SEGUNDOS = 300
+
+
+def calcular_fragmento(particion, fragmentos):
+    """Fragmento fijo de una conversación (mismo teléfono, mismo fragmento)"""
+    return zlib.crc32(str(particion).encode("utf-8")) % max(1, int(fragmentos))
+
+
+def separar_payload(payload):
+    """
+    Separa un payload del webhook en eventos individuales
+
+    Returns:
+        list: dicts con clave_dedup, tipo, wa_message_id, particion y datos
+            (el mensaje o estado tal como lo envía Meta)
+    """
+    eventos = []
+    for entry in payload.get("entry") or []:
+        for change in entry.get("changes") or []:
+            value = change.get("value") or {}
+            for status in value.get("statuses") or []:
+                wa_message_id = status.get("id")
+                estado = status.get("status")
+                if not wa_message_id or not estado:
+                    continue
+                eventos.append({
+                    "clave_dedup": f"estado:{wa_message_id}:{estado}",
+                    "tipo": "estado",
+                    "wa_message_id": wa_message_id,
+                    "particion": str(status.get("recipient_id") or ""),
+                    "datos": status
+                })
+            for mensaje in value.get("messages") or []:
+                wa_message_id = mensaje.get("id")
+                telefono = mensaje.get("from")
+                if not wa_message_id or not telefono:
+                    continue
+                eventos.append({
+                    "clave_dedup": f"mensaje:{wa_message_id}",
+                    "tipo": "mensaje",
+                    "wa_message_id": wa_message_id,
+                    "particion": str(telefono),
+                    "datos": mensaje
+                })
+    return eventos
+
+
+class WhatsAppWebhookColaModelo:
+    """Clase para encolar y consumir eventos del webhook de WhatsApp"""
+
+    def __init__(self):
+        self.base_datos = BaseDatos()
+        self.logger = obtener_logger()
+
+    def encolar_payload(self, payload, fragmentos, max_intentos=5):
+        """
+        Guarda cada mensaje y estado del payload (ignora los ya recibidos)
+
+        Lanza la excepción si no se pudo escribir, para que el webhook responda
+        con error y Meta reintente la entrega.
+
+        Returns:
+            int: cantidad de eventos nuevos
+        """
+        eventos = separar_payload(payload)
+        if not eventos:
+            return 0
+        consulta = """
+        INSERT IGNORE INTO whatsapp_webhook_entrantes
+            (clave_dedup, tipo, wa_message_id, particion, fragmento, payload, max_intentos)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+        """
+        filas = [
+            (
+                evento["clave_dedup"][:191],
+                evento["tipo"],
+                evento["wa_message_id"],
+                evento["particion"][:32],
+                calcular_fragmento(evento["particion"], fragmentos),
+                json.dumps(evento["datos"], ensure_ascii=False),
+                max_intentos
+            )
+            for evento in eventos
+        ]
+        with self.base_datos.transaccion() as cursor:
+            cursor.executemany(consulta, filas)
+            nuevos = max(cursor.rowcount, 0)
+        if nuevos < len(filas):
+            self.logger.info(f"Webhook WhatsApp: {len(filas) - nuevos} eventos duplicados ignorados")
+        return nuevos
+
+    def fragmentos_con_pendientes(self):
+        """Fragmentos que tienen eventos listos para procesar"""
+        filas = self.base_datos.obtener_todos(
+            "SELECT DISTINCT fragmento FROM whatsapp_webhook_entrantes "
+            "WHERE estado = 'pendiente' AND proximo_intento <= NOW()"
+        ) or []
+        return [int(fila['fragmento']) for fila in filas]
+
+    def obtener_pendientes(self, fragmento, limite=50):
+        """
+        Eventos pendientes de un fragmento en orden de llegada
+
+        Incluye los que esperan un reintento (listo = 0) para que el
+        procesador no adelante eventos posteriores de esa conversación.
+        """
+        consulta = """
+        SELECT id, tipo, wa_message_id, particion, payload, intentos, max_intentos,
+               proximo_intento <= NOW() AS listo
+        FROM whatsapp_webhook_entrantes
+        WHERE fragmento = %s AND estado = 'pendiente'
+        ORDER BY id
+        LIMIT %s
+        """
+        registros = self.base_datos.obtener_todos(consulta, (int(fragmento), int(limite))) or []
+        for registro in registros:
+            try:
+                registro['payload'] = json.loads(registro.get('payload') or '{}')
+            except (TypeError, ValueError):
+                registro['payload'] = {}
+        return registros
+
+    def marcar_procesado(self, registro_id):
+        consulta = """
+        UPDATE whatsapp_webhook_entrantes
+        SET estado = 'procesado', fecha_procesado = NOW(), intentos = intentos + 1, ultimo_error = NULL
+        WHERE id = %s
+        """
+        return self.base_datos.ejecutar_consulta(consulta, (registro_id,))
+
+    def marcar_procesados(self, registro_ids):
+        """Marca varios eventos como procesados con una sola sentencia"""
+        if not registro_ids:
+            return True
+        marcadores = ', '.join(['%s'] * len(registro_ids))
+        consulta = f"""
+        UPDATE whatsapp_webhook_entrantes
+        SET estado = 'procesado', fecha_procesado = NOW(), intentos = intentos + 1, ultimo_error = NULL
+        WHERE id IN ({marcadores})
+        """
+        return self.base_datos.ejecutar_consulta(consulta, tuple(registro_ids))
+
+    def marcar_error(self, registro_id, error, intentos, max_intentos):
+        """Programa un reintento con espera exponencial o marca el evento como fallido"""
+        intentos = int(intentos or 0) + 1
+        if intentos >= int(max_intentos or 0):
+            consulta = """
+            UPDATE whatsapp_webhook_entrantes
+            SET estado = 'fallido', intentos = %s, ultimo_error = %s
+            WHERE id = %s
+            """
+            return self.base_datos.ejecutar_consulta(consulta, (intentos, str(error)[:2000], registro_id))
+
+        espera = min(REINTENTO_BASE_SEGUNDOS * (2 ** (intentos - 1)), REINTENTO_MAXIMO_SEGUNDOS)
+        consulta = """
+        UPDATE whatsapp_webhook_entrantes
+        SET intentos = %s, ultimo_error = %s, proximo_intento = NOW() + INTERVAL %s SECOND
+        WHERE id = %s
+        """
+        return self.base_datos.ejecutar_consulta(consulta, (intentos, str(error)[:2000], espera, registro_id))
+
+    def purgar_procesados(self, dias=7):
+        """Elimina los eventos procesados hace más de `dias` días"""
+        consulta = """
+        DELETE FROM whatsapp_webhook_entrantes
+        WHERE estado = 'procesado' AND fecha_procesado < NOW() - INTERVAL %s DAY
+        LIMIT 5000
+        """
+        return self.base_datos.ejecutar_consulta(consulta, (int(dias),))
+
+    def obtener_resumen(self):
+        """Cantidad de eventos por estado y antigüedad del pendiente más viejo"""
+        filas = self.base_datos.obtener_todos(
+            "SELECT estado, COUNT(*) AS total, "
+            "TIMESTAMPDIFF(SECOND, MIN(fecha_creacion), NOW()) AS antiguedad_segundos "
+            "FROM whatsapp_webhook_entrantes GROUP BY estado"
+        ) or []
+        resumen = {fila['estado']: int(fila['total'] or 0) for fila in filas}
+        pendientes = next((fila for fila in filas if fila['estado'] == 'pendiente'), None)
+        resumen['antiguedad_pendiente_segundos'] = int(pendientes['antiguedad_segundos'] or 0) if pendientes else 0
+        return resumen
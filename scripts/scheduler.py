@@ -1,10 +1,24 @@
 #!/usr/bin/env python3
 """
 Scheduler para procesar notificaciones automáticamente
-Ejecutar con crontab cada minuto: */1 * * * *
+
+Modo residente (recomendado): python scripts/scheduler.py --daemon
+    Un solo proceso mantiene cargados los módulos y conexiones y ejecuta cada
+    tarea según su intervalo (SCHEDULER_INTERVALO_* en .env).
+
+Modo cron (compatibilidad): ejecutar con crontab cada minuto: */1 * * * *
+    Ejecuta todas las tareas una vez y termina.
+
+En ambos modos cada tarea toma un bloqueo GET_LOCK en MySQL, así que nunca
+corre dos veces en paralelo aunque convivan el cron y el daemon o haya varios
+servidores.
 """
+import json
 import os
+import signal
 import sys
+import threading
+import time
 from datetime import datetime
 
 # Agregar el directorio raíz al path
@@ -15,35 +29,315 @@ if ROOT_DIR not in sys.path:
 # Configurar logging
 LOG_DIR = os.path.join(ROOT_DIR, "logs")
 LOG_FILE = os.path.join(LOG_DIR, "scheduler.log")
+# Métricas por tarea del daemon (se reescribe tras cada ejecución)
+ESTADO_FILE = os.path.join(LOG_DIR, "scheduler_estado.json")
 
 # Crear directorio de logs si no existe
 os.makedirs(LOG_DIR, exist_ok=True)
 
+# Prefijo de los bloqueos con nombre en MySQL (uno por tarea)
+PREFIJO_BLOQUEO = "lirios_scheduler"
+
+
 def log_mensaje(mensaje):
     """Escribe un mensaje en el log del scheduler"""
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     with open(LOG_FILE, "a", encoding="utf-8") as f:
         f.write(f"[{timestamp}] {mensaje}\n")
 
+
+class ContextoTareas:
+    """
+    Instancias compartidas entre ejecuciones
+
+    Se crean al primer uso y se reutilizan mientras viva el proceso, en vez de
+    reimportar módulos y reconstruir modelos e integraciones en cada minuto.
+    """
+
+    def __init__(self, limite=100):
+        self.limite = limite
+        self._instancias = {}
+
+    def obtener(self, nombre, fabrica):
+        if nombre not in self._instancias:
+            self._instancias[nombre] = fabrica()
+        return self._instancias[nombre]
+
+
+def generar_notificaciones(contexto):
+    """Genera las notificaciones programadas (procedimiento en BD o envío directo)"""
+    from modelos.notificacion_modelo_v2 import NotificacionModeloV2
+    modelo = contexto.obtener('notificacion_modelo_v2', NotificacionModeloV2)
+    resultado = modelo.generar_notificaciones_programadas()
+    if resultado is not None:
+        return "generadas"
+
+    # Sin procedimiento en la BD: procesamiento directo como en procesar_notificaciones_v2
+    from integraciones.sistema_notificaciones import SistemaNotificaciones
+    sistema = contexto.obtener('sistema_notificaciones', SistemaNotificaciones)
+    total = sistema.procesar_notificaciones_programadas()
+    return f"fallback, enviadas={total}"
+
+
+def enviar_pendientes(contexto):
+    """Envía las notificaciones pendientes cuya fecha programada ya llegó"""
+    from integraciones.sistema_notificaciones_v2 import SistemaNotificacionesV2
+    sistema = contexto.obtener('sistema_notificaciones_v2', SistemaNotificacionesV2)
+    enviados, errores = sistema.procesar_notificaciones_pendientes(limite=contexto.limite)
+    return f"enviadas={enviados}, errores={errores}"
+
+
+def reintentar_whatsapp(contexto):
+    """Reintenta los mensajes de WhatsApp fallidos"""
+    from utilidades.reintentar_mensajes_whatsapp import ServicioReintentosWhatsApp
+    servicio = contexto.obtener('reintentos_whatsapp', ServicioReintentosWhatsApp)
+    resultado = servicio.procesar_reintentos(limite=contexto.limite)
+    return (f"total={resultado['total']}, exitosos={resultado['exitosos']}, "
+            f"fallidos={resultado['fallidos']}")
+
+
+def actualizar_eventos_finalizados(contexto):
+    """Marca como completados los eventos cuya fecha ya pasó"""
+    from modelos.evento_modelo import EventoModelo
+    EventoModelo().actualizar_eventos_finalizados()
+    return "actualizados"
+
+
+def procesar_outbox_notificaciones(limite=100):
+    """Envía las notificaciones encoladas (respaldo si ningún proceso web las está enviando)"""
+    from config import NOTIF_ASYNC_CONFIG
+    if not NOTIF_ASYNC_CONFIG['enabled']:
+        return "desactivado"
+    from integraciones.despachador_notificaciones import DespachadorNotificaciones
+    if not DespachadorNotificaciones.cola_disponible():
+        return "sin tabla notificaciones_outbox"
+    procesadas = DespachadorNotificaciones.obtener().procesar_pendientes(limite=limite)
+    return f"procesadas={procesadas}"
+
+
+def procesar_webhook_whatsapp(limite=500):
+    """Procesa los eventos del webhook de WhatsApp encolados (respaldo de los hilos web)"""
+    from config import WA_WEBHOOK_CONFIG
+    if not WA_WEBHOOK_CONFIG['async_enabled']:
+        return "desactivado"
+    from integraciones.procesador_webhook_whatsapp import ProcesadorWebhookWhatsApp
+    if not ProcesadorWebhookWhatsApp.cola_disponible():
+        return "sin tabla whatsapp_webhook_entrantes"
+    procesados = ProcesadorWebhookWhatsApp.obtener().procesar_pendientes(limite=limite)
+    return f"procesados={procesados}"
+
+
+def refrescar_rollups(completo=False):
+    """Refresca los agregados diarios de KPIs (kpi_*_diario) desde su marca de agua"""
+    from modelos.kpi_rollup_modelo import KpiRollupModelo
+    resultados = KpiRollupModelo().refrescar(completo=completo)
+    return ", ".join(
+        f"{nombre}={datos.get('modo', 'error')}:{datos.get('filas', 0)}"
+        for nombre, datos in resultados.items()
+    )
+
+
+class TareaProgramada:
+    """Tarea del scheduler con su intervalo y métricas de ejecución"""
+
+    def __init__(self, nombre, funcion, intervalo):
+        self.nombre = nombre
+        self.funcion = funcion
+        self.intervalo = max(1, int(intervalo))
+        self.proxima = 0.0
+        self.ejecuciones = 0
+        self.errores = 0
+        self.omitidas_por_bloqueo = 0
+        self.duracion_total = 0.0
+        self.duracion_ultima = 0.0
+        self.duracion_maxima = 0.0
+        self.ultima_ejecucion = None
+        self.ultimo_resultado = None
+        self.ultimo_error = None
+
+    def pendiente(self, ahora):
+        return ahora >= self.proxima
+
+    def ejecutar(self, base_datos):
+        """
+        Ejecuta la tarea si obtiene su bloqueo en MySQL
+
+        Returns:
+            bool: False si se omitió porque otro proceso la estaba ejecutando
+        """
+        self.proxima = time.monotonic() + self.intervalo
+        with base_datos.bloqueo_asesor(f"{PREFIJO_BLOQUEO}:{self.nombre}") as obtenido:
+            if not obtenido:
+                self.omitidas_por_bloqueo += 1
+                log_mensaje(f"OMITIDA - {self.nombre}: en ejecución en otro proceso")
+                return False
+
+            inicio = time.monotonic()
+            self.ultima_ejecucion = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            try:
+                self.ultimo_resultado = self.funcion()
+                self.ultimo_error = None
+                log_mensaje(f"OK - {self.nombre}: {self.ultimo_resultado} ({self._milisegundos(time.monotonic() - inicio)} ms)")
+            except Exception as e:
+                self.errores += 1
+                self.ultimo_error = str(e)
+                log_mensaje(f"ERROR - {self.nombre}: {str(e)}")
+            finally:
+                duracion = time.monotonic() - inicio
+                self.ejecuciones += 1
+                self.duracion_ultima = duracion
+                self.duracion_total += duracion
+                self.duracion_maxima = max(self.duracion_maxima, duracion)
+        return True
+
+    @staticmethod
+    def _milisegundos(segundos):
+        return int(segundos * 1000)
+
+    def estadisticas(self):
+        return {
+            'intervalo': self.intervalo,
+            'ejecuciones': self.ejecuciones,
+            'errores': self.errores,
+            'omitidas_por_bloqueo': self.omitidas_por_bloqueo,
+            'duracion_ultima_ms': self._milisegundos(self.duracion_ultima),
+            'duracion_promedio_ms': self._milisegundos(self.duracion_total / self.ejecuciones) if self.ejecuciones else 0,
+            'duracion_maxima_ms': self._milisegundos(self.duracion_maxima),
+            'ultima_ejecucion': self.ultima_ejecucion,
+            'ultimo_resultado': self.ultimo_resultado,
+            'ultimo_error': self.ultimo_error
+        }
+
+
+def crear_tareas(config, rollups_completo=False):
+    """Tabla de tareas del scheduler, en el orden en que se ejecutan"""
+    contexto = ContextoTareas(limite=config['limite'])
+    intervalos = config['intervalos']
+    definiciones = [
+        ('generar_notificaciones', lambda: generar_notificaciones(contexto)),
+        ('enviar_pendientes', lambda: enviar_pendientes(contexto)),
+        ('eventos_finalizados', lambda: actualizar_eventos_finalizados(contexto)),
+        ('reintentos_whatsapp', lambda: reintentar_whatsapp(contexto)),
+        # Notificaciones encoladas por pagos y cambios de estado
+        ('outbox_notificaciones', lambda: procesar_outbox_notificaciones(limite=contexto.limite)),
+        # Mensajes y estados del webhook de WhatsApp pendientes en la cola
+        ('webhook_whatsapp', lambda: procesar_webhook_whatsapp()),
+        # Agregados diarios para el tablero y reportes
+        ('rollups_kpi', lambda: refrescar_rollups(completo=rollups_completo)),
+    ]
+    return [TareaProgramada(nombre, funcion, intervalos[nombre]) for nombre, funcion in definiciones]
+
+
+def guardar_estado(tareas, inicio_proceso):
+    """Escribe las métricas de cada tarea en logs/scheduler_estado.json"""
+    estado = {
+        'pid': os.getpid(),
+        'inicio': inicio_proceso,
+        'actualizado': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        'tareas': {tarea.nombre: tarea.estadisticas() for tarea in tareas}
+    }
+    temporal = ESTADO_FILE + ".tmp"
+    try:
+        with open(temporal, "w", encoding="utf-8") as f:
+            json.dump(estado, f, indent=2, default=str)
+        os.replace(temporal, ESTADO_FILE)
+    except OSError as e:
+        log_mensaje(f"ERROR - No se pudo guardar {ESTADO_FILE}: {e}")
+
+
+def registrar_metricas(tareas):
+    for tarea in tareas:
+        datos = tarea.estadisticas()
+        log_mensaje(
+            f"METRICAS - {tarea.nombre}: ejecuciones={datos['ejecuciones']}, errores={datos['errores']}, "
+            f"omitidas={datos['omitidas_por_bloqueo']}, promedio={datos['duracion_promedio_ms']} ms, "
+            f"max={datos['duracion_maxima_ms']} ms"
+        )
+
+
+def ejecutar_daemon(tareas, intervalo_metricas):
+    """Bucle del scheduler residente; termina limpio con SIGTERM o SIGINT"""
+    from modelos.base_datos import BaseDatos
+    from utilidades.perfil_consultas import instalar_perfil
+
+    # Perfil de consultas SQL por huella (DB_PROFILER_ENABLED)
+    instalar_perfil()
+    detener = threading.Event()
+
+    def _senal(signum, frame):
+        log_mensaje(f"Señal {signum} recibida, deteniendo scheduler")
+        detener.set()
+
+    signal.signal(signal.SIGTERM, _senal)
+    signal.signal(signal.SIGINT, _senal)
+
+    base_datos = BaseDatos()
+    inicio_proceso = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    proximas_metricas = time.monotonic() + intervalo_metricas
+    log_mensaje(
+        f"INICIO - Scheduler residente (pid {os.getpid()}): "
+        + ", ".join(f"{tarea.nombre}={tarea.intervalo}s" for tarea in tareas)
+    )
+
+    while not detener.is_set():
+        for tarea in tareas:
+            if detener.is_set():
+                break
+            if not tarea.pendiente(time.monotonic()):
+                continue
+            try:
+                tarea.ejecutar(base_datos)
+            except Exception as e:
+                # Sin conexión para el bloqueo: reintentar en el próximo intervalo
+                tarea.errores += 1
+                tarea.ultimo_error = str(e)
+                log_mensaje(f"ERROR - {tarea.nombre}: no se pudo tomar el bloqueo: {e}")
+            finally:
+                BaseDatos.liberar_conexion_hilo()
+            guardar_estado(tareas, inicio_proceso)
+
+        ahora = time.monotonic()
+        if ahora >= proximas_metricas:
+            registrar_metricas(tareas)
+            proximas_metricas = ahora + intervalo_metricas
+
+        espera = min(tarea.proxima for tarea in tareas) - time.monotonic()
+        detener.wait(min(max(espera, 0.5), 60))
+
+    registrar_metricas(tareas)
+    guardar_estado(tareas, inicio_proceso)
+    from integraciones.email import IntegracionEmail
+    IntegracionEmail.cerrar_conexiones()
+    log_mensaje("FIN - Scheduler residente detenido")
+    return 0
+
+
 def main():
     """Función principal del scheduler"""
+    # --rollups-completo: reconstruye los agregados diarios desde cero
+    rollups_completo = "--rollups-completo" in sys.argv
+    daemon = "--daemon" in sys.argv
     try:
-        log_mensaje("INICIO - Procesamiento de notificaciones")
-        
         # Cambiar al directorio raíz
         os.chdir(ROOT_DIR)
-        
-        # Importar y ejecutar el procesador de notificaciones
-        # Simular argumentos de línea de comandos
-        sys.argv = ['procesar_notificaciones_v2.py', '--limite', '100']
-        from utilidades.procesar_notificaciones_v2 import main as procesar_notificaciones
-        
-        # Ejecutar el procesamiento (limite de 100 notificaciones por ejecución)
-        procesar_notificaciones()
-        
-        log_mensaje("OK - Notificaciones: procesado, Reintentos WA: procesado")
-        return 0
-        
+
+        from config import SCHEDULER_CONFIG
+        from modelos.base_datos import BaseDatos
+        tareas = crear_tareas(SCHEDULER_CONFIG, rollups_completo=rollups_completo)
+
+        if daemon:
+            return ejecutar_daemon(tareas, SCHEDULER_CONFIG['intervalo_metricas'])
+
+        log_mensaje("INICIO - Procesamiento de notificaciones")
+        base_datos = BaseDatos()
+        for tarea in tareas:
+            try:
+                tarea.ejecutar(base_datos)
+            except Exception as e:
+                tarea.errores += 1
+                log_mensaje(f"ERROR - {tarea.nombre}: no se pudo tomar el bloqueo: {e}")
+        return 1 if any(tarea.errores for tarea in tareas) else 0
+
     except Exception as e:
         error_msg = f"ERROR - {str(e)}"
         log_mensaje(error_msg)
@@ -0,0 +1,70 @@
+"""
+Caché en memoria de configuraciones (integraciones, configuración general, métricas)
+Las lecturas se comparten en todo el proceso durante CONFIG_CACHE_TTL segundos
+y los modelos la invalidan al guardar cambios. En otros procesos (workers de
+gunicorn, scheduler) el cambio se ve al vencer el TTL.
+"""
+import copy
+import threading
+import time
+from config import CONFIG_CACHE_TTL
+
+
+class CacheConfiguracion:
+    """Valores por clave con vencimiento; una sola carga concurrente por clave"""
+
+    def __init__(self, ttl=60):
+        self.ttl = float(ttl)
+        self._valores = {}
+        self._lock = threading.Lock()
+        self._locks_carga = {}
+        self._estadisticas = {'aciertos': 0, 'cargas': 0, 'invalidaciones': 0}
+
+    def obtener(self, clave, cargar):
+        """
+        Devuelve el valor de `clave`, llamando a `cargar()` si no está o venció
+
+        Se entrega una copia para que quien lo use pueda modificarlo sin
+        alterar lo guardado. Si `cargar` lanza una excepción no se guarda nada.
+        """
+        if self.ttl <= 0:
+            return cargar()
+        with self._lock:
+            entrada = self._valores.get(clave)
+            if entrada and entrada[1] > time.monotonic():
+                self._estadisticas['aciertos'] += 1
+                return copy.deepcopy(entrada[0])
+            lock_carga = self._locks_carga.setdefault(clave, threading.Lock())
+
+        with lock_carga:
+            # Otro hilo pudo cargarla mientras se esperaba
+            with self._lock:
+                entrada = self._valores.get(clave)
+                if entrada and entrada[1] > time.monotonic():
+                    self._estadisticas['aciertos'] += 1
+                    return copy.deepcopy(entrada[0])
+                generacion = self._estadisticas['invalidaciones']
+            valor = cargar()
+            with self._lock:
+                self._estadisticas['cargas'] += 1
+                # Si se invalidó durante la carga, el valor puede estar viejo: no guardarlo
+                if generacion == self._estadisticas['invalidaciones']:
+                    self._valores[clave] = (valor, time.monotonic() + self.ttl)
+            return copy.deepcopy(valor)
+
+    def invalidar(self, prefijo=None):
+        """Descarta las claves que empiezan con `prefijo` (todas si es None)"""
+        with self._lock:
+            if prefijo is None:
+                self._valores.clear()
+            else:
+                for clave in [clave for clave in self._valores if clave.startswith(prefijo)]:
+                    del self._valores[clave]
+            self._estadisticas['invalidaciones'] += 1
+
+    def estadisticas(self):
+        with self._lock:
+            return {**self._estadisticas, 'claves': len(self._valores), 'ttl': self.ttl}
+
+
+cache_configuracion = CacheConfiguracion(ttl=CONFIG_CACHE_TTL)
@@ -0,0 +1,67 @@
+"""
+Caché en memoria acotada (LRU) con vencimiento por entrada
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class CacheLRU:
+    """
+    Guarda hasta `max_entradas` valores; al llenarse descarta el menos usado.
+
+    Cada entrada vence a los `ttl` segundos (o antes, si se indica al guardar).
+    Es segura entre hilos y vive solo en el proceso actual.
+    """
+
+    def __init__(self, max_entradas=1000, ttl=60):
+        self.max_entradas = max(1, int(max_entradas))
+        self.ttl = float(ttl)
+        self._valores = OrderedDict()
+        self._lock = threading.Lock()
+        self._estadisticas = {'aciertos': 0, 'fallos': 0, 'descartes': 0, 'invalidaciones': 0}
+
+    def obtener(self, clave):
+        """Valor guardado para `clave` o None si no está o venció"""
+        with self._lock:
+            entrada = self._valores.get(clave)
+            if entrada is None:
+                self._estadisticas['fallos'] += 1
+                return None
+            valor, vence = entrada
+            if vence <= time.monotonic():
+                del self._valores[clave]
+                self._estadisticas['fallos'] += 1
+                return None
+            self._valores.move_to_end(clave)
+            self._estadisticas['aciertos'] += 1
+            return valor
+
+    def guardar(self, clave, valor, ttl=None):
+        ttl = self.ttl if ttl is None else min(float(ttl), self.ttl)
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._valores[clave] = (valor, time.monotonic() + ttl)
+            self._valores.move_to_end(clave)
+            while len(self._valores) > self.max_entradas:
+                self._valores.popitem(last=False)
+                self._estadisticas['descartes'] += 1
+
+    def invalidar(self, clave):
+        with self._lock:
+            self._valores.pop(clave, None)
+            self._estadisticas['invalidaciones'] += 1
+
+    def limpiar(self):
+        with self._lock:
+            self._valores.clear()
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                **self._estadisticas,
+                'entradas': len(self._valores),
+                'max_entradas': self.max_entradas,
+                'ttl': self.ttl
+            }
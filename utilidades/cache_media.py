@@ -0,0 +1,278 @@
+"""
+Caché en disco de la media de WhatsApp (/api/whatsapp_chat/media/<media_id>)
+
+Cada archivo se guarda una sola vez con su SHA-256 como nombre
+(objetos/ab/abcdef...) y un índice por media_id apunta al objeto. Al superar
+MEDIA_CACHE_MAX_MB se borran los objetos usados hace más tiempo (la fecha de
+modificación se renueva en cada lectura) y las entradas del índice que
+apuntaban a ellos. Varios procesos pueden compartir el directorio: la
+escritura es atómica (archivo temporal + rename).
+"""
+import hashlib
+import json
+import os
+import queue
+import re
+import tempfile
+import threading
+import time
+from pathlib import Path
+from config import MEDIA_CACHE_CONFIG
+from utilidades.logger import obtener_logger
+
+
+# Los media_id de Meta son numéricos; cualquier otra cosa no se usa como nombre de archivo
+_PATRON_MEDIA_ID = re.compile(r'^[A-Za-z0-9_.-]{1,128}$')
+
+
+class _ArchivoConHash:
+    """Archivo de escritura que calcula el SHA-256 y el tamaño de lo escrito"""
+
+    def __init__(self, archivo):
+        self._archivo = archivo
+        self.hash = hashlib.sha256()
+        self.tamano = 0
+
+    def write(self, datos):
+        self.hash.update(datos)
+        self.tamano += len(datos)
+        return self._archivo.write(datos)
+
+
+class CacheMedia:
+    """Media de WhatsApp en disco, direccionada por contenido y con expulsión LRU por tamaño"""
+
+    _instancia = None
+    _lock_instancia = threading.Lock()
+
+    def __init__(self, directorio, max_bytes, precarga=True, tamano_cola=200):
+        directorio = Path(directorio)
+        if not directorio.is_absolute():
+            directorio = Path(__file__).parent.parent / directorio
+        self.directorio = directorio
+        self.max_bytes = max_bytes
+        self.precarga = precarga
+        self.logger = obtener_logger()
+        self._lock = threading.Lock()
+        self._en_curso = {}
+        self._tamano_total = None
+        self._tamano_cola = tamano_cola
+        self._pendientes = None
+        self._pid = None
+        for subdirectorio in ('objetos', 'indice', 'tmp'):
+            (self.directorio / subdirectorio).mkdir(parents=True, exist_ok=True)
+
+    @classmethod
+    def obtener(cls):
+        with cls._lock_instancia:
+            if cls._instancia is None:
+                cls._instancia = cls(
+                    directorio=MEDIA_CACHE_CONFIG['directorio'],
+                    max_bytes=MEDIA_CACHE_CONFIG['max_mb'] * 1024 * 1024,
+                    precarga=MEDIA_CACHE_CONFIG['prefetch']
+                )
+            return cls._instancia
+
+    def _ruta_indice(self, media_id):
+        if not media_id or not _PATRON_MEDIA_ID.match(media_id):
+            return None
+        return self.directorio / 'indice' / f"{media_id}.json"
+
+    def _ruta_objeto(self, sha256):
+        return self.directorio / 'objetos' / sha256[:2] / sha256
+
+    def buscar(self, media_id):
+        """
+        Media ya descargada
+
+        Returns:
+            tuple: (ruta, mime_type, sha256) o None si no está en caché
+        """
+        ruta_indice = self._ruta_indice(media_id)
+        if ruta_indice is None:
+            return None
+        try:
+            with open(ruta_indice, 'r', encoding='utf-8') as archivo:
+                entrada = json.load(archivo)
+        except (OSError, ValueError):
+            return None
+        ruta = self._ruta_objeto(entrada['sha256'])
+        try:
+            # Marca de uso para la expulsión LRU
+            os.utime(ruta)
+        except OSError:
+            # El objeto fue expulsado: el índice quedó huérfano
+            self._borrar(ruta_indice)
+            return None
+        return str(ruta), entrada.get('mime_type') or 'application/octet-stream', entrada['sha256']
+
+    def obtener_media(self, media_id, descargar=None):
+        """
+        Media desde el disco o, si no está, descargada una sola vez aunque la
+        pidan varios hilos a la vez
+
+        Args:
+            media_id: Id de la media en WhatsApp
+            descargar: Función (media_id, archivo) -> mime_type o None; por
+                defecto IntegracionWhatsApp.descargar_media_a_archivo
+
+        Returns:
+            tuple: (ruta, mime_type, sha256) o None si no se pudo obtener
+        """
+        encontrado = self.buscar(media_id)
+        if encontrado or self._ruta_indice(media_id) is None:
+            return encontrado
+        with self._lock:
+            lock_media = self._en_curso.setdefault(media_id, threading.Lock())
+        try:
+            with lock_media:
+                encontrado = self.buscar(media_id)
+                if encontrado:
+                    return encontrado
+                return self._descargar(media_id, descargar)
+        finally:
+            with self._lock:
+                self._en_curso.pop(media_id, None)
+
+    def _descargar(self, media_id, descargar):
+        if descargar is None:
+            from integraciones.whatsapp import IntegracionWhatsApp
+            descargar = IntegracionWhatsApp().descargar_media_a_archivo
+        descriptor, ruta_temporal = tempfile.mkstemp(dir=self.directorio / 'tmp')
+        try:
+            with os.fdopen(descriptor, 'wb') as archivo:
+                escritor = _ArchivoConHash(archivo)
+                mime_type = descargar(media_id, escritor)
+            if not mime_type or not escritor.tamano:
+                return None
+            sha256 = escritor.hash.hexdigest()
+            ruta = self._ruta_objeto(sha256)
+            nuevo = not ruta.exists()
+            if nuevo:
+                ruta.parent.mkdir(exist_ok=True)
+                os.replace(ruta_temporal, ruta)
+            self._escribir_indice(media_id, {'sha256': sha256, 'mime_type': mime_type, 'tamano': escritor.tamano})
+        finally:
+            self._borrar(ruta_temporal)
+        if nuevo:
+            self._sumar(escritor.tamano)
+        return str(ruta), mime_type, sha256
+
+    def _escribir_indice(self, media_id, entrada):
+        ruta_indice = self._ruta_indice(media_id)
+        descriptor, ruta_temporal = tempfile.mkstemp(dir=self.directorio / 'tmp')
+        with os.fdopen(descriptor, 'w', encoding='utf-8') as archivo:
+            json.dump(entrada, archivo)
+        os.replace(ruta_temporal, ruta_indice)
+
+    def _objetos(self):
+        """(ruta, tamaño, fecha de último uso) de cada objeto en disco"""
+        objetos = []
+        for ruta in (self.directorio / 'objetos').glob('*/*'):
+            try:
+                estado = ruta.stat()
+            except OSError:
+                continue
+            objetos.append((ruta, estado.st_size, estado.st_mtime))
+        return objetos
+
+    def _sumar(self, tamano):
+        with self._lock:
+            if self._tamano_total is None:
+                self._tamano_total = sum(objeto[1] for objeto in self._objetos())
+            else:
+                self._tamano_total += tamano
+            excedido = self._tamano_total > self.max_bytes
+        if excedido:
+            self.expulsar()
+
+    def expulsar(self):
+        """Borra los objetos menos usados hasta quedar en el 90% de max_bytes"""
+        with self._lock:
+            # Otros procesos también escriben: se parte del tamaño real en disco
+            objetos = sorted(self._objetos(), key=lambda objeto: objeto[2])
+            total = sum(objeto[1] for objeto in objetos)
+            objetivo = self.max_bytes * 0.9
+            borrados = set()
+            for ruta, tamano, _ in objetos:
+                if total <= objetivo:
+                    break
+                if self._borrar(ruta):
+                    total -= tamano
+                    borrados.add(ruta.name)
+            self._tamano_total = total
+        if borrados:
+            indices = self._borrar_indices(borrados)
+            self.logger.info(
+                f"Caché de media: {len(borrados)} archivos y {indices} índices expulsados, "
+                f"{total / 1048576:.1f} MB en disco"
+            )
+
+    def _borrar_indices(self, sha256s):
+        """Borra las entradas del índice que apuntan a objetos expulsados; retorna cuántas"""
+        borrados = 0
+        for ruta_indice in (self.directorio / 'indice').glob('*.json'):
+            try:
+                with open(ruta_indice, 'r', encoding='utf-8') as archivo:
+                    sha256 = json.load(archivo).get('sha256')
+            except (OSError, ValueError):
+                continue
+            # El objeto pudo volver a descargarse mientras tanto
+            if sha256 in sha256s and not self._ruta_objeto(sha256).exists() and self._borrar(ruta_indice):
+                borrados += 1
+        return borrados
+
+    @staticmethod
+    def _borrar(ruta):
+        try:
+            os.remove(ruta)
+            return True
+        except OSError:
+            return False
+
+    def precargar(self, media_id):
+        """Encola la descarga en segundo plano (media recibida por el webhook)"""
+        if not self.precarga or self._ruta_indice(media_id) is None:
+            return
+        self._asegurar_hilo()
+        try:
+            self._pendientes.put_nowait(media_id)
+        except queue.Full:
+            self.logger.warning(f"Caché de media: cola de precarga llena, {media_id} se descargará al verla")
+
+    def _asegurar_hilo(self):
+        """Hilo de precarga (también tras un fork, donde los hilos no se heredan)"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._pendientes = queue.Queue(self._tamano_cola)
+            threading.Thread(target=self._bucle_precarga, name="cache-media-precarga", daemon=True).start()
+
+    def _bucle_precarga(self):
+        from modelos.base_datos import BaseDatos
+        while True:
+            media_id = self._pendientes.get()
+            inicio = time.monotonic()
+            try:
+                # Cliente por descarga (descargar=None): toma el token vigente de la configuración
+                if self.obtener_media(media_id):
+                    self.logger.debug(
+                        f"Caché de media: {media_id} precargada en {time.monotonic() - inicio:.2f}s"
+                    )
+            except Exception as e:
+                self.logger.warning(f"Caché de media: no se pudo precargar {media_id}: {e}")
+            finally:
+                BaseDatos.liberar_conexion_hilo()
+
+
+def precargar_media(media_id):
+    """Descarga en segundo plano la media de un mensaje entrante; nunca lanza excepciones"""
+    if not MEDIA_CACHE_CONFIG['enabled'] or not media_id:
+        return
+    try:
+        CacheMedia.obtener().precargar(media_id)
+    except Exception as e:
+        obtener_logger().warning(f"Caché de media: no se pudo encolar {media_id}: {e}")
@@ -1,11 +1,17 @@
 """
 Sistema de logging para la aplicación
 Almacena logs en archivos de texto, uno por cada día
+
+Las líneas se encolan y un hilo aparte las escribe por lotes sobre el archivo
+del día, que se mantiene abierto (LOG_CONFIG en config.py).
 """
+import atexit
 import os
+import queue
 import threading
 from datetime import datetime
 from pathlib import Path
+from config import LOG_CONFIG
 
 
 class Logger:
@@ -17,15 +23,24 @@ class Logger:
     INFO = "INFO"
     DEBUG = "DEBUG"
     
+    # Prioridad de cada nivel (los tipos personalizados de log() cuentan como INFO)
+    PRIORIDADES = {DEBUG: 10, INFO: 20, WARNING: 30, ERROR: 40}
+    
     _instance = None
     _lock = threading.Lock()
     
-    def __init__(self, directorio_logs="logs"):
+    def __init__(self, directorio_logs="logs", nivel=None, asincrono=None, tamano_cola=None,
+                 tamano_lote=None, intervalo_vaciado=None):
         """
         Inicializa el logger
         
         Args:
             directorio_logs: Nombre del directorio donde se guardarán los logs
+            nivel: Nivel mínimo a escribir (por defecto LOG_CONFIG['level'])
+            asincrono: Escribir desde un hilo aparte (por defecto LOG_CONFIG['async'])
+            tamano_cola: Líneas en espera como máximo antes de descartar
+            tamano_lote: Líneas que se escriben como máximo por vaciado
+            intervalo_vaciado: Segundos máximos que una línea espera en memoria
         """
         # Obtener la ruta del directorio del proyecto
         self.directorio_base = Path(__file__).parent.parent
@@ -34,8 +49,28 @@ class Logger:
         # Crear directorio de logs si no existe
         self.directorio_logs.mkdir(exist_ok=True)
         
-        # Lock para escrituras thread-safe
+        nivel = (nivel or LOG_CONFIG['level']).upper()
+        self.nivel_minimo = self.PRIORIDADES.get(nivel, self.PRIORIDADES[self.INFO])
+        self.asincrono = LOG_CONFIG['async'] if asincrono is None else asincrono
+        self.tamano_lote = max(1, int(tamano_lote or LOG_CONFIG['batch_size']))
+        self.intervalo_vaciado = float(intervalo_vaciado or LOG_CONFIG['flush_interval'])
+        self._tamano_cola = max(1, int(tamano_cola or LOG_CONFIG['queue_size']))
+        
+        # Lock para escrituras thread-safe (archivo abierto y cambio de día)
         self.archivo_lock = threading.Lock()
+        self._archivo = None
+        self._fecha_archivo = None
+        
+        self._cola = queue.Queue(self._tamano_cola)
+        self._hilo = None
+        self._pid = None
+        self._lock_hilo = threading.Lock()
+        self._detener = threading.Event()
+        self._lock_estadisticas = threading.Lock()
+        self._estadisticas = {'escritas': 0, 'descartadas': 0, 'lotes': 0, 'errores_escritura': 0}
+        self._descartadas_por_nivel = {}
+        self._descartadas_sin_informar = 0
+        atexit.register(self.cerrar)
     
     @classmethod
     def obtener_instancia(cls, directorio_logs="logs"):
@@ -44,7 +79,7 @@ class Logger:
         
         Args:
             directorio_logs: Nombre del directorio donde se guardarán los logs
-            
+        
         Returns:
             Logger: Instancia única del logger
         """
@@ -60,7 +95,7 @@ class Logger:
         
         Args:
             fecha: Objeto datetime. Si es None, usa la fecha actual
-            
+        
         Returns:
             Path: Ruta del archivo de log
         """
@@ -72,31 +107,143 @@ class Logger:
     
     def _escribir_log(self, tipo, mensaje):
         """
-        Escribe un log en el archivo correspondiente
+        Registra un log en el archivo correspondiente
+        
+        En modo asíncrono solo encola la línea; si la cola está llena la
+        descarta y la cuenta en lugar de bloquear al hilo que registra. Los
+        ERROR nunca se descartan: con la cola llena se escriben en el momento.
         
         Args:
             tipo: Tipo de log (ERROR, WARNING, INFO, DEBUG)
             mensaje: Mensaje a escribir
         """
-        # Obtener fecha y hora actual
-        ahora = datetime.now()
-        fecha_hora = ahora.strftime("%Y-%m-%d %H:%M:%S")
-        
-        # Formatear línea de log
-        linea_log = f"[{fecha_hora}] [{tipo}] {mensaje}\n"
-        
-        # Obtener ruta del archivo
-        ruta_archivo = self._obtener_ruta_archivo(ahora)
+        if self.PRIORIDADES.get(tipo, self.PRIORIDADES[self.INFO]) < self.nivel_minimo:
+            return
+        registro = (datetime.now(), tipo, mensaje)
+        if not self.asincrono:
+            self._escribir_lote([registro])
+            return
+        self._asegurar_hilo()
+        try:
+            self._cola.put_nowait(registro)
+        except queue.Full:
+            if tipo == self.ERROR:
+                self._escribir_lote([registro])
+                return
+            with self._lock_estadisticas:
+                self._estadisticas['descartadas'] += 1
+                self._descartadas_sin_informar += 1
+                self._descartadas_por_nivel[tipo] = self._descartadas_por_nivel.get(tipo, 0) + 1
+    
+    def _asegurar_hilo(self):
+        """Arranca el hilo escritor (también tras un fork, donde el hilo no se hereda)"""
+        if self._pid == os.getpid() and self._hilo is not None:
+            return
+        with self._lock_hilo:
+            if self._pid == os.getpid() and self._hilo is not None:
+                return
+            if self._pid is not None:
+                # Proceso hijo: la cola y el archivo heredados pueden estar a medio usar
+                self._cola = queue.Queue(self._tamano_cola)
+                self.archivo_lock = threading.Lock()
+                self._archivo = None
+                self._fecha_archivo = None
+            self._pid = os.getpid()
+            self._detener.clear()
+            self._hilo = threading.Thread(target=self._bucle_escritura, name="logger-escritor", daemon=True)
+            self._hilo.start()
+    
+    def _bucle_escritura(self):
+        while not self._detener.is_set():
+            try:
+                primero = self._cola.get(timeout=self.intervalo_vaciado)
+            except queue.Empty:
+                continue
+            self._escribir_lote(self._tomar_lote(primero))
+    
+    def _tomar_lote(self, primero=None):
+        """Saca de la cola hasta tamano_lote líneas sin esperar"""
+        lote = [primero] if primero is not None else []
+        while len(lote) < self.tamano_lote:
+            try:
+                lote.append(self._cola.get_nowait())
+            except queue.Empty:
+                break
+        return lote
+    
+    def _escribir_lote(self, lote):
+        """Escribe las líneas en el archivo de su día y vacía el buffer una vez"""
+        with self._lock_estadisticas:
+            descartadas = self._descartadas_sin_informar
+            self._descartadas_sin_informar = 0
+        if descartadas:
+            lote = lote + [(datetime.now(), self.WARNING,
+                            f"Logger: {descartadas} líneas descartadas por cola llena")]
         
-        # Escribir en el archivo (thread-safe)
         with self.archivo_lock:
             try:
-                with open(ruta_archivo, 'a', encoding='utf-8') as archivo:
-                    archivo.write(linea_log)
+                for ahora, tipo, mensaje in lote:
+                    fecha = ahora.date()
+                    if self._archivo is None or fecha != self._fecha_archivo:
+                        self._abrir_archivo(ahora)
+                    self._archivo.write(f"[{ahora.strftime('%Y-%m-%d %H:%M:%S')}] [{tipo}] {mensaje}\n")
+                if self._archivo is not None:
+                    self._archivo.flush()
             except Exception as e:
                 # Si hay un error al escribir, intentar imprimir en consola
                 print(f"Error al escribir en el log: {e}")
-                print(f"Intento de log: {linea_log}")
+                for ahora, tipo, mensaje in lote[-5:]:
+                    print(f"Intento de log: [{tipo}] {mensaje}")
+                self._cerrar_archivo()
+                with self._lock_estadisticas:
+                    self._estadisticas['errores_escritura'] += 1
+                return
+        with self._lock_estadisticas:
+            self._estadisticas['escritas'] += len(lote)
+            self._estadisticas['lotes'] += 1
+    
+    def _abrir_archivo(self, fecha):
+        """Cierra el archivo del día anterior y abre (en modo append) el de `fecha`"""
+        self._cerrar_archivo()
+        self._archivo = open(self._obtener_ruta_archivo(fecha), 'a', encoding='utf-8')
+        self._fecha_archivo = fecha.date()
+    
+    def _cerrar_archivo(self):
+        if self._archivo is not None:
+            try:
+                self._archivo.close()
+            except Exception:
+                pass
+        self._archivo = None
+        self._fecha_archivo = None
+    
+    def vaciar(self):
+        """Escribe de inmediato lo que haya en la cola (desde el hilo que llama)"""
+        while True:
+            lote = self._tomar_lote()
+            if not lote:
+                break
+            self._escribir_lote(lote)
+    
+    def cerrar(self):
+        """Detiene el hilo escritor, vacía la cola y cierra el archivo (al salir del proceso)"""
+        self._detener.set()
+        if self._hilo is not None and self._pid == os.getpid():
+            self._hilo.join(timeout=2)
+        self.vaciar()
+        with self.archivo_lock:
+            self._cerrar_archivo()
+    
+    def estadisticas(self):
+        """Líneas escritas, descartadas (total y por nivel) y en espera"""
+        with self._lock_estadisticas:
+            return {
+                **self._estadisticas,
+                'descartadas_por_nivel': dict(self._descartadas_por_nivel),
+                'en_cola': self._cola.qsize(),
+                'capacidad_cola': self._tamano_cola,
+                'asincrono': self.asincrono
+            }
     
     def error(self, mensaje):
         """
@@ -152,9 +299,8 @@ def obtener_logger(directorio_logs="logs"):
     
     Args:
         directorio_logs: Nombre del directorio donde se guardarán los logs
-        
+    
     Returns:
         Logger: Instancia del logger
     """
     return Logger.obtener_instancia(directorio_logs)
-
@@ -0,0 +1,210 @@
+"""
+Migraciones versionadas del esquema de la base de datos
+
+Cada archivo de migraciones/ se llama NNNN_descripcion.sql o NNNN_descripcion.py
+y se aplica una sola vez, en orden de versión; las aplicadas quedan en la
+tabla schema_version. Las migraciones .py definen `aplicar(base_datos)` y
+lanzan una excepción si fallan.
+
+Uso:
+    python utilidades/migraciones.py            # aplica las pendientes
+    python utilidades/migraciones.py --estado   # lista aplicadas y pendientes
+    python utilidades/migraciones.py --hasta 3  # aplica hasta la versión 3
+"""
+import argparse
+import hashlib
+import importlib.util
+import os
+import re
+import sys
+import time
+
+# Agregar el directorio raíz al path para importar config y modelos
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modelos.base_datos import BaseDatos
+from modelos.esquema import EsquemaBD
+from utilidades.logger import obtener_logger
+
+
+DIRECTORIO_MIGRACIONES = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migraciones'
+)
+# Bloqueo GET_LOCK para que dos procesos no apliquen migraciones a la vez
+NOMBRE_BLOQUEO = "lirios_migraciones"
+PATRON_ARCHIVO = re.compile(r'^(\d+)_([\w-]+)\.(sql|py)$')
+
+
+def separar_sentencias(script_sql):
+    """Divide un script SQL en sentencias (terminadas en ';' al final de línea)"""
+    sentencias = []
+    actual = ""
+    for linea in script_sql.split('\n'):
+        linea_limpia = linea.strip()
+        if not linea_limpia or linea_limpia.startswith('--'):
+            continue
+        actual += linea + "\n"
+        if linea.rstrip().endswith(';'):
+            sentencia = actual.strip().rstrip(';').strip()
+            if sentencia:
+                sentencias.append(sentencia)
+            actual = ""
+    if actual.strip():
+        sentencias.append(actual.strip())
+    return sentencias
+
+
+class Migracion:
+    """Un archivo de migraciones/"""
+
+    def __init__(self, version, nombre, ruta):
+        self.version = version
+        self.nombre = nombre
+        self.ruta = ruta
+        self.tipo = ruta.rsplit('.', 1)[-1]
+        with open(ruta, 'rb') as archivo:
+            self.checksum = hashlib.sha256(archivo.read()).hexdigest()
+
+    def aplicar(self, base_datos):
+        if self.tipo == 'sql':
+            with open(self.ruta, 'r', encoding='utf-8') as archivo:
+                sentencias = separar_sentencias(archivo.read())
+            # El DDL hace commit implícito en MySQL: una sentencia fallida detiene
+            # la migración y las anteriores quedan aplicadas (escribirlas idempotentes)
+            with base_datos.transaccion() as cursor:
+                for sentencia in sentencias:
+                    cursor.execute(sentencia)
+        else:
+            spec = importlib.util.spec_from_file_location(f"migracion_{self.version:04d}", self.ruta)
+            modulo = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(modulo)
+            modulo.aplicar(base_datos)
+
+
+class GestorMigraciones:
+    """Aplica las migraciones pendientes y registra cada una en schema_version"""
+
+    def __init__(self, directorio=DIRECTORIO_MIGRACIONES):
+        self.directorio = directorio
+        self.base_datos = BaseDatos()
+        self.logger = obtener_logger()
+
+    def disponibles(self):
+        """Migraciones del directorio ordenadas por versión"""
+        migraciones = {}
+        for archivo in sorted(os.listdir(self.directorio)):
+            coincidencia = PATRON_ARCHIVO.match(archivo)
+            if not coincidencia:
+                continue
+            version = int(coincidencia.group(1))
+            if version in migraciones:
+                raise ValueError(f"Versión de migración repetida: {version} ({archivo})")
+            migraciones[version] = Migracion(version, coincidencia.group(2), os.path.join(self.directorio, archivo))
+        return [migraciones[version] for version in sorted(migraciones)]
+
+    def _asegurar_tabla_versiones(self):
+        with self.base_datos.transaccion() as cursor:
+            cursor.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INT PRIMARY KEY,
+                nombre VARCHAR(150) NOT NULL,
+                checksum CHAR(64) NOT NULL,
+                duracion_ms INT NOT NULL DEFAULT 0,
+                fecha_aplicada TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+            """)
+
+    def aplicadas(self):
+        """dict {version: fila de schema_version}; vacío si la tabla aún no existe"""
+        if not EsquemaBD.tabla_existe('schema_version'):
+            return {}
+        filas = self.base_datos.obtener_todos(
+            "SELECT version, nombre, checksum, duracion_ms, fecha_aplicada FROM schema_version ORDER BY version"
+        ) or []
+        return {int(fila['version']): fila for fila in filas}
+
+    def pendientes(self):
+        aplicadas = self.aplicadas()
+        return [migracion for migracion in self.disponibles() if migracion.version not in aplicadas]
+
+    def estado(self):
+        """Lista de dicts con version, nombre, aplicada, fecha y si cambió el archivo"""
+        aplicadas = self.aplicadas()
+        resultado = []
+        for migracion in self.disponibles():
+            fila = aplicadas.get(migracion.version)
+            resultado.append({
+                'version': migracion.version,
+                'nombre': migracion.nombre,
+                'aplicada': fila is not None,
+                'fecha_aplicada': fila.get('fecha_aplicada') if fila else None,
+                'modificada': bool(fila) and fila.get('checksum') != migracion.checksum
+            })
+        return resultado
+
+    def migrar(self, hasta=None, timeout_bloqueo=60):
+        """
+        Aplica en orden las migraciones pendientes (hasta la versión `hasta`)
+
+        Se detiene en la primera que falle y lanza la excepción.
+
+        Returns:
+            list: versiones aplicadas
+        """
+        with self.base_datos.bloqueo_asesor(NOMBRE_BLOQUEO, timeout_bloqueo) as obtenido:
+            if not obtenido:
+                raise RuntimeError("Otro proceso está aplicando migraciones")
+            self._asegurar_tabla_versiones()
+            EsquemaBD.invalidar()
+            aplicadas = []
+            for migracion in self.pendientes():
+                if hasta is not None and migracion.version > hasta:
+                    break
+                self.logger.info(f"Aplicando migración {migracion.version:04d}_{migracion.nombre}")
+                inicio = time.monotonic()
+                try:
+                    migracion.aplicar(self.base_datos)
+                except Exception as e:
+                    self.logger.error(f"Falló la migración {migracion.version:04d}_{migracion.nombre}: {e}")
+                    raise
+                finally:
+                    # Aplicada o a medias, el esquema cambió
+                    EsquemaBD.invalidar()
+                duracion_ms = int((time.monotonic() - inicio) * 1000)
+                with self.base_datos.transaccion() as cursor:
+                    cursor.execute(
+                        "INSERT INTO schema_version (version, nombre, checksum, duracion_ms) VALUES (%s, %s, %s, %s)",
+                        (migracion.version, migracion.nombre, migracion.checksum, duracion_ms)
+                    )
+                aplicadas.append(migracion.version)
+            return aplicadas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migraciones del esquema de Lirios Eventos")
+    parser.add_argument("--estado", action="store_true", help="Solo muestra las migraciones aplicadas y pendientes")
+    parser.add_argument("--hasta", type=int, help="Aplica hasta esta versión (inclusive)")
+    args = parser.parse_args()
+
+    gestor = GestorMigraciones()
+    if args.estado:
+        for fila in gestor.estado():
+            marca = "[OK]" if fila['aplicada'] else "[PENDIENTE]"
+            aviso = " (archivo modificado después de aplicarse)" if fila['modificada'] else ""
+            print(f"{marca} {fila['version']:04d}_{fila['nombre']}{aviso}")
+        return 0
+
+    try:
+        aplicadas = gestor.migrar(hasta=args.hasta)
+    except Exception as e:
+        print(f"[ERROR] {e}")
+        return 1
+    if aplicadas:
+        print(f"[OK] Migraciones aplicadas: {', '.join(f'{version:04d}' for version in aplicadas)}")
+    else:
+        print("[OK] El esquema está al día")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,363 @@
+"""
+Perfil de consultas SQL agrupadas por huella
+
+Cada sentencia que pasa por BaseDatos se normaliza a una huella (valores
+reemplazados por ?) y se acumulan cantidad, tiempo total, p95 y filas por
+huella. Se activa con DB_PROFILER_ENABLED; cada proceso vuelca su resumen a
+logs/perfil_consultas_<pid>.json y la CLI une los de los procesos activos.
+
+Uso:
+    python utilidades/perfil_consultas.py                 # 20 huellas con más tiempo total
+    python utilidades/perfil_consultas.py --orden p95 --top 10
+    python utilidades/perfil_consultas.py --todos         # incluye procesos terminados
+    python utilidades/perfil_consultas.py --limpiar       # borra los volcados
+"""
+import argparse
+import atexit
+import glob
+import json
+import math
+import os
+import queue
+import re
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+# Agregar el directorio raíz al path para importar config y modelos
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import PERFIL_CONSULTAS_CONFIG
+
+
+DIRECTORIO_VOLCADOS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'logs')
+ORDENES = ('total', 'p95', 'cantidad', 'filas', 'promedio')
+# Un volcado sin renovar durante estos intervalos es de un proceso terminado (otro
+# despliegue, un worker reciclado): no se mezcla con los actuales
+INTERVALOS_VOLCADO_VIGENTE = 3
+
+_RE_COMENTARIOS = re.compile(r'/\*.*?\*/|--[^\n]*', re.S)
+_RE_CADENAS = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.)*\"")
+_RE_MARCADORES = re.compile(r'%\(\w+\)s|%s')
+_RE_NUMEROS = re.compile(r'\b\d+(?:\.\d+)?\b')
+_RE_LISTAS = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_RE_FILAS_VALUES = re.compile(r'\(\?\+\)(?:\s*,\s*\(\?\+\))+')
+_RE_ESPACIOS = re.compile(r'\s+')
+
+
+def normalizar(consulta):
+    """
+    Huella de una sentencia: sin comentarios ni valores literales
+
+    Las listas IN (...) y los VALUES de varias filas se reducen a (?+) para
+    que no cambie la huella con la cantidad de elementos.
+    """
+    huella = _RE_COMENTARIOS.sub(' ', str(consulta))
+    huella = _RE_CADENAS.sub('?', huella)
+    huella = _RE_MARCADORES.sub('?', huella)
+    huella = _RE_NUMEROS.sub('?', huella)
+    huella = _RE_LISTAS.sub('(?+)', huella)
+    huella = _RE_FILAS_VALUES.sub('(?+)', huella)
+    return _RE_ESPACIOS.sub(' ', huella).strip().lower()
+
+
+def percentil(valores, porcentaje):
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    indice = max(0, math.ceil(porcentaje / 100 * len(ordenados)) - 1)
+    return ordenados[indice]
+
+
+class EstadisticaConsulta:
+    """Acumulado de una huella"""
+
+    __slots__ = ('cantidad', 'total', 'maximo', 'filas', 'errores', 'muestras', 'ejemplo', 'explain')
+
+    def __init__(self, ejemplo, muestras):
+        self.cantidad = 0
+        self.total = 0.0
+        self.maximo = 0.0
+        self.filas = 0
+        self.errores = 0
+        self.muestras = deque(maxlen=muestras)
+        self.ejemplo = ejemplo
+        self.explain = None
+
+    def como_dict(self, huella):
+        return {
+            'huella': huella,
+            'cantidad': self.cantidad,
+            'total_ms': round(self.total * 1000, 2),
+            'promedio_ms': round(self.total * 1000 / self.cantidad, 3) if self.cantidad else 0.0,
+            'p95_ms': round(percentil(self.muestras, 95) * 1000, 3),
+            'max_ms': round(self.maximo * 1000, 3),
+            'filas': self.filas,
+            'filas_promedio': round(self.filas / self.cantidad, 1) if self.cantidad else 0.0,
+            'errores': self.errores,
+            'ejemplo': self.ejemplo,
+            'explain': self.explain
+        }
+
+
+class PerfilConsultas:
+    """Acumula las sentencias del proceso por huella (observador de BaseDatos)"""
+
+    _instancia = None
+    _lock_instancia = threading.Lock()
+
+    def __init__(self, explain_ms=0, max_huellas=2000, muestras=500, intervalo_volcado=60):
+        self.explain_ms = explain_ms
+        self.max_huellas = max(1, int(max_huellas))
+        self.muestras = max(1, int(muestras))
+        self.intervalo_volcado = intervalo_volcado
+        self._lock = threading.Lock()
+        self._estadisticas = {}
+        self._huellas_sql = {}
+        self._huellas_ignoradas = 0
+        self._desde = datetime.now()
+        self._explicar = queue.Queue(100)
+        self._interno = threading.local()
+        self._hilo = None
+        self._pid = None
+
+    @classmethod
+    def obtener(cls):
+        with cls._lock_instancia:
+            if cls._instancia is None:
+                cls._instancia = cls(
+                    explain_ms=PERFIL_CONSULTAS_CONFIG['explain_ms'],
+                    max_huellas=PERFIL_CONSULTAS_CONFIG['max_huellas'],
+                    muestras=PERFIL_CONSULTAS_CONFIG['muestras'],
+                    intervalo_volcado=PERFIL_CONSULTAS_CONFIG['intervalo_volcado']
+                )
+            return cls._instancia
+
+    def instalar(self):
+        """Empieza a medir todas las sentencias de BaseDatos en este proceso"""
+        from modelos.base_datos import BaseDatos
+        BaseDatos.agregar_observador(self.observar)
+        atexit.register(self.volcar)
+        self._asegurar_hilo()
+
+    def _asegurar_hilo(self):
+        """Hilo de EXPLAIN y volcados (también tras un fork, donde el hilo no se hereda)"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._hilo = threading.Thread(target=self._bucle, name="perfil-consultas", daemon=True)
+            self._hilo.start()
+
+    def _huella(self, consulta):
+        huella = self._huellas_sql.get(consulta)
+        if huella is None:
+            huella = normalizar(consulta)
+            if len(self._huellas_sql) < 5000:
+                self._huellas_sql[consulta] = huella
+        return huella
+
+    def observar(self, consulta, parametros, segundos, filas, error):
+        if getattr(self._interno, 'activo', False):
+            return
+        self._asegurar_hilo()
+        huella = self._huella(consulta)
+        with self._lock:
+            estadistica = self._estadisticas.get(huella)
+            if estadistica is None:
+                if len(self._estadisticas) >= self.max_huellas:
+                    self._huellas_ignoradas += 1
+                    return
+                estadistica = EstadisticaConsulta(_RE_ESPACIOS.sub(' ', str(consulta)).strip()[:2000], self.muestras)
+                self._estadisticas[huella] = estadistica
+            estadistica.cantidad += 1
+            estadistica.total += segundos
+            estadistica.maximo = max(estadistica.maximo, segundos)
+            estadistica.filas += filas
+            estadistica.muestras.append(segundos)
+            if error is not None:
+                estadistica.errores += 1
+            explicar = (
+                self.explain_ms > 0 and error is None and estadistica.explain is None
+                and segundos * 1000 >= self.explain_ms and huella.startswith('select')
+            )
+            if explicar:
+                # Marca provisional: un solo EXPLAIN por huella
+                estadistica.explain = []
+        if explicar:
+            try:
+                self._explicar.put_nowait((huella, consulta, parametros))
+            except queue.Full:
+                with self._lock:
+                    estadistica.explain = None
+
+    def _bucle(self):
+        from modelos.base_datos import BaseDatos
+        self._interno.activo = True
+        base_datos = None
+        proximo_volcado = time.monotonic() + self.intervalo_volcado
+        while True:
+            try:
+                huella, consulta, parametros = self._explicar.get(timeout=max(1, proximo_volcado - time.monotonic()))
+            except queue.Empty:
+                huella = None
+            if huella is not None:
+                try:
+                    if base_datos is None:
+                        base_datos = BaseDatos()
+                    plan = base_datos.obtener_todos(f"EXPLAIN {consulta}", parametros) or []
+                except Exception as e:
+                    plan = [{'error': str(e)[:200]}]
+                finally:
+                    BaseDatos.liberar_conexion_hilo()
+                with self._lock:
+                    if huella in self._estadisticas:
+                        self._estadisticas[huella].explain = plan
+            if time.monotonic() >= proximo_volcado:
+                self.volcar()
+                proximo_volcado = time.monotonic() + self.intervalo_volcado
+
+    def resumen(self, top=20, orden='total'):
+        """Huellas más costosas según `orden` (total, p95, cantidad, filas o promedio)"""
+        with self._lock:
+            filas = [estadistica.como_dict(huella) for huella, estadistica in self._estadisticas.items()]
+            ignoradas = self._huellas_ignoradas
+        return {
+            'pid': os.getpid(),
+            'desde': self._desde.isoformat(timespec='seconds'),
+            'generado': datetime.now().isoformat(timespec='seconds'),
+            'huellas': len(filas),
+            'huellas_ignoradas': ignoradas,
+            'consultas': ordenar(filas, orden)[:top] if top else ordenar(filas, orden)
+        }
+
+    def reiniciar(self):
+        with self._lock:
+            self._estadisticas.clear()
+            self._huellas_ignoradas = 0
+            self._desde = datetime.now()
+
+    def volcar(self):
+        """Escribe el resumen completo en logs/perfil_consultas_<pid>.json"""
+        try:
+            os.makedirs(DIRECTORIO_VOLCADOS, exist_ok=True)
+            ruta = os.path.join(DIRECTORIO_VOLCADOS, f"perfil_consultas_{os.getpid()}.json")
+            temporal = ruta + ".tmp"
+            with open(temporal, 'w', encoding='utf-8') as archivo:
+                json.dump(self.resumen(top=None), archivo, ensure_ascii=False, default=str)
+            os.replace(temporal, ruta)
+        except Exception as e:
+            print(f"No se pudo volcar el perfil de consultas: {e}")
+
+
+def _clave_orden(orden):
+    return {
+        'total': 'total_ms',
+        'p95': 'p95_ms',
+        'cantidad': 'cantidad',
+        'filas': 'filas',
+        'promedio': 'promedio_ms'
+    }.get(orden, 'total_ms')
+
+
+def ordenar(filas, orden='total'):
+    clave = _clave_orden(orden)
+    return sorted(filas, key=lambda fila: fila[clave], reverse=True)
+
+
+def instalar_perfil():
+    """Activa el perfil en este proceso si DB_PROFILER_ENABLED=true"""
+    if PERFIL_CONSULTAS_CONFIG['enabled']:
+        PerfilConsultas.obtener().instalar()
+
+
+def combinar_volcados(directorio=DIRECTORIO_VOLCADOS, max_antiguedad=None):
+    """
+    Une por huella los volcados de los procesos activos
+
+    Se omiten los volcados generados hace más de `max_antiguedad` segundos
+    (por defecto INTERVALOS_VOLCADO_VIGENTE intervalos de volcado). El p95
+    combinado es el mayor p95 de los procesos (aproximado).
+
+    Returns:
+        tuple: (filas combinadas, cantidad de volcados omitidos)
+    """
+    if max_antiguedad is None:
+        max_antiguedad = INTERVALOS_VOLCADO_VIGENTE * PERFIL_CONSULTAS_CONFIG['intervalo_volcado']
+    ahora = datetime.now()
+    combinadas = {}
+    omitidos = 0
+    for ruta in glob.glob(os.path.join(directorio, "perfil_consultas_*.json")):
+        try:
+            with open(ruta, 'r', encoding='utf-8') as archivo:
+                volcado = json.load(archivo)
+            antiguedad = (ahora - datetime.fromisoformat(volcado['generado'])).total_seconds()
+        except (OSError, ValueError, KeyError, TypeError):
+            continue
+        if max_antiguedad and antiguedad > max_antiguedad:
+            omitidos += 1
+            continue
+        for fila in volcado.get('consultas') or []:
+            actual = combinadas.get(fila['huella'])
+            if actual is None:
+                combinadas[fila['huella']] = dict(fila)
+                continue
+            for campo in ('cantidad', 'total_ms', 'filas', 'errores'):
+                actual[campo] += fila[campo]
+            actual['p95_ms'] = max(actual['p95_ms'], fila['p95_ms'])
+            actual['max_ms'] = max(actual['max_ms'], fila['max_ms'])
+            actual['explain'] = actual.get('explain') or fila.get('explain')
+    for fila in combinadas.values():
+        if fila['cantidad']:
+            fila['promedio_ms'] = round(fila['total_ms'] / fila['cantidad'], 3)
+            fila['filas_promedio'] = round(fila['filas'] / fila['cantidad'], 1)
+    return list(combinadas.values()), omitidos
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Consultas SQL más costosas (perfil por huella)")
+    parser.add_argument("--top", type=int, default=20, help="Cantidad de huellas a mostrar")
+    parser.add_argument("--orden", choices=ORDENES, default="total", help="Criterio de orden")
+    parser.add_argument("--json", action="store_true", help="Salida en JSON")
+    parser.add_argument("--limpiar", action="store_true", help="Borra los volcados de logs/")
+    parser.add_argument(
+        "--todos", action="store_true",
+        help="Incluye los volcados de procesos terminados (sin renovar en los últimos intervalos)"
+    )
+    args = parser.parse_args()
+
+    if args.limpiar:
+        rutas = glob.glob(os.path.join(DIRECTORIO_VOLCADOS, "perfil_consultas_*.json"))
+        for ruta in rutas:
+            os.remove(ruta)
+        print(f"[OK] {len(rutas)} volcados eliminados")
+        return 0
+
+    filas, omitidos = combinar_volcados(max_antiguedad=0 if args.todos else None)
+    filas = ordenar(filas, args.orden)[:args.top]
+    if args.json:
+        print(json.dumps(filas, ensure_ascii=False, indent=2, default=str))
+        return 0
+    if omitidos:
+        print(f"({omitidos} volcados de procesos terminados omitidos; --todos para incluirlos)")
+    if not filas:
+        print("Sin datos: active DB_PROFILER_ENABLED=true y espere el primer volcado")
+        return 0
+    print(f"{'cantidad':>9} {'total ms':>11} {'prom ms':>9} {'p95 ms':>9} {'filas/ej':>9}  huella")
+    for fila in filas:
+        print(
+            f"{fila['cantidad']:>9} {fila['total_ms']:>11.1f} {fila['promedio_ms']:>9.2f} "
+            f"{fila['p95_ms']:>9.2f} {fila['filas_promedio']:>9.1f}  {fila['huella'][:160]}"
+        )
+        if fila.get('explain'):
+            for paso in fila['explain']:
+                print(f"{'':>51}EXPLAIN {json.dumps(paso, ensure_ascii=False, default=str)[:200]}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
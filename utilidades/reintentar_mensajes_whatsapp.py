@@ -26,37 +26,6 @@ class ServicioReintentosWhatsApp:
         self.chat_modelo = WhatsAppChatModelo()
         self.base_datos = BaseDatos()
         self.whatsapp = IntegracionWhatsApp()
-        self._asegurar_columnas_reintento()
-    
-    def _asegurar_columnas_reintento(self):
-        """Asegura que las columnas de reintento existan"""
-        try:
-            consulta = """
-            SELECT COUNT(*) as total
-            FROM information_schema.COLUMNS
-            WHERE TABLE_SCHEMA = DATABASE()
-              AND TABLE_NAME = 'whatsapp_mensajes'
-              AND COLUMN_NAME = 'intentos_reintento'
-            """
-            existe = self.base_datos.obtener_uno(consulta) or {}
-            if int(existe.get("total") or 0) == 0:
-                self.base_datos.ejecutar_consulta(
-                    "ALTER TABLE whatsapp_mensajes ADD COLUMN intentos_reintento INT DEFAULT 0"
-                )
-                self.base_datos.ejecutar_consulta(
-                    "ALTER TABLE whatsapp_mensajes ADD COLUMN fecha_ultimo_reintento TIMESTAMP NULL"
-                )
-                self.base_datos.ejecutar_consulta(
-                    "ALTER TABLE whatsapp_mensajes ADD COLUMN pendiente_reintento TINYINT(1) DEFAULT 0"
-                )
-                self.base_datos.ejecutar_consulta(
-                    "ALTER TABLE whatsapp_mensajes ADD COLUMN max_intentos_reintento INT DEFAULT 3"
-                )
-                self.base_datos.ejecutar_consulta(
-                    "ALTER TABLE whatsapp_mensajes ADD INDEX idx_pendiente_reintento (pendiente_reintento, estado, fecha_creacion)"
-                )
-        except Exception as e:
-            logger.warning(f"Error al asegurar columnas de reintento: {e}")
     
     def _es_error_no_reintentable(self, raw_json):
         """Determina si un error no debe reintentarse"""
@@ -0,0 +1,230 @@
+"""
+Pub/sub de eventos en tiempo real (stream SSE del chat de WhatsApp)
+
+Los modelos publican cambios (mensaje nuevo, no leídos, estado de entrega) y
+cada conexión SSE del proceso recibe una copia en su propia cola. Con varios
+procesos (workers de gunicorn, scheduler, hilos del webhook) REALTIME_BROKER=bd
+reenvía los eventos por la tabla eventos_tiempo_real: cada proceso con
+suscriptores la lee cada REALTIME_DB_POLL_MS (migración 0003).
+
+Los ids AUTO_INCREMENT se asignan al insertar, no al confirmar: una fila puede
+hacerse visible después de otra con id mayor. Por eso cada lectura repite los
+últimos VENTANA_RELECTURA ids y descarta los ya entregados. Una fila confirmada
+fuera de esa ventana se pierde; el cliente se pone al día con updated_since.
+"""
+import json
+import os
+import queue
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime
+from config import TIEMPO_REAL_CONFIG
+from utilidades.logger import obtener_logger
+
+
+# Ids previos al último leído que se vuelven a consultar (filas confirmadas tarde)
+VENTANA_RELECTURA = 200
+LIMITE_LECTURA = 500
+
+
+class Suscripcion:
+    """Cola de eventos de un cliente conectado"""
+
+    def __init__(self, canales, tamano_cola):
+        self.canales = set(canales)
+        self._cola = queue.Queue(tamano_cola)
+        # El cliente no leyó a tiempo y se descartaron eventos: debe resincronizar
+        self.desbordada = False
+
+    def entregar(self, evento):
+        if evento['canal'] not in self.canales:
+            return
+        try:
+            self._cola.put_nowait(evento)
+        except queue.Full:
+            self.desbordada = True
+
+    def siguiente(self, timeout):
+        """Próximo evento o None si no llegó ninguno en `timeout` segundos"""
+        try:
+            return self._cola.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class CanalEventos:
+    """Reparte los eventos publicados entre las suscripciones del proceso"""
+
+    _instancia = None
+    _lock_instancia = threading.Lock()
+
+    def __init__(self, broker='local', intervalo_bd=1.0, retencion_minutos=60, tamano_cola=500):
+        self.broker = broker
+        self.intervalo_bd = intervalo_bd
+        self.retencion_minutos = retencion_minutos
+        self.tamano_cola = tamano_cola
+        self.logger = obtener_logger()
+        self._lock = threading.Lock()
+        self._suscripciones = set()
+        self._salientes = queue.Queue(10000)
+        self._hay_suscriptores = threading.Event()
+        self._pid = None
+        self._origen = None
+
+    @classmethod
+    def obtener(cls):
+        with cls._lock_instancia:
+            if cls._instancia is None:
+                cls._instancia = cls(
+                    broker=TIEMPO_REAL_CONFIG['broker'],
+                    intervalo_bd=TIEMPO_REAL_CONFIG['intervalo_bd'],
+                    retencion_minutos=TIEMPO_REAL_CONFIG['retencion_minutos'],
+                    tamano_cola=TIEMPO_REAL_CONFIG['tamano_cola']
+                )
+            return cls._instancia
+
+    def _asegurar_hilos(self):
+        """Hilos del broker en BD (también tras un fork, donde los hilos no se heredan)"""
+        if self.broker != 'bd' or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            # Identifica las filas que escribe este proceso para no recibirlas dos veces
+            self._origen = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+            self._salientes = queue.Queue(10000)
+            threading.Thread(target=self._bucle_escritura, name="tiempo-real-escritura", daemon=True).start()
+            threading.Thread(target=self._bucle_lectura, name="tiempo-real-lectura", daemon=True).start()
+
+    def suscribir(self, canales):
+        self._asegurar_hilos()
+        suscripcion = Suscripcion(canales, self.tamano_cola)
+        with self._lock:
+            self._suscripciones.add(suscripcion)
+            self._hay_suscriptores.set()
+        return suscripcion
+
+    def desuscribir(self, suscripcion):
+        with self._lock:
+            self._suscripciones.discard(suscripcion)
+            if not self._suscripciones:
+                self._hay_suscriptores.clear()
+
+    def _repartir(self, evento):
+        with self._lock:
+            suscripciones = list(self._suscripciones)
+        for suscripcion in suscripciones:
+            suscripcion.entregar(evento)
+
+    def publicar(self, canal, tipo, datos):
+        """Entrega el evento a los suscriptores locales y, con broker bd, a los demás procesos"""
+        evento = {
+            'canal': canal,
+            'tipo': tipo,
+            'datos': datos,
+            'fecha': datetime.now().isoformat(timespec='milliseconds')
+        }
+        self._repartir(evento)
+        if self.broker == 'bd':
+            self._asegurar_hilos()
+            try:
+                self._salientes.put_nowait(evento)
+            except queue.Full:
+                self.logger.warning(f"Tiempo real: cola de salida llena, evento {canal}/{tipo} no reenviado")
+
+    def _bucle_escritura(self):
+        """Inserta por lotes los eventos publicados en este proceso y purga los viejos"""
+        from modelos.base_datos import BaseDatos
+        base_datos = BaseDatos()
+        proxima_limpieza = 0.0
+        while True:
+            lote = [self._salientes.get()]
+            while len(lote) < 200:
+                try:
+                    lote.append(self._salientes.get_nowait())
+                except queue.Empty:
+                    break
+            filas = [
+                (evento['canal'], evento['tipo'], json.dumps(evento['datos'], ensure_ascii=False, default=str), self._origen)
+                for evento in lote
+            ]
+            try:
+                with base_datos.transaccion() as cursor:
+                    cursor.executemany(
+                        "INSERT INTO eventos_tiempo_real (canal, tipo, datos, origen) VALUES (%s, %s, %s, %s)",
+                        filas
+                    )
+                if time.monotonic() >= proxima_limpieza:
+                    proxima_limpieza = time.monotonic() + 300
+                    base_datos.ejecutar_consulta(
+                        "DELETE FROM eventos_tiempo_real WHERE fecha_creacion < NOW() - INTERVAL %s MINUTE LIMIT 5000",
+                        (self.retencion_minutos,)
+                    )
+            except Exception as e:
+                self.logger.error(f"Tiempo real: no se pudieron reenviar {len(lote)} eventos: {e}")
+            finally:
+                BaseDatos.liberar_conexion_hilo()
+
+    def _bucle_lectura(self):
+        """Mientras haya suscriptores, lee los eventos que publicaron otros procesos"""
+        from modelos.base_datos import BaseDatos
+        base_datos = BaseDatos()
+        ultimo_id = None
+        # Ids ya entregados dentro de la ventana de relectura
+        vistos = set()
+        while True:
+            if not self._hay_suscriptores.is_set():
+                # Sin clientes no se consulta la tabla; al volver se parte del final
+                ultimo_id = None
+                self._hay_suscriptores.wait()
+            try:
+                if ultimo_id is None:
+                    fila = base_datos.obtener_uno("SELECT COALESCE(MAX(id), 0) AS id FROM eventos_tiempo_real") or {}
+                    ultimo_id = int(fila.get('id') or 0)
+                    # Lo que ya está en la ventana es anterior a la conexión: no se entrega
+                    vistos = {
+                        fila['id'] for fila in base_datos.obtener_todos(
+                            "SELECT id FROM eventos_tiempo_real WHERE id > %s",
+                            (ultimo_id - VENTANA_RELECTURA,)
+                        ) or []
+                    }
+                filas = base_datos.obtener_todos(
+                    "SELECT id, canal, tipo, datos, origen, fecha_creacion FROM eventos_tiempo_real "
+                    "WHERE id > %s ORDER BY id LIMIT %s",
+                    (ultimo_id - VENTANA_RELECTURA, LIMITE_LECTURA)
+                ) or []
+                for fila in filas:
+                    if fila['id'] in vistos:
+                        continue
+                    vistos.add(fila['id'])
+                    ultimo_id = max(ultimo_id, fila['id'])
+                    if fila['origen'] == self._origen:
+                        continue
+                    fecha = fila.get('fecha_creacion')
+                    self._repartir({
+                        'canal': fila['canal'],
+                        'tipo': fila['tipo'],
+                        'datos': json.loads(fila['datos']) if fila.get('datos') else None,
+                        'fecha': fecha.isoformat() if isinstance(fecha, datetime) else fecha
+                    })
+                vistos = {id_evento for id_evento in vistos if id_evento > ultimo_id - VENTANA_RELECTURA}
+                if len(filas) == LIMITE_LECTURA:
+                    continue
+            except Exception as e:
+                self.logger.error(f"Tiempo real: error al leer eventos de otros procesos: {e}")
+            finally:
+                BaseDatos.liberar_conexion_hilo()
+            time.sleep(self.intervalo_bd)
+
+
+def publicar(canal, tipo, datos):
+    """Publica un evento; nunca lanza excepciones (el cambio ya está guardado)"""
+    if not TIEMPO_REAL_CONFIG['enabled']:
+        return
+    try:
+        CanalEventos.obtener().publicar(canal, tipo, datos)
+    except Exception as e:
+        obtener_logger().warning(f"Tiempo real: no se pudo publicar {canal}/{tipo}: {e}")